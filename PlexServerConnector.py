@@ -0,0 +1,123 @@
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence
+
+
+PROBE_TIMEOUT_SECONDS = 5
+CONNECT_TIMEOUT_SECONDS = 8
+REMEMBERED_URI_TTL_SECONDS = 24 * 60 * 60
+MAX_PROBE_WORKERS = 8
+
+logger = logging.getLogger(__name__)
+
+
+class NoReachableConnection(ConnectionError):
+    """Raised when none of a server's candidate URIs answered a probe."""
+
+
+@dataclass(frozen=True)
+class ProbeResult:
+    uri: str
+    latency: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def describe(self) -> str:
+        if self.ok:
+            return f"{self.uri} {self.latency * 1000:.0f} ms"
+        return f"{self.uri} failed ({self.error})"
+
+
+def candidate_uris(resource: Any) -> List[str]:
+    """Connection URIs for a plex.tv resource or a cached server, best first."""
+    preferred = getattr(resource, "preferred_connections", None)
+    if callable(preferred):
+        uris = list(preferred())
+    else:
+        uris = list(getattr(resource, "connections", ()) or ())
+    return list(dict.fromkeys(uri for uri in uris if uri))
+
+
+def probe_identity(
+    uri: str,
+    token: Optional[str],
+    expected_identifier: str = "",
+    timeout: float = PROBE_TIMEOUT_SECONDS,
+) -> None:
+    """Check that ``uri`` answers ``/identity`` as the expected server.
+
+    ``/identity`` is the smallest endpoint a Plex server exposes, so the
+    probe measures reachability rather than response size. A server that
+    reports a different ``machineIdentifier`` (e.g. a stale LAN address now
+    used by another box) is treated as unreachable.
+    """
+    import requests
+
+    headers = {"Accept": "application/json"}
+    if token:
+        headers["X-Plex-Token"] = token
+    response = requests.get(f"{uri.rstrip('/')}/identity", headers=headers, timeout=timeout)
+    response.raise_for_status()
+    if expected_identifier:
+        try:
+            identifier = response.json()["MediaContainer"]["machineIdentifier"]
+        except (ValueError, KeyError, TypeError):
+            identifier = ""
+        if identifier and identifier != expected_identifier:
+            raise ConnectionError(f"answered as a different server ({identifier})")
+
+
+def race_connections(
+    uris: Sequence[str],
+    probe: Callable[[str], None],
+    clock: Callable[[], float] = time.monotonic,
+) -> List[ProbeResult]:
+    """Probe every URI concurrently and return as soon as one is healthy.
+
+    The first result in the returned list is the winner when it is ``ok``.
+    Failed probes that finished earlier follow it; probes still in flight
+    are abandoned rather than awaited.
+    """
+    if not uris:
+        return []
+    results: List[ProbeResult] = []
+    pool = ThreadPoolExecutor(
+        max_workers=min(MAX_PROBE_WORKERS, len(uris)),
+        thread_name_prefix="plex-probe",
+    )
+
+    def _probe(uri: str) -> ProbeResult:
+        started = clock()
+        try:
+            probe(uri)
+        except Exception as error:
+            return ProbeResult(uri=uri, error=str(error) or type(error).__name__)
+        return ProbeResult(uri=uri, latency=clock() - started)
+
+    try:
+        pending = {pool.submit(_probe, uri) for uri in uris}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result.ok:
+                    return [result] + results
+                results.append(result)
+        return results
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def remembered_uri_is_fresh(
+    remembered_at: Optional[float],
+    ttl: float = REMEMBERED_URI_TTL_SECONDS,
+    now: Optional[float] = None,
+) -> bool:
+    if not remembered_at:
+        return False
+    return (time.time() if now is None else now) - remembered_at < ttl
@@ -0,0 +1,445 @@
+import random
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+DEFAULT_WRITE_WORKERS = 4
+MIN_WRITE_WORKERS = 1
+MAX_WRITE_WORKERS = 16
+DEFAULT_WRITE_RETRIES = 2
+RETRY_BACKOFF_SECONDS = 0.5
+MAX_RETRY_AFTER_SECONDS = 30.0
+WRITE_LATENCY_TARGET_SECONDS = 1.0
+DECREASE_INTERVAL_SECONDS = 1.0
+CONCURRENCY_HISTORY_LIMIT = 200
+BREAKER_FAILURE_THRESHOLD = 8
+BREAKER_RESET_SECONDS = 30.0
+TRANSIENT_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+THROTTLE_STATUS_CODES = frozenset({429, 503})
+_TRANSIENT_ERROR_NAMES = frozenset({
+    "ConnectionError",
+    "ConnectTimeout",
+    "ReadTimeout",
+    "Timeout",
+    "ChunkedEncodingError",
+})
+_STATUS_PREFIX = re.compile(r"^\((\d{3})\)")
+
+
+def error_status_code(error: BaseException) -> Optional[int]:
+    """Return the HTTP status behind a Plex request error, when one is known."""
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    if isinstance(status, int):
+        return status
+    # plexapi.exceptions.BadRequest messages start with "(<status>) <codename>".
+    match = _STATUS_PREFIX.match(str(error))
+    return int(match.group(1)) if match else None
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Connection resets, timeouts and 408/429/5xx responses are worth retrying."""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    if any(cls.__name__ in _TRANSIENT_ERROR_NAMES for cls in type(error).__mro__):
+        return True
+    return error_status_code(error) in TRANSIENT_STATUS_CODES
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """The delay a 429/503 response asked for in its ``Retry-After`` header, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return min(float(headers.get("Retry-After")), MAX_RETRY_AFTER_SECONDS)
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of a write while a server's circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Stop sending writes to a server after sustained transient failures.
+
+    The breaker opens after ``failure_threshold`` consecutive transient
+    failures. While open, writes fail fast with :class:`CircuitOpenError`.
+    After ``reset_timeout`` seconds one trial request is let through: success
+    closes the breaker, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and self.clock() - self._opened_at < self.reset_timeout:
+                return False
+            if self._trial_in_flight:
+                return False
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.trips += 1
+                self._state = self.OPEN
+                self._opened_at = self.clock()
+                self._trial_in_flight = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            return {"state": state, "consecutiveFailures": self._failures, "trips": self.trips}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def circuit_breaker(server: Any) -> CircuitBreaker:
+    """The shared circuit breaker for ``server``, so every write path sees its health."""
+    server_id = str(getattr(server, "machineIdentifier", None) or f"object:{id(server)}")
+    with _breakers_lock:
+        breaker = _breakers.get(server_id)
+        if breaker is None:
+            breaker = _breakers[server_id] = CircuitBreaker()
+        return breaker
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on in-flight Plex writes.
+
+    Every ``limit`` fast, successful requests raise the limit by one, up to
+    ``maximum``. A transient error, a throttling response or a request slower
+    than ``latency_target`` halves it, down to ``minimum``. Decreases happen at
+    most once per ``decrease_interval``, so one burst of failures from requests
+    that were already in flight counts as a single congestion signal. Every
+    change is kept in ``history``.
+    """
+
+    def __init__(
+        self,
+        initial: int = DEFAULT_WRITE_WORKERS,
+        minimum: int = MIN_WRITE_WORKERS,
+        maximum: int = MAX_WRITE_WORKERS,
+        latency_target: float = WRITE_LATENCY_TARGET_SECONDS,
+        decrease_interval: float = DECREASE_INTERVAL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.latency_target = latency_target
+        self.decrease_interval = decrease_interval
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._limit = min(max(initial, self.minimum), self.maximum)
+        self._started = clock()
+        self._last_decrease: Optional[float] = None
+        self._successes = 0
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.slow = 0
+        self.total_latency = 0.0
+        self.history: List[Dict[str, Any]] = [{"t": 0.0, "limit": self._limit, "reason": "start"}]
+
+    @property
+    def limit(self) -> int:
+        with self._lock:
+            return self._limit
+
+    def record(self, latency: float, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self.requests += 1
+            self.total_latency += latency
+            if error is not None:
+                self.errors += 1
+                throttled = error_status_code(error) in THROTTLE_STATUS_CODES
+                if throttled:
+                    self.throttled += 1
+                self._decrease("throttled" if throttled else "error")
+            elif latency > self.latency_target:
+                self.slow += 1
+                self._decrease("latency")
+            else:
+                self._successes += 1
+                if self._successes >= self._limit and self._limit < self.maximum:
+                    self._set_limit(self._limit + 1, "increase")
+
+    def _decrease(self, reason: str) -> None:
+        now = self.clock()
+        self._successes = 0
+        if self._last_decrease is not None and now - self._last_decrease < self.decrease_interval:
+            return
+        self._last_decrease = now
+        if self._limit > self.minimum:
+            self._set_limit(max(self.minimum, self._limit // 2), reason)
+
+    def _set_limit(self, limit: int, reason: str) -> None:
+        self._limit = limit
+        self._successes = 0
+        self.history.append({
+            "t": round(self.clock() - self._started, 3),
+            "limit": limit,
+            "reason": reason,
+        })
+        if len(self.history) > CONCURRENCY_HISTORY_LIMIT:
+            del self.history[1:len(self.history) - CONCURRENCY_HISTORY_LIMIT + 1]
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limit": self._limit,
+                "minimum": self.minimum,
+                "maximum": self.maximum,
+                "peak": max(entry["limit"] for entry in self.history),
+                "requests": self.requests,
+                "errors": self.errors,
+                "throttled": self.throttled,
+                "slow": self.slow,
+                "avgLatencyMs": round(self.total_latency / self.requests * 1000, 1) if self.requests else None,
+                "history": list(self.history),
+            }
+
+
+def describe_write_stats(stats: Dict[str, Any]) -> str:
+    """One log line summarising :meth:`PlexWriteExecutor.stats`."""
+    concurrency = stats.get("concurrency")
+    if not concurrency or not concurrency["requests"]:
+        return "Write concurrency: no Plex writes were made"
+    line = (
+        f"Write concurrency: started at {concurrency['history'][0]['limit']}, "
+        f"peak {concurrency['peak']}, ended at {concurrency['limit']} "
+        f"({concurrency['requests']} requests, avg {concurrency['avgLatencyMs']} ms, "
+        f"{concurrency['errors']} transient errors, {concurrency['throttled']} throttled)"
+    )
+    circuit = stats.get("circuit")
+    if circuit and circuit["state"] != CircuitBreaker.CLOSED:
+        line += f"; circuit breaker {circuit['state'].replace('_', '-')}"
+    return line
+
+
+def rate_rating_key(server: Any, rating_key: Any, rating: Any) -> None:
+    """Set the user rating of one item by ratingKey; ``rating=-1`` clears it."""
+    server.query(
+        f"/:/rate?key={rating_key}&identifier=com.plexapp.plugins.library&rating={rating}",
+        method=server._session.put,
+    )
+
+
+def mark_watched_rating_key(server: Any, rating_key: Any) -> None:
+    """Mark one item watched by ratingKey for the user whose token ``server`` holds."""
+    server.query(f"/:/scrobble?key={rating_key}&identifier=com.plexapp.plugins.library")
+
+
+def mark_unwatched_rating_key(server: Any, rating_key: Any) -> None:
+    """Mark one item unwatched by ratingKey for the user whose token ``server`` holds."""
+    server.query(f"/:/unscrobble?key={rating_key}&identifier=com.plexapp.plugins.library")
+
+
+@dataclass
+class WriteOutcome:
+    task: Any
+    error: Optional[BaseException] = None
+    attempts: int = 1
+    result: Any = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class ProgressThrottle:
+    """Decide when a progress update is worth emitting.
+
+    An update is due when ``min_interval`` seconds have passed or progress
+    advanced by ``min_percent`` since the last one. The final item is always
+    reported so the UI finishes at 100%.
+    """
+
+    def __init__(
+        self,
+        total: int,
+        min_interval: float = 0.25,
+        min_percent: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.total = total
+        self.min_interval = min_interval
+        self.min_step = max(1.0, total * min_percent / 100.0)
+        self.clock = clock
+        self._last_time: Optional[float] = None
+        self._last_current = 0
+
+    def should_emit(self, current: int) -> bool:
+        now = self.clock()
+        due = (
+            current >= self.total
+            or self._last_time is None
+            or now - self._last_time >= self.min_interval
+            or current - self._last_current >= self.min_step
+        )
+        if due:
+            self._last_time = now
+            self._last_current = current
+        return due
+
+
+class PlexWriteExecutor:
+    """Run Plex write requests with adaptive concurrency, retries and a circuit breaker.
+
+    The number of requests in flight follows an :class:`AdaptiveConcurrency`
+    limit between ``min_workers`` and ``max_workers``, starting at
+    ``initial_workers``. Transient failures (see :func:`is_transient_error`)
+    are retried with jittered exponential backoff, honouring ``Retry-After``.
+    ``on_done`` receives every outcome in the calling thread, so callers can
+    update counters and emit progress without locks. Outcomes are not kept,
+    so memory stays flat however many writes an import makes.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = MAX_WRITE_WORKERS,
+        retries: int = DEFAULT_WRITE_RETRIES,
+        backoff: float = RETRY_BACKOFF_SECONDS,
+        sleep: Optional[Callable[[float], None]] = None,
+        initial_workers: int = DEFAULT_WRITE_WORKERS,
+        min_workers: int = MIN_WRITE_WORKERS,
+        latency_target: float = WRITE_LATENCY_TARGET_SECONDS,
+        breaker: Optional[CircuitBreaker] = None,
+        jitter: Callable[[], float] = random.random,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_workers = max(1, max_workers)
+        self.min_workers = min(max(1, min_workers), self.max_workers)
+        self.initial_workers = min(max(self.min_workers, initial_workers), self.max_workers)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.sleep = sleep or time.sleep
+        self.latency_target = latency_target
+        self.breaker = breaker
+        self.jitter = jitter
+        self.clock = clock
+        self.concurrency: Optional[AdaptiveConcurrency] = None
+
+    def run(
+        self,
+        tasks: Iterable[Any],
+        write: Callable[[Any], Any],
+        on_done: Optional[Callable[[WriteOutcome], None]] = None,
+    ) -> Dict[str, Any]:
+        """Write every task; returns :meth:`stats` for the run."""
+        concurrency = self.concurrency = AdaptiveConcurrency(
+            initial=self.initial_workers,
+            minimum=self.min_workers,
+            maximum=self.max_workers,
+            latency_target=self.latency_target,
+            clock=self.clock,
+        )
+
+        def _collect(futures):
+            for future in futures:
+                outcome = future.result()
+                if on_done:
+                    on_done(outcome)
+
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="plex-write",
+        ) as pool:
+            pending = set()
+            for task in tasks:
+                while len(pending) >= concurrency.limit:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    _collect(done)
+                pending.add(pool.submit(self._attempt, task, write, concurrency))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                _collect(done)
+        return self.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        """Concurrency over time and breaker state for the last :meth:`run`."""
+        data: Dict[str, Any] = {"concurrency": self.concurrency.to_dict() if self.concurrency else None}
+        if self.breaker is not None:
+            data["circuit"] = self.breaker.to_dict()
+        return data
+
+    def _attempt(self, task: Any, write: Callable[[Any], Any], concurrency: AdaptiveConcurrency) -> WriteOutcome:
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.breaker is not None and not self.breaker.allow():
+                return WriteOutcome(
+                    task=task,
+                    error=CircuitOpenError("Plex server is failing; writes are paused"),
+                    attempts=attempt,
+                )
+            started = self.clock()
+            try:
+                result = write(task)
+            except Exception as error:
+                transient = is_transient_error(error)
+                concurrency.record(self.clock() - started, error if transient else None)
+                if self.breaker is not None:
+                    if transient:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                if attempt > self.retries or not transient:
+                    return WriteOutcome(task=task, error=error, attempts=attempt)
+                self.sleep(self._retry_delay(attempt, error))
+                continue
+            concurrency.record(self.clock() - started)
+            if self.breaker is not None:
+                self.breaker.record_success()
+            return WriteOutcome(task=task, attempts=attempt, result=result)
+
+    def _retry_delay(self, attempt: int, error: BaseException) -> float:
+        # "Equal jitter": half the exponential step is fixed, half is random,
+        # so retries from parallel writers spread out but never collapse to 0.
+        step = self.backoff * (2 ** (attempt - 1))
+        delay = step / 2 + step / 2 * self.jitter()
+        requested = retry_after_seconds(error)
+        return max(delay, requested) if requested is not None else delay
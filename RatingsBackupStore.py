@@ -0,0 +1,244 @@
+import csv
+import gzip
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows, where the app is served by a single process.
+    fcntl = None
+
+
+CATALOG_FILENAME = "catalog.json"
+CATALOG_LOCK_FILENAME = "catalog.lock"
+DEFAULT_MAX_BACKUPS = 20
+DEFAULT_MAX_AGE_DAYS = 90
+BACKUP_FIELDNAMES = [
+    "Library", "RatingKey", "MediaType", "Title", "Year", "UserRating", "Guid"
+]
+
+# One lock for every store instance in this process: the catalog is a single
+# file per directory. Other worker processes are kept out with a file lock.
+_catalog_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class BackupRecord:
+    backup_id: str
+    filename: str
+    download_name: str
+    created_at: float
+    entries: int
+
+
+def fsync_directory(directory: str) -> None:
+    """Persist a rename on POSIX; directories cannot be opened on Windows."""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    try:
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_durably(path: str, data: bytes) -> None:
+    """Replace ``path`` atomically, syncing the data before and after the rename."""
+    temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(temporary_path, "wb") as handle:
+            handle.write(data)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temporary_path, path)
+    except Exception:
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
+        raise
+    fsync_directory(os.path.dirname(path) or ".")
+
+
+class RatingsBackupStore:
+    """Gzip-compressed rating backups recorded in a catalog on disk.
+
+    Rows are compressed and written while the caller's iterator is still
+    producing them. The file is fsynced before its atomic rename, and the
+    catalog (``catalog.json``) survives restarts so earlier backups stay
+    downloadable. Retention limits are applied after every new backup.
+    Catalog updates hold ``catalog.lock`` as well as a thread lock, so
+    several worker processes sharing the directory cannot drop each
+    other's records.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_backups: int = DEFAULT_MAX_BACKUPS,
+        max_age_days: float = DEFAULT_MAX_AGE_DAYS,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.directory = directory
+        self.max_backups = max_backups
+        self.max_age_days = max_age_days
+        self.clock = clock
+
+    @property
+    def catalog_path(self) -> str:
+        return os.path.join(self.directory, CATALOG_FILENAME)
+
+    @contextmanager
+    def _locked_catalog(self) -> Iterator[None]:
+        with _catalog_lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, CATALOG_LOCK_FILENAME), "a") as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def write(
+        self,
+        rows: Iterable[Dict[str, Any]],
+        download_prefix: str = "PlexRatingsBackup",
+    ) -> BackupRecord:
+        os.makedirs(self.directory, exist_ok=True)
+        backup_id = uuid.uuid4().hex
+        created_at = self.clock()
+        timestamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(created_at))
+        filename = f"{backup_id}.csv.gz"
+        final_path = os.path.join(self.directory, filename)
+        temporary_path = final_path + ".tmp"
+        entries = 0
+
+        try:
+            with open(temporary_path, "wb") as raw_file:
+                with gzip.GzipFile(fileobj=raw_file, mode="wb", filename="") as gzip_file:
+                    with io.TextIOWrapper(gzip_file, encoding="utf-8", newline="") as text_file:
+                        writer = csv.DictWriter(text_file, fieldnames=BACKUP_FIELDNAMES)
+                        writer.writeheader()
+                        for row in rows:
+                            writer.writerow(row)
+                            entries += 1
+                raw_file.flush()
+                os.fsync(raw_file.fileno())
+            os.replace(temporary_path, final_path)
+            fsync_directory(self.directory)
+        except BaseException:
+            try:
+                if os.path.isfile(temporary_path):
+                    os.remove(temporary_path)
+            except OSError:
+                pass
+            raise
+
+        record = BackupRecord(
+            backup_id=backup_id,
+            filename=filename,
+            download_name=f"{download_prefix}_{timestamp}_{backup_id[:8]}.csv.gz",
+            created_at=created_at,
+            entries=entries,
+        )
+        with self._locked_catalog():
+            catalog = [existing for existing in self._load_catalog() if existing.backup_id != backup_id]
+            catalog.append(record)
+            self._save_catalog(self._prune(catalog, keep=backup_id))
+        return record
+
+    def get(self, backup_id: str) -> Optional[Tuple[BackupRecord, str]]:
+        """Return a catalogued backup and its path, if the file still exists."""
+        if not isinstance(backup_id, str):
+            return None
+        with self._locked_catalog():
+            catalog = self._load_catalog()
+        for record in catalog:
+            if record.backup_id == backup_id:
+                path = os.path.join(self.directory, record.filename)
+                return (record, path) if os.path.isfile(path) else None
+        return None
+
+    def list(self) -> List[BackupRecord]:
+        with self._locked_catalog():
+            return sorted(self._load_catalog(), key=lambda record: record.created_at, reverse=True)
+
+    def _prune(self, catalog: List[BackupRecord], keep: str) -> List[BackupRecord]:
+        cutoff = self.clock() - self.max_age_days * 86400
+        newest_first = sorted(catalog, key=lambda record: record.created_at, reverse=True)
+        retained: List[BackupRecord] = []
+        for record in newest_first:
+            path = os.path.join(self.directory, record.filename)
+            expired = record.created_at < cutoff or len(retained) >= self.max_backups
+            if record.backup_id != keep and (expired or not os.path.isfile(path)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            retained.append(record)
+        return retained
+
+    def _load_catalog(self) -> List[BackupRecord]:
+        """The catalog; a missing or corrupt one is rebuilt from the backup files on disk.
+
+        A corrupt catalog is kept as ``catalog.json.corrupt-<timestamp>`` rather
+        than overwritten.
+        """
+        try:
+            with open(self.catalog_path, "r", encoding="utf-8") as catalog_file:
+                entries = json.load(catalog_file)
+            return [BackupRecord(**entry) for entry in entries]
+        except FileNotFoundError:
+            catalog = self._rebuild_catalog()
+        except (ValueError, TypeError):
+            corrupt_path = f"{self.catalog_path}.corrupt-{time.strftime('%Y%m%d_%H%M%S')}"
+            os.replace(self.catalog_path, corrupt_path)
+            catalog = self._rebuild_catalog()
+        if catalog:
+            self._save_catalog(catalog)
+        return catalog
+
+    def _rebuild_catalog(self) -> List[BackupRecord]:
+        catalog: List[BackupRecord] = []
+        try:
+            names = sorted(os.listdir(self.directory))
+        except OSError:
+            return catalog
+        for name in names:
+            backup_id = name[:-len(".csv.gz")]
+            if not name.endswith(".csv.gz") or len(backup_id) != 32:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                created_at = os.path.getmtime(path)
+                with gzip.open(path, "rt", encoding="utf-8", newline="") as backup_file:
+                    entries = max(0, sum(1 for _row in csv.reader(backup_file)) - 1)
+            except (OSError, EOFError, csv.Error, UnicodeDecodeError):
+                continue
+            timestamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(created_at))
+            catalog.append(BackupRecord(
+                backup_id=backup_id,
+                filename=name,
+                download_name=f"PlexRatingsBackup_{timestamp}_{backup_id[:8]}.csv.gz",
+                created_at=created_at,
+                entries=entries,
+            ))
+        return catalog
+
+    def _save_catalog(self, catalog: List[BackupRecord]) -> None:
+        data = json.dumps([asdict(record) for record in catalog], indent=1).encode("utf-8")
+        write_durably(self.catalog_path, data)
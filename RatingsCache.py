@@ -0,0 +1,200 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+CONNECTION_TTL_SECONDS = 30 * 60
+SECTIONS_TTL_SECONDS = 5 * 60
+MAX_CACHED_CONNECTIONS = 16
+MAX_CACHED_SECTION_LISTS = 16
+MAX_CACHED_INDEXES = 8
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    expirations: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        lookups = self.hits + self.misses
+        data["hitRate"] = round(self.hits / lookups, 4) if lookups else None
+        return data
+
+
+class TTLCache:
+    """A thread-safe LRU mapping whose entries expire ``ttl`` seconds after being stored.
+
+    ``get_or_load`` runs at most one loader per key at a time; other callers
+    wait for its result. A load that overlaps an ``invalidate`` of its key is
+    returned to its caller but not stored, so writes never leave stale data
+    behind.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        max_entries: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._loading: Dict[Hashable, threading.Event] = {}
+        self._generation = 0
+        self._stats = CacheStats()
+
+    def _lookup(self, key: Hashable, count: bool) -> Tuple[bool, Any]:
+        """Return ``(found, value)``; the caller holds the lock."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if self.clock() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                if count:
+                    self._stats.hits += 1
+                return True, entry[1]
+            del self._entries[key]
+            self._stats.expirations += 1
+        if count:
+            self._stats.misses += 1
+        return False, None
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (self.clock(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            found, value = self._lookup(key, count=True)
+        return value if found else default
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Like ``get`` without touching LRU order or statistics."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() - entry[0] < self.ttl:
+                return entry[1]
+        return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._store(key, value)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        counted = False
+        while True:
+            with self._lock:
+                found, value = self._lookup(key, count=not counted)
+                counted = True
+                if found:
+                    return value
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    generation = self._generation
+                    break
+            loading.wait()
+        try:
+            value = loader()
+            with self._lock:
+                if generation == self._generation:
+                    self._store(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            loading.set()
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> int:
+        """Drop every entry, or those whose key matches ``predicate``; returns the count."""
+        with self._lock:
+            self._generation += 1
+            keys = [key for key in self._entries if predicate is None or predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            self._stats.invalidations += len(keys)
+            return len(keys)
+
+    def pop(self, key: Hashable) -> None:
+        self.invalidate(lambda candidate: candidate == key)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            data = self._stats.to_dict()
+            data.update({
+                "size": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl,
+            })
+            return data
+
+
+@dataclass(frozen=True)
+class SectionInfo:
+    """Metadata for one Plex library section, plus the section object it came from."""
+
+    key: str
+    title: str
+    type: str
+    updated_at: Optional[float] = None
+    section: Any = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def from_section(cls, section: Any) -> "SectionInfo":
+        return cls(
+            key=str(getattr(section, "key", "") or ""),
+            title=getattr(section, "title", ""),
+            type=getattr(section, "type", "") or "",
+            updated_at=_timestamp(getattr(section, "updatedAt", None)),
+            section=section,
+        )
+
+    @property
+    def item_count(self) -> Optional[int]:
+        """Total items in the section, or ``None`` when Plex cannot say.
+
+        Plex needs a request per section to count, so this is only asked for
+        when used; plexapi memoizes it on the cached section object.
+        """
+        try:
+            return int(self.section.totalSize)
+        except Exception:
+            return None
+
+    def to_dict(self, include_count: bool = False) -> Dict[str, Any]:
+        data = {
+            "key": self.key,
+            "title": self.title,
+            "type": self.type,
+            "updatedAt": self.updated_at,
+        }
+        if include_count:
+            data["itemCount"] = self.item_count
+        return data
+
+
+def _timestamp(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    if hasattr(value, "timestamp"):
+        return value.timestamp()
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
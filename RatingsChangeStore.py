@@ -0,0 +1,225 @@
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+CHANGE_BATCH_SIZE = 500
+MAX_RECORDED_RUNS = 50
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    server TEXT,
+    server_name TEXT,
+    user TEXT,
+    source TEXT,
+    library TEXT,
+    undone_at REAL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    run_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    rating_key TEXT NOT NULL,
+    title TEXT,
+    year TEXT,
+    old_rating REAL,
+    new_rating REAL NOT NULL,
+    was_watched INTEGER,
+    applied INTEGER NOT NULL DEFAULT 0,
+    marked_watched INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (run_id, seq)
+);
+CREATE INDEX IF NOT EXISTS changes_by_rating_key ON changes (rating_key);
+CREATE INDEX IF NOT EXISTS runs_by_created_at ON runs (created_at);
+"""
+
+
+@dataclass(frozen=True)
+class RatingChange:
+    """A rating an import planned to write, with the state it replaces."""
+
+    rating_key: str
+    new_rating: float
+    old_rating: Optional[float] = None
+    title: str = ""
+    year: str = ""
+    was_watched: Optional[bool] = None
+    applied: bool = False
+    marked_watched: bool = False
+
+
+@dataclass(frozen=True)
+class ChangeRun:
+    run_id: str
+    created_at: float
+    server: Optional[str]
+    server_name: Optional[str]
+    user: Optional[str]
+    source: Optional[str]
+    library: Optional[str]
+    changes: int
+    applied: int
+    undone_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "runId": self.run_id,
+            "createdAt": self.created_at,
+            "server": self.server_name or self.server,
+            "user": self.user,
+            "source": self.source,
+            "library": self.library,
+            "changes": self.changes,
+            "applied": self.applied,
+            "undoneAt": self.undone_at,
+        }
+
+
+class ChangeStore:
+    """Every rating change made by import runs, in a local SQLite database.
+
+    Planned changes are stored (with the rating they replace) before Plex is
+    written, and marked applied in batches as writes succeed, so a run can be
+    undone by ratingKey even if it was interrupted. Only the newest
+    ``max_runs`` runs are kept.
+    """
+
+    def __init__(self, path: str, max_runs: int = MAX_RECORDED_RUNS):
+        self.path = path
+        self.max_runs = max_runs
+
+    def begin_run(
+        self,
+        details: Dict[str, Any],
+        changes: Sequence[RatingChange],
+        run_id: Optional[str] = None,
+    ) -> "ChangeRecorder":
+        run_id = run_id or uuid.uuid4().hex
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT INTO runs (run_id, created_at, server, server_name, user, source, library) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    run_id,
+                    time.time(),
+                    details.get("server"),
+                    details.get("serverName"),
+                    details.get("user"),
+                    details.get("source"),
+                    details.get("library"),
+                ),
+            )
+            connection.executemany(
+                "INSERT INTO changes (run_id, seq, rating_key, title, year, old_rating, new_rating, was_watched) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        run_id, seq, change.rating_key, change.title, change.year,
+                        change.old_rating, change.new_rating,
+                        None if change.was_watched is None else int(change.was_watched),
+                    )
+                    for seq, change in enumerate(changes)
+                ],
+            )
+            self._prune(connection)
+        return ChangeRecorder(self, run_id)
+
+    def runs(self, limit: int = 20) -> List[ChangeRun]:
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT r.run_id, r.created_at, r.server, r.server_name, r.user, r.source, r.library, "
+                "COUNT(c.seq), COALESCE(SUM(c.applied), 0), r.undone_at "
+                "FROM runs r LEFT JOIN changes c ON c.run_id = r.run_id "
+                "GROUP BY r.run_id ORDER BY r.created_at DESC, r.rowid DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [ChangeRun(*row[:9], undone_at=row[9]) for row in rows]
+
+    def get_run(self, run_id: str) -> Optional[ChangeRun]:
+        if not isinstance(run_id, str):
+            return None
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT r.run_id, r.created_at, r.server, r.server_name, r.user, r.source, r.library, "
+                "COUNT(c.seq), COALESCE(SUM(c.applied), 0), r.undone_at "
+                "FROM runs r LEFT JOIN changes c ON c.run_id = r.run_id "
+                "WHERE r.run_id = ? GROUP BY r.run_id",
+                (run_id,),
+            ).fetchone()
+        return ChangeRun(*row[:9], undone_at=row[9]) if row else None
+
+    def changes(self, run_id: str) -> List[RatingChange]:
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT rating_key, new_rating, old_rating, title, year, was_watched, applied, marked_watched "
+                "FROM changes WHERE run_id = ? ORDER BY seq",
+                (run_id,),
+            ).fetchall()
+        return [
+            RatingChange(
+                rating_key=row[0],
+                new_rating=row[1],
+                old_rating=row[2],
+                title=row[3] or "",
+                year=row[4] or "",
+                was_watched=None if row[5] is None else bool(row[5]),
+                applied=bool(row[6]),
+                marked_watched=bool(row[7]),
+            )
+            for row in rows
+        ]
+
+    def mark_undone(self, run_id: str) -> None:
+        with closing(self._connect()) as connection, connection:
+            connection.execute("UPDATE runs SET undone_at = ? WHERE run_id = ?", (time.time(), run_id))
+
+    def _mark_applied(self, run_id: str, outcomes: Sequence[Tuple[int, bool]]) -> None:
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                "UPDATE changes SET applied = 1, marked_watched = ? WHERE run_id = ? AND seq = ?",
+                [(int(watched), run_id, seq) for seq, watched in outcomes],
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.executescript(_SCHEMA)
+        return connection
+
+    def _prune(self, connection: sqlite3.Connection) -> None:
+        expired = [
+            row[0] for row in connection.execute(
+                "SELECT run_id FROM runs ORDER BY created_at DESC, rowid DESC LIMIT -1 OFFSET ?",
+                (self.max_runs,),
+            )
+        ]
+        for run_id in expired:
+            connection.execute("DELETE FROM changes WHERE run_id = ?", (run_id,))
+            connection.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+
+class ChangeRecorder:
+    """Marks one run's changes applied, a batch per transaction."""
+
+    def __init__(self, store: ChangeStore, run_id: str, batch_size: int = CHANGE_BATCH_SIZE):
+        self.store = store
+        self.run_id = run_id
+        self.batch_size = max(1, batch_size)
+        self._pending: List[Tuple[int, bool]] = []
+
+    def applied(self, seq: int, marked_watched: bool = False) -> None:
+        self._pending.append((seq, marked_watched))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._pending:
+            pending, self._pending = self._pending, []
+            self.store._mark_applied(self.run_id, pending)
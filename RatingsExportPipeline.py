@@ -0,0 +1,139 @@
+import csv
+import io
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+from RatingsImportPipeline import (
+    ImportPipelineError,
+    RatingsImportPipeline,
+    item_guids,
+    iter_rated_items,
+)
+
+
+EXPORT_COLUMNS = {
+    "IMDb": ("Const", "Your Rating", "Date Rated", "Title", "Title Type", "Year"),
+    "Letterboxd": ("Date", "Name", "Year", "Rating"),
+}
+EXPORT_SECTION_TYPES = {"IMDb": ("movie", "show"), "Letterboxd": ("movie",)}
+PLEX_TYPE_TO_IMDB_TYPE = {"movie": "Movie", "show": "TV Series", "episode": "TV Episode"}
+EXPORT_CHUNK_ROWS = 200
+
+
+def imdb_id(item: Any) -> Optional[str]:
+    """The item's IMDb ID (``tt...``) from the same GUIDs the import matches on."""
+    for guid in item_guids(item):
+        if guid.startswith("imdb://"):
+            return guid[len("imdb://"):]
+    return None
+
+
+def _rated_date(item: Any) -> str:
+    rated_at = getattr(item, "lastRatedAt", None)
+    return rated_at.strftime("%Y-%m-%d") if hasattr(rated_at, "strftime") else ""
+
+
+class RatingsExporter:
+    """Write what Plex currently holds as an IMDb- or Letterboxd-format ratings CSV.
+
+    Rated items are read a page at a time with the server-side ``userRating``
+    filter and turned into CSV text as they arrive, so an export is one pass
+    over the rated items and never holds the whole file. The columns are
+    the ones the import reads, so an export can be imported again.
+
+    IMDb rows need an IMDb ID, taken from the item's GUIDs exactly as the
+    import matches them; items without one are counted and left out.
+    Letterboxd rows are movies only, matched back by title and year. An
+    item present in several libraries is exported once.
+    """
+
+    def __init__(self, sections: Sequence[Any], fmt: str, include_episodes: bool = False):
+        if fmt not in EXPORT_COLUMNS:
+            raise ImportPipelineError(f"Unsupported export format: {fmt}")
+        self.fmt = fmt
+        self.sections = [
+            section for section in sections
+            if getattr(section, "type", None) in EXPORT_SECTION_TYPES[fmt]
+        ]
+        if not self.sections:
+            kinds = " or ".join(EXPORT_SECTION_TYPES[fmt])
+            raise ImportPipelineError(f"No {kinds} libraries to export {fmt} ratings from")
+        self.include_episodes = include_episodes and fmt == "IMDb"
+        self.stats: Dict[str, Any] = {
+            "format": fmt,
+            "sections": len(self.sections),
+            "rated": 0,
+            "exported": 0,
+            "missing_imdb_id": 0,
+            "duplicates": 0,
+        }
+
+    def rows(self) -> Iterator[Dict[str, str]]:
+        seen = set()
+        for item in self._rated_items():
+            self.stats["rated"] += 1
+            row = self._row(item)
+            if row is None:
+                continue
+            key = row["Const"] if self.fmt == "IMDb" else (row["Name"].lower(), row["Year"])
+            if key in seen:
+                self.stats["duplicates"] += 1
+                continue
+            seen.add(key)
+            self.stats["exported"] += 1
+            yield row
+
+    def iter_csv(self, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[str]:
+        """The CSV as text chunks of up to ``chunk_rows`` rows, header first."""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS[self.fmt], lineterminator="\n")
+        writer.writeheader()
+        pending = 0
+        for row in self.rows():
+            writer.writerow(row)
+            pending += 1
+            if pending >= chunk_rows:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        yield buffer.getvalue()
+
+    def _rated_items(self) -> Iterator[Any]:
+        for section in self.sections:
+            try:
+                yield from iter_rated_items(section)
+                if self.include_episodes and getattr(section, "type", None) == "show":
+                    yield from iter_rated_items(section, libtype="episode")
+            except Exception as error:
+                section_name = getattr(section, "title", "?")
+                raise ImportPipelineError(
+                    f'Could not read rated items of Plex library "{section_name}": {error}'
+                ) from error
+
+    def _row(self, item: Any) -> Optional[Dict[str, str]]:
+        rating = RatingsImportPipeline._current_rating(item)
+        if rating is None or rating <= 0:
+            return None
+        year = str(getattr(item, "year", "") or "")
+        title = getattr(item, "title", "") or ""
+        if self.fmt == "Letterboxd":
+            if getattr(item, "type", None) != "movie":
+                return None
+            stars = max(1, min(10, int(rating + 0.5))) / 2
+            return {"Date": _rated_date(item), "Name": title, "Year": year, "Rating": f"{stars:g}"}
+
+        title_type = PLEX_TYPE_TO_IMDB_TYPE.get(getattr(item, "type", None))
+        if title_type is None:
+            return None
+        const = imdb_id(item)
+        if const is None:
+            self.stats["missing_imdb_id"] += 1
+            return None
+        return {
+            "Const": const,
+            "Your Rating": str(max(1, min(10, int(rating + 0.5)))),
+            "Date Rated": _rated_date(item),
+            "Title": title,
+            "Title Type": title_type,
+            "Year": year,
+        }
@@ -0,0 +1,112 @@
+import csv
+import json
+import os
+import threading
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+
+IMDB_FAILURE_COLUMNS = ("Title", "Year", "IMDbID", "Reason", "YourRating", "TitleType")
+LETTERBOXD_FAILURE_COLUMNS = ("Title", "Year", "Reason", "YourRating")
+FAILURE_FORMATS = ("csv", "jsonl")
+_READ_CHUNK_BYTES = 64 * 1024
+
+
+def failure_columns(source: str) -> Tuple[str, ...]:
+    """CSV columns for a source's failure records, in a fixed order.
+
+    Letterboxd records have no IMDb ID or title type; any other source
+    (including merged IMDb+Letterboxd imports) gets the IMDb columns, which
+    are a superset.
+    """
+    if source.lower() == "letterboxd":
+        return LETTERBOXD_FAILURE_COLUMNS
+    return IMDB_FAILURE_COLUMNS
+
+
+class FailureLog:
+    """Unmatched and failed import rows, streamed to disk as they happen.
+
+    Each record is appended to a JSON-lines file and to a CSV whose columns
+    are fixed up front, and both are flushed per record, so the files are
+    complete up to the last failure even if the run dies. Only a count is
+    kept in memory. The files are created on the first failure; a run
+    without failures leaves none.
+
+    The pipeline treats a log like the list it used to fill: ``append``
+    adds a record, ``len`` is the number recorded and iterating reads the
+    records back from the JSON-lines file.
+    """
+
+    def __init__(self, base_path: str, columns: Sequence[str] = IMDB_FAILURE_COLUMNS):
+        self.jsonl_path = base_path + ".jsonl"
+        self.csv_path = base_path + ".csv"
+        self.columns = tuple(columns)
+        self.count = 0
+        self._lock = threading.Lock()
+        self._jsonl = None
+        self._csv = None
+        self._writer = None
+        self._sizes = {"jsonl": 0, "csv": 0}
+
+    def append(self, record: Dict[str, str]) -> None:
+        with self._lock:
+            if self._jsonl is None:
+                self._open()
+            self._jsonl.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._writer.writerow(record)
+            self._jsonl.flush()
+            self._csv.flush()
+            self._sizes = {"jsonl": self._jsonl.tell(), "csv": self._csv.tell()}
+            self.count += 1
+
+    def close(self) -> None:
+        with self._lock:
+            for handle in (self._jsonl, self._csv):
+                if handle is not None:
+                    handle.close()
+            self._jsonl = self._csv = self._writer = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        path, size = self.snapshot("jsonl")
+        if path is None:
+            return
+        with open(path, "rb") as handle:
+            while handle.tell() < size:
+                yield json.loads(handle.readline().decode("utf-8"))
+
+    def snapshot(self, fmt: str) -> Tuple[Optional[str], int]:
+        """The path of one output file and how many bytes of it are whole records.
+
+        A reader that stops at that size never sees a half-written row, even
+        while the run is still appending.
+        """
+        if fmt not in FAILURE_FORMATS:
+            raise ValueError(f"Unknown failure format: {fmt}")
+        with self._lock:
+            if not self.count:
+                return None, 0
+            return (self.csv_path if fmt == "csv" else self.jsonl_path), self._sizes[fmt]
+
+    def _open(self) -> None:
+        directory = os.path.dirname(self.jsonl_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._jsonl = open(self.jsonl_path, "w", encoding="utf-8", newline="")
+        self._csv = open(self.csv_path, "w", encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(self._csv, fieldnames=self.columns, extrasaction="ignore")
+        self._writer.writeheader()
+
+
+def read_prefix(path: str, size: int) -> Iterator[bytes]:
+    """Yield the first ``size`` bytes of a file in bounded chunks."""
+    with open(path, "rb") as handle:
+        remaining = size
+        while remaining > 0:
+            chunk = handle.read(min(_READ_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
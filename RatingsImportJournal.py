@@ -0,0 +1,282 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from RatingsBackupStore import fsync_directory
+
+
+JOURNAL_SUFFIX = ".jsonl"
+JOURNAL_SYNC_EVERY = 100
+JOURNAL_SYNC_SECONDS = 1.0
+MAX_COMPLETED_JOURNALS = 20
+_RUN_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class JournalError(Exception):
+    """Raised when an import journal cannot be read or resumed."""
+
+
+@dataclass(frozen=True)
+class JournalEntry:
+    """One rating write planned by an apply run, addressed by ratingKey."""
+
+    index: int
+    rating_key: str
+    rating: float
+    title: str = ""
+    year: str = ""
+
+    def to_record(self) -> Dict[str, Any]:
+        return {
+            "type": "planned",
+            "i": self.index,
+            "key": self.rating_key,
+            "rating": self.rating,
+            "title": self.title,
+            "year": self.year,
+        }
+
+
+@dataclass
+class JournalState:
+    """What a journal says about its run: the plan, and which writes are known to be done."""
+
+    run_id: str
+    path: str
+    details: Dict[str, Any]
+    entries: List[JournalEntry] = field(default_factory=list)
+    done: set = field(default_factory=set)
+    failed: Dict[int, str] = field(default_factory=dict)
+    complete: bool = False
+
+    @property
+    def remaining(self) -> List[JournalEntry]:
+        return [entry for entry in self.entries if entry.index not in self.done]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "runId": self.run_id,
+            "createdAt": self.details.get("createdAt"),
+            "source": self.details.get("source", ""),
+            "library": self.details.get("library", ""),
+            "server": self.details.get("serverName", ""),
+            "user": self.details.get("user"),
+            "total": len(self.entries),
+            "done": len(self.done),
+            "failed": len(self.failed),
+            "remaining": len(self.remaining),
+            "complete": self.complete,
+        }
+
+
+class ImportJournal:
+    """An append-only JSON-lines record of one apply run.
+
+    ``begin`` writes the run's details and every planned write, then fsyncs,
+    before Plex is touched. Outcomes are appended as they arrive and synced
+    every ``sync_every`` records or ``sync_interval`` seconds, so a crash can
+    lose at most one batch of outcomes; those items are simply written again
+    on resume, which is harmless because ratings are idempotent. The file is
+    only created by ``begin``, so runs with nothing to write leave no journal.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        details: Optional[Dict[str, Any]] = None,
+        sync_every: int = JOURNAL_SYNC_EVERY,
+        sync_interval: float = JOURNAL_SYNC_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.path = path
+        self.run_id = os.path.basename(path)[:-len(JOURNAL_SUFFIX)] if path.endswith(JOURNAL_SUFFIX) else ""
+        self.details = dict(details or {})
+        self.sync_every = max(1, sync_every)
+        self.sync_interval = sync_interval
+        self.clock = clock
+        self.syncs = 0
+        self._lock = threading.Lock()
+        self._handle = None
+        self._started = False
+        self._pending = 0
+        self._last_sync = 0.0
+
+    @property
+    def started(self) -> bool:
+        """Whether ``begin`` has created the journal file."""
+        return self._started
+
+    def begin(self, details: Dict[str, Any], entries: Sequence[JournalEntry]) -> None:
+        """Open a new journal and durably record the run before any write is made."""
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        record = {"type": "run", "runId": self.run_id, "createdAt": time.time()}
+        record.update(self.details)
+        record.update(details)
+        with self._lock:
+            self._handle = open(self.path, "x", encoding="utf-8")
+            self._started = True
+            self._append(record)
+            for entry in entries:
+                self._append(entry.to_record())
+            self._sync()
+        fsync_directory(directory)
+
+    def reopen(self) -> None:
+        """Continue an existing journal, e.g. to record a resumed run."""
+        with self._lock:
+            self._handle = open(self.path, "a", encoding="utf-8")
+            self._append({"type": "resume", "at": time.time()})
+            self._sync()
+
+    def record(self, index: int, error: Optional[BaseException] = None) -> None:
+        if error is None:
+            record: Dict[str, Any] = {"type": "done", "i": index}
+        else:
+            record = {"type": "failed", "i": index, "error": str(error)}
+        with self._lock:
+            if self._handle is None:
+                return
+            self._append(record)
+            self._pending += 1
+            if self._pending >= self.sync_every or self.clock() - self._last_sync >= self.sync_interval:
+                self._sync()
+
+    def close(self, complete: bool = True) -> None:
+        """Sync outstanding outcomes; ``complete`` marks the run finished.
+
+        Closing without ``complete`` (after an error) leaves the journal
+        resumable.
+        """
+        with self._lock:
+            if self._handle is None:
+                return
+            try:
+                if complete:
+                    self._append({"type": "end", "at": time.time()})
+                self._sync()
+            finally:
+                self._handle.close()
+                self._handle = None
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        self._handle.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def _sync(self) -> None:
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._pending = 0
+        self._last_sync = self.clock()
+        self.syncs += 1
+
+
+def read_journal(path: str) -> JournalState:
+    """Replay a journal. A torn final line (the process died mid-append) is ignored."""
+    try:
+        with open(path, "r", encoding="utf-8") as journal_file:
+            lines = journal_file.read().split("\n")
+    except OSError as error:
+        raise JournalError(f"Could not read import journal: {error}") from error
+
+    state: Optional[JournalState] = None
+    for number, line in enumerate(lines):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            if number == len(lines) - 1:
+                break
+            raise JournalError(f"Import journal is corrupt at line {number + 1}") from error
+        kind = record.get("type")
+        if kind == "run":
+            details = {key: value for key, value in record.items() if key != "type"}
+            state = JournalState(run_id=record.get("runId", ""), path=path, details=details)
+        elif state is None:
+            raise JournalError("Not an import journal; it does not start with a run record")
+        elif kind == "planned":
+            state.entries.append(JournalEntry(
+                index=int(record["i"]),
+                rating_key=str(record["key"]),
+                rating=float(record["rating"]),
+                title=record.get("title", ""),
+                year=record.get("year", ""),
+            ))
+        elif kind == "done":
+            state.done.add(int(record["i"]))
+            state.failed.pop(int(record["i"]), None)
+        elif kind == "failed":
+            state.failed[int(record["i"])] = record.get("error", "")
+        elif kind == "resume":
+            state.complete = False
+        elif kind == "end":
+            state.complete = True
+    if state is None:
+        raise JournalError("Import journal is empty")
+    return state
+
+
+class JournalStore:
+    """Import journals kept in one directory, named by run id."""
+
+    def __init__(self, directory: str, max_completed: int = MAX_COMPLETED_JOURNALS):
+        self.directory = directory
+        self.max_completed = max_completed
+
+    def create(self, details: Optional[Dict[str, Any]] = None) -> ImportJournal:
+        path = os.path.join(self.directory, uuid.uuid4().hex + JOURNAL_SUFFIX)
+        return ImportJournal(path, details=details)
+
+    def path(self, run_id: str) -> Optional[str]:
+        if not isinstance(run_id, str) or not _RUN_ID_PATTERN.match(run_id):
+            return None
+        path = os.path.join(self.directory, run_id + JOURNAL_SUFFIX)
+        return path if os.path.isfile(path) else None
+
+    def get(self, run_id: str) -> Optional[JournalState]:
+        path = self.path(run_id)
+        if path is None:
+            return None
+        try:
+            return read_journal(path)
+        except JournalError:
+            return None
+
+    def list(self, include_complete: bool = False) -> List[JournalState]:
+        """Journals newest first; by default only runs that can still be resumed."""
+        states = []
+        completed = []
+        for name in self._names():
+            try:
+                state = read_journal(os.path.join(self.directory, name))
+            except JournalError:
+                continue
+            if state.complete:
+                completed.append(state)
+            if include_complete or not state.complete:
+                states.append(state)
+        self._prune(completed)
+        return sorted(states, key=lambda state: state.details.get("createdAt") or 0, reverse=True)
+
+    def _names(self) -> List[str]:
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return [
+            name for name in names
+            if name.endswith(JOURNAL_SUFFIX) and _RUN_ID_PATTERN.match(name[:-len(JOURNAL_SUFFIX)])
+        ]
+
+    def _prune(self, completed: List[JournalState]) -> None:
+        completed.sort(key=lambda state: state.details.get("createdAt") or 0, reverse=True)
+        for state in completed[self.max_completed:]:
+            try:
+                os.remove(state.path)
+            except OSError:
+                pass
@@ -1,7 +1,23 @@
 import csv
 import math
-from dataclasses import dataclass, field
-from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+import time
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Optional, Sequence, Tuple, Union
+
+from PlexWriteExecutor import (
+    PlexWriteExecutor,
+    WriteOutcome,
+    circuit_breaker,
+    mark_watched_rating_key,
+    rate_rating_key,
+)
+from RatingsCache import MAX_CACHED_INDEXES, TTLCache
+from RatingsChangeStore import ChangeRecorder, ChangeStore, RatingChange
+from RatingsFailureLog import FailureLog
+from RatingsImportJournal import ImportJournal, JournalEntry, JournalState
+from RatingsPlanFile import SavedPlan
+from RatingsRestorePipeline import METADATA_BATCH_SIZE, fetch_items_by_rating_key
+from RatingsSessionStore import is_auth_error
 
 
 IMDB_TYPE_TO_PLEX_TYPES = {
@@ -13,11 +29,165 @@ IMDB_TYPE_TO_PLEX_TYPES = {
     "TV Episode": {"episode"},
 }
 
+RATED_ITEMS_PAGE_SIZE = 500
+EPISODES_PAGE_SIZE = 1000
+FILTER_REJECTED_PREFIXES = ("Unknown filter field", "Unknown filter operator", "Unknown operator")
+CONFLICT_PRIORITY = "priority"
+CONFLICT_RECENT = "recent"
+CONFLICT_RULES = (CONFLICT_PRIORITY, CONFLICT_RECENT)
+LIBRARY_INDEX_TTL_SECONDS = 300
+RATING_TOLERANCE = 0.01
+PREVIEW_COLUMNS = ("title", "year", "matched", "status", "newRating", "currentRating", "thumb", "source")
+# Status codes of the columnar preview; statuses not listed get codes after these.
+PREVIEW_STATUSES = (
+    "will_update", "unchanged", "not_found", "type_mismatch", "invalid_rating",
+    "missing_id", "missing_fields", "superseded",
+)
+CSV_REQUIRED_HEADERS = {
+    "IMDb": {"Const", "Title", "Title Type", "Your Rating", "Year"},
+    "Letterboxd": {"Name", "Year", "Rating"},
+}
+
 
 class ImportPipelineError(Exception):
     """Raised when an import plan cannot be built safely."""
 
 
+def detect_source(headers: Sequence[str], requested_source: str = "") -> str:
+    """Return the ratings source whose required columns are present in ``headers``.
+
+    Raises ``ValueError`` with a user-facing message when the requested source
+    is unknown or its columns are missing, or when no source matches.
+    """
+    if requested_source and requested_source not in CSV_REQUIRED_HEADERS:
+        raise ValueError("Unsupported ratings source")
+    sources_to_check = [requested_source] if requested_source else list(CSV_REQUIRED_HEADERS)
+    detected_source = next(
+        (
+            source
+            for source in sources_to_check
+            if CSV_REQUIRED_HEADERS[source].issubset(headers)
+        ),
+        None,
+    )
+    if detected_source:
+        return detected_source
+    if requested_source:
+        missing = sorted(CSV_REQUIRED_HEADERS[requested_source].difference(headers))
+        raise ValueError(
+            f"Invalid {requested_source} CSV; missing required columns: {', '.join(missing)}"
+        )
+    raise ValueError("Unsupported CSV format; expected an IMDb or Letterboxd ratings export")
+
+
+def positive_user_rating(item: Any) -> Optional[Any]:
+    """Return the item's user rating when one is set, otherwise ``None``."""
+    value = getattr(item, "userRating", None)
+    try:
+        return value if value is not None and float(value) > 0 else None
+    except (TypeError, ValueError):
+        return None
+
+
+def view_count_watched(item: Any) -> Optional[bool]:
+    """Whether ``item``'s ``viewCount`` says it was watched; ``None`` when unknown."""
+    view_count = getattr(item, "viewCount", None)
+    return bool(view_count) if isinstance(view_count, int) else None
+
+
+def _filter_rejected(error: BaseException) -> bool:
+    """True when the server (or plexapi's own validation) refused the ``userRating`` filter itself."""
+    if is_auth_error(error):
+        return False
+    names = {cls.__name__ for cls in type(error).__mro__}
+    if "BadRequest" in names:
+        return True
+    # plexapi's LibrarySection._validateFilterField raises NotFound for filters the section lacks.
+    return "NotFound" in names and str(error).startswith(FILTER_REJECTED_PREFIXES)
+
+
+def iter_rated_items(
+    section: Any,
+    page_size: int = RATED_ITEMS_PAGE_SIZE,
+    libtype: Optional[str] = None,
+) -> Iterator[Any]:
+    """Yield the items of a library section that carry a user rating.
+
+    Plex applies the ``userRating>>0`` filter server-side and results are
+    requested one page at a time, so unrated items are never transferred.
+    Servers that reject the filter fall back to a full client-side scan;
+    auth and network errors are raised rather than paid for with a scan.
+    ``libtype`` selects another item type of the section, e.g. ``"episode"``.
+    """
+    type_filter = {"libtype": libtype} if libtype else {}
+    start = 0
+    while True:
+        try:
+            page = section.search(
+                filters={"userRating>>": 0},
+                container_start=start,
+                container_size=page_size,
+                maxresults=page_size,
+                **type_filter,
+            )
+        except Exception as error:
+            if start or not _filter_rejected(error):
+                raise
+            everything = section.search(**type_filter) if libtype else section.all()
+            for item in everything:
+                if positive_user_rating(item) is not None:
+                    yield item
+            return
+        for item in page:
+            if positive_user_rating(item) is not None:
+                yield item
+        if len(page) < page_size:
+            return
+        start += page_size
+
+
+def iter_episodes(section: Any, page_size: int = EPISODES_PAGE_SIZE) -> Iterator[Any]:
+    """Yield every episode of a show section from paged ``libtype=episode`` requests.
+
+    Episodes come back with their GUIDs in bulk, so there is no per-show or
+    per-season walk.
+    """
+    start = 0
+    while True:
+        page = section.search(
+            libtype="episode",
+            container_start=start,
+            container_size=page_size,
+            maxresults=page_size,
+            includeGuids=True,
+        )
+        yield from page
+        if len(page) < page_size:
+            return
+        start += page_size
+
+
+def user_ratings(server: Any, sections: Sequence[Any], include_episodes: bool = False) -> Dict[str, float]:
+    """Current ratings of ``server``'s token user in ``sections``, keyed by ratingKey.
+
+    ``sections`` may come from another user's connection; each is reopened by
+    key on ``server`` and only its rated items are fetched, in pages. With
+    ``include_episodes`` the rated episodes of show sections are fetched too.
+    """
+    ratings: Dict[str, float] = {}
+    for section in sections:
+        user_section = server.library.sectionByID(int(section.key))
+        libtypes: List[Optional[str]] = [None]
+        if include_episodes and getattr(section, "type", None) == "show":
+            libtypes.append("episode")
+        for libtype in libtypes:
+            for item in iter_rated_items(user_section, libtype=libtype):
+                rating = RatingsImportPipeline._current_rating(item)
+                if rating is not None:
+                    ratings[str(item.ratingKey)] = rating
+    return ratings
+
+
 @dataclass(frozen=True)
 class ImportOptions:
     source: str
@@ -26,6 +196,7 @@ class ImportOptions:
     mark_watched: bool = False
     dry_run: bool = False
     all_libraries: bool = False
+    verify: bool = False
 
     @classmethod
     def from_values(cls, values: Dict[str, Any]) -> "ImportOptions":
@@ -56,6 +227,7 @@ class ImportOptions:
             mark_watched=bool(values.get("-WATCHED-", False)),
             dry_run=bool(values.get("-DRYRUN-", False)),
             all_libraries=bool(values.get("-ALLLIBS-", False)),
+            verify=bool(values.get("-VERIFY-", False)),
         )
 
 
@@ -68,6 +240,15 @@ class ParsedRow:
     rating_text: str
     title_type: str = ""
     external_id: str = ""
+    rated_at: str = ""
+
+
+@dataclass(frozen=True)
+class ImportSource:
+    """One CSV in a (possibly merged) import and the ratings source it holds."""
+
+    path: str
+    source: str
 
 
 @dataclass(frozen=True)
@@ -116,6 +297,7 @@ class PlanItem:
             "newRating": self.new_rating,
             "currentRating": self.current_rating,
             "thumb": self.thumb,
+            "source": self.parsed.source,
         }
 
     def failure_record(self, reason: Optional[str] = None) -> Dict[str, str]:
@@ -143,6 +325,7 @@ class ImportPlan:
     items: Sequence[PlanItem]
     total_rows: int
     options: ImportOptions
+    timings: Dict[str, float] = field(default_factory=dict)
 
     @property
     def matched_count(self) -> int:
@@ -156,6 +339,31 @@ class ImportPlan:
     def update_count(self) -> int:
         return sum(1 for item in self.items if item.status == "will_update")
 
+    def to_preview_columns(self) -> Dict[str, Any]:
+        """The preview as parallel arrays, one per field of :meth:`PlanItem.to_preview_dict`.
+
+        ``status`` and ``source`` hold indexes into the ``statuses`` and
+        ``sources`` tables and ``matched`` holds 0/1, so each row costs a few
+        bytes for those fields instead of repeating the key names and strings.
+        """
+        statuses = list(PREVIEW_STATUSES)
+        sources: List[str] = []
+        columns: Dict[str, List[Any]] = {name: [] for name in PREVIEW_COLUMNS}
+        for item in self.items:
+            if item.status not in statuses:
+                statuses.append(item.status)
+            if item.parsed.source not in sources:
+                sources.append(item.parsed.source)
+            columns["title"].append(item.title)
+            columns["year"].append(item.year)
+            columns["matched"].append(1 if item.matched else 0)
+            columns["status"].append(statuses.index(item.status))
+            columns["newRating"].append(item.new_rating)
+            columns["currentRating"].append(item.current_rating)
+            columns["thumb"].append(item.thumb)
+            columns["source"].append(sources.index(item.parsed.source))
+        return {"columns": columns, "statuses": statuses, "sources": sources, "count": len(self.items)}
+
 
 @dataclass(frozen=True)
 class ApplyResult:
@@ -164,16 +372,181 @@ class ApplyResult:
     failures: Sequence[Dict[str, str]]
 
 
+@dataclass(frozen=True)
+class LibraryIndex:
+    """GUID and title/year lookups for the items of one or more sections.
+
+    Episode GUIDs are only indexed when ``include_episodes`` is set, since
+    fetching every episode costs far more than the top-level items.
+    """
+
+    guid_lookup: Dict[str, Tuple[Any, Any]]
+    title_lookup: Dict[Tuple[str, str], Tuple[Any, Any]]
+    item_count: int = 0
+    episode_lookup: Dict[str, Tuple[Any, Any]] = field(default_factory=dict)
+    includes_episodes: bool = False
+
+    @classmethod
+    def build(cls, sections: Sequence[Any], include_episodes: bool = False) -> "LibraryIndex":
+        guid_lookup: Dict[str, Tuple[Any, Any]] = {}
+        title_lookup: Dict[Tuple[str, str], Tuple[Any, Any]] = {}
+        episode_lookup: Dict[str, Tuple[Any, Any]] = {}
+        item_count = 0
+        for section in sections:
+            try:
+                section_items = section.all()
+            except Exception as error:
+                section_name = getattr(section, "title", "?")
+                raise ImportPipelineError(
+                    f'Could not scan Plex library "{section_name}": {error}'
+                ) from error
+            for item in section_items:
+                item_count += 1
+                _index_guids(guid_lookup, item, section)
+                if getattr(item, "type", None) == "movie":
+                    title = (getattr(item, "title", "") or "").lower().strip()
+                    year = str(getattr(item, "year", "") or "")
+                    title_lookup.setdefault((title, year), (item, section))
+            if include_episodes and getattr(section, "type", None) == "show":
+                try:
+                    for episode in iter_episodes(section):
+                        item_count += 1
+                        _index_guids(episode_lookup, episode, section)
+                except Exception as error:
+                    section_name = getattr(section, "title", "?")
+                    raise ImportPipelineError(
+                        f'Could not fetch episodes of Plex library "{section_name}": {error}'
+                    ) from error
+        return cls(
+            guid_lookup=guid_lookup,
+            title_lookup=title_lookup,
+            item_count=item_count,
+            episode_lookup=episode_lookup,
+            includes_episodes=include_episodes,
+        )
+
+
+def _same_rating(left: Optional[float], right: Optional[float]) -> bool:
+    if left is None or right is None:
+        return left is None and right is None
+    return abs(left - right) < RATING_TOLERANCE
+
+
+def item_guids(item: Any) -> Iterator[str]:
+    """The item's primary GUID, then its external ones (``imdb://``, ``tmdb://``, ...)."""
+    primary_guid = getattr(item, "guid", None)
+    if primary_guid:
+        yield primary_guid
+    for guid in getattr(item, "guids", []) or []:
+        guid_id = getattr(guid, "id", None)
+        if guid_id:
+            yield guid_id
+
+
+def _index_guids(lookup: Dict[str, Tuple[Any, Any]], item: Any, section: Any) -> None:
+    for guid in item_guids(item):
+        lookup.setdefault(guid, (item, section))
+
+
+def _item_key(item: Any) -> Any:
+    rating_key = getattr(item, "ratingKey", None)
+    return ("ratingKey", str(rating_key)) if rating_key is not None else ("object", id(item))
+
+
+def find_section(server: Any, title: str, sections: Sequence[Any]) -> Any:
+    """The section called ``title`` from an already-fetched list, else from Plex."""
+    for section in sections:
+        if getattr(section, "title", None) == title:
+            return section
+    return server.library.section(title)
+
+
+def library_index_key(server: Any, sections: Sequence[Any]) -> Tuple[str, Tuple[str, ...]]:
+    server_id = getattr(server, "machineIdentifier", None) or f"object:{id(server)}"
+    section_ids = sorted(
+        str(getattr(section, "key", None) or getattr(section, "title", "")) for section in sections
+    )
+    return str(server_id), tuple(section_ids)
+
+
+class LibraryIndexCache:
+    """Share library indexes between background warm-up, previews and updates.
+
+    Entries expire after ``ttl`` seconds and must be invalidated after ratings
+    are written, because the indexed items carry the user rating used to plan
+    unchanged skips. Concurrent requests for the same key wait for a single
+    build instead of scanning the library twice.
+    """
+
+    def __init__(
+        self,
+        ttl: float = LIBRARY_INDEX_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+        max_entries: int = MAX_CACHED_INDEXES,
+    ):
+        self._cache = TTLCache("libraryIndexes", ttl, max_entries, clock=clock)
+
+    def get_or_build(
+        self, server: Any, sections: Sequence[Any], include_episodes: bool = False
+    ) -> LibraryIndex:
+        key = library_index_key(server, sections)
+        if not include_episodes:
+            # An index built with episodes also answers plain lookups.
+            with_episodes = self._cache.peek((key, True))
+            if with_episodes is not None:
+                return with_episodes
+        return self._cache.get_or_load(
+            (key, include_episodes),
+            lambda: LibraryIndex.build(sections, include_episodes=include_episodes),
+        )
+
+    def peek(
+        self, server: Any, sections: Sequence[Any], include_episodes: bool = False
+    ) -> Optional[LibraryIndex]:
+        key = library_index_key(server, sections)
+        index = self._cache.peek((key, True))
+        if index is None and not include_episodes:
+            index = self._cache.peek((key, False))
+        return index
+
+    def invalidate(self, server: Any = None) -> None:
+        if server is None:
+            self._cache.invalidate()
+            return
+        server_id = library_index_key(server, [])[0]
+        self._cache.invalidate(lambda key: key[0][0] == server_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
 class RatingsImportPipeline:
     """One import path used by both preview and update.
 
     Every import follows the same parse -> validate -> match -> plan -> apply
     stages. Applying a plan never performs a second match.
+
+    ``user_server`` imports for a Plex Home or managed user: matching still
+    uses ``server`` (and its cached index), while current ratings are read and
+    new ones written by ratingKey through the user's own connection.
     """
 
-    def __init__(self, server: Any, log: Optional[Callable[[str], None]] = None):
+    def __init__(
+        self,
+        server: Any,
+        log: Optional[Callable[[str], None]] = None,
+        index_cache: Optional[LibraryIndexCache] = None,
+        list_sections: Optional[Callable[[], Sequence[Any]]] = None,
+        user_server: Any = None,
+        executor: Optional[PlexWriteExecutor] = None,
+    ):
         self.server = server
         self.log = log or (lambda _message: None)
+        self.index_cache = index_cache
+        self.user_server = user_server
+        self.executor = executor
+        # Callers with a section cache pass it here; otherwise Plex is asked directly.
+        self.list_sections = list_sections or (lambda: self.server.library.sections())
 
     def parse(
         self,
@@ -200,6 +573,7 @@ class RatingsImportPipeline:
                         rating_text=(raw_row.get("Your Rating") or "").strip(),
                         title_type=title_type,
                         external_id=(raw_row.get("Const") or "").strip(),
+                        rated_at=(raw_row.get("Date Rated") or "").strip(),
                     )
                 elif options.source == "Letterboxd":
                     parsed_row = ParsedRow(
@@ -208,6 +582,7 @@ class RatingsImportPipeline:
                         title=(raw_row.get("Name") or "").strip(),
                         year=(raw_row.get("Year") or "").strip(),
                         rating_text=(raw_row.get("Rating") or "").strip(),
+                        rated_at=(raw_row.get("Date") or "").strip(),
                     )
                 else:
                     raise ImportPipelineError(f"Unsupported ratings source: {options.source}")
@@ -266,34 +641,15 @@ class RatingsImportPipeline:
         validated_rows: Sequence[ValidatedRow],
         sections: Sequence[Any],
         source: str,
+        index: Optional[LibraryIndex] = None,
     ) -> Sequence[MatchedRow]:
         if not validated_rows:
             return []
 
-        guid_lookup: Dict[str, Tuple[Any, Any]] = {}
-        title_lookup: Dict[Tuple[str, str], Tuple[Any, Any]] = {}
-
-        for section in sections:
-            try:
-                section_items = section.all()
-            except Exception as error:
-                section_name = getattr(section, "title", "?")
-                raise ImportPipelineError(
-                    f'Could not scan Plex library "{section_name}": {error}'
-                ) from error
-            for item in section_items:
-                if source == "IMDb":
-                    primary_guid = getattr(item, "guid", None)
-                    if primary_guid:
-                        guid_lookup.setdefault(primary_guid, (item, section))
-                    for guid in getattr(item, "guids", []) or []:
-                        guid_id = getattr(guid, "id", None)
-                        if guid_id:
-                            guid_lookup.setdefault(guid_id, (item, section))
-                elif getattr(item, "type", None) == "movie":
-                    title = (getattr(item, "title", "") or "").lower().strip()
-                    year = str(getattr(item, "year", "") or "")
-                    title_lookup.setdefault((title, year), (item, section))
+        if index is None:
+            index = self.library_index(sections)
+        guid_lookup = index.guid_lookup
+        title_lookup = index.title_lookup
 
         matched_rows: List[MatchedRow] = []
         for validated in validated_rows:
@@ -306,7 +662,9 @@ class RatingsImportPipeline:
                 continue
 
             parsed = validated.parsed
-            if source == "IMDb":
+            if source == "IMDb" and parsed.title_type == "TV Episode":
+                match = index.episode_lookup.get(f"imdb://{parsed.external_id}")
+            elif source == "IMDb":
                 match = guid_lookup.get(f"imdb://{parsed.external_id}")
             else:
                 match = title_lookup.get((parsed.title.lower(), parsed.year))
@@ -343,17 +701,65 @@ class RatingsImportPipeline:
             ))
         return matched_rows
 
+    def resolve_conflicts(
+        self,
+        matched_rows: Sequence[MatchedRow],
+        rule: str = CONFLICT_PRIORITY,
+    ) -> Sequence[MatchedRow]:
+        """Keep one rating per Plex item; the other rows for it become ``superseded``.
+
+        ``priority`` keeps the first row in input order, so earlier CSVs win.
+        ``recent`` keeps the most recently rated row and falls back to input
+        order when rating dates are missing or equal.
+        """
+        if rule not in CONFLICT_RULES:
+            raise ImportPipelineError(f"Unknown conflict rule: {rule}")
+        winners: Dict[Any, int] = {}
+        for position, matched in enumerate(matched_rows):
+            if matched.status or matched.plex_item is None:
+                continue
+            key = _item_key(matched.plex_item)
+            best = winners.get(key)
+            if best is None or (
+                rule == CONFLICT_RECENT
+                and matched.validated.parsed.rated_at > matched_rows[best].validated.parsed.rated_at
+            ):
+                winners[key] = position
+
+        resolved: List[MatchedRow] = []
+        for position, matched in enumerate(matched_rows):
+            if matched.status or matched.plex_item is None:
+                resolved.append(matched)
+                continue
+            winner_position = winners[_item_key(matched.plex_item)]
+            if winner_position == position:
+                resolved.append(matched)
+                continue
+            winner = matched_rows[winner_position].validated
+            resolved.append(replace(
+                matched,
+                status="superseded",
+                reason=f"Superseded by {winner.parsed.source} rating {winner.new_rating:g}",
+            ))
+        return resolved
+
     def plan(
         self,
         matched_rows: Sequence[MatchedRow],
         parsed_import: ParsedImport,
         options: ImportOptions,
+        current_ratings: Optional[Dict[str, float]] = None,
     ) -> ImportPlan:
         plan_items: List[PlanItem] = []
         for matched in matched_rows:
             parsed = matched.validated.parsed
             item = matched.plex_item
-            current_rating = self._current_rating(item) if item is not None else None
+            if item is None:
+                current_rating = None
+            elif current_ratings is not None:
+                current_rating = current_ratings.get(str(getattr(item, "ratingKey", "")))
+            else:
+                current_rating = self._current_rating(item)
             if matched.status:
                 status = matched.status
             elif (
@@ -385,6 +791,12 @@ class RatingsImportPipeline:
             options=options,
         )
 
+    def library_index(self, sections: Sequence[Any], include_episodes: bool = False) -> LibraryIndex:
+        """Return the match index for ``sections``, reusing a warm one when cached."""
+        if self.index_cache is None:
+            return LibraryIndex.build(sections, include_episodes=include_episodes)
+        return self.index_cache.get_or_build(self.server, sections, include_episodes=include_episodes)
+
     def build_plan(
         self,
         filepath: str,
@@ -392,13 +804,105 @@ class RatingsImportPipeline:
         options: ImportOptions,
         max_items: int = 0,
     ) -> ImportPlan:
-        sections = self._resolve_sections(selected_library, options.all_libraries)
-        parsed = self.parse(filepath, options, max_items=max_items)
-        validated = self.validate(parsed)
-        matched = self.match(validated, sections, options.source)
-        return self.plan(matched, parsed, options)
+        return self.build_merged_plan(
+            [ImportSource(filepath, options.source)],
+            selected_library,
+            options,
+            max_items=max_items,
+        )
+
+    def build_merged_plan(
+        self,
+        inputs: Sequence[ImportSource],
+        selected_library: str,
+        options: ImportOptions,
+        conflict_rule: str = CONFLICT_PRIORITY,
+        max_items: int = 0,
+    ) -> ImportPlan:
+        """Plan one import from several CSVs: one row stream, one index, one write per item.
+
+        ``options.source`` is ignored in favour of each input's own source;
+        ``max_items`` limits the rows parsed from each CSV.
+        """
+        if not inputs:
+            raise ImportPipelineError("No CSV files to import")
+        if conflict_rule not in CONFLICT_RULES:
+            raise ImportPipelineError(f"Unknown conflict rule: {conflict_rule}")
+        timings: Dict[str, float] = {}
+
+        def _timed(stage: str, run: Callable[[], Any]) -> Any:
+            started = time.perf_counter()
+            try:
+                return run()
+            finally:
+                timings[stage] = round(time.perf_counter() - started, 4)
+
+        def _parse_all() -> ParsedImport:
+            parsed_imports = [
+                self.parse(item.path, replace(options, source=item.source), max_items=max_items)
+                for item in inputs
+            ]
+            return ParsedImport(
+                rows=[row for parsed_import in parsed_imports for row in parsed_import.rows],
+                total_rows=sum(parsed_import.total_rows for parsed_import in parsed_imports),
+            )
+
+        def _match_all() -> List[MatchedRow]:
+            # Each source has its own match rule; results keep the input order
+            # that the priority rule depends on.
+            positions_by_source: Dict[str, List[int]] = {}
+            for position, row in enumerate(validated):
+                positions_by_source.setdefault(row.parsed.source, []).append(position)
+            matched_rows: List[Optional[MatchedRow]] = [None] * len(validated)
+            for source, positions in positions_by_source.items():
+                rows = self.match([validated[p] for p in positions], sections, source, index=index)
+                for position, matched_row in zip(positions, rows):
+                    matched_rows[position] = matched_row
+            return matched_rows
+
+        sources = list(dict.fromkeys(item.source for item in inputs))
+        plan_options = replace(options, source="+".join(sources))
+        sections = _timed(
+            "resolve",
+            lambda: self._resolve_sections(selected_library, options.all_libraries),
+        )
+        parsed = _timed("parse", _parse_all)
+        validated = _timed("validate", lambda: self.validate(parsed))
+        include_episodes = any(
+            row.parsed.title_type == "TV Episode" and not row.status for row in validated
+        )
+        index = _timed(
+            "index",
+            lambda: self.library_index(sections, include_episodes) if validated else None,
+        )
+        matched = _timed("match", _match_all)
+        merged = _timed("merge", lambda: self.resolve_conflicts(matched, conflict_rule))
+        current_ratings = None
+        if self.user_server is not None and validated:
+            current_ratings = _timed("ratings", lambda: user_ratings(self.user_server, sections, include_episodes))
+        plan = _timed("plan", lambda: self.plan(merged, parsed, plan_options, current_ratings))
+        plan.timings.update(timings)
+        return plan
+
+    def apply(
+        self,
+        plan: ImportPlan,
+        journal: Optional[ImportJournal] = None,
+        changes: Optional[ChangeStore] = None,
+        details: Optional[Dict[str, Any]] = None,
+        failure_log: Optional[FailureLog] = None,
+    ) -> ApplyResult:
+        """Write a plan to Plex.
 
-    def apply(self, plan: ImportPlan) -> ApplyResult:
+        With a ``journal``, every planned write is recorded before the first
+        one is made and each outcome as it completes, so an interrupted run
+        can be finished with :meth:`resume`. With a ``changes`` store, each
+        write is recorded with the rating and watched state it replaces, so
+        the run can be undone. ``details`` (library, user, ...) are stored
+        with both. With a ``failure_log``, failures are streamed to it as
+        they happen instead of being collected in memory, and it is returned
+        as the result's ``failures``.
+        """
         stats: Dict[str, Any] = {
             "updated": 0,
             "total_items": len(plan.items),
@@ -409,11 +913,24 @@ class RatingsImportPipeline:
             "not_found": 0,
             "type_mismatch": 0,
             "rate_failed": 0,
+            "superseded": 0,
+            "drifted": 0,
+            "verify_mismatch": 0,
+            "watched_marked": 0,
+            "watched_skipped": 0,
+            "watch_failed": 0,
             "dry_run": plan.options.dry_run,
         }
-        failures: List[Dict[str, str]] = []
+        failures = failure_log if failure_log is not None else []
+        to_write: List[PlanItem] = []
+        rated: List[PlanItem] = []
+        marked: set = set()
 
         for item in plan.items:
+            if item.status == "superseded":
+                stats["superseded"] += 1
+                self.log(f'Skipping "{item.title} ({item.year})" from {item.parsed.source}: {item.reason}')
+                continue
             if item.status == "unchanged":
                 stats["skipped_unchanged"] += 1
                 self.log(
@@ -432,41 +949,415 @@ class RatingsImportPipeline:
                         f'Plex: {getattr(item.plex_item, "type", "?")})'
                     )
                 continue
+            if plan.options.dry_run:
+                message = (
+                    f'[DRY RUN] Would update "{item.title} ({item.year})" '
+                    f'to {item.new_rating} ({item.new_rating / 2.0:.1f}\u2605)'
+                )
+                if plan.options.mark_watched:
+                    message += " and mark watched"
+                self.log(message)
+                stats["updated"] += 1
+                continue
+            to_write.append(item)
+
+        if to_write:
+            executor = self.executor or PlexWriteExecutor(
+                breaker=circuit_breaker(self.user_server if self.user_server is not None else self.server)
+            )
+            positions = {id(item): index for index, item in enumerate(to_write)}
+            run_details = self._run_details(plan.options)
+            run_details.update(details or {})
+            if journal is not None:
+                journal.begin(run_details, [
+                    JournalEntry(
+                        index=index,
+                        rating_key=str(item.plex_item.ratingKey),
+                        rating=item.new_rating,
+                        title=item.title,
+                        year=str(item.year or ""),
+                    )
+                    for index, item in enumerate(to_write)
+                ])
+            recorder = None
+            if changes is not None:
+                recorder = changes.begin_run(
+                    run_details,
+                    [
+                        RatingChange(
+                            rating_key=str(item.plex_item.ratingKey),
+                            new_rating=item.new_rating,
+                            old_rating=item.current_rating,
+                            title=item.title,
+                            year=str(item.year or ""),
+                            was_watched=self._was_watched(item.plex_item),
+                        )
+                        for item in to_write
+                    ],
+                    run_id=journal.run_id if journal is not None else None,
+                )
 
+            def _on_written(outcome: WriteOutcome) -> None:
+                item = outcome.task
+                if journal is not None:
+                    journal.record(positions[id(item)], outcome.error)
+                if recorder is not None and outcome.ok:
+                    recorder.applied(positions[id(item)])
+                if not outcome.ok:
+                    stats["rate_failed"] += 1
+                    failures.append(item.failure_record(reason=f"Rate failed: {outcome.error}"))
+                    return
+                self.log(
+                    f'Updated Plex rating for "{item.title} ({item.year})" '
+                    f'to {item.new_rating} ({item.new_rating / 2.0:.1f}\u2605)'
+                )
+                stats["updated"] += 1
+                rated.append(item)
+
+            def _on_marked(item: PlanItem) -> None:
+                marked.add(id(item))
+                if recorder is not None:
+                    recorder.applied(positions[id(item)], marked_watched=True)
+
+            completed = False
             try:
-                star_form = item.new_rating / 2.0
-                if plan.options.dry_run:
-                    message = (
-                        f'[DRY RUN] Would update "{item.title} ({item.year})" '
-                        f'to {item.new_rating} ({star_form:.1f}\u2605)'
+                executor.run(to_write, self._rate_function(), on_done=_on_written)
+                stats["writes"] = executor.stats()
+                if plan.options.mark_watched and rated:
+                    unwatched = [item for item in rated if self._was_watched(item.plex_item) is not True]
+                    stats["watched_skipped"] = len(rated) - len(unwatched)
+                    self._mark_watched_phase(
+                        executor,
+                        unwatched,
+                        self._mark_watched_function(),
+                        lambda item: f'"{item.title} ({item.year})"',
+                        stats,
+                        on_marked=_on_marked,
                     )
-                    if plan.options.mark_watched:
-                        message += " and mark watched"
-                    self.log(message)
+                completed = True
+            finally:
+                if journal is not None:
+                    journal.close(complete=completed)
+                if recorder is not None:
+                    recorder.flush()
+            if journal is not None:
+                stats["journal"] = journal.run_id
+            if recorder is not None:
+                stats["run_id"] = recorder.run_id
+            if plan.options.verify and rated:
+                self._verify([(item, id(item) in marked) for item in rated], stats, failures)
+
+        return ApplyResult(success=True, stats=stats, failures=failures)
+
+    def load_saved_plan(self, saved: SavedPlan, dry_run: bool = False) -> ImportPlan:
+        """Turn a saved plan back into an :class:`ImportPlan` without re-matching.
+
+        Planned updates are fetched by ratingKey in batches of
+        ``METADATA_BATCH_SIZE`` and checked for drift: an item whose rating
+        is no longer the one the plan saw is marked ``drifted`` and left
+        alone, one that already has the new rating is ``unchanged``, and one
+        that is gone is ``not_found``. Every other row keeps the status the
+        plan gave it.
+        """
+        server_id = getattr(self.server, "machineIdentifier", None)
+        if saved.server and server_id and saved.server != server_id:
+            raise ImportPipelineError(
+                f'This plan was made for server "{saved.server_name or saved.server}", '
+                f'not the one connected'
+            )
+        target = self.user_server if self.user_server is not None else self.server
+        planned_keys = [
+            entry.rating_key for entry in saved.items
+            if entry.status == "will_update" and entry.rating_key
+        ]
+        try:
+            current = fetch_items_by_rating_key(target, planned_keys) if planned_keys else {}
+        except Exception as error:
+            raise ImportPipelineError(f"Could not read the planned items from Plex: {error}") from error
+
+        items = []
+        for entry in saved.items:
+            parsed = ParsedRow(
+                source=entry.source or saved.source,
+                raw={},
+                title=entry.title,
+                year=entry.year,
+                rating_text=entry.rating_text,
+                title_type=entry.title_type,
+                external_id=entry.external_id,
+            )
+            status, reason = entry.status, entry.reason
+            plex_item = None
+            current_rating = entry.old_rating
+            if status == "will_update":
+                plex_item = current.get(entry.rating_key) if entry.rating_key else None
+                if plex_item is None:
+                    status, reason = "not_found", "Item is no longer in Plex"
                 else:
-                    item.plex_item.rate(rating=item.new_rating)
-                    self.log(
-                        f'Updated Plex rating for "{item.title} ({item.year})" '
-                        f'to {item.new_rating} ({star_form:.1f}\u2605)'
-                    )
-                    if plan.options.mark_watched:
-                        try:
-                            item.plex_item.markWatched()
-                            self.log(f'Marked "{item.title} ({item.year})" as watched')
-                        except Exception as error:
-                            self.log(f"Error marking as watched for {item.title}: {error}")
-                stats["updated"] += 1
-            except Exception as error:
+                    current_rating = self._current_rating(plex_item)
+                    if _same_rating(current_rating, entry.new_rating):
+                        status = "unchanged"
+                    elif not _same_rating(current_rating, entry.old_rating):
+                        status = "drifted"
+                        reason = (
+                            f"Rating changed since the plan was made "
+                            f"(plan: {entry.old_rating}, Plex: {current_rating})"
+                        )
+            items.append(PlanItem(
+                parsed=parsed,
+                status=status,
+                matched=entry.rating_key is not None,
+                new_rating=entry.new_rating,
+                current_rating=current_rating,
+                title=entry.title,
+                year=entry.year,
+                thumb=None,
+                plex_item=plex_item,
+                reason=reason,
+            ))
+
+        drifted = sum(1 for item in items if item.status == "drifted")
+        self.log(
+            f"Loaded saved plan {saved.hash[:12]}: {sum(1 for item in items if item.status == 'will_update')} "
+            f"of {saved.update_count} planned update(s) still apply, {drifted} drifted"
+        )
+        return ImportPlan(
+            source=saved.source,
+            items=items,
+            total_rows=saved.total_rows,
+            options=ImportOptions(
+                source=saved.source,
+                selected_media_types=frozenset(),
+                force_overwrite=bool(saved.options.get("forceOverwrite")),
+                mark_watched=bool(saved.options.get("markWatched")),
+                dry_run=dry_run,
+                all_libraries=bool(saved.options.get("allLibraries")),
+                verify=bool(saved.options.get("verify")),
+            ),
+        )
+
+    def _verify(
+        self,
+        written: Sequence[Tuple[PlanItem, bool]],
+        stats: Dict[str, Any],
+        failures: Union[List[Dict[str, str]], FailureLog],
+    ) -> None:
+        """Re-read written items in bulk and report those Plex did not store as planned.
+
+        Items are fetched by ratingKey in batches of ``METADATA_BATCH_SIZE``,
+        as the user who was written for, so verifying costs a handful of
+        requests rather than one per item.
+        """
+        target = self.user_server if self.user_server is not None else self.server
+        rating_keys = [item.plex_item.ratingKey for item, _watched in written]
+        started = time.perf_counter()
+        try:
+            stored = fetch_items_by_rating_key(target, rating_keys)
+        except Exception as error:
+            self.log(f"Could not verify the written ratings: {error}")
+            stats["verification"] = {"checked": 0, "error": str(error)}
+            return
+
+        mismatched = 0
+        for item, watched in written:
+            found = stored.get(str(item.plex_item.ratingKey))
+            if found is None:
+                reason = "Verification failed: item is no longer in Plex"
+            else:
+                rating = self._current_rating(found)
+                if rating is None or abs(rating - item.new_rating) >= RATING_TOLERANCE:
+                    reason = f"Verification failed: Plex has {rating}, expected {item.new_rating}"
+                elif watched and getattr(found, "viewCount", None) == 0:
+                    reason = "Verification failed: not marked watched"
+                else:
+                    continue
+            mismatched += 1
+            failures.append(item.failure_record(reason=reason))
+            self.log(f'{reason} for "{item.title} ({item.year})"')
+
+        unique_keys = len({str(key) for key in rating_keys})
+        stats["verify_mismatch"] = mismatched
+        stats["verification"] = {
+            "checked": len(written),
+            "mismatched": mismatched,
+            "requests": math.ceil(unique_keys / METADATA_BATCH_SIZE),
+            "seconds": round(time.perf_counter() - started, 4),
+        }
+        self.log(
+            f"Verified {len(written)} written ratings with {stats['verification']['requests']} "
+            f"request(s): {mismatched} mismatch(es)"
+        )
+
+    def resume(
+        self,
+        state: JournalState,
+        journal: ImportJournal,
+        changes: Optional[ChangeStore] = None,
+        failure_log: Optional[FailureLog] = None,
+    ) -> ApplyResult:
+        """Finish an interrupted apply run from its journal, by ratingKey and without a scan.
+
+        Writes the journal recorded as done are skipped; failed and unrecorded
+        ones are attempted again, and their outcomes appended to the journal
+        (and to the run's recorded changes, when ``changes`` has them).
+        ``failure_log`` works as for :meth:`apply`.
+        """
+        mark_watched = bool(state.details.get("markWatched"))
+        remaining = state.remaining
+        stats: Dict[str, Any] = {
+            "operation": "resume",
+            "total_items": len(state.entries),
+            "already_done": len(state.entries) - len(remaining),
+            "updated": 0,
+            "rate_failed": 0,
+            "watched_marked": 0,
+            "watch_failed": 0,
+            "dry_run": False,
+        }
+        failures = failure_log if failure_log is not None else []
+        rated: List[JournalEntry] = []
+        target = self.user_server if self.user_server is not None else self.server
+        if not remaining:
+            return ApplyResult(success=True, stats=stats, failures=failures)
+
+        recorder = None
+        if changes is not None and changes.get_run(state.run_id) is not None:
+            recorder = ChangeRecorder(changes, state.run_id)
+
+        def _on_written(outcome: WriteOutcome) -> None:
+            entry = outcome.task
+            journal.record(entry.index, outcome.error)
+            if recorder is not None and outcome.ok:
+                recorder.applied(entry.index)
+            if not outcome.ok:
                 stats["rate_failed"] += 1
-                failures.append(item.failure_record(reason=f"Rate failed: {error}"))
+                failures.append({
+                    "Title": entry.title,
+                    "Year": entry.year,
+                    "Reason": f"Rate failed: {outcome.error}",
+                    "YourRating": str(entry.rating),
+                })
+                return
+            self.log(
+                f'Updated Plex rating for "{entry.title} ({entry.year})" '
+                f'to {entry.rating} ({entry.rating / 2.0:.1f}\u2605)'
+            )
+            stats["updated"] += 1
+            rated.append(entry)
 
-        return ApplyResult(success=True, stats=stats, failures=failures)
+        def _on_marked(entry: JournalEntry) -> None:
+            if recorder is not None:
+                recorder.applied(entry.index, marked_watched=True)
+
+        self.log(
+            f"Resuming import: {stats['already_done']} of {len(state.entries)} writes "
+            f"already done, {len(remaining)} remaining"
+        )
+        executor = self.executor or PlexWriteExecutor(breaker=circuit_breaker(target))
+        journal.reopen()
+        completed = False
+        try:
+            executor.run(
+                remaining,
+                lambda entry: rate_rating_key(target, entry.rating_key, entry.rating),
+                on_done=_on_written,
+            )
+            stats["writes"] = executor.stats()
+            if mark_watched and rated:
+                # The journal holds no view counts; re-read them from the
+                # user's own server so watched items are not scrobbled again.
+                current = fetch_items_by_rating_key(target, [entry.rating_key for entry in rated])
+                unwatched = [
+                    entry for entry in rated
+                    if view_count_watched(current.get(str(entry.rating_key))) is not True
+                ]
+                stats["watched_skipped"] = len(rated) - len(unwatched)
+                self._mark_watched_phase(
+                    executor,
+                    unwatched,
+                    lambda entry: mark_watched_rating_key(target, entry.rating_key),
+                    lambda entry: f'"{entry.title} ({entry.year})"',
+                    stats,
+                    on_marked=_on_marked,
+                )
+            completed = True
+        finally:
+            journal.close(complete=completed)
+            if recorder is not None:
+                recorder.flush()
+        stats["journal"] = journal.run_id
+        return ApplyResult(success=stats["rate_failed"] == 0, stats=stats, failures=failures)
+
+    def _run_details(self, options: ImportOptions) -> Dict[str, Any]:
+        return {
+            "source": options.source,
+            "markWatched": options.mark_watched,
+            "server": getattr(self.server, "machineIdentifier", None),
+            "serverName": getattr(self.server, "friendlyName", None),
+        }
+
+    def _was_watched(self, item: Any) -> Optional[bool]:
+        """Whether the importing user had watched ``item``; ``None`` when unknown.
+
+        Items come from the owner's index, so their view count is not the
+        other user's when importing through ``user_server``.
+        """
+        if self.user_server is not None:
+            return None
+        return view_count_watched(item)
+
+    def _rate_function(self) -> Callable[[PlanItem], None]:
+        user_server = self.user_server
+
+        def _rate(item: PlanItem) -> None:
+            if user_server is not None:
+                rate_rating_key(user_server, item.plex_item.ratingKey, item.new_rating)
+            else:
+                item.plex_item.rate(rating=item.new_rating)
+
+        return _rate
+
+    def _mark_watched_function(self) -> Callable[[PlanItem], None]:
+        user_server = self.user_server
+
+        def _mark(item: PlanItem) -> None:
+            if user_server is not None:
+                mark_watched_rating_key(user_server, item.plex_item.ratingKey)
+            else:
+                item.plex_item.markWatched()
+
+        return _mark
+
+    def _mark_watched_phase(
+        self,
+        executor: PlexWriteExecutor,
+        tasks: Sequence[Any],
+        mark: Callable[[Any], None],
+        describe: Callable[[Any], str],
+        stats: Dict[str, Any],
+        on_marked: Callable[[Any], None],
+    ) -> None:
+        """Mark rated items watched as a second write phase through the same executor.
+
+        A failed mark does not fail the rating; it is counted as ``watch_failed``.
+        """
+        def _on_done(outcome: WriteOutcome) -> None:
+            if outcome.ok:
+                stats["watched_marked"] += 1
+                self.log(f"Marked {describe(outcome.task)} as watched")
+                on_marked(outcome.task)
+            else:
+                stats["watch_failed"] += 1
+                self.log(f"Error marking {describe(outcome.task)} as watched: {outcome.error}")
+
+        executor.run(tasks, mark, on_done=_on_done)
+        stats["watched_writes"] = executor.stats()
 
     def _resolve_sections(self, selected_library: str, all_libraries: bool) -> Sequence[Any]:
         try:
             if all_libraries:
                 sections = [
-                    section for section in self.server.library.sections()
+                    section for section in self.list_sections()
                     if getattr(section, "type", "") in ("movie", "show")
                 ]
                 if not sections:
@@ -474,7 +1365,7 @@ class RatingsImportPipeline:
                 return sections
             if not selected_library:
                 raise ImportPipelineError("No library selected")
-            return [self.server.library.section(selected_library)]
+            return [find_section(self.server, selected_library, self.list_sections())]
         except ImportPipelineError:
             raise
         except Exception as error:
@@ -0,0 +1,259 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+DEFAULT_JOB_WORKERS = 4
+DEFAULT_JOB_HISTORY = 100
+DEFAULT_LEASE_INTERVAL = 5.0
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+ACTIVE_JOB_STATES = frozenset({JOB_QUEUED, JOB_RUNNING})
+
+
+@dataclass
+class Job:
+    job_id: str
+    kind: str
+    server_id: Optional[str]
+    exclusive: bool
+    target: Callable[["Job"], Any] = field(repr=False)
+    status: str = JOB_QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = field(default=None, repr=False)
+    error: Optional[str] = None
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE_JOB_STATES
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.done.wait(timeout)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "jobId": self.job_id,
+            "kind": self.kind,
+            "server": self.server_id,
+            "exclusive": self.exclusive,
+            "status": self.status,
+            "createdAt": self.created_at,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """Run operations as jobs on a bounded worker pool.
+
+    Exclusive jobs (anything that writes to Plex) never overlap with another
+    exclusive job for the same server; they wait in the queue instead. Jobs
+    for different servers, and non-exclusive read-only jobs such as preview
+    builds, run in parallel up to ``max_workers``. Queued jobs start in
+    submission order as soon as they are allowed to run. Each target is
+    called with its own :class:`Job` so it can tag progress events.
+    ``on_change``, when given, is called with a job each time it is queued,
+    started, or finished.
+
+    ``leases`` (see ``RatingsStateStore.StoreLeases``) extends the per-server
+    rule to other processes: an exclusive job only starts once it holds its
+    server's lease, and stays queued while another worker holds it. Every
+    ``lease_interval`` seconds the leases of running jobs are renewed and
+    queued jobs are retried.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_JOB_WORKERS,
+        history_limit: int = DEFAULT_JOB_HISTORY,
+        on_change: Optional[Callable[[Job], None]] = None,
+        leases: Any = None,
+        lease_interval: float = DEFAULT_LEASE_INTERVAL,
+    ):
+        self.max_workers = max(1, max_workers)
+        self.history_limit = history_limit
+        self.on_change = on_change
+        self.leases = leases
+        self.lease_interval = lease_interval
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="ratings-job",
+        )
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._queue: List[Job] = []
+        self._running: List[Job] = []
+        self._leased: Dict[str, Job] = {}
+        self._heartbeat: Optional[threading.Thread] = None
+        # Renewals and releases are serialized so a renewal cannot put back
+        # a lease that was just released.
+        self._lease_lock = threading.Lock()
+
+    def submit(
+        self,
+        kind: str,
+        target: Callable[[Job], Any],
+        server_id: Optional[str] = None,
+        exclusive: bool = True,
+    ) -> Job:
+        job = Job(
+            job_id=uuid.uuid4().hex,
+            kind=kind,
+            server_id=server_id,
+            exclusive=exclusive,
+            target=target,
+        )
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._queue.append(job)
+            self._trim_history()
+        self._notify(job)
+        self._dispatch()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def active(
+        self,
+        kinds: Optional[Iterable[str]] = None,
+        server_id: Optional[str] = None,
+    ) -> List[Job]:
+        wanted = set(kinds) if kinds is not None else None
+        with self._lock:
+            return [
+                job for job in self._jobs.values()
+                if job.active
+                and (wanted is None or job.kind in wanted)
+                and (server_id is None or job.server_id == server_id)
+            ]
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Block until no job is queued or running; mainly for tests and shutdown."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                pending = list(self._queue) + list(self._running)
+            if not pending:
+                return True
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            pending[0].wait(remaining)
+
+    def _dispatch(self) -> None:
+        started = []
+        with self._lock:
+            busy_servers = {
+                job.server_id for job in self._running
+                if job.exclusive and job.server_id is not None
+            }
+            for job in list(self._queue):
+                if len(self._running) >= self.max_workers:
+                    break
+                if job.exclusive and job.server_id in busy_servers:
+                    continue
+                if not self._acquire_lease(job):
+                    # Held by another worker; later jobs for the server wait behind this one.
+                    busy_servers.add(job.server_id)
+                    continue
+                self._queue.remove(job)
+                self._running.append(job)
+                job.status = JOB_RUNNING
+                job.started_at = time.time()
+                if job.exclusive and job.server_id is not None:
+                    busy_servers.add(job.server_id)
+                started.append(job)
+                self._executor.submit(self._run, job)
+            if self._leased or any(self._needs_lease(job) for job in self._queue):
+                self._start_heartbeat()
+        for job in started:
+            self._notify(job)
+
+    def _run(self, job: Job) -> None:
+        try:
+            job.result = job.target(job)
+            job.status = JOB_SUCCEEDED
+        except Exception as error:
+            job.error = str(error)
+            job.status = JOB_FAILED
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._running.remove(job)
+                leased = self._leased.pop(job.job_id, None) is not None
+            if leased:
+                self._call_leases("release", job)
+            self._notify(job)
+            job.done.set()
+            self._dispatch()
+
+    def _needs_lease(self, job: Job) -> bool:
+        return self.leases is not None and job.exclusive and job.server_id is not None
+
+    def _acquire_lease(self, job: Job) -> bool:
+        if not self._needs_lease(job):
+            return True
+        try:
+            acquired = self.leases.acquire(job.server_id, job.job_id)
+        except Exception:
+            acquired = False
+        if acquired:
+            self._leased[job.job_id] = job
+        return acquired
+
+    def _call_leases(self, action: str, job: Job) -> None:
+        with self._lease_lock:
+            try:
+                getattr(self.leases, action)(job.server_id, job.job_id)
+            except Exception:
+                pass
+
+    def _start_heartbeat(self) -> None:
+        if self._heartbeat is not None:
+            return
+        self._heartbeat = threading.Thread(target=self._beat, name="ratings-job-leases", daemon=True)
+        self._heartbeat.start()
+
+    def _beat(self) -> None:
+        while True:
+            time.sleep(self.lease_interval)
+            with self._lock:
+                leased = list(self._leased.values())
+                if not leased and not any(self._needs_lease(job) for job in self._queue):
+                    self._heartbeat = None
+                    return
+            for job in leased:
+                self._call_leases("renew", job)
+            self._dispatch()
+
+    def _notify(self, job: Job) -> None:
+        if self.on_change is None:
+            return
+        try:
+            self.on_change(job)
+        except Exception:
+            pass
+
+    def _trim_history(self) -> None:
+        finished = sorted(
+            (job for job in self._jobs.values() if not job.active),
+            key=lambda job: job.created_at,
+        )
+        for job in finished[:max(0, len(self._jobs) - self.history_limit)]:
+            self._jobs.pop(job.job_id, None)
@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from RatingsImportPipeline import ImportPlan
+
+
+PLAN_FILE_TYPE = "ratings-plan"
+PLAN_FORMAT_VERSION = 1
+PLAN_SUFFIX = ".plan.jsonl"
+PLAN_COLUMNS = (
+    "ratingKey", "sectionKey", "oldRating", "newRating", "status", "reason",
+    "title", "year", "source", "externalId", "titleType", "ratingText",
+)
+
+
+class PlanFileError(Exception):
+    """Raised when a saved plan cannot be read, or was changed after it was written."""
+
+
+@dataclass(frozen=True)
+class PlannedItem:
+    """One row of a saved plan: the matched item by ratingKey, and what the plan decided."""
+
+    rating_key: Optional[str]
+    section_key: Optional[str]
+    old_rating: Optional[float]
+    new_rating: Optional[float]
+    status: str
+    reason: str = ""
+    title: str = ""
+    year: str = ""
+    source: str = ""
+    external_id: str = ""
+    title_type: str = ""
+    rating_text: str = ""
+
+    def to_row(self) -> List[Any]:
+        return [
+            self.rating_key, self.section_key, self.old_rating, self.new_rating, self.status, self.reason,
+            self.title, self.year, self.source, self.external_id, self.title_type, self.rating_text,
+        ]
+
+    @classmethod
+    def from_row(cls, row: List[Any]) -> "PlannedItem":
+        if not isinstance(row, list) or len(row) != len(PLAN_COLUMNS):
+            raise PlanFileError("Plan file has a malformed item row")
+        rating_key, section_key, old_rating, new_rating, status, *rest = row
+        return cls(
+            rating_key=None if rating_key is None else str(rating_key),
+            section_key=None if section_key is None else str(section_key),
+            old_rating=_optional_float(old_rating),
+            new_rating=_optional_float(new_rating),
+            status=str(status),
+            reason=str(rest[0] or ""),
+            title=str(rest[1] or ""),
+            year=str(rest[2] or ""),
+            source=str(rest[3] or ""),
+            external_id=str(rest[4] or ""),
+            title_type=str(rest[5] or ""),
+            rating_text=str(rest[6] or ""),
+        )
+
+
+@dataclass(frozen=True)
+class SavedPlan:
+    """An import plan without live Plex objects, as stored in a plan file."""
+
+    source: str
+    items: Tuple[PlannedItem, ...]
+    options: Dict[str, Any] = field(default_factory=dict)
+    server: Optional[str] = None
+    server_name: Optional[str] = None
+    library: str = ""
+    total_rows: int = 0
+    created_at: float = 0.0
+
+    @property
+    def hash(self) -> str:
+        return plan_hash(self._header(), (item.to_row() for item in self.items))
+
+    @property
+    def update_count(self) -> int:
+        return sum(1 for item in self.items if item.status == "will_update")
+
+    def to_dict(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for item in self.items:
+            counts[item.status] = counts.get(item.status, 0) + 1
+        return {
+            "hash": self.hash,
+            "createdAt": self.created_at,
+            "source": self.source,
+            "server": self.server_name or self.server,
+            "library": self.library,
+            "plannedUpdates": self.update_count,
+            "statuses": counts,
+        }
+
+    def _header(self) -> Dict[str, Any]:
+        return {
+            "type": PLAN_FILE_TYPE,
+            "version": PLAN_FORMAT_VERSION,
+            "createdAt": self.created_at,
+            "source": self.source,
+            "server": self.server,
+            "serverName": self.server_name,
+            "library": self.library,
+            "totalRows": self.total_rows,
+            "options": self.options,
+            "columns": list(PLAN_COLUMNS),
+            "count": len(self.items),
+        }
+
+
+def plan_hash(header: Dict[str, Any], rows: Iterable[List[Any]]) -> str:
+    """SHA-256 over the header (minus its own hash) and every row, in canonical JSON."""
+    digest = hashlib.sha256()
+    digest.update(_canonical({key: value for key, value in header.items() if key != "hash"}))
+    for row in rows:
+        digest.update(b"\n")
+        digest.update(_canonical(row))
+    return digest.hexdigest()
+
+
+def saved_plan(plan: "ImportPlan", server: Any = None, library: str = "") -> SavedPlan:
+    """Snapshot an in-memory plan by ratingKey so it can be written to a file."""
+    items = []
+    for item in plan.items:
+        rating_key = getattr(item.plex_item, "ratingKey", None) if item.plex_item is not None else None
+        section_key = getattr(item.section, "key", None) if item.section is not None else None
+        items.append(PlannedItem(
+            rating_key=None if rating_key is None else str(rating_key),
+            section_key=None if section_key is None else str(section_key),
+            old_rating=item.current_rating,
+            new_rating=item.new_rating,
+            status=item.status,
+            reason=item.reason,
+            title=item.title,
+            year=str(item.year or ""),
+            source=item.parsed.source,
+            external_id=item.parsed.external_id,
+            title_type=item.parsed.title_type,
+            rating_text=item.parsed.rating_text,
+        ))
+    return SavedPlan(
+        source=plan.source,
+        items=tuple(items),
+        options={
+            "markWatched": plan.options.mark_watched,
+            "forceOverwrite": plan.options.force_overwrite,
+            "verify": plan.options.verify,
+            "allLibraries": plan.options.all_libraries,
+        },
+        server=getattr(server, "machineIdentifier", None),
+        server_name=getattr(server, "friendlyName", None),
+        library=library,
+        total_rows=plan.total_rows,
+        created_at=round(time.time(), 3),
+    )
+
+
+def dump_plan(saved: SavedPlan) -> Iterator[str]:
+    """The plan file's lines: a JSON header carrying the hash, then one compact array per item."""
+    header = saved._header()
+    header["hash"] = saved.hash
+    yield json.dumps(header, separators=(",", ":")) + "\n"
+    for item in saved.items:
+        yield json.dumps(item.to_row(), separators=(",", ":"), ensure_ascii=False) + "\n"
+
+
+def write_plan(saved: SavedPlan, path: str) -> None:
+    partial = path + ".part"
+    with open(partial, "w", encoding="utf-8", newline="") as plan_file:
+        plan_file.writelines(dump_plan(saved))
+    os.replace(partial, path)
+
+
+def load_plan(lines: Iterable[str]) -> SavedPlan:
+    """Parse plan-file lines, rejecting other versions and any file whose hash does not match."""
+    iterator = iter(lines)
+    try:
+        header = json.loads(next(iterator))
+    except StopIteration:
+        raise PlanFileError("Plan file is empty") from None
+    except ValueError as error:
+        raise PlanFileError("Not a ratings plan file") from error
+    if not isinstance(header, dict) or header.get("type") != PLAN_FILE_TYPE:
+        raise PlanFileError("Not a ratings plan file")
+    if header.get("version") != PLAN_FORMAT_VERSION:
+        raise PlanFileError(f"Unsupported plan file version: {header.get('version')}")
+    if header.get("columns") != list(PLAN_COLUMNS):
+        raise PlanFileError("Plan file has unexpected columns")
+    rows = []
+    for number, line in enumerate(iterator, start=2):
+        if not line.strip():
+            continue
+        try:
+            rows.append(json.loads(line))
+        except ValueError as error:
+            raise PlanFileError(f"Plan file is corrupt at line {number}") from error
+    if len(rows) != header.get("count") or plan_hash(header, rows) != header.get("hash"):
+        raise PlanFileError("Plan file does not match its hash; it was modified or is incomplete")
+    return SavedPlan(
+        source=str(header.get("source") or ""),
+        items=tuple(PlannedItem.from_row(row) for row in rows),
+        options=dict(header.get("options") or {}),
+        server=header.get("server"),
+        server_name=header.get("serverName"),
+        library=str(header.get("library") or ""),
+        total_rows=int(header.get("totalRows") or 0),
+        created_at=float(header.get("createdAt") or 0.0),
+    )
+
+
+def read_plan(path: str) -> SavedPlan:
+    try:
+        with open(path, "r", encoding="utf-8") as plan_file:
+            return load_plan(plan_file)
+    except (OSError, UnicodeDecodeError) as error:
+        raise PlanFileError(f"Could not read plan file: {error}") from error
+
+
+def _canonical(value: Any) -> bytes:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _optional_float(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError) as error:
+        raise PlanFileError(f"Plan file has an invalid rating: {value!r}") from error
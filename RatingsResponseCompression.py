@@ -0,0 +1,91 @@
+import functools
+import gzip
+from typing import Any, Dict, Optional
+
+
+COMPRESSIBLE_MIMETYPES = ("application/json", "text/html")
+COMPRESSION_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+@functools.lru_cache(maxsize=None)
+def brotli_available() -> bool:
+    """Whether the optional ``brotli`` package is installed; looked up once per process."""
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """``Accept-Encoding`` as a map of coding to q-value; malformed q-values count as 0."""
+    accepted: Dict[str, float] = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """The content coding to use for a client: brotli when installed and accepted, else gzip.
+
+    Between two accepted codings the higher q-value wins; brotli wins a tie.
+    """
+    accepted = _accepted_encodings(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    candidates = ["br", "gzip"] if brotli_available() else ["gzip"]
+    best, best_quality = None, 0.0
+    for coding in candidates:
+        quality = accepted.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        import brotli
+
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response: Any, accept_encoding: str, min_bytes: int = COMPRESSION_MIN_BYTES) -> Any:
+    """Compress a buffered JSON or HTML response in place when it is large enough and the client accepts it.
+
+    Streamed responses (downloads, the log stream), error and partial
+    responses, and ones that already carry a ``Content-Encoding`` are left
+    alone.
+    """
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        or not 200 <= response.status_code < 300
+        or response.status_code in (204, 206)
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    if len(body) < min_bytes:
+        return response
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return response
+    response.set_data(compress(body, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
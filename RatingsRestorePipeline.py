@@ -0,0 +1,263 @@
+import csv
+import gzip
+import math
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from PlexWriteExecutor import (
+    PlexWriteExecutor,
+    WriteOutcome,
+    circuit_breaker,
+    error_status_code,
+    rate_rating_key,
+)
+
+
+BACKUP_REQUIRED_HEADERS = {"RatingKey", "Guid", "UserRating"}
+METADATA_BATCH_SIZE = 100
+GUID_BATCH_SIZE = 50
+_CSV_ESCAPED_PREFIXES = ("=", "+", "-", "@")
+
+
+class RestoreError(Exception):
+    """Raised when a ratings backup cannot be read or restored."""
+
+
+@dataclass(frozen=True)
+class RestoreRow:
+    library: str
+    rating_key: str
+    guid: str
+    title: str
+    year: str
+    rating: float
+
+
+@dataclass
+class RestoreTarget:
+    row: RestoreRow
+    rating_key: Optional[str] = None
+    resolved_by_guid: bool = False
+
+
+@dataclass(frozen=True)
+class RestoreResult:
+    success: bool
+    stats: Dict[str, Any]
+
+
+def fetch_items_by_rating_key(server: Any, rating_keys: Sequence[Any]) -> Dict[str, Any]:
+    """Load items with batched ``/library/metadata/<k1,k2,...>`` requests, keyed by ratingKey.
+
+    Keys that no longer exist are left out; other request errors propagate.
+    """
+    numeric_keys = sorted({int(key) for key in map(str, rating_keys) if key.isdigit()})
+    items: Dict[str, Any] = {}
+    for start in range(0, len(numeric_keys), METADATA_BATCH_SIZE):
+        batch = numeric_keys[start:start + METADATA_BATCH_SIZE]
+        try:
+            fetched = server.fetchItems(batch)
+        except Exception as error:
+            if error_status_code(error) == 404 or type(error).__name__ == "NotFound":
+                continue
+            raise
+        for item in fetched:
+            items[str(getattr(item, "ratingKey", ""))] = item
+    return items
+
+
+def _unescape_csv(value: Optional[str]) -> str:
+    """Undo the formula-injection escaping applied when the backup was written."""
+    text = (value or "").strip()
+    if len(text) > 1 and text[0] == "'" and text[1] in _CSV_ESCAPED_PREFIXES:
+        return text[1:]
+    return text
+
+
+def _open_backup(path: str):
+    with open(path, "rb") as probe:
+        compressed = probe.read(2) == b"\x1f\x8b"
+    if compressed:
+        return gzip.open(path, "rt", encoding="utf-8-sig", newline="")
+    return open(path, "r", encoding="utf-8-sig", newline="")
+
+
+def read_backup(path: str) -> Sequence[RestoreRow]:
+    """Parse a PlexRatingsBackup CSV (plain or gzip-compressed) into restorable rows."""
+    try:
+        return _read_backup_rows(path)
+    except (gzip.BadGzipFile, EOFError) as error:
+        raise RestoreError(f"Backup file is not a valid compressed backup: {error}") from error
+
+
+def _read_backup_rows(path: str) -> Sequence[RestoreRow]:
+    rows: List[RestoreRow] = []
+    with _open_backup(path) as backup_file:
+        reader = csv.DictReader(backup_file)
+        missing = BACKUP_REQUIRED_HEADERS.difference(reader.fieldnames or [])
+        if missing:
+            raise RestoreError(
+                f"Not a ratings backup; missing required columns: {', '.join(sorted(missing))}"
+            )
+        for raw_row in reader:
+            try:
+                rating = float(raw_row.get("UserRating") or "")
+            except ValueError:
+                continue
+            rating_key = _unescape_csv(raw_row.get("RatingKey"))
+            guid = _unescape_csv(raw_row.get("Guid"))
+            if not math.isfinite(rating) or not 0 < rating <= 10 or not (rating_key or guid):
+                continue
+            rows.append(RestoreRow(
+                library=_unescape_csv(raw_row.get("Library")),
+                rating_key=rating_key,
+                guid=guid,
+                title=_unescape_csv(raw_row.get("Title")),
+                year=_unescape_csv(raw_row.get("Year")),
+                rating=rating,
+            ))
+    return rows
+
+
+class RatingsRestorePipeline:
+    """Write ratings from a backup straight back to Plex by ratingKey.
+
+    RatingKeys are verified with batched ``/library/metadata/<k1,k2,...>``
+    requests. Only rows whose key no longer exists (or now points at a
+    different GUID) fall back to a GUID lookup: a ``guid=`` search per batch
+    of GUIDs in the row's own library. Rows whose library no longer exists
+    are only looked up in every library with ``search_all_libraries``.
+    """
+
+    def __init__(
+        self,
+        server: Any,
+        log: Optional[Callable[[str], None]] = None,
+        executor: Optional[PlexWriteExecutor] = None,
+        list_sections: Optional[Callable[[], Sequence[Any]]] = None,
+        search_all_libraries: bool = False,
+    ):
+        self.server = server
+        self.search_all_libraries = search_all_libraries
+        self.log = log or (lambda _message: None)
+        self.executor = executor or PlexWriteExecutor(breaker=circuit_breaker(server))
+        self.list_sections = list_sections or (lambda: self.server.library.sections())
+
+    def resolve(self, rows: Sequence[RestoreRow]) -> List[RestoreTarget]:
+        targets = [RestoreTarget(row=row) for row in rows]
+        existing = self._existing_guids([row.rating_key for row in rows if row.rating_key])
+        unresolved: List[RestoreTarget] = []
+        for target in targets:
+            key = target.row.rating_key
+            if key in existing and (not target.row.guid or existing[key] in ("", target.row.guid)):
+                target.rating_key = key
+            else:
+                unresolved.append(target)
+
+        if unresolved:
+            self.log(f"{len(unresolved)} backup entries need a GUID lookup")
+            guid_lookup = self._guid_lookup(unresolved)
+            for target in unresolved:
+                rating_key = guid_lookup.get(target.row.guid) if target.row.guid else None
+                if rating_key:
+                    target.rating_key = rating_key
+                    target.resolved_by_guid = True
+        return targets
+
+    def restore(
+        self,
+        rows: Sequence[RestoreRow],
+        on_progress: Optional[Callable[[int, int], None]] = None,
+    ) -> RestoreResult:
+        targets = self.resolve(rows)
+        writable = [target for target in targets if target.rating_key]
+        stats: Dict[str, Any] = {
+            "operation": "restore",
+            "total_items": len(rows),
+            "restored": 0,
+            "resolved_by_guid": sum(1 for target in writable if target.resolved_by_guid),
+            "not_found": len(targets) - len(writable),
+            "failed": 0,
+        }
+        for target in targets:
+            if not target.rating_key:
+                self.log(f'Could not find "{target.row.title} ({target.row.year})" on the server')
+
+        done = 0
+
+        def _write(target: RestoreTarget):
+            rate_rating_key(self.server, target.rating_key, target.row.rating)
+
+        def _on_done(outcome: WriteOutcome):
+            nonlocal done
+            target = outcome.task
+            if outcome.ok:
+                stats["restored"] += 1
+                self.log(
+                    f'Restored rating for "{target.row.title} ({target.row.year})" '
+                    f'to {target.row.rating}'
+                )
+            else:
+                stats["failed"] += 1
+                self.log(f'Failed to restore rating for "{target.row.title}": {outcome.error}')
+            done += 1
+            if on_progress:
+                on_progress(done, len(writable))
+
+        self.executor.run(writable, _write, on_done=_on_done)
+        if writable:
+            stats["writes"] = self.executor.stats()
+        return RestoreResult(success=stats["failed"] == 0, stats=stats)
+
+    def _existing_guids(self, rating_keys: Sequence[str]) -> Dict[str, str]:
+        """Map each ratingKey that still exists on the server to its GUID."""
+        try:
+            items = fetch_items_by_rating_key(self.server, rating_keys)
+        except Exception as error:
+            raise RestoreError(f"Could not look up backup items in Plex: {error}") from error
+        return {key: getattr(item, "guid", "") or "" for key, item in items.items()}
+
+    def _guid_lookup(self, targets: Sequence[RestoreTarget]) -> Dict[str, str]:
+        """Map the GUIDs of ``targets`` to current ratingKeys with batched ``guid=`` searches."""
+        try:
+            sections = [
+                section for section in self.list_sections()
+                if getattr(section, "type", "") in ("movie", "show")
+            ]
+        except Exception as error:
+            raise RestoreError(f"Could not list Plex libraries: {error}") from error
+        guids_by_library: Dict[str, List[str]] = {}
+        for target in targets:
+            if target.row.guid:
+                guids_by_library.setdefault(target.row.library, []).append(target.row.guid)
+
+        lookup: Dict[str, str] = {}
+        for library, guids in guids_by_library.items():
+            named = [section for section in sections if section.title == library]
+            if not named:
+                if not self.search_all_libraries:
+                    self.log(
+                        f'Library "{library}" no longer exists; {len(guids)} backup entries were not '
+                        f"looked up (search all libraries to include them)"
+                    )
+                    continue
+                self.log(f'Library "{library}" no longer exists; looking up {len(guids)} entries in every library')
+                named = sections
+            for section in named:
+                wanted = [guid for guid in dict.fromkeys(guids) if guid not in lookup]
+                for start in range(0, len(wanted), GUID_BATCH_SIZE):
+                    batch = wanted[start:start + GUID_BATCH_SIZE]
+                    try:
+                        found = section.search(guid=batch)
+                    except Exception as error:
+                        raise RestoreError(
+                            f'Could not look up backup items in Plex library "{section.title}": {error}'
+                        ) from error
+                    for item in found:
+                        rating_key = str(getattr(item, "ratingKey", ""))
+                        item_guids = [getattr(item, "guid", None)]
+                        item_guids.extend(getattr(guid, "id", None) for guid in getattr(item, "guids", []) or [])
+                        for guid in item_guids:
+                            if guid in batch:
+                                lookup.setdefault(guid, rating_key)
+        return lookup
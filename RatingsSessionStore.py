@@ -0,0 +1,217 @@
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field, replace
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from RatingsBackupStore import write_durably
+
+
+SESSION_FILENAME = "session.bin"
+KEY_FILENAME = "session.key"
+SESSION_KEY_ENV = "RTP_SESSION_KEY"
+SESSION_FORMAT_VERSION = 1
+AUTH_ERROR_NAMES = frozenset({"Unauthorized"})
+AUTH_STATUS_CODES = frozenset({401})
+
+logger = logging.getLogger(__name__)
+
+
+def is_auth_error(error: BaseException) -> bool:
+    """True for plexapi ``Unauthorized`` errors and HTTP 401 responses."""
+    from PlexWriteExecutor import error_status_code
+
+    if any(cls.__name__ in AUTH_ERROR_NAMES for cls in type(error).__mro__):
+        return True
+    return error_status_code(error) in AUTH_STATUS_CODES
+
+
+@dataclass(frozen=True)
+class CachedServer:
+    name: str
+    client_identifier: str = ""
+    connections: Tuple[str, ...] = ()
+    last_uri: Optional[str] = None
+    last_uri_at: Optional[float] = None
+    recent_library: str = ""
+    recent_all_libraries: bool = False
+
+
+@dataclass(frozen=True)
+class CachedSession:
+    token: str
+    username: str = ""
+    servers: Tuple[CachedServer, ...] = ()
+    saved_at: float = field(default_factory=time.time)
+    last_server: str = ""
+
+    def server(self, name: str) -> Optional[CachedServer]:
+        return next((server for server in self.servers if server.name == name), None)
+
+    def with_last_uri(self, name: str, uri: str, at: Optional[float] = None) -> "CachedSession":
+        chosen_at = time.time() if at is None else at
+        servers = tuple(
+            replace(server, last_uri=uri, last_uri_at=chosen_at) if server.name == name else server
+            for server in self.servers
+        )
+        return replace(self, servers=servers, saved_at=time.time())
+
+    def with_recent_library(self, name: str, library: str, all_libraries: bool) -> "CachedSession":
+        servers = tuple(
+            replace(server, recent_library=library, recent_all_libraries=all_libraries)
+            if server.name == name else server
+            for server in self.servers
+        )
+        return replace(self, servers=servers, last_server=name, saved_at=time.time())
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["version"] = SESSION_FORMAT_VERSION
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CachedSession":
+        servers = tuple(
+            CachedServer(
+                name=server["name"],
+                client_identifier=server.get("client_identifier", ""),
+                connections=tuple(server.get("connections") or ()),
+                last_uri=server.get("last_uri"),
+                last_uri_at=server.get("last_uri_at"),
+                recent_library=server.get("recent_library", ""),
+                recent_all_libraries=bool(server.get("recent_all_libraries", False)),
+            )
+            for server in data.get("servers") or ()
+        )
+        return cls(
+            token=data["token"],
+            username=data.get("username", ""),
+            servers=servers,
+            saved_at=float(data.get("saved_at", 0)),
+            last_server=data.get("last_server", ""),
+        )
+
+
+def cached_servers_from_resources(resources: Sequence[Any]) -> Tuple[CachedServer, ...]:
+    """Snapshot plex.tv server resources so they can be reused after a restart."""
+    from PlexServerConnector import candidate_uris
+
+    return tuple(
+        CachedServer(
+            name=resource.name,
+            client_identifier=getattr(resource, "clientIdentifier", "") or "",
+            connections=tuple(candidate_uris(resource)),
+        )
+        for resource in resources
+    )
+
+
+class SessionStore:
+    """Encrypted on-disk cache of the Plex token, servers and working URIs.
+
+    Sessions are encrypted with Fernet from the optional ``cryptography``
+    package. The key comes from ``RTP_SESSION_KEY`` or a key file created
+    next to the session with owner-only permissions. Without
+    ``cryptography`` nothing is written, so a token is never stored in
+    plain text. A session that cannot be decrypted is discarded.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    @property
+    def session_path(self) -> str:
+        return os.path.join(self.directory, SESSION_FILENAME)
+
+    @property
+    def key_path(self) -> str:
+        return os.path.join(self.directory, KEY_FILENAME)
+
+    @staticmethod
+    def encryption_available() -> bool:
+        try:
+            import cryptography.fernet  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def load(self) -> Optional[CachedSession]:
+        if not self.encryption_available():
+            return None
+        with self._lock:
+            try:
+                with open(self.session_path, "rb") as session_file:
+                    encrypted = session_file.read()
+            except OSError:
+                return None
+            try:
+                payload = self._fernet(create_key=False).decrypt(encrypted)
+                return CachedSession.from_dict(json.loads(payload.decode("utf-8")))
+            except Exception as error:
+                logger.warning("Discarding unreadable Plex session cache: %s", error)
+                self._remove_session()
+                return None
+
+    def save(self, session: CachedSession) -> bool:
+        if not self.encryption_available():
+            logger.info("cryptography is not installed; the Plex session will not be persisted")
+            return False
+        payload = json.dumps(session.to_dict()).encode("utf-8")
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            write_durably(self.session_path, self._fernet(create_key=True).encrypt(payload))
+            _restrict_permissions(self.session_path)
+        return True
+
+    def remember_uri(self, server_name: str, uri: str, at: Optional[float] = None) -> None:
+        """Record the connection URI that won the latest probe race for a server."""
+        session = self.load()
+        if session is None or not session.server(server_name):
+            return
+        self.save(session.with_last_uri(server_name, uri, at))
+
+    def remember_library(self, server_name: str, library: str, all_libraries: bool) -> None:
+        """Record the most recently used library so its index can be warmed next time."""
+        session = self.load()
+        if session is None or not session.server(server_name):
+            return
+        self.save(session.with_recent_library(server_name, library, all_libraries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._remove_session()
+
+    def _remove_session(self) -> None:
+        try:
+            os.remove(self.session_path)
+        except OSError:
+            pass
+
+    def _fernet(self, create_key: bool):
+        from cryptography.fernet import Fernet
+
+        key = os.environ.get(SESSION_KEY_ENV, "").strip().encode("ascii")
+        if key:
+            return Fernet(key)
+        try:
+            with open(self.key_path, "rb") as key_file:
+                return Fernet(key_file.read().strip())
+        except FileNotFoundError:
+            if not create_key:
+                raise
+        key = Fernet.generate_key()
+        os.makedirs(self.directory, exist_ok=True)
+        descriptor = os.open(self.key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(descriptor, "wb") as key_file:
+            key_file.write(key)
+        return Fernet(key)
+
+
+def _restrict_permissions(path: str) -> None:
+    try:
+        os.chmod(path, 0o600)
+    except OSError:
+        pass
@@ -0,0 +1,393 @@
+import collections
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+EVENT_HISTORY = 1000
+EVENT_POLL_SECONDS = 0.2
+SQLITE_URL_PREFIX = "sqlite:///"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+"""
+
+
+class StateStoreError(Exception):
+    """Raised for a state store URL that cannot be opened."""
+
+
+class MemoryStateStore:
+    """Web state held in this process: the default, for a single server process.
+
+    Values live in namespaces (``upload``, ``clear-confirmation``, ``jobs``,
+    ...) and may expire after ``ttl`` seconds. Events published for the
+    log stream are numbered. Each reader keeps its own cursor, so every
+    connected page sees every event. The last ``EVENT_HISTORY`` events are
+    kept for readers that reconnect.
+    """
+
+    shared = False
+
+    def __init__(self, clock: Callable[[], float] = time.time, history: int = EVENT_HISTORY):
+        self.clock = clock
+        self._lock = threading.Condition()
+        self._values: Dict[Tuple[str, str], Tuple[Any, Optional[float]]] = {}
+        self._events: collections.deque = collections.deque(maxlen=history)
+        self._last_event_id = 0
+
+    def put(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._values[(namespace, key)] = (value, self._expiry(ttl))
+
+    def add(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> Any:
+        """Store ``value`` unless the key already holds one; returns whichever is stored."""
+        with self._lock:
+            existing = self._live(namespace, key)
+            if existing is not None:
+                return existing
+            self._values[(namespace, key)] = (value, self._expiry(ttl))
+            return value
+
+    def get(self, namespace: str, key: str) -> Any:
+        with self._lock:
+            return self._live(namespace, key)
+
+    def increment(self, namespace: str, key: str) -> int:
+        with self._lock:
+            value = (self._live(namespace, key) or 0) + 1
+            self._values[(namespace, key)] = (value, None)
+            return value
+
+    def take(self, namespace: str, key: str) -> Any:
+        """Remove and return a value in one step, so only one reader ever gets it."""
+        with self._lock:
+            value = self._live(namespace, key)
+            self._values.pop((namespace, key), None)
+            return value
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._values.pop((namespace, key), None)
+
+    def replace_if(self, namespace: str, key: str, expected: Any, value: Any, ttl: Optional[float] = None) -> bool:
+        """Store ``value`` only while the key still holds ``expected``; True when it did."""
+        with self._lock:
+            if self._live(namespace, key) != expected:
+                return False
+            self._values[(namespace, key)] = (value, self._expiry(ttl))
+            return True
+
+    def delete_if(self, namespace: str, key: str, expected: Any) -> bool:
+        """Remove the key only while it still holds ``expected``; True when it did."""
+        with self._lock:
+            if self._live(namespace, key) != expected:
+                return False
+            del self._values[(namespace, key)]
+            return True
+
+    def items(self, namespace: str) -> Dict[str, Any]:
+        with self._lock:
+            now = self.clock()
+            return {
+                key: value for (space, key), (value, expires_at) in self._values.items()
+                if space == namespace and (expires_at is None or expires_at > now)
+            }
+
+    def clear(self, namespace: str) -> None:
+        with self._lock:
+            for key in [key for key in self._values if key[0] == namespace]:
+                del self._values[key]
+
+    def publish(self, event: Dict[str, Any]) -> int:
+        with self._lock:
+            self._last_event_id += 1
+            self._events.append((self._last_event_id, event))
+            self._lock.notify_all()
+            return self._last_event_id
+
+    def last_event_id(self) -> int:
+        with self._lock:
+            return self._last_event_id
+
+    def events_after(self, cursor: int, timeout: float = 0.0) -> List[Tuple[int, Dict[str, Any]]]:
+        """Events numbered above ``cursor``, waiting up to ``timeout`` seconds for the first one."""
+        with self._lock:
+            if self._last_event_id <= cursor and timeout > 0:
+                self._lock.wait_for(lambda: self._last_event_id > cursor, timeout)
+            return [(event_id, event) for event_id, event in self._events if event_id > cursor]
+
+    def _expiry(self, ttl: Optional[float]) -> Optional[float]:
+        return None if ttl is None else self.clock() + ttl
+
+    def _live(self, namespace: str, key: str) -> Any:
+        stored = self._values.get((namespace, key))
+        if stored is None:
+            return None
+        value, expires_at = stored
+        if expires_at is not None and expires_at <= self.clock():
+            del self._values[(namespace, key)]
+            return None
+        return value
+
+
+class SqliteStateStore:
+    """The same state in a SQLite file, shared by every worker process on the host.
+
+    Values are stored as JSON. Every call is its own short transaction, and
+    ``take`` and ``add`` run under ``BEGIN IMMEDIATE``, so two workers can
+    never both consume one confirmation; ``replace_if`` and ``delete_if``
+    are single conditional statements. Readers of the event log poll for
+    new rows every ``EVENT_POLL_SECONDS``. Connections are per thread and
+    per process, so a store opened before a pre-forking server forks is
+    still safe to use in the workers.
+    """
+
+    shared = True
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time, history: int = EVENT_HISTORY):
+        self.path = path
+        self.clock = clock
+        self.history = history
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(sqlite3.connect(path, timeout=10)) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+
+    def put(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), self._expiry(ttl)),
+            )
+
+    def add(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> Any:
+        with self._transaction(immediate=True) as connection:
+            existing = self._live(connection, namespace, key)
+            if existing is not None:
+                return existing
+            connection.execute(
+                "INSERT OR REPLACE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), self._expiry(ttl)),
+            )
+            return value
+
+    def get(self, namespace: str, key: str) -> Any:
+        with self._transaction() as connection:
+            return self._live(connection, namespace, key)
+
+    def increment(self, namespace: str, key: str) -> int:
+        with self._transaction(immediate=True) as connection:
+            value = (self._live(connection, namespace, key) or 0) + 1
+            connection.execute(
+                "INSERT OR REPLACE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, NULL)",
+                (namespace, key, json.dumps(value)),
+            )
+            return value
+
+    def take(self, namespace: str, key: str) -> Any:
+        with self._transaction(immediate=True) as connection:
+            value = self._live(connection, namespace, key)
+            connection.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+            return value
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def replace_if(self, namespace: str, key: str, expected: Any, value: Any, ttl: Optional[float] = None) -> bool:
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE state SET value = ?, expires_at = ? WHERE namespace = ? AND key = ? AND value = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (json.dumps(value), self._expiry(ttl), namespace, key, json.dumps(expected), self.clock()),
+            )
+            return cursor.rowcount == 1
+
+    def delete_if(self, namespace: str, key: str, expected: Any) -> bool:
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "DELETE FROM state WHERE namespace = ? AND key = ? AND value = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, key, json.dumps(expected), self.clock()),
+            )
+            return cursor.rowcount == 1
+
+    def items(self, namespace: str) -> Dict[str, Any]:
+        with self._transaction() as connection:
+            rows = connection.execute(
+                "SELECT key, value FROM state WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, self.clock()),
+            ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def clear(self, namespace: str) -> None:
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM state WHERE namespace = ?", (namespace,))
+
+    def publish(self, event: Dict[str, Any]) -> int:
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "INSERT INTO events (created_at, payload) VALUES (?, ?)", (self.clock(), json.dumps(event))
+            )
+            event_id = cursor.lastrowid
+            if event_id % 100 == 0:
+                connection.execute("DELETE FROM events WHERE id <= ?", (event_id - self.history,))
+            return event_id
+
+    def last_event_id(self) -> int:
+        with self._transaction() as connection:
+            row = connection.execute("SELECT MAX(id) FROM events").fetchone()
+        return row[0] or 0
+
+    def events_after(self, cursor: int, timeout: float = 0.0) -> List[Tuple[int, Dict[str, Any]]]:
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._transaction() as connection:
+                rows = connection.execute(
+                    "SELECT id, payload FROM events WHERE id > ? ORDER BY id LIMIT ?", (cursor, self.history)
+                ).fetchall()
+            if rows or time.monotonic() >= deadline:
+                return [(event_id, json.loads(payload)) for event_id, payload in rows]
+            time.sleep(min(EVENT_POLL_SECONDS, max(0.0, deadline - time.monotonic())))
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or getattr(self._local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _transaction(self, immediate: bool = False) -> "_Transaction":
+        return _Transaction(self._connection(), immediate)
+
+    def _expiry(self, ttl: Optional[float]) -> Optional[float]:
+        return None if ttl is None else self.clock() + ttl
+
+    def _live(self, connection: sqlite3.Connection, namespace: str, key: str) -> Any:
+        row = connection.execute(
+            "SELECT value, expires_at FROM state WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at <= self.clock():
+            connection.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+            return None
+        return json.loads(value)
+
+
+class _Transaction:
+    def __init__(self, connection: sqlite3.Connection, immediate: bool):
+        self.connection = connection
+        self.immediate = immediate
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.connection.execute("BEGIN IMMEDIATE" if self.immediate else "BEGIN")
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.connection.execute("ROLLBACK" if exc_type is not None else "COMMIT")
+
+
+class EventQueue:
+    """``queue.Queue``-style access to a store's event log.
+
+    ``put`` publishes an event for every reader. ``get`` and
+    ``get_nowait`` read the events after this object's own cursor, in
+    order, which is how code and tests that drained the old in-process
+    queue keep working.
+    """
+
+    def __init__(self, store: Any):
+        self.store = store
+        self._cursor = store.last_event_id()
+        self._pending: collections.deque = collections.deque()
+        self._lock = threading.Lock()
+
+    def put(self, event: Dict[str, Any]) -> None:
+        self.store.publish(event)
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> Dict[str, Any]:
+        with self._lock:
+            if not self._pending:
+                wait = (timeout if timeout is not None else 3600.0) if block else 0.0
+                for event_id, event in self.store.events_after(self._cursor, wait):
+                    self._cursor = event_id
+                    self._pending.append(event)
+            if not self._pending:
+                raise queue.Empty
+            return self._pending.popleft()
+
+    def get_nowait(self) -> Dict[str, Any]:
+        return self.get(block=False)
+
+    def attach(self, store: Any) -> None:
+        """Switch to another store, starting after its newest event."""
+        with self._lock:
+            self.store = store
+            self._cursor = store.last_event_id()
+            self._pending.clear()
+
+
+class StoreLeases:
+    """Leases on keys in a state store, held by one owner at a time across workers.
+
+    A lease expires after ``ttl`` seconds unless it is renewed, so a worker
+    that dies while holding one only blocks its key until then. Renewing and
+    releasing check the owner and write in one store operation, so a worker
+    whose lease lapsed cannot overwrite or drop the next holder's.
+    """
+
+    def __init__(self, store: Any, namespace: str, ttl: float):
+        self.store = store
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def acquire(self, key: str, owner: str) -> bool:
+        return self.store.add(self.namespace, key, owner, ttl=self.ttl) == owner
+
+    def renew(self, key: str, owner: str) -> bool:
+        return self.store.replace_if(self.namespace, key, owner, owner, ttl=self.ttl)
+
+    def release(self, key: str, owner: str) -> bool:
+        return self.store.delete_if(self.namespace, key, owner)
+
+    def holders(self) -> Dict[str, str]:
+        return self.store.items(self.namespace)
+
+
+def open_state_store(url: str) -> Any:
+    """A store for ``url``: ``memory`` (or empty) for in-process, ``sqlite:///<path>`` for a shared file."""
+    url = (url or "").strip()
+    if url in ("", "memory"):
+        return MemoryStateStore()
+    if url.startswith(SQLITE_URL_PREFIX):
+        path = url[len(SQLITE_URL_PREFIX):]
+        if not path:
+            raise StateStoreError("A sqlite state store needs a file path, e.g. sqlite:///state.sqlite3")
+        try:
+            return SqliteStateStore(path)
+        except (OSError, sqlite3.Error) as error:
+            raise StateStoreError(f"Could not open the state store {path}: {error}") from error
+    raise StateStoreError(f"Unsupported state store: {url!r} (use 'memory' or 'sqlite:///<path>')")
@@ -0,0 +1,102 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from RatingsResponseCompression import brotli_available, choose_encoding
+
+
+ASSET_EXTENSIONS = (".css", ".js")
+ASSET_URL_PREFIX = "/assets/"
+FINGERPRINT_LENGTH = 12
+ASSET_CACHE_CONTROL = "private, max-age=31536000, immutable"
+ASSET_GZIP_LEVEL = 9
+ASSET_BROTLI_QUALITY = 11
+
+
+@dataclass(frozen=True)
+class StaticAsset:
+    """One static file, held in memory with its fingerprint and precompressed bodies."""
+
+    name: str
+    url_name: str
+    mimetype: str
+    etag: str
+    bodies: Dict[Optional[str], bytes] = field(repr=False)
+
+    def body(self, encoding: Optional[str]) -> bytes:
+        return self.bodies.get(encoding, self.bodies[None])
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        """A strong ETag per representation, since the compressed bodies differ byte for byte."""
+        return self.etag if encoding is None else f"{self.etag}.{encoding}"
+
+
+class StaticAssets:
+    """Fingerprint and precompress the files of a static directory once, at startup.
+
+    Each ``.css``/``.js`` file is read, hashed, and compressed at the highest
+    level with gzip (and brotli when installed). It is then served under
+    ``/assets/<stem>.<hash><ext>``. The hash is part of the URL, so a
+    response never goes stale. It can be cached for a year as ``immutable``,
+    with the full SHA-256 as a strong ETag. Any edit to a file produces a new
+    URL after a restart.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._by_name: Optional[Dict[str, StaticAsset]] = None
+        self._by_url_name: Dict[str, StaticAsset] = {}
+
+    def build(self) -> Dict[str, StaticAsset]:
+        with self._lock:
+            if self._by_name is not None:
+                return self._by_name
+            assets: Dict[str, StaticAsset] = {}
+            try:
+                names = sorted(os.listdir(self.directory))
+            except OSError:
+                names = []
+            for name in names:
+                path = os.path.join(self.directory, name)
+                stem, extension = os.path.splitext(name)
+                if extension not in ASSET_EXTENSIONS or not os.path.isfile(path):
+                    continue
+                with open(path, "rb") as asset_file:
+                    body = asset_file.read()
+                digest = hashlib.sha256(body).hexdigest()
+                bodies: Dict[Optional[str], bytes] = {
+                    None: body,
+                    "gzip": gzip.compress(body, compresslevel=ASSET_GZIP_LEVEL, mtime=0),
+                }
+                if brotli_available():
+                    import brotli
+
+                    bodies["br"] = brotli.compress(body, quality=ASSET_BROTLI_QUALITY)
+                assets[name] = StaticAsset(
+                    name=name,
+                    url_name=f"{stem}.{digest[:FINGERPRINT_LENGTH]}{extension}",
+                    mimetype=mimetypes.guess_type(name)[0] or "application/octet-stream",
+                    etag=digest,
+                    bodies=bodies,
+                )
+            self._by_url_name = {asset.url_name: asset for asset in assets.values()}
+            self._by_name = assets
+            return assets
+
+    def url(self, name: str) -> str:
+        """The fingerprinted URL of ``name``; files that are not assets keep their plain static URL."""
+        asset = self.build().get(name)
+        return ASSET_URL_PREFIX + asset.url_name if asset else f"/static/{name}"
+
+    def get(self, url_name: str) -> Optional[StaticAsset]:
+        self.build()
+        return self._by_url_name.get(url_name)
+
+    def encoding_for(self, asset: StaticAsset, accept_encoding: str) -> Optional[str]:
+        encoding = choose_encoding(accept_encoding)
+        return encoding if encoding in asset.bodies else None
@@ -0,0 +1,621 @@
+import csv
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from PlexServerConnector import (
+    CONNECT_TIMEOUT_SECONDS,
+    NoReachableConnection,
+    candidate_uris,
+    probe_identity,
+    race_connections,
+)
+from RatingsChangeStore import ChangeStore
+from RatingsExportPipeline import EXPORT_COLUMNS, RatingsExporter
+from RatingsFailureLog import FailureLog, failure_columns
+from RatingsImportJournal import ImportJournal, JournalError, JournalStore, read_journal
+from RatingsImportPipeline import (
+    CONFLICT_PRIORITY,
+    CONFLICT_RULES,
+    ImportOptions,
+    ImportSource,
+    ImportPipelineError,
+    LibraryIndexCache,
+    RatingsImportPipeline,
+    detect_source,
+    find_section,
+)
+from RatingsPlanFile import PlanFileError, read_plan, saved_plan, write_plan
+
+
+MEDIA_TYPE_OPTIONS = {
+    "movie": "-MOVIE-",
+    "tv-series": "-TVSERIES-",
+    "tv-mini-series": "-TVMINISERIES-",
+    "tv-movie": "-TVMOVIE-",
+    "short": "-SHORT-",
+    "tv-episode": "-TVEPISODE-",
+}
+DEFAULT_MEDIA_TYPES = ("movie", "tv-series", "tv-mini-series", "tv-movie")
+DEFAULT_FAILURES_DIR = "failures"
+
+
+class CliError(Exception):
+    """Raised for problems that should end a headless run with a JSON error."""
+
+
+# Errors whose message reads well on its own; anything else is reported with
+# its class name so plexapi's Unauthorized/NotFound or a requests timeout is
+# recognisable without importing those packages here.
+DESCRIBED_ERRORS = (
+    CliError, OSError, UnicodeDecodeError, csv.Error, ValueError, sqlite3.Error, ImportPipelineError,
+)
+
+
+def error_message(error: BaseException) -> str:
+    """The ``error`` text of a JSON report for an exception that ended a run or file."""
+    if isinstance(error, DESCRIBED_ERRORS):
+        return str(error)
+    return f"{type(error).__name__}: {error}"
+
+
+def add_import_arguments(parser) -> None:
+    parser.add_argument(
+        "csv",
+        nargs="*",
+        help="IMDb or Letterboxd ratings export(s) to import as the token's own user",
+    )
+    parser.add_argument(
+        "--user",
+        action="append",
+        default=[],
+        metavar="USER=CSV",
+        help="Import CSV as this Plex Home or managed user (repeatable); the library is scanned once for all users",
+    )
+    _add_connection_arguments(parser)
+    library = parser.add_mutually_exclusive_group(required=True)
+    library.add_argument("--library", help="Library to update")
+    library.add_argument(
+        "--all-libraries",
+        action="store_true",
+        help="Match against every movie and TV library",
+    )
+    parser.add_argument(
+        "--source",
+        choices=("auto", "IMDb", "Letterboxd"),
+        default="auto",
+        help="Ratings source (default: detect from each CSV's columns)",
+    )
+    parser.add_argument(
+        "--media-types",
+        default=",".join(DEFAULT_MEDIA_TYPES),
+        help=f"Comma-separated IMDb title types to import (choices: {', '.join(MEDIA_TYPE_OPTIONS)})",
+    )
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        help="Merge each user's CSVs into one import that writes every item once",
+    )
+    parser.add_argument(
+        "--conflict",
+        choices=CONFLICT_RULES,
+        default=CONFLICT_PRIORITY,
+        help="When merged CSVs rate the same item: 'priority' keeps the earlier CSV, "
+             "'recent' the most recently rated row (default: priority)",
+    )
+    parser.add_argument("--mark-watched", action="store_true", help="Mark updated items as watched")
+    parser.add_argument(
+        "--force-overwrite",
+        action="store_true",
+        help="Write ratings even when Plex already has the same value",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Plan only; do not write to Plex")
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Re-read written items in bulk afterwards and report any Plex did not store",
+    )
+    parser.add_argument(
+        "--journal-dir",
+        default="",
+        metavar="DIR",
+        help="Record each import's writes in a journal here, so an interrupted run can be resumed",
+    )
+    parser.add_argument(
+        "--changes-db",
+        default="",
+        metavar="PATH",
+        help="Record every rating change in this SQLite file, so a run can be undone",
+    )
+    parser.add_argument(
+        "--save-plan",
+        default="",
+        metavar="PATH",
+        help="Write the plan to this file instead of applying it; apply it later with apply-plan",
+    )
+    _add_failures_argument(parser)
+    parser.add_argument("--verbose", action="store_true", help="Write per-item log lines to stderr")
+
+
+def add_apply_plan_arguments(parser) -> None:
+    parser.add_argument("plan", help="Plan file written by import --save-plan or downloaded from the web UI")
+    _add_connection_arguments(parser)
+    parser.add_argument("--dry-run", action="store_true", help="Check the plan for drift; do not write to Plex")
+    parser.add_argument(
+        "--journal-dir",
+        default="",
+        metavar="DIR",
+        help="Record the writes in a journal here, so an interrupted run can be resumed",
+    )
+    parser.add_argument(
+        "--changes-db",
+        default="",
+        metavar="PATH",
+        help="Record every rating change in this SQLite file, so the run can be undone",
+    )
+    _add_failures_argument(parser)
+    parser.add_argument("--verbose", action="store_true", help="Write per-item log lines to stderr")
+
+
+def add_resume_arguments(parser) -> None:
+    parser.add_argument("journal", help="Journal of an interrupted import (written with --journal-dir)")
+    _add_connection_arguments(parser)
+    parser.add_argument(
+        "--changes-db",
+        default="",
+        metavar="PATH",
+        help="The --changes-db the import recorded to, so resumed writes are recorded too",
+    )
+    _add_failures_argument(parser)
+    parser.add_argument("--verbose", action="store_true", help="Write per-item log lines to stderr")
+
+
+def add_undo_arguments(parser) -> None:
+    parser.add_argument("run_id", help="Run id reported as stats.run_id by the import")
+    parser.add_argument("--changes-db", required=True, metavar="PATH", help="The --changes-db the import recorded to")
+    _add_connection_arguments(parser)
+    parser.add_argument("--verbose", action="store_true", help="Write per-item log lines to stderr")
+
+
+def add_export_arguments(parser) -> None:
+    _add_connection_arguments(parser)
+    library = parser.add_mutually_exclusive_group(required=True)
+    library.add_argument("--library", help="Library to export")
+    library.add_argument(
+        "--all-libraries",
+        action="store_true",
+        help="Export every movie and TV library",
+    )
+    parser.add_argument(
+        "--format",
+        choices=tuple(EXPORT_COLUMNS),
+        default="IMDb",
+        help="CSV layout, the same one the import reads (default: IMDb)",
+    )
+    parser.add_argument(
+        "--episodes",
+        action="store_true",
+        help="Also export rated TV episodes (IMDb format only)",
+    )
+    parser.add_argument(
+        "--output",
+        default="-",
+        metavar="PATH",
+        help="Write the CSV here (default: stdout, with the JSON summary on stderr)",
+    )
+
+
+def _add_failures_argument(parser) -> None:
+    parser.add_argument(
+        "--failures-dir",
+        default=DEFAULT_FAILURES_DIR,
+        metavar="DIR",
+        help=f"Write unmatched and failed rows here as CSV and JSON lines (default: {DEFAULT_FAILURES_DIR})",
+    )
+
+
+def _add_connection_arguments(parser) -> None:
+    parser.add_argument(
+        "--token",
+        default=os.environ.get("PLEX_TOKEN", ""),
+        help="Plex token (default: $PLEX_TOKEN)",
+    )
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--baseurl", help="Connect directly to this server URL, e.g. http://plex:32400")
+    target.add_argument("--server", help="Connect to this server name through plex.tv")
+
+
+def connect_to_server(token: str, baseurl: Optional[str] = None, server_name: Optional[str] = None):
+    """Open a PlexServer from a stored token without the interactive OAuth flow."""
+    if not token:
+        raise CliError("A Plex token is required (--token or PLEX_TOKEN)")
+    try:
+        if baseurl:
+            from plexapi.server import PlexServer
+            return PlexServer(baseurl, token, timeout=CONNECT_TIMEOUT_SECONDS)
+        from plexapi.myplex import MyPlexAccount
+        from plexapi.server import PlexServer
+        resource = MyPlexAccount(token=token).resource(server_name)
+        results = race_connections(
+            candidate_uris(resource),
+            lambda uri: probe_identity(uri, token, resource.clientIdentifier),
+        )
+        if not results or not results[0].ok:
+            raise NoReachableConnection(
+                "; ".join(result.describe() for result in results) or "no connections listed"
+            )
+        return PlexServer(results[0].uri, token, timeout=CONNECT_TIMEOUT_SECONDS)
+    except Exception as error:
+        raise CliError(f"Could not connect to Plex: {error}") from error
+
+
+def parse_user_imports(values: List[str]) -> List[Tuple[str, str]]:
+    """Split ``USER=CSV`` arguments into ``(user, path)`` pairs."""
+    pairs = []
+    for value in values:
+        user, separator, path = value.partition("=")
+        if not separator or not user.strip() or not path.strip():
+            raise CliError(f"Expected --user USER=CSV, got {value!r}")
+        pairs.append((user.strip(), path.strip()))
+    return pairs
+
+
+def switch_user(server: Any, username: str):
+    """A connection to ``server`` that acts as the given Plex Home or managed user."""
+    try:
+        return server.switchUser(username)
+    except Exception as error:
+        raise CliError(f"Could not switch to Plex user '{username}': {error}") from error
+
+
+def _csv_source(path: str, requested_source: str) -> str:
+    with open(path, "r", encoding="utf-8-sig", newline="") as csv_file:
+        headers = next(csv.reader(csv_file), [])
+    return detect_source(headers, "" if requested_source == "auto" else requested_source)
+
+
+def _failure_log(directory: str, path: str, source: str, user: Optional[str] = None) -> FailureLog:
+    """Failures of one run, streamed to ``directory``; the files appear with the first failure."""
+    ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if user:
+        stem = f"{user}_{stem}"
+    return FailureLog(
+        os.path.join(directory, f"Unmatched_{source.lower().replace('+', '_')}_{stem}_{ts}"),
+        columns=failure_columns(source),
+    )
+
+
+def _failure_summary(failure_log: FailureLog) -> Dict[str, Any]:
+    """The failure count for a JSON report, with the log's paths when anything was written."""
+    summary: Dict[str, Any] = {"failures": len(failure_log)}
+    if failure_log:
+        summary["failureLog"] = {"csv": failure_log.csv_path, "jsonl": failure_log.jsonl_path}
+    return summary
+
+
+def _import_values(args, source: str) -> Dict[str, Any]:
+    requested_types = {name.strip() for name in args.media_types.split(",") if name.strip()}
+    unknown = sorted(requested_types.difference(MEDIA_TYPE_OPTIONS))
+    if unknown:
+        raise CliError(f"Unknown media type(s): {', '.join(unknown)}")
+    values = {option: name in requested_types for name, option in MEDIA_TYPE_OPTIONS.items()}
+    values.update({
+        "-IMDB-": source == "IMDb",
+        "-LETTERBOXD-": source == "Letterboxd",
+        "-WATCHED-": args.mark_watched,
+        "-FORCEOVERWRITE-": args.force_overwrite,
+        "-DRYRUN-": args.dry_run,
+        "-VERIFY-": args.verify,
+        "-ALLLIBS-": args.all_libraries,
+    })
+    return values
+
+
+def import_csvs(
+    server: Any,
+    paths: List[str],
+    args,
+    log: Callable[[str], None],
+    index_cache: Optional[LibraryIndexCache] = None,
+    user: Optional[str] = None,
+    user_server: Any = None,
+) -> Dict[str, Any]:
+    """Plan and apply CSVs as one merged import, returning its JSON-ready summary."""
+    merged = len(paths) > 1
+    summary: Dict[str, Any] = {"csv": list(paths) if merged else paths[0]}
+    if user:
+        summary["user"] = user
+    try:
+        inputs = [ImportSource(path, _csv_source(path, args.source)) for path in paths]
+        source = "+".join(dict.fromkeys(item.source for item in inputs))
+        options = ImportOptions.from_values(_import_values(args, inputs[0].source))
+        pipeline = RatingsImportPipeline(
+            server, log=log, index_cache=index_cache, user_server=user_server
+        )
+        plan = pipeline.build_merged_plan(
+            inputs, args.library or "", options, conflict_rule=args.conflict
+        )
+        if args.save_plan:
+            saved = saved_plan(plan, server, library=args.library or "")
+            write_plan(saved, args.save_plan)
+            summary.update({
+                "success": True,
+                "source": source,
+                "plan": dict(saved.to_dict(), path=args.save_plan),
+                "timings": dict(plan.timings),
+            })
+            return summary
+        journal = JournalStore(args.journal_dir).create() if args.journal_dir and not args.dry_run else None
+        changes = ChangeStore(args.changes_db) if args.changes_db and not args.dry_run else None
+        failure_log = _failure_log(args.failures_dir, paths[0], source, user)
+        started = time.perf_counter()
+        try:
+            result = pipeline.apply(
+                plan,
+                journal=journal,
+                changes=changes,
+                details={"csv": list(paths), "library": args.library or "All libraries", "user": user},
+                failure_log=failure_log,
+            )
+        finally:
+            failure_log.close()
+        timings = dict(plan.timings)
+        timings["apply"] = round(time.perf_counter() - started, 4)
+    except Exception as error:
+        summary.update({"success": False, "error": error_message(error)})
+        return summary
+
+    summary.update({
+        "success": result.success,
+        "source": source,
+        "stats": result.stats,
+        **_failure_summary(failure_log),
+        "timings": timings,
+    })
+    if journal is not None and journal.started:
+        summary["journal"] = journal.path
+    return summary
+
+
+def _batches(paths: List[str], merge: bool) -> List[List[str]]:
+    if not paths:
+        return []
+    return [list(paths)] if merge else [[path] for path in paths]
+
+
+def _verbose_logger(args) -> Callable[[str], None]:
+    """Log progress to stderr with ``--verbose``; stdout is kept for the JSON report."""
+    if args.verbose:
+        return lambda message: print(message, file=sys.stderr)
+    return lambda _message: None
+
+
+def _emit_report(report: Dict[str, Any], out, started: float, timings: Optional[Dict[str, float]] = None) -> int:
+    """Write ``report`` as JSON with its total time; returns the exit code."""
+    timings = dict(timings or {})
+    timings["total"] = round(time.perf_counter() - started, 4)
+    report["timings"] = timings
+    json.dump(report, out, indent=2, default=str)
+    out.write("\n")
+    return 0 if report["success"] else 1
+
+
+def run_import(args, connect: Callable[..., Any] = connect_to_server, out=None) -> int:
+    """Run a headless import and print a JSON summary; returns the exit code."""
+    out = out or sys.stdout
+    started = time.perf_counter()
+    log = _verbose_logger(args)
+    report: Dict[str, Any] = {"success": False, "dryRun": args.dry_run, "files": []}
+    timings: Dict[str, float] = {}
+    try:
+        connect_started = time.perf_counter()
+        user_imports = parse_user_imports(args.user)
+        if not args.csv and not user_imports:
+            raise CliError("Nothing to import; pass CSV files and/or --user USER=CSV")
+        if args.save_plan and (user_imports or len(_batches(args.csv, args.merge)) > 1):
+            raise CliError("--save-plan writes one plan; pass a single CSV (or --merge) and no --user")
+        server = connect(args.token, baseurl=args.baseurl, server_name=args.server)
+        timings["connect"] = round(time.perf_counter() - connect_started, 4)
+        # One index serves every CSV and user. User imports read current
+        # ratings separately, so only the owner's own writes make it stale;
+        # they run last to keep the scan shared.
+        index_cache = LibraryIndexCache()
+        files: List[Dict[str, Any]] = []
+        paths_by_user: Dict[str, List[str]] = {}
+        for user, path in user_imports:
+            paths_by_user.setdefault(user, []).append(path)
+        for user, user_paths in paths_by_user.items():
+            try:
+                user_server = switch_user(server, user)
+            except CliError as error:
+                files.extend(
+                    {"csv": path, "user": user, "success": False, "error": str(error)}
+                    for path in user_paths
+                )
+                continue
+            for batch in _batches(user_paths, args.merge):
+                files.append(import_csvs(
+                    server, batch, args, log,
+                    index_cache=index_cache, user=user, user_server=user_server,
+                ))
+        for batch in _batches(args.csv, args.merge):
+            files.append(import_csvs(server, batch, args, log, index_cache=index_cache))
+            if not args.dry_run:
+                index_cache.invalidate(server)
+        report["files"] = files
+        report["success"] = all(summary["success"] for summary in files)
+        report["indexCache"] = index_cache.stats()
+    except Exception as error:
+        report["error"] = error_message(error)
+    return _emit_report(report, out, started, timings)
+
+
+def run_resume(args, connect: Callable[..., Any] = connect_to_server, out=None) -> int:
+    """Finish an interrupted import from its journal and print a JSON summary."""
+    out = out or sys.stdout
+    started = time.perf_counter()
+    log = _verbose_logger(args)
+    report: Dict[str, Any] = {"success": False, "journal": args.journal}
+    try:
+        try:
+            state = read_journal(args.journal)
+        except JournalError as error:
+            raise CliError(str(error)) from error
+        server = connect(args.token, baseurl=args.baseurl, server_name=args.server)
+        _check_server(server, state.details.get("server"), state.details.get("serverName"))
+        user = state.details.get("user")
+        user_server = switch_user(server, user) if user else None
+        pipeline = RatingsImportPipeline(server, log=log, user_server=user_server)
+        changes = ChangeStore(args.changes_db) if args.changes_db else None
+        failure_log = _failure_log(args.failures_dir, args.journal, state.details.get("source") or "IMDb")
+        try:
+            result = pipeline.resume(
+                state, ImportJournal(args.journal), changes=changes, failure_log=failure_log
+            )
+        except (OSError, sqlite3.Error) as error:
+            raise CliError(f"Could not update the import journal: {error}") from error
+        finally:
+            failure_log.close()
+        report.update({
+            "success": result.success,
+            "stats": result.stats,
+            **_failure_summary(failure_log),
+        })
+    except Exception as error:
+        report["error"] = error_message(error)
+    return _emit_report(report, out, started)
+
+
+def run_apply_plan(args, connect: Callable[..., Any] = connect_to_server, out=None) -> int:
+    """Apply a saved plan by ratingKey, without re-matching, and print a JSON summary.
+
+    Planned items whose Plex rating changed since the plan was made are
+    reported as drifted and not written.
+    """
+    out = out or sys.stdout
+    started = time.perf_counter()
+    log = _verbose_logger(args)
+    report: Dict[str, Any] = {"success": False, "dryRun": args.dry_run, "plan": args.plan}
+    try:
+        try:
+            saved = read_plan(args.plan)
+        except PlanFileError as error:
+            raise CliError(str(error)) from error
+        report["hash"] = saved.hash
+        server = connect(args.token, baseurl=args.baseurl, server_name=args.server)
+        _check_server(server, saved.server, saved.server_name)
+        pipeline = RatingsImportPipeline(server, log=log)
+        journal = JournalStore(args.journal_dir).create() if args.journal_dir and not args.dry_run else None
+        changes = ChangeStore(args.changes_db) if args.changes_db and not args.dry_run else None
+        failure_log = _failure_log(args.failures_dir, args.plan, saved.source)
+        try:
+            plan = pipeline.load_saved_plan(saved, dry_run=args.dry_run)
+            result = pipeline.apply(
+                plan,
+                journal=journal,
+                changes=changes,
+                details={"plan": saved.hash, "library": saved.library or "All libraries"},
+                failure_log=failure_log,
+            )
+        except (OSError, sqlite3.Error, ImportPipelineError) as error:
+            raise CliError(str(error)) from error
+        finally:
+            failure_log.close()
+        report.update({
+            "success": result.success,
+            "source": saved.source,
+            **_failure_summary(failure_log),
+            "stats": result.stats,
+        })
+        if journal is not None and journal.started:
+            report["journal"] = journal.path
+    except Exception as error:
+        report["error"] = error_message(error)
+    return _emit_report(report, out, started)
+
+
+def run_undo(args, connect: Callable[..., Any] = connect_to_server, out=None) -> int:
+    """Revert one recorded import run by ratingKey and print a JSON summary."""
+    from RatingsUndoPipeline import RatingsUndoPipeline, UndoError
+
+    out = out or sys.stdout
+    started = time.perf_counter()
+    log = _verbose_logger(args)
+    report: Dict[str, Any] = {"success": False, "runId": args.run_id}
+    try:
+        store = ChangeStore(args.changes_db)
+        try:
+            run = store.get_run(args.run_id)
+        except sqlite3.Error as error:
+            raise CliError(f"Could not read the change history: {error}") from error
+        if run is None:
+            raise CliError(f"No recorded import run {args.run_id!r} in {args.changes_db}")
+        server = connect(args.token, baseurl=args.baseurl, server_name=args.server)
+        _check_server(server, run.server, run.server_name)
+        target = switch_user(server, run.user) if run.user else server
+        try:
+            result = RatingsUndoPipeline(target, store, log=log).undo(args.run_id)
+        except (UndoError, sqlite3.Error) as error:
+            raise CliError(str(error)) from error
+        report.update({"success": result.success, "stats": result.stats})
+    except Exception as error:
+        report["error"] = error_message(error)
+    return _emit_report(report, out, started)
+
+
+def _check_server(server: Any, expected: Optional[str], expected_name: Optional[str]) -> None:
+    actual = getattr(server, "machineIdentifier", None)
+    if expected and actual and expected != actual:
+        raise CliError(
+            f"The run was made on server {expected_name or expected}, not the one connected to"
+        )
+
+
+def run_export(args, connect: Callable[..., Any] = connect_to_server, out=None) -> int:
+    """Export the token user's Plex ratings as an importable CSV and print a JSON summary.
+
+    The CSV is streamed as rated items are read. A file is written under a
+    temporary name and only renamed into place once the export finished.
+    """
+    to_stdout = args.output == "-"
+    out = out or (sys.stderr if to_stdout else sys.stdout)
+    started = time.perf_counter()
+    report: Dict[str, Any] = {"success": False, "format": args.format, "output": args.output}
+    try:
+        server = connect(args.token, baseurl=args.baseurl, server_name=args.server)
+        try:
+            sections = list(server.library.sections())
+            if args.library:
+                sections = [find_section(server, args.library, sections)]
+            exporter = RatingsExporter(sections, args.format, include_episodes=args.episodes)
+        except ImportPipelineError as error:
+            raise CliError(str(error)) from error
+        except Exception as error:
+            raise CliError(f"Could not open Plex libraries: {error}") from error
+        try:
+            if to_stdout:
+                for chunk in exporter.iter_csv():
+                    sys.stdout.write(chunk)
+                sys.stdout.flush()
+            else:
+                partial = args.output + ".part"
+                try:
+                    with open(partial, "w", encoding="utf-8", newline="") as csv_file:
+                        for chunk in exporter.iter_csv():
+                            csv_file.write(chunk)
+                    os.replace(partial, args.output)
+                except BaseException:
+                    if os.path.exists(partial):
+                        os.remove(partial)
+                    raise
+        except (OSError, ImportPipelineError) as error:
+            raise CliError(str(error)) from error
+        report.update({"success": True, "stats": exporter.stats})
+    except Exception as error:
+        report["error"] = error_message(error)
+    return _emit_report(report, out, started)
@@ -1,117 +1,482 @@
-import csv
 import datetime
 import logging
 import threading
 import time
-import webbrowser
-from typing import Callable, List, Optional, Dict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import Callable, List, Optional
 from pathlib import Path
-from plexapi.myplex import MyPlexPinLogin, MyPlexAccount
-from RatingsImportPipeline import ImportOptions, ImportPipelineError, RatingsImportPipeline
-
-# Configure logging
-logging.basicConfig(
-    filename="RatingsToPlex.log",
-    level=logging.DEBUG,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    encoding='utf-8'
+from RatingsCache import (
+    CONNECTION_TTL_SECONDS,
+    MAX_CACHED_CONNECTIONS,
+    MAX_CACHED_SECTION_LISTS,
+    SECTIONS_TTL_SECONDS,
+    SectionInfo,
+    TTLCache,
 )
+from RatingsImportPipeline import (
+    ImportOptions,
+    ImportPipelineError,
+    LibraryIndexCache,
+    RatingsImportPipeline,
+)
+from PlexWriteExecutor import describe_write_stats
+from RatingsFailureLog import FailureLog, failure_columns
+from PlexServerConnector import (
+    CONNECT_TIMEOUT_SECONDS,
+    NoReachableConnection,
+    candidate_uris,
+    probe_identity,
+    race_connections,
+    remembered_uri_is_fresh,
+)
+from RatingsSessionStore import CachedSession, cached_servers_from_resources, is_auth_error
+
+LOG_FILENAME = "RatingsToPlex.log"
+PREFETCH_WORKERS = 4
 logger = logging.getLogger(__name__)
 
 
+def configure_logging(filename=LOG_FILENAME):
+    """Send application logs to the log file; called once at startup, not on import."""
+    logging.basicConfig(
+        filename=filename,
+        level=logging.DEBUG,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        encoding='utf-8'
+    )
+
+
+def _server_name(server):
+    return getattr(server, "friendlyName", None) or getattr(server, "name", None) or ""
+
+
 class PlexConnection:
     """Wraps a Plex account/resources with lightweight caching for faster UI interactions."""
 
-    def __init__(self, account, server, resources):
+    def __init__(self, account, server, resources, token=None, username="",
+                 on_connected=None, on_auth_error=None, log_fn=None):
         self.account = account
         self.server = server
         self.resources = resources
-        self._server_cache = {}  # server_name -> connected PlexServer
-        self._libraries_cache = {}  # server_name -> list[str]
+        self.token = token or getattr(account, "authenticationToken", None)
+        self.username = username
+        self.on_connected = on_connected  # (server_name, uri, chosen_at) after a probe race
+        self.on_auth_error = on_auth_error  # (error) when Plex rejects the token
+        self.log_fn = log_fn
+        # server_name -> connected PlexServer / tuple[SectionInfo]
+        self.connections = TTLCache("connections", CONNECTION_TTL_SECONDS, MAX_CACHED_CONNECTIONS)
+        self.sections = TTLCache("sections", SECTIONS_TTL_SECONDS, MAX_CACHED_SECTION_LISTS)
+        # server_name -> (uri, chosen_at) of the last probe race winner
+        self._remembered_uris = {
+            res.name: (res.last_uri, getattr(res, "last_uri_at", None))
+            for res in resources if getattr(res, "last_uri", None)
+        }
         self._lock = threading.Lock()
         logger.debug("PlexConnection initialized with account: %s, server: %s", account, server)
 
+    def get_account(self):
+        """The plex.tv account; restored sessions only create it when first needed."""
+        if self.account is None:
+            from plexapi.myplex import MyPlexAccount
+            self.account = MyPlexAccount(token=self.token)
+        return self.account
+
+    def _log(self, message):
+        logger.info(message)
+        if self.log_fn:
+            self.log_fn(message)
+
+    def _open_server(self, uri):
+        from plexapi.server import PlexServer
+        return PlexServer(uri, self.token, timeout=CONNECT_TIMEOUT_SECONDS)
+
+    def _connect(self, resource):
+        name = resource.name
+        # The last race winner is reused until its TTL expires, then every
+        # candidate is probed again so a better route can take over.
+        uri, chosen_at = self._remembered_uris.get(name, (None, None))
+        if uri and remembered_uri_is_fresh(chosen_at):
+            try:
+                connected = self._open_server(uri)
+                self._log(f"Connected to '{name}' via remembered {uri}")
+                return connected
+            except Exception as e:
+                if is_auth_error(e):
+                    raise
+                self._log(f"Remembered connection {uri} for '{name}' failed: {e}")
+
+        uris = candidate_uris(resource)
+        if not uris:
+            uris = candidate_uris(self.get_account().resource(name))
+        identifier = (getattr(resource, "clientIdentifier", "")
+                      or getattr(resource, "client_identifier", "") or "")
+        results = race_connections(uris, lambda candidate: probe_identity(candidate, self.token, identifier))
+        if results:
+            self._log(f"Probed {len(uris)} connection(s) for '{name}': "
+                      + "; ".join(result.describe() for result in results))
+        if not results or not results[0].ok:
+            raise NoReachableConnection(f"No connection to '{name}' answered ({len(uris)} tried)")
+        winner = results[0].uri
+        connected = self._open_server(winner)
+        self._remember_uri(name, winner)
+        return connected
+
+    def _remember_uri(self, server_name, uri):
+        chosen_at = time.time()
+        with self._lock:
+            self._remembered_uris[server_name] = (uri, chosen_at)
+        if self.on_connected:
+            try:
+                self.on_connected(server_name, uri, chosen_at)
+            except Exception as e:  # pragma: no cover (cache update is best-effort)
+                logger.error("Could not remember connection for %s: %s", server_name, e)
+
+    def remembered_uri(self, server_name):
+        """(uri, chosen_at) of the last probe race winner, or (None, None)."""
+        with self._lock:
+            return self._remembered_uris.get(server_name, (None, None))
+
+    def _connected(self, server_name, connected):
+        self.connections.put(server_name, connected)
+
+    def _auth_failed(self, error):
+        if is_auth_error(error) and self.on_auth_error:
+            self.on_auth_error(error)
+
     def get_servers(self) -> List[str]:
         return [resource.name for resource in self.resources]
 
     def switch_to_server(self, server_name: str) -> bool:
         # Reuse cached connection if available
-        with self._lock:
-            if server_name in self._server_cache:
-                self.server = self._server_cache[server_name]
-                logger.debug("Using cached server connection for: %s", server_name)
-                return True
+        cached = self.connections.get(server_name)
+        if cached is not None:
+            self.server = cached
+            logger.debug("Using cached server connection for: %s", server_name)
+            return True
         try:
             resource = next((res for res in self.resources if res.name == server_name), None)
             if resource:
-                connected = self.account.resource(resource.name).connect(timeout=8)  # type: ignore[arg-type]
-                with self._lock:
-                    self._server_cache[server_name] = connected
+                connected = self._connect(resource)
+                self._connected(server_name, connected)
                 self.server = connected
                 logger.info("Connected to server: %s", server_name)
                 return True
         except Exception as e:
             logger.error("Error switching server: %s", e)
+            self._auth_failed(e)
         return False
 
+    def _load_sections(self, server):
+        def _load():
+            infos = tuple(SectionInfo.from_section(section) for section in server.library.sections())
+            logger.debug("Fetched %d libraries for server %s", len(infos), _server_name(server))
+            return infos
+        return _load
+
+    def get_sections(self, server=None):
+        """Section metadata for ``server`` (default: the active one), served from the sections cache."""
+        server = server or self.server
+        if not server:
+            raise ConnectionError("Not connected to a Plex server")
+        name = _server_name(server)
+        if not name:
+            return self._load_sections(server)()
+        return self.sections.get_or_load(name, self._load_sections(server))
+
+    def list_sections(self, server=None):
+        """Library section objects for pipelines that scan them."""
+        return [info.section for info in self.get_sections(server)]
+
     def get_libraries(self) -> List[str]:
         if not self.server:
             logger.warning("Server is not connected. Cannot fetch libraries.")
             return []
-        server_name = getattr(self.server, 'friendlyName', None) or getattr(self.server, 'name', None)
-        if server_name and server_name in self._libraries_cache:
-            logger.debug("Libraries cache hit for server: %s", server_name)
-            return self._libraries_cache[server_name]
         try:
-            libs = [section.title for section in self.server.library.sections()]
-            if server_name:
-                self._libraries_cache[server_name] = libs
-            logger.debug("Fetched %d libraries for server %s", len(libs), server_name)
-            return libs
+            return [info.title for info in self.get_sections()]
         except Exception as e:
             logger.error("Failed to fetch libraries from server: %s", e)
+            self._auth_failed(e)
             return []
 
-    def prefetch_all_libraries_async(self, log_fn: Optional[Callable[[str], None]] = None):
-        """Background warm-up of server connections and library lists for all servers."""
+    def invalidate(self, server_name=None):
+        """Forget cached connections and section lists for one server, or all of them."""
+        if server_name is None:
+            self.connections.invalidate()
+            self.sections.invalidate()
+        else:
+            self.connections.pop(server_name)
+            self.sections.pop(server_name)
+
+    def cache_stats(self):
+        return {"connections": self.connections.stats(), "sections": self.sections.stats()}
+
+    def prefetch_all_libraries_async(self, log_fn: Optional[Callable[[str], None]] = None,
+                                     on_server_ready: Optional[Callable[[str, object], None]] = None,
+                                     max_workers: int = PREFETCH_WORKERS):
+        """Background warm-up of server connections and library lists, several servers at a time.
+
+        ``on_server_ready(name, server)`` runs on the prefetch thread once a
+        server is connected, so callers can warm further per-server state.
+        """
+
+        def _prefetch(res):
+            name = res.name
+            try:
+                start = time.perf_counter()
+                server_obj = self.connections.peek(name)
+                if server_obj is None:
+                    server_obj = self._connect(res)
+                    self._connected(name, server_obj)
+                libs = self.sections.get_or_load(name, self._load_sections(server_obj))
+                duration = time.perf_counter() - start
+                if log_fn:
+                    log_fn(f"Prefetched libraries for '{name}' ({len(libs)} libraries) in {duration:.2f}s")
+                if on_server_ready:
+                    on_server_ready(name, server_obj)
+            except Exception as e:  # pragma: no cover (best-effort prefetch)
+                self._auth_failed(e)
+                if log_fn:
+                    log_fn(f"Prefetch failed for '{name}': {e}")
 
         def _worker():
-            for res in self.resources:
-                name = res.name
-                if name in self._libraries_cache:
-                    continue
-                try:
-                    start = time.perf_counter()
-                    if name not in self._server_cache:
-                        connected = self.account.resource(res.name).connect(timeout=8)  # type: ignore[arg-type]
-                        with self._lock:
-                            self._server_cache[name] = connected
-                    server_obj = self._server_cache[name]
-                    libs = [s.title for s in server_obj.library.sections()]
-                    self._libraries_cache[name] = libs
-                    duration = time.perf_counter() - start
-                    if log_fn:
-                        log_fn(f"Prefetched libraries for '{name}' ({len(libs)} libraries) in {duration:.2f}s")
-                except Exception as e:  # pragma: no cover (best-effort prefetch)
-                    if log_fn:
-                        log_fn(f"Prefetch failed for '{name}': {e}")
+            pending = [res for res in self.resources if self.sections.peek(res.name) is None]
+            if not pending:
+                return
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(pending)),
+                                    thread_name_prefix="plex-prefetch") as pool:
+                list(pool.map(_prefetch, pending))
         threading.Thread(target=_worker, daemon=True).start()
 
 
 class RatingsToPlexRatingsController:
-    def __init__(self, server=None, log_callback=None):
+    def __init__(self, server=None, log_callback=None, session_store=None, on_session_invalid=None):
         self.plex_connection = None
         self.log_callback = log_callback
+        self.session_store = session_store
+        self.on_session_invalid = on_session_invalid
+        self.library_indexes = LibraryIndexCache()
+        self._recent_libraries = {}  # server_name -> (library, all_libraries)
+        self.last_server = ""
         logger.debug("RatingsToPlexRatingsController initialized")
 
-    def log_message(self, message, log_filename):
+    # --------------------- Caches --------------------- #
+    def section_source(self, server):
+        """A callable listing ``server``'s sections through the connection cache, if there is one."""
+        list_sections = getattr(self.plex_connection, "list_sections", None)
+        if list_sections is None:
+            return None
+        return lambda: list_sections(server)
+
+    def get_sections(self, server_name):
+        """Switch to ``server_name`` and return its cached section metadata."""
+        if not self.plex_connection.switch_to_server(server_name):
+            raise ConnectionError(f"Could not connect to server '{server_name}'")
+        self.last_server = server_name
+        self.warm_library_index_async(server_name)
+        return self.plex_connection.get_sections()
+
+    def cache_stats(self):
+        stats = {"libraryIndexes": self.library_indexes.stats()}
+        if self.plex_connection:
+            stats.update(self.plex_connection.cache_stats())
+        return stats
+
+    def invalidate_caches(self, server_name=None):
+        """Drop cached connections, section lists and match indexes."""
+        connection = self.plex_connection
+        if server_name is None:
+            self.library_indexes.invalidate()
+        else:
+            cached = connection.connections.peek(server_name) if connection else None
+            if cached is not None:
+                self.library_indexes.invalidate(cached)
+        if connection:
+            connection.invalidate(server_name)
+
+    def _active_server_name(self):
+        server = self.plex_connection.server if self.plex_connection else None
+        if server is None:
+            return ""
+        return getattr(server, "friendlyName", None) or getattr(server, "name", "") or ""
+
+    def _record_recent_library(self, selected_library, all_libraries):
+        name = self._active_server_name()
+        if not name:
+            return
+        self._recent_libraries[name] = (selected_library, bool(all_libraries))
+        self.last_server = name
+        if self.session_store:
+            try:
+                self.session_store.remember_library(name, selected_library, bool(all_libraries))
+            except Exception as e:  # pragma: no cover (persistence is best-effort)
+                logger.error("Could not remember recent library: %s", e)
+
+    def _warm_if_active(self, server_name, server):
+        active = self._active_server_name() or self.last_server
+        if server_name == active:
+            self.warm_library_index(server_name, server)
+
+    def warm_library_index(self, server_name, server):
+        """Build the match index for the server's most recently used library ahead of a preview."""
+        library, all_libraries = self._recent_libraries.get(server_name, ("", False))
+        if not library and not all_libraries:
+            return None
+        pipeline = RatingsImportPipeline(
+            server, index_cache=self.library_indexes, list_sections=self.section_source(server)
+        )
+        try:
+            sections = pipeline._resolve_sections(library, all_libraries)
+            if self.library_indexes.peek(server, sections) is not None:
+                return None
+            start = time.perf_counter()
+            index = pipeline.library_index(sections)
+        except Exception as e:  # pragma: no cover (best-effort warm-up)
+            logger.info("Library index warm-up for '%s' failed: %s", server_name, e)
+            return None
+        logger.info(
+            "Warmed match index for '%s' / %s (%d items) in %.2fs",
+            server_name, "all libraries" if all_libraries else library,
+            index.item_count, time.perf_counter() - start,
+        )
+        return index
+
+    def warm_library_index_async(self, server_name):
+        connection = self.plex_connection
+        server = connection.server if connection else None
+        if server is None:
+            return
+        threading.Thread(
+            target=self.warm_library_index, args=(server_name, server), daemon=True
+        ).start()
+
+    # --------------------- Persistent Session --------------------- #
+    def _new_connection(self, account, resources, token, username):
+        return PlexConnection(
+            account,
+            None,
+            resources,
+            token=token,
+            username=username,
+            on_connected=self._remember_connection,
+            on_auth_error=lambda _error: self.invalidate_session(),
+            log_fn=self._log_connection,
+        )
+
+    def restore_session(self) -> bool:
+        """Reconnect from the encrypted session cache without OAuth or plex.tv calls."""
+        session = self.session_store.load() if self.session_store else None
+        if not session or not session.servers:
+            return False
+        self.plex_connection = self._new_connection(
+            None, list(session.servers), session.token, session.username
+        )
+        self.last_server = session.last_server
+        for server in session.servers:
+            if server.recent_library or server.recent_all_libraries:
+                self._recent_libraries[server.name] = (server.recent_library, server.recent_all_libraries)
+        logger.info("Restored cached Plex session for %s", session.username or "account")
+        return True
+
+    def reload_session(self) -> bool:
+        """Drop the in-memory connection and load whatever session is cached now.
+
+        Another worker process may have logged in or out since this one
+        restored its session.
+        """
+        self.plex_connection = None
+        self.library_indexes.invalidate()
+        self._recent_libraries.clear()
+        self.last_server = ""
+        return self.restore_session()
+
+    def revalidate_session(self) -> bool:
+        """Check the cached token against plex.tv and refresh the server list.
+
+        Returns False only when Plex rejected the token; network problems keep
+        the cached session so the app still works while plex.tv is unreachable.
+        """
+        connection = self.plex_connection
+        if not connection or not connection.token:
+            return False
+        try:
+            from plexapi.myplex import MyPlexAccount
+            account = MyPlexAccount(token=connection.token)
+            resources = [r for r in account.resources() if r.owned and r.connections and r.provides == 'server']
+        except Exception as e:
+            if is_auth_error(e):
+                logger.warning("Cached Plex session was rejected: %s", e)
+                self.invalidate_session()
+                return False
+            logger.info("Could not revalidate cached Plex session: %s", e)
+            return True
+        servers = []
+        for server in cached_servers_from_resources(resources):
+            uri, chosen_at = connection.remembered_uri(server.name)
+            library, all_libraries = self._recent_libraries.get(server.name, ("", False))
+            servers.append(replace(
+                server,
+                last_uri=uri,
+                last_uri_at=chosen_at,
+                recent_library=library,
+                recent_all_libraries=all_libraries,
+            ))
+        servers = tuple(servers)
+        current = {server.name for server in servers}
+        for removed in [res.name for res in connection.resources if res.name not in current]:
+            self.invalidate_caches(removed)
+        connection.account = account
+        connection.resources = list(servers)
+        self._save_session(account, servers)
+        connection.prefetch_all_libraries_async(
+            log_fn=lambda m: logger.debug(m),
+            on_server_ready=self._warm_if_active,
+        )
+        return True
+
+    def invalidate_session(self, notify=True):
+        if self.session_store:
+            self.session_store.clear()
+        had_connection = self.plex_connection is not None
+        self.plex_connection = None
+        self.library_indexes.invalidate()
+        self._recent_libraries.clear()
+        self.last_server = ""
+        if notify and had_connection and self.on_session_invalid:
+            self.on_session_invalid()
+
+    def _save_session(self, account, servers):
+        if not self.session_store:
+            return
+        username = getattr(account, "username", "") or getattr(account, "email", "") or ""
+        try:
+            self.session_store.save(CachedSession(
+                token=account.authenticationToken,
+                username=username,
+                servers=servers,
+                last_server=self.last_server,
+            ))
+        except Exception as e:  # pragma: no cover (persistence is best-effort)
+            logger.error("Could not save Plex session: %s", e)
+
+    def _log_connection(self, message):
+        if self.log_callback:
+            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self.log_callback(f"{timestamp} - {message}\n")
+
+    def _remember_connection(self, server_name, uri, chosen_at=None):
+        if self.session_store:
+            self.session_store.remember_uri(server_name, uri, chosen_at)
+
+    def log_message(self, message, log_filename, log_callback=None):
         now = datetime.datetime.now()
         timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
         full_message = f"{timestamp} - {message}\n"
         logger.info(message)
-        if self.log_callback:
-            self.log_callback(full_message)
+        callback = log_callback or self.log_callback
+        if callback:
+            callback(full_message)
     # Ensure UTF-8 so special characters in logs do not raise Windows charmap errors
         try:
             with open(log_filename, 'a', encoding='utf-8') as log_file:
@@ -128,6 +493,10 @@ class RatingsToPlexRatingsController:
             logger.error("Log write failure for %s: %s", log_filename, e)
 
     def login_and_fetch_servers(self, update_ui_callback):
+        # plexapi pulls in requests and friends; load it only when a login starts.
+        import webbrowser
+        from plexapi.myplex import MyPlexPinLogin, MyPlexAccount
+
         logger.info("Initiating Plex login and fetching servers")
         headers = {'X-Plex-Client-Identifier': 'unique_client_identifier'}
         pinlogin = MyPlexPinLogin(headers=headers, oauth=True)
@@ -142,9 +511,14 @@ class RatingsToPlexRatingsController:
             servers = [r.name for r in resources]
             if servers:
                 logger.info("Fetched servers: %s", servers)
-                self.plex_connection = PlexConnection(plex_account, None, resources)
+                username = getattr(plex_account, "username", "") or getattr(plex_account, "email", "") or ""
+                self.plex_connection = self._new_connection(plex_account, resources, pinlogin.token, username)
+                self._save_session(plex_account, cached_servers_from_resources(resources))
                 # No persistent seeding; rely on live prefetch
-                self.plex_connection.prefetch_all_libraries_async(log_fn=lambda m: logger.debug(m))
+                self.plex_connection.prefetch_all_libraries_async(
+                    log_fn=lambda m: logger.debug(m),
+                    on_server_ready=self._warm_if_active,
+                )
                 update_ui_callback(servers=servers, success=True)
             else:
                 logger.warning("No servers found after login")
@@ -161,6 +535,8 @@ class RatingsToPlexRatingsController:
 
     def get_libraries(self, server_name):
         if self.plex_connection.switch_to_server(server_name):
+            self.last_server = server_name
+            self.warm_library_index_async(server_name)
             return self.plex_connection.get_libraries()
         logger.error("Failed to switch to server: %s", server_name)
         return []
@@ -176,11 +552,17 @@ class RatingsToPlexRatingsController:
 
     # Persistent cache methods removed
 
-    def build_import_plan(self, filepath, selected_library, values, max_items=0):
-        if not self.plex_connection or not self.plex_connection.server:
-            raise ImportPipelineError("Not connected to a Plex server")
+    def build_import_plan(self, filepath, selected_library, values, max_items=0, server=None):
+        """Plan an import against ``server``, by default the currently connected one."""
+        if server is None:
+            if not self.plex_connection or not self.plex_connection.server:
+                raise ImportPipelineError("Not connected to a Plex server")
+            server = self.plex_connection.server
         options = ImportOptions.from_values(values)
-        pipeline = RatingsImportPipeline(self.plex_connection.server)
+        self._record_recent_library(selected_library, options.all_libraries)
+        pipeline = RatingsImportPipeline(
+            server, index_cache=self.library_indexes, list_sections=self.section_source(server)
+        )
         return pipeline.build_plan(
             filepath,
             selected_library,
@@ -188,29 +570,61 @@ class RatingsToPlexRatingsController:
             max_items=max_items,
         )
 
-    def update_ratings(self, filepath, selected_library, values):
+    def update_ratings(
+        self,
+        filepath,
+        selected_library,
+        values,
+        log_callback=None,
+        journal=None,
+        changes=None,
+        failure_log=None,
+        server=None,
+    ):
+        """Plan and apply an import; ``server`` defaults to the currently connected one.
+
+        Callers that queue the update pass the server they checked, so a later
+        server switch cannot redirect the writes. Errors are logged and
+        reported as ``False``, except Plex rejecting the token, which is
+        raised so the caller can drop the session.
+        """
         now = datetime.datetime.now()
         log_filename = f"RatingsUpdateLog_{now.strftime('%Y%m%d_%H%M%S')}.log"
         logger.info("Starting update_ratings with file: %s and library: %s", filepath, selected_library)
-        if not self.plex_connection or not self.plex_connection.server:
+        if server is None and self.plex_connection:
+            server = self.plex_connection.server
+        if server is None:
             logger.error("Not connected to a Plex server")
-            self.log_message('Error: Not connected to a Plex server', log_filename)
+            self.log_message('Error: Not connected to a Plex server', log_filename, log_callback)
             return False
 
+        writing = False
         try:
             options = ImportOptions.from_values(values)
             if options.dry_run:
-                self.log_message('DRY RUN ENABLED: No changes will be written to Plex.', log_filename)
+                self.log_message('DRY RUN ENABLED: No changes will be written to Plex.', log_filename, log_callback)
             if options.all_libraries:
-                self.log_message('Cross-library mode enabled.', log_filename)
+                self.log_message('Cross-library mode enabled.', log_filename, log_callback)
 
-            self.log_message(f"Planning {options.source} ratings import", log_filename)
+            self.log_message(f"Planning {options.source} ratings import", log_filename, log_callback)
+            self._record_recent_library(selected_library, options.all_libraries)
             pipeline = RatingsImportPipeline(
-                self.plex_connection.server,
-                log=lambda message: self.log_message(message, log_filename),
+                server,
+                log=lambda message: self.log_message(message, log_filename, log_callback),
+                index_cache=self.library_indexes,
+                list_sections=self.section_source(server),
             )
             plan = pipeline.build_plan(filepath, selected_library, options)
-            result = pipeline.apply(plan)
+            if failure_log is None and not options.dry_run:
+                failure_log = self._failure_log(filepath, options.source)
+            writing = not options.dry_run
+            result = pipeline.apply(
+                plan,
+                journal=journal,
+                changes=changes,
+                details={"library": "All libraries" if options.all_libraries else selected_library},
+                failure_log=None if options.dry_run else failure_log,
+            )
 
             updated = result.stats["updated"]
             total_items = result.stats["total_items"]
@@ -224,7 +638,7 @@ class RatingsToPlexRatingsController:
                     f"Successfully updated {updated} out of {total_items} "
                     f"({options.source})"
                 )
-            self.log_message(summary, log_filename)
+            self.log_message(summary, log_filename, log_callback)
 
             breakdown = [
                 "Breakdown:",
@@ -235,53 +649,74 @@ class RatingsToPlexRatingsController:
                 f"  Not found in Plex: {result.stats['not_found']}",
                 f"  Type mismatch: {result.stats['type_mismatch']}",
                 f"  Rate failed errors: {result.stats['rate_failed']}",
+                f"  Verification mismatches: {result.stats['verify_mismatch']}",
                 f"  Exported failures: {len(result.failures)}",
             ]
+            if options.mark_watched and not options.dry_run:
+                breakdown[-1:-1] = [
+                    f"  Marked watched: {result.stats['watched_marked']}",
+                    f"  Already watched: {result.stats['watched_skipped']}",
+                    f"  Mark watched errors: {result.stats['watch_failed']}",
+                ]
             for line in breakdown:
-                self.log_message(line, log_filename)
+                self.log_message(line, log_filename, log_callback)
+            if "writes" in result.stats:
+                self.log_message(describe_write_stats(result.stats["writes"]), log_filename, log_callback)
+            if "journal" in result.stats:
+                self.log_message(f"Import journal: {result.stats['journal']}", log_filename, log_callback)
+            if "run_id" in result.stats:
+                self.log_message(
+                    f"Changes recorded as run {result.stats['run_id']}; it can be undone from the run history",
+                    log_filename,
+                    log_callback,
+                )
 
             if options.dry_run:
-                self.log_message('Dry run mode: No failure CSV exported.', log_filename)
+                self.log_message('Dry run mode: No failure CSV exported.', log_filename, log_callback)
             else:
-                self._export_failures_if_any(
-                    list(result.failures),
-                    filepath,
-                    options.source.lower(),
-                    log_filename,
-                )
+                self._report_failures(failure_log, log_filename, log_callback)
             return result.success
         except FileNotFoundError:
             logger.error("CSV file not found: %s", filepath)
-            self.log_message('Error: File not found', log_filename)
+            self.log_message('Error: File not found', log_filename, log_callback)
             return False
         except ImportPipelineError as e:
             logger.error("Import planning failed: %s", e)
-            self.log_message(f'Error planning import: {e}', log_filename)
+            self.log_message(f'Error planning import: {e}', log_filename, log_callback)
             return False
         except Exception as e:
             logger.error("Error processing CSV: %s", e)
-            self.log_message(f'Error processing CSV: {e}', log_filename)
+            self.log_message(f'Error processing CSV: {e}', log_filename, log_callback)
+            if is_auth_error(e):
+                raise
             return False
+        finally:
+            if writing:
+                # Indexed items carry userRating, so a cached index is stale
+                # after any write, including those of a run that failed midway.
+                self.library_indexes.invalidate(server)
+            if failure_log is not None:
+                failure_log.close()
 
-    # --------------------- Failure Export Helper --------------------- #
-    def _export_failures_if_any(self, failures: List[Dict[str, str]], source_filepath: str, source_name: str, log_filename: str):
-        if not failures:
-            self.log_message("No failed or unmatched items to export.", log_filename)
+    # --------------------- Failure Export Helpers --------------------- #
+    @staticmethod
+    def _failure_log(source_filepath: str, source: str) -> FailureLog:
+        """Failures of one run, streamed next to the working directory as CSV and JSONL."""
+        ts = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        base = Path(source_filepath).stem
+        return FailureLog(
+            str(Path.cwd() / f"Unmatched_{source.lower()}_{base}_{ts}"),
+            columns=failure_columns(source),
+        )
+
+    def _report_failures(self, failure_log: FailureLog, log_filename: str, log_callback=None):
+        if not failure_log:
+            self.log_message("No failed or unmatched items to export.", log_filename, log_callback)
             return
-        try:
-            ts = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-            base = Path(source_filepath).stem
-            out_path = Path.cwd() / f"Unmatched_{source_name}_{base}_{ts}.csv"
-            # Determine headers union for robustness
-            headers = set()
-            for f in failures:
-                headers.update(f.keys())
-            headers = list(headers)
-            with open(out_path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=headers)
-                writer.writeheader()
-                writer.writerows(failures)
-            self.log_message(f"Exported {len(failures)} unmatched/failed items to {out_path}", log_filename)
-        except Exception as e:
-            self.log_message(f"Failed to export unmatched items CSV: {e}", log_filename)
+        self.log_message(
+            f"Exported {len(failure_log)} unmatched/failed items to {failure_log.csv_path} "
+            f"(and {Path(failure_log.jsonl_path).name})",
+            log_filename,
+            log_callback,
+        )
 
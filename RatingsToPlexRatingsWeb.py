@@ -1,33 +1,65 @@
 import csv
 import hmac
+import io
 import ipaddress
 import json
 import os
-import queue
 import re
 import secrets
-import ssl
 import threading
 import time
-import urllib.request
 import uuid
-import webbrowser
 from flask import Flask, render_template, request, jsonify, Response, send_file
 from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
-from RatingsToPlexRatingsController import RatingsToPlexRatingsController
+from RatingsImportPipeline import (
+    ImportPipelineError,
+    RatingsImportPipeline,
+    detect_source,
+    find_section,
+    iter_rated_items,
+    positive_user_rating,
+)
+from RatingsBackupStore import RatingsBackupStore
+from RatingsChangeStore import ChangeStore
+from RatingsExportPipeline import EXPORT_COLUMNS, RatingsExporter
+from RatingsFailureLog import FAILURE_FORMATS, FailureLog, failure_columns, read_prefix
+from RatingsImportJournal import ImportJournal, JournalStore
+from RatingsJobManager import ACTIVE_JOB_STATES, JOB_FAILED, JOB_SUCCEEDED, JobManager
+from RatingsResponseCompression import COMPRESSION_MIN_BYTES, compress_response
+from RatingsStaticAssets import ASSET_CACHE_CONTROL, StaticAssets
+from RatingsStateStore import EventQueue, MemoryStateStore, StoreLeases, open_state_store
+from RatingsPlanFile import PLAN_SUFFIX, PlanFileError, dump_plan, load_plan, saved_plan
+from RatingsSessionStore import SessionStore, is_auth_error
+from RatingsRestorePipeline import RatingsRestorePipeline, RestoreError, read_backup
+from RatingsUndoPipeline import RatingsUndoPipeline
+from RatingsToPlexRatingsController import RatingsToPlexRatingsController, configure_logging
+from PlexWriteExecutor import (
+    PlexWriteExecutor,
+    ProgressThrottle,
+    circuit_breaker,
+    describe_write_stats,
+    rate_rating_key,
+)
 from version import __version__
 
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
 BACKUP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backups")
+SESSION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "session")
+JOURNAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "journals")
+CHANGE_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history", "changes.sqlite3")
+FAILURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "failures")
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
 MAX_CSV_UPLOAD_BYTES = 10 * 1024 * 1024
+MIN_ACCESS_TOKEN_LENGTH = 16
 CLEAR_CONFIRMATION_TTL_SECONDS = 60
-CSV_REQUIRED_HEADERS = {
-    "IMDb": {"Const", "Title", "Title Type", "Your Rating", "Year"},
-    "Letterboxd": {"Name", "Year", "Rating"},
-}
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-os.makedirs(BACKUP_DIR, exist_ok=True)
+BACKUP_RETENTION_COUNT = 20
+BACKUP_RETENTION_DAYS = 90
+JOB_WORKERS = 4
+JOB_SNAPSHOT_TTL_SECONDS = 24 * 60 * 60
+UPLOAD_HOLD_TTL_SECONDS = 12 * 60 * 60
+SERVER_LEASE_TTL_SECONDS = 60
+PREVIEW_SHAPES = ("items", "columnar")
 
 app = Flask(__name__)
 app.config.update(
@@ -96,6 +128,12 @@ def _protect_requests():
     return None
 
 
+@app.after_request
+def _compress_json(response):
+    """gzip (or brotli, when installed) JSON and HTML responses above ``COMPRESSION_MIN_BYTES``."""
+    return compress_response(response, request.headers.get("Accept-Encoding", ""), COMPRESSION_MIN_BYTES)
+
+
 @app.errorhandler(RequestEntityTooLarge)
 def _upload_too_large(_error):
     return jsonify({
@@ -104,9 +142,6 @@ def _upload_too_large(_error):
 
 
 def _validate_csv_upload(path, requested_source):
-    if requested_source and requested_source not in CSV_REQUIRED_HEADERS:
-        raise ValueError("Unsupported ratings source")
-
     with open(path, "r", encoding="utf-8-sig", newline="") as fh:
         reader = csv.DictReader(fh)
         headers = list(reader.fieldnames or [])
@@ -115,33 +150,17 @@ def _validate_csv_upload(path, requested_source):
         if len(headers) != len(set(headers)):
             raise ValueError("CSV file contains duplicate column headers")
 
-        if requested_source:
-            sources_to_check = [requested_source]
-        else:
-            sources_to_check = list(CSV_REQUIRED_HEADERS)
-
-        detected_source = next(
-            (
-                source
-                for source in sources_to_check
-                if CSV_REQUIRED_HEADERS[source].issubset(headers)
-            ),
-            None,
-        )
-        if not detected_source:
-            if requested_source:
-                missing = sorted(CSV_REQUIRED_HEADERS[requested_source].difference(headers))
-                raise ValueError(
-                    f"Invalid {requested_source} CSV; missing required columns: {', '.join(missing)}"
-                )
-            raise ValueError(
-                "Unsupported CSV format; expected an IMDb or Letterboxd ratings export"
-            )
-
+        detected_source = detect_source(headers, requested_source)
         row_count = sum(1 for _ in reader)
         return detected_source, row_count
 
 
+def _upload_path(filename):
+    # The directory is normally created by init_app(); recreate it if it was removed.
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    return os.path.join(UPLOAD_DIR, filename)
+
+
 def _discard_upload(path):
     """Delete a generated upload only when it resolves inside UPLOAD_DIR."""
     if not path:
@@ -161,12 +180,20 @@ def _discard_upload(path):
 
 
 def _cleanup_old_uploads(keep_path):
-    """Remove prior regular files from the application-owned upload directory."""
-    keep = os.path.realpath(keep_path)
+    """Remove prior regular files from the application-owned upload directory.
+
+    The current upload and files any worker still holds (see
+    ``_hold_upload``) are kept.
+    """
+    keep = {os.path.realpath(path) for path in _held_uploads()}
+    keep.add(os.path.realpath(keep_path))
+    current_path, _row_count = _current_upload()
+    if current_path:
+        keep.add(os.path.realpath(current_path))
     try:
         with os.scandir(UPLOAD_DIR) as entries:
             for entry in entries:
-                if entry.is_file(follow_symlinks=False) and os.path.realpath(entry.path) != keep:
+                if entry.is_file(follow_symlinks=False) and os.path.realpath(entry.path) not in keep:
                     try:
                         os.remove(entry.path)
                     except OSError:
@@ -175,24 +202,88 @@ def _cleanup_old_uploads(keep_path):
         app.logger.warning("Could not scan the upload directory for old files")
 
 # --------------- Shared state ---------------
-log_queue = queue.Queue()
+# State that every worker process must see (log events, the uploaded CSV,
+# clear confirmations, job snapshots, the login) lives in ``state_store``;
+# see configure_state_store(). The rest below belongs to this process.
+state_store = MemoryStateStore()
+log_queue = EventQueue(state_store)
 controller = None
-uploaded_csv_path = None
-csv_row_count = 0
-update_running = False
+session_generation = 0
+static_assets = StaticAssets(STATIC_DIR)
 state_lock = threading.Lock()
-clear_confirmation_lock = threading.Lock()
-clear_confirmations = {}
-backup_lock = threading.Lock()
-rating_backups = {}
 
-# Progress tracking (written by log callback, read by update thread)
+
+def _publish_job(job):
+    """Keep a snapshot of each job in a shared store so any worker can report on it."""
+    if not state_store.shared:
+        return
+    details = job.to_dict()
+    if not job.active and isinstance(job.result, dict):
+        details["result"] = job.result
+    try:
+        state_store.put("jobs", job.job_id, details, ttl=JOB_SNAPSHOT_TTL_SECONDS)
+    except (TypeError, ValueError):
+        details.pop("result", None)
+        state_store.put("jobs", job.job_id, details, ttl=JOB_SNAPSHOT_TTL_SECONDS)
+
+
+jobs = JobManager(max_workers=JOB_WORKERS, on_change=_publish_job)
+
+
+def configure_state_store(store):
+    """Use ``store`` for state shared between requests; returns the store it replaces.
+
+    A shared store also carries the CSRF token, so a page served by one
+    worker can post to another, and the per-server leases that keep writes
+    from two workers to one server from overlapping.
+    """
+    global state_store
+    previous = state_store
+    state_store = store
+    log_queue.attach(store)
+    jobs.leases = StoreLeases(store, "server-lock", SERVER_LEASE_TTL_SECONDS) if store.shared else None
+    if store.shared:
+        app.config["CSRF_TOKEN"] = store.add("app", "csrf-token", app.config["CSRF_TOKEN"])
+    return previous
+
+
+def _current_upload():
+    """The path and row count of the uploaded CSV, or ``(None, 0)``."""
+    upload = state_store.get("upload", "current") or {}
+    return upload.get("path"), upload.get("rowCount", 0)
+
+
+def _set_current_upload(path, row_count):
+    state_store.put("upload", "current", {"path": path, "rowCount": row_count})
+
+
+def _hold_upload(path):
+    """Keep ``path`` from being replaced or deleted while it is read; returns the release function."""
+    hold_id = uuid.uuid4().hex
+    state_store.put("upload-holds", hold_id, path, ttl=UPLOAD_HOLD_TTL_SECONDS)
+    return lambda: state_store.delete("upload-holds", hold_id)
+
+
+def _held_uploads():
+    return set(state_store.items("upload-holds").values())
+
+
+def _update_running():
+    """Whether an update job is queued or running in this or any other worker."""
+    if jobs.active(kinds=("update",)):
+        return True
+    return state_store.shared and any(
+        details.get("kind") == "update" and details.get("status") in ACTIVE_JOB_STATES
+        for details in state_store.items("jobs").values()
+    )
+
+# Progress tracking per update job (written by the job's log callback)
 progress_lock = threading.Lock()
-progress_state = {
-    "current": 0,
-    "total": 0,
-    "stats": {},
-}
+progress_state = {}
+
+# Failure logs of update/resume jobs, downloadable while the job runs
+failure_log_lock = threading.Lock()
+failure_logs = {}
 
 # Patterns that indicate one CSV row was processed (for progress bar)
 _PROGRESS_PATTERNS = [
@@ -211,11 +302,15 @@ _STAT_PATTERNS = [
     ("not_found", "Not found in Plex:"),
     ("type_mismatch", "Type mismatch:"),
     ("rate_failed", "Rate failed errors:"),
+    ("verify_mismatch", "Verification mismatches:"),
+    ("watched_marked", "Marked watched:"),
+    ("watched_skipped", "Already watched:"),
+    ("watch_failed", "Mark watched errors:"),
     ("exported_failures", "Exported failures:"),
 ]
 
 
-def _log_callback(message):
+def _log_callback(message, job_id=None):
     """Controller calls this for every log line; we push into the SSE queue and track progress."""
     msg = message.rstrip("\n")
 
@@ -225,29 +320,31 @@ def _log_callback(message):
         log_queue.put({"type": "log", "data": msg})
 
     with progress_lock:
-        if progress_state["total"] <= 0:
+        progress = progress_state.get(job_id)
+        if not progress or progress["total"] <= 0:
             return
 
         # Count actual updates and dry runs for progress (not unchanged skips)
         if any(p in msg for p in _PROGRESS_PATTERNS[:2]):
-            progress_state["current"] += 1
+            progress["current"] += 1
             log_queue.put({
                 "type": "progress",
                 "data": json.dumps({
-                    "current": progress_state["current"],
-                    "total": progress_state["total"],
+                    "current": progress["current"],
+                    "total": progress["total"],
+                    "jobId": job_id,
                 }),
             })
         # Parse final summary line
         m = re.search(r"Successfully updated (\d+) out of (\d+)", msg)
         if m:
-            progress_state["stats"]["updated"] = int(m.group(1))
-            progress_state["stats"]["total_items"] = int(m.group(2))
+            progress["stats"]["updated"] = int(m.group(1))
+            progress["stats"]["total_items"] = int(m.group(2))
         m = re.search(r"DRY RUN: (\d+) of (\d+)", msg)
         if m:
-            progress_state["stats"]["updated"] = int(m.group(1))
-            progress_state["stats"]["total_items"] = int(m.group(2))
-            progress_state["stats"]["dry_run"] = True
+            progress["stats"]["updated"] = int(m.group(1))
+            progress["stats"]["total_items"] = int(m.group(2))
+            progress["stats"]["dry_run"] = True
 
         # Parse breakdown stats
         for key, pattern in _STAT_PATTERNS:
@@ -255,17 +352,27 @@ def _log_callback(message):
                 idx = msg.index(pattern) + len(pattern)
                 num_str = msg[idx:].strip()
                 try:
-                    progress_state["stats"][key] = int(num_str)
+                    progress["stats"][key] = int(num_str)
                 except ValueError:
                     pass
                 break
 
 
-def _reset_progress(total):
+def _start_progress(job_id, total):
+    with progress_lock:
+        progress_state[job_id] = {"current": 0, "total": total, "stats": {}}
+
+
+def _finish_progress(job_id):
     with progress_lock:
-        progress_state["current"] = 0
-        progress_state["total"] = total
-        progress_state["stats"] = {}
+        progress = progress_state.pop(job_id, None)
+    return dict(progress["stats"]) if progress else {}
+
+
+def _active_server_id(ctrl):
+    """Jobs are serialized per server; operations without a connection share one slot."""
+    server = ctrl.plex_connection.server if ctrl.plex_connection else None
+    return _server_confirmation_id(server) if server is not None else "disconnected"
 
 
 def _server_confirmation_id(server):
@@ -275,22 +382,12 @@ def _server_confirmation_id(server):
 
 def _create_clear_confirmation(server, selected_library, all_libraries, confirmation_text):
     token = secrets.token_urlsafe(32)
-    now = time.monotonic()
-    with clear_confirmation_lock:
-        expired = [
-            existing_token
-            for existing_token, details in clear_confirmations.items()
-            if details["expires_at"] <= now
-        ]
-        for existing_token in expired:
-            clear_confirmations.pop(existing_token, None)
-        clear_confirmations[token] = {
-            "expires_at": now + CLEAR_CONFIRMATION_TTL_SECONDS,
-            "server_id": _server_confirmation_id(server),
-            "library": selected_library,
-            "all_libraries": all_libraries,
-            "confirmation_text": confirmation_text,
-        }
+    state_store.put("clear-confirmation", token, {
+        "server_id": _server_confirmation_id(server),
+        "library": selected_library,
+        "all_libraries": all_libraries,
+        "confirmation_text": confirmation_text,
+    }, ttl=CLEAR_CONFIRMATION_TTL_SECONDS)
     return token
 
 
@@ -298,34 +395,23 @@ def _consume_clear_confirmation(token, server, selected_library, all_libraries,
     if not token or not isinstance(token, str):
         return False, "A clear confirmation token is required", 403
 
-    now = time.monotonic()
-    with clear_confirmation_lock:
-        details = clear_confirmations.get(token)
-        if not details:
-            return False, "Clear confirmation is invalid or has already been used", 403
-        if details["expires_at"] <= now:
-            clear_confirmations.pop(token, None)
-            return False, "Clear confirmation has expired; request a new confirmation", 410
-
-        valid_scope = (
-            details["server_id"] == _server_confirmation_id(server)
-            and details["library"] == selected_library
-            and details["all_libraries"] is all_libraries
-            and details["confirmation_text"] == confirmation_text
-        )
-        if not valid_scope:
-            return False, "Clear confirmation does not match the selected server and library", 403
-
-        clear_confirmations.pop(token, None)
-        return True, "", 200
+    # Expired confirmations are dropped by the store.
+    details = state_store.get("clear-confirmation", token)
+    if not details:
+        return False, "Clear confirmation is invalid, has expired or has already been used", 403
 
-
-def _positive_user_rating(item):
-    value = getattr(item, "userRating", None)
-    try:
-        return value if value is not None and float(value) > 0 else None
-    except (TypeError, ValueError):
-        return None
+    valid_scope = (
+        details["server_id"] == _server_confirmation_id(server)
+        and details["library"] == selected_library
+        and details["all_libraries"] is all_libraries
+        and details["confirmation_text"] == confirmation_text
+    )
+    if not valid_scope:
+        return False, "Clear confirmation does not match the selected server and library", 403
+    # Taken out of the store in one step, so two workers cannot both use it.
+    if state_store.take("clear-confirmation", token) is None:
+        return False, "Clear confirmation is invalid, has expired or has already been used", 403
+    return True, "", 200
 
 
 def _csv_safe(value):
@@ -335,81 +421,173 @@ def _csv_safe(value):
     return text
 
 
-def _create_ratings_backup(items_with_libraries):
-    backup_id = uuid.uuid4().hex
-    timestamp = time.strftime("%Y%m%d_%H%M%S")
-    download_name = f"PlexRatingsBackup_{timestamp}_{backup_id[:8]}.csv"
-    final_path = os.path.join(BACKUP_DIR, f"{backup_id}.csv")
-    temporary_path = final_path + ".tmp"
-    backed_up = 0
-
+def _section_item_count(section):
+    """Return the section's total item count, or ``None`` when Plex cannot say."""
     try:
-        with open(temporary_path, "w", encoding="utf-8", newline="") as backup_file:
-            fieldnames = [
-                "Library", "RatingKey", "MediaType", "Title", "Year", "UserRating", "Guid"
-            ]
-            writer = csv.DictWriter(backup_file, fieldnames=fieldnames)
-            writer.writeheader()
-            for library_name, item in items_with_libraries:
-                rating = _positive_user_rating(item)
-                if rating is None:
-                    continue
-                writer.writerow({
-                    "Library": _csv_safe(library_name),
-                    "RatingKey": _csv_safe(getattr(item, "ratingKey", "")),
-                    "MediaType": _csv_safe(getattr(item, "type", "")),
-                    "Title": _csv_safe(getattr(item, "title", "")),
-                    "Year": _csv_safe(getattr(item, "year", "")),
-                    "UserRating": rating,
-                    "Guid": _csv_safe(getattr(item, "guid", "")),
-                })
-                backed_up += 1
-        os.replace(temporary_path, final_path)
+        return int(section.totalSize)
     except Exception:
-        try:
-            if os.path.isfile(temporary_path):
-                os.remove(temporary_path)
-        except OSError:
-            pass
-        raise
-
-    with backup_lock:
-        rating_backups[backup_id] = {
-            "path": final_path,
-            "download_name": download_name,
+        return None
+
+
+def _backup_store():
+    return RatingsBackupStore(
+        BACKUP_DIR,
+        max_backups=BACKUP_RETENTION_COUNT,
+        max_age_days=BACKUP_RETENTION_DAYS,
+    )
+
+
+def _journal_store():
+    return JournalStore(JOURNAL_DIR)
+
+
+def _change_store():
+    return ChangeStore(CHANGE_DB_PATH)
+
+
+def _failure_log(job_id, source):
+    """Create the failure log for one job; logs of jobs no longer in the job history are dropped."""
+    log = FailureLog(os.path.join(FAILURE_DIR, f"failures_{job_id}"), columns=failure_columns(source))
+    with failure_log_lock:
+        for expired in [known for known in failure_logs if jobs.get(known) is None]:
+            failure_logs.pop(expired, None)
+        failure_logs[job_id] = log
+    return log
+
+
+def _backup_rows(items_with_libraries):
+    for library_name, item in items_with_libraries:
+        rating = positive_user_rating(item)
+        if rating is None:
+            continue
+        yield {
+            "Library": _csv_safe(library_name),
+            "RatingKey": _csv_safe(getattr(item, "ratingKey", "")),
+            "MediaType": _csv_safe(getattr(item, "type", "")),
+            "Title": _csv_safe(getattr(item, "title", "")),
+            "Year": _csv_safe(getattr(item, "year", "")),
+            "UserRating": rating,
+            "Guid": _csv_safe(getattr(item, "guid", "")),
         }
-    return backup_id, download_name, backed_up
+
+
+def _create_ratings_backup(items_with_libraries):
+    """Stream rated items into a compressed, catalogued backup before any write."""
+    record = _backup_store().write(_backup_rows(items_with_libraries))
+    return record.backup_id, record.download_name, record.entries
+
+
+def _session_changed():
+    """Tell other workers to reload the Plex session from the session cache."""
+    global session_generation
+    if state_store.shared:
+        session_generation = state_store.increment("app", "session-generation")
+
+
+def _session_invalidated():
+    _session_changed()
+    log_queue.put({"type": "log", "data": "Plex session expired or was revoked; please log in again."})
+    log_queue.put({"type": "session_invalid", "data": json.dumps({"connected": False})})
+
+
+def _handle_plex_error(ctrl, error):
+    """Drop the cached session when Plex rejects the token."""
+    if is_auth_error(error) and hasattr(ctrl, "invalidate_session"):
+        ctrl.invalidate_session()
+
+
+def _revalidate_session_job(job):
+    ctrl = _get_controller()
+    return {"valid": ctrl.revalidate_session()}
 
 
 def _get_controller():
-    global controller
+    global controller, session_generation
     if controller is None:
-        controller = RatingsToPlexRatingsController(log_callback=_log_callback)
+        controller = RatingsToPlexRatingsController(
+            log_callback=_log_callback,
+            session_store=SessionStore(SESSION_DIR),
+            on_session_invalid=_session_invalidated,
+        )
+        if state_store.shared:
+            session_generation = state_store.get("app", "session-generation") or 0
+        if controller.restore_session():
+            jobs.submit("session", _revalidate_session_job, exclusive=False)
+    elif state_store.shared:
+        _sync_controller(controller)
     return controller
 
 
+def _sync_controller(ctrl):
+    """Follow logins, logouts and server switches made through another worker.
+
+    Deferred while this process runs a job, which still uses the current
+    connection and library indexes; the next request after it catches up.
+    """
+    global session_generation
+    if jobs.active():
+        return
+    generation = state_store.get("app", "session-generation") or 0
+    if generation != session_generation and hasattr(ctrl, "reload_session"):
+        session_generation = generation
+        ctrl.reload_session()
+    server_name = state_store.get("app", "server")
+    connection = ctrl.plex_connection
+    current = getattr(connection, "server", None) if connection else None
+    if server_name and connection and (current is None or getattr(ctrl, "last_server", "") != server_name):
+        try:
+            if connection.switch_to_server(server_name):
+                ctrl.last_server = server_name
+        except Exception as error:
+            app.logger.warning("Could not switch to server %s: %s", server_name, error)
+
+
 # --------------- Routes ---------------
 
+@app.context_processor
+def _asset_urls():
+    return {"asset_url": static_assets.url}
+
+
 @app.route("/")
 def index():
-    return render_template(
+    response = Response(render_template(
         "index.html",
         version=__version__,
         csrf_token=app.config["CSRF_TOKEN"],
-    )
+    ))
+    # The page carries the CSRF token; the assets it links to are cached instead.
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+@app.route("/assets/<filename>")
+def static_asset(filename):
+    """A fingerprinted static file, precompressed and cacheable for a year."""
+    asset = static_assets.get(filename)
+    if asset is None:
+        return Response("Not found", status=404, mimetype="text/plain")
+    encoding = static_assets.encoding_for(asset, request.headers.get("Accept-Encoding", ""))
+    response = Response(asset.body(encoding), mimetype=asset.mimetype)
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    response.set_etag(asset.etag_for(encoding))
+    response.headers["Cache-Control"] = ASSET_CACHE_CONTROL
+    return response.make_conditional(request)
 
 
 @app.route("/api/login", methods=["POST"])
 def api_login():
     ctrl = _get_controller()
 
-    def _login_thread():
+    def _login_job(job):
         def on_done(servers=None, success=False):
             username = ""
-            if success and ctrl.plex_connection and ctrl.plex_connection.account:
-                username = (getattr(ctrl.plex_connection.account, "username", "")
-                            or getattr(ctrl.plex_connection.account, "email", ""))
+            if success and ctrl.plex_connection:
+                username = ctrl.plex_connection.username
             if success and servers:
+                _session_changed()
                 log_queue.put({"type": "login_complete", "data": json.dumps({
                     "success": True, "servers": servers, "username": username,
                 })})
@@ -426,8 +604,75 @@ def api_login():
                 "success": False, "servers": [], "username": "",
             })})
 
-    threading.Thread(target=_login_thread, daemon=True).start()
-    return jsonify({"status": "login_started"})
+    job = jobs.submit("login", _login_job, exclusive=False)
+    return jsonify({"status": "login_started", "jobId": job.job_id})
+
+
+def _list_sections(ctrl, server):
+    """``server``'s library sections, through the controller's section cache when it has one."""
+    source = ctrl.section_source(server) if hasattr(ctrl, "section_source") else None
+    return list(source()) if source else list(server.library.sections())
+
+
+def _invalidate_library_indexes(server):
+    """Drop cached match indexes after ratings on ``server`` were written."""
+    indexes = getattr(_get_controller(), "library_indexes", None)
+    if indexes is not None and server is not None:
+        indexes.invalidate(server)
+
+
+def _run_write_job(kind, work, server, server_id=None):
+    """Submit a job that writes ratings to ``server`` and report how it ended.
+
+    ``work(job)`` returns ``(success, stats)``. Either way an
+    ``update_complete`` event is published and the cached indexes of
+    ``server`` are dropped. ``server_id`` overrides the job's server slot.
+    """
+    def _job(job):
+        try:
+            success, stats = work(job)
+            log_queue.put({"type": "update_complete", "data": json.dumps({
+                "success": success, "stats": stats, "jobId": job.job_id,
+            })})
+            return {"success": success, "stats": stats}
+        except Exception as e:
+            _handle_plex_error(_get_controller(), e)
+            log_queue.put({"type": "log", "data": f"{kind.replace('-', ' ').capitalize()} error: {e}"})
+            log_queue.put({"type": "update_complete", "data": json.dumps({
+                "success": False, "stats": {"operation": kind}, "jobId": job.job_id,
+            })})
+            raise
+        finally:
+            _invalidate_library_indexes(server)
+
+    return jobs.submit(kind, _job, server_id=server_id or _server_confirmation_id(server))
+
+
+@app.route("/api/session", methods=["GET"])
+def api_session():
+    """Report whether a (possibly restored) Plex session is ready to use."""
+    ctrl = _get_controller()
+    connection = ctrl.plex_connection
+    current = getattr(connection, "server", None) if connection else None
+    return jsonify({
+        "connected": connection is not None,
+        "username": getattr(connection, "username", "") if connection else "",
+        "servers": [resource.name for resource in getattr(connection, "resources", [])] if connection else [],
+        "server": (
+            (getattr(current, "friendlyName", "") or "") if current is not None
+            else getattr(ctrl, "last_server", "") if connection else ""
+        ),
+        "persistent": SessionStore.encryption_available(),
+    })
+
+
+@app.route("/api/session", methods=["DELETE"])
+def api_logout():
+    ctrl = _get_controller()
+    if hasattr(ctrl, "invalidate_session"):
+        ctrl.invalidate_session(notify=False)
+        _session_changed()
+    return jsonify({"connected": False})
 
 
 @app.route("/api/libraries", methods=["POST"])
@@ -438,20 +683,20 @@ def api_libraries():
     if not server_name:
         return jsonify({"error": "No server specified"}), 400
     try:
-        ctrl.get_libraries(server_name)  # switches server connection
-        sections = ctrl.plex_connection.server.library.sections()
+        sections = ctrl.get_sections(server_name)  # switches server connection
+        state_store.put("app", "server", server_name)
         libraries = [s.title for s in sections
                      if getattr(s, "type", "") in ("movie", "show")]
         return jsonify({"libraries": libraries})
     except Exception as e:
+        _handle_plex_error(ctrl, e)
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/api/upload-csv", methods=["POST"])
 def api_upload_csv():
-    global uploaded_csv_path, csv_row_count
     with state_lock:
-        if update_running:
+        if _update_running() or _held_uploads():
             return jsonify({"error": "Cannot replace the CSV while an operation is running"}), 409
         if "file" not in request.files:
             return jsonify({"error": "No file uploaded"}), 400
@@ -466,35 +711,40 @@ def api_upload_csv():
 
         requested_source = (request.form.get("source") or "").strip()
         storage_filename = f"{uuid.uuid4().hex}.csv"
-        save_path = os.path.join(UPLOAD_DIR, storage_filename)
+        save_path = _upload_path(storage_filename)
 
+        # Held until it is the current upload, so another worker's cleanup leaves it alone.
+        release_upload = _hold_upload(save_path)
         try:
-            uploaded_file.save(save_path)
-            detected_source, row_count = _validate_csv_upload(save_path, requested_source)
-        except (UnicodeDecodeError, csv.Error, ValueError) as error:
-            _discard_upload(save_path)
-            return jsonify({"error": str(error)}), 400
-        except OSError:
-            _discard_upload(save_path)
-            app.logger.exception("Unable to store uploaded CSV")
-            return jsonify({"error": "Unable to store uploaded CSV"}), 500
-
-        uploaded_csv_path = save_path
-        csv_row_count = row_count
+            try:
+                uploaded_file.save(save_path)
+                detected_source, row_count = _validate_csv_upload(save_path, requested_source)
+            except (UnicodeDecodeError, csv.Error, ValueError) as error:
+                _discard_upload(save_path)
+                return jsonify({"error": str(error)}), 400
+            except OSError:
+                _discard_upload(save_path)
+                app.logger.exception("Unable to store uploaded CSV")
+                return jsonify({"error": "Unable to store uploaded CSV"}), 500
+
+            _set_current_upload(save_path, row_count)
+        finally:
+            release_upload()
         _cleanup_old_uploads(keep_path=save_path)
         return jsonify({
             "filename": display_filename,
-            "rowCount": csv_row_count,
+            "rowCount": row_count,
             "source": detected_source,
         })
 
 
 @app.route("/api/csv-preview", methods=["GET"])
 def api_csv_preview():
-    if not uploaded_csv_path or not os.path.isfile(uploaded_csv_path):
+    csv_path, row_count = _current_upload()
+    if not csv_path or not os.path.isfile(csv_path):
         return jsonify({"error": "No CSV uploaded"}), 400
     try:
-        with open(uploaded_csv_path, "r", encoding="utf-8-sig", newline="") as fh:
+        with open(csv_path, "r", encoding="utf-8-sig", newline="") as fh:
             reader = csv.DictReader(fh)
             headers = list(reader.fieldnames or [])
             rows = []
@@ -502,74 +752,76 @@ def api_csv_preview():
                 if i >= 10:
                     break
                 rows.append(row)
-        return jsonify({"headers": headers, "rows": rows, "totalRows": csv_row_count})
+        return jsonify({"headers": headers, "rows": rows, "totalRows": row_count})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def _import_values(data, all_libraries):
+    """The controller's import options from a JSON request body."""
+    return {
+        "-IMDB-": data.get("source", "IMDb") == "IMDb",
+        "-LETTERBOXD-": data.get("source", "IMDb") == "Letterboxd",
+        "-MOVIE-": data.get("movie", True),
+        "-TVSERIES-": data.get("tvSeries", True),
+        "-TVMINISERIES-": data.get("tvMiniSeries", True),
+        "-TVMOVIE-": data.get("tvMovie", True),
+        "-TVEPISODE-": data.get("tvEpisode", False),
+        "-WATCHED-": data.get("markWatched", False),
+        "-FORCEOVERWRITE-": data.get("forceOverwrite", False),
+        "-DRYRUN-": data.get("dryRun", False),
+        "-VERIFY-": data.get("verify", False),
+        "-ALLLIBS-": all_libraries,
+    }
+
+
 @app.route("/api/update-ratings", methods=["POST"])
 def api_update_ratings():
-    global update_running
-    with state_lock:
-        if update_running:
-            return jsonify({"error": "Update already in progress"}), 409
-        update_running = True
-
     data = request.get_json(silent=True) or {}
 
-    filepath = uploaded_csv_path
+    filepath, row_count = _current_upload()
     if not filepath or not os.path.isfile(filepath):
-        with state_lock:
-            update_running = False
         return jsonify({"error": "No CSV file uploaded"}), 400
 
     selected_library = data.get("library", "")
     all_libs = data.get("allLibraries", False)
     if not all_libs and not selected_library:
-        with state_lock:
-            update_running = False
         return jsonify({"error": "No library selected"}), 400
 
-    values = {
-        "-IMDB-": data.get("source", "IMDb") == "IMDb",
-        "-LETTERBOXD-": data.get("source", "IMDb") == "Letterboxd",
-        "-MOVIE-": data.get("movie", True),
-        "-TVSERIES-": data.get("tvSeries", True),
-        "-TVMINISERIES-": data.get("tvMiniSeries", True),
-        "-TVMOVIE-": data.get("tvMovie", True),
-        "-WATCHED-": data.get("markWatched", False),
-        "-FORCEOVERWRITE-": data.get("forceOverwrite", False),
-        "-DRYRUN-": data.get("dryRun", False),
-        "-ALLLIBS-": all_libs,
-    }
+    values = _import_values(data, all_libs)
 
-    # Reset progress tracking — use expected count of items that will actually
-    # produce work (from preview data) so the bar reflects real progress.
+    # Progress uses the expected count of items that will actually produce
+    # work (from preview data) so the bar reflects real progress.
     expected_total = data.get("expectedTotal")
-    _reset_progress(expected_total if expected_total else csv_row_count)
+    progress_total = expected_total if expected_total else row_count
+    ctrl = _get_controller()
+    server = ctrl.plex_connection.server if ctrl.plex_connection else None
 
-    def _update_thread():
-        global update_running
-        ctrl = _get_controller()
+    def _update_job(job):
+        job_id = job.job_id
+        _start_progress(job_id, progress_total)
         try:
-            success = ctrl.update_ratings(filepath, selected_library, values)
-            with progress_lock:
-                stats = dict(progress_state["stats"])
-            log_queue.put({"type": "update_complete", "data": json.dumps({
-                "success": bool(success), "stats": stats,
-            })})
-        except Exception as e:
-            log_queue.put({"type": "log", "data": f"Update error: {e}"})
-            log_queue.put({"type": "update_complete", "data": json.dumps({
-                "success": False, "stats": {},
-            })})
+            success = ctrl.update_ratings(
+                filepath,
+                selected_library,
+                values,
+                log_callback=lambda message: _log_callback(message, job_id),
+                journal=_journal_store().create(),
+                changes=_change_store(),
+                failure_log=None if values["-DRYRUN-"] else _failure_log(job_id, data.get("source", "IMDb")),
+                server=server,
+            )
+        except Exception:
+            _finish_progress(job_id)
+            raise
         finally:
-            with state_lock:
-                update_running = False
-            _reset_progress(0)
+            release_upload()
+        return bool(success), _finish_progress(job_id)
 
-    threading.Thread(target=_update_thread, daemon=True).start()
-    return jsonify({"status": "update_started"})
+    with state_lock:
+        release_upload = _hold_upload(filepath)
+        job = _run_write_job("update", _update_job, server, server_id=_active_server_id(ctrl))
+    return jsonify({"status": "update_started", "jobId": job.job_id, "jobStatus": job.status})
 
 
 @app.route("/api/clear-ratings/prepare", methods=["POST"])
@@ -584,10 +836,6 @@ def api_prepare_clear_ratings():
     if not all_libs and not selected_library:
         return jsonify({"error": "No library selected"}), 400
 
-    with state_lock:
-        if update_running:
-            return jsonify({"error": "An operation is already in progress"}), 409
-
     ctrl = _get_controller()
     if not ctrl.plex_connection or not ctrl.plex_connection.server:
         return jsonify({"error": "Not connected to a Plex server"}), 400
@@ -596,7 +844,7 @@ def api_prepare_clear_ratings():
     try:
         if all_libs:
             sections = [
-                section for section in server.library.sections()
+                section for section in _list_sections(ctrl, server)
                 if getattr(section, "type", "") in ("movie", "show")
             ]
             if not sections:
@@ -604,7 +852,7 @@ def api_prepare_clear_ratings():
             confirmation_text = "ALL LIBRARIES"
             scope_label = "all movie and TV libraries"
         else:
-            section = server.library.section(selected_library)
+            section = find_section(server, selected_library, _list_sections(ctrl, server))
             if getattr(section, "type", "") not in ("movie", "show"):
                 return jsonify({"error": "Selected library cannot contain user ratings"}), 400
             selected_library = section.title
@@ -630,7 +878,6 @@ def api_prepare_clear_ratings():
 @app.route("/api/clear-ratings", methods=["POST"])
 def api_clear_ratings():
     """Remove ratings only after a scoped, single-use confirmation."""
-    global update_running
     data = request.get_json(silent=True) or {}
     selected_library = data.get("library", "")
     all_libs = data.get("allLibraries") is True
@@ -648,130 +895,411 @@ def api_clear_ratings():
         return jsonify({"error": "Not connected to a Plex server"}), 400
     server = ctrl.plex_connection.server
 
-    with state_lock:
-        if update_running:
-            return jsonify({"error": "An operation is already in progress"}), 409
-        valid, error_message, error_status = _consume_clear_confirmation(
-            confirmation_token,
-            server,
-            selected_library,
-            all_libs,
-            confirmation_text,
-        )
-        if not valid:
-            return jsonify({"error": error_message}), error_status
-        update_running = True
-
-    def _clear_thread():
-        global update_running
-        try:
-            if all_libs:
-                sections = [s for s in server.library.sections()
-                            if getattr(s, "type", "") in ("movie", "show")]
-            else:
-                sections = [server.library.section(selected_library)]
+    valid, error_message, error_status = _consume_clear_confirmation(
+        confirmation_token,
+        server,
+        selected_library,
+        all_libs,
+        confirmation_text,
+    )
+    if not valid:
+        return jsonify({"error": error_message}), error_status
 
-            # Collect all items first for accurate progress
-            items_with_libraries = []
-            for sec in sections:
-                section_items = sec.all()
-                log_queue.put({"type": "log", "data": f"Scanning library: {sec.title} ({len(section_items)} items)"})
-                items_with_libraries.extend((sec.title, item) for item in section_items)
+    def _clear_job(job):
+        ctrl = _get_controller()
+        if all_libs:
+            sections = [s for s in _list_sections(ctrl, server)
+                        if getattr(s, "type", "") in ("movie", "show")]
+        else:
+            sections = [find_section(server, selected_library, _list_sections(ctrl, server))]
 
-            total = len(items_with_libraries)
-            log_queue.put({"type": "log", "data": f"Found {total} items across {len(sections)} library/libraries"})
+        # Only rated items are requested from Plex; they are streamed into
+        # the backup writer and queued for clearing as each page arrives.
+        items_to_clear = []
+        section_counts = []
 
-            try:
-                backup_id, backup_filename, backed_up = _create_ratings_backup(items_with_libraries)
-            except Exception as error:
-                app.logger.exception("Could not create ratings backup before clear")
+        def _rated_items():
+            for sec in sections:
+                rated_in_section = 0
+                for item in iter_rated_items(sec):
+                    rated_in_section += 1
+                    items_to_clear.append(item)
+                    yield sec.title, item
+                section_counts.append(_section_item_count(sec))
                 log_queue.put({
                     "type": "log",
-                    "data": f"Clear aborted: ratings backup could not be created: {error}",
+                    "data": f"Scanned library: {sec.title} ({rated_in_section} rated items)",
                 })
-                log_queue.put({"type": "update_complete", "data": json.dumps({
-                    "success": False,
-                    "stats": {
-                        "operation": "clear",
-                        "backup_failed": True,
-                        "total_items": total,
-                    },
-                })})
-                return
 
+        try:
+            backup_id, backup_filename, backed_up = _create_ratings_backup(_rated_items())
+        except Exception as error:
+            app.logger.exception("Could not create ratings backup before clear")
             log_queue.put({
                 "type": "log",
-                "data": f"Backed up {backed_up} ratings before clearing",
+                "data": f"Clear aborted: ratings backup could not be created: {error}",
             })
+            return False, {
+                "operation": "clear",
+                "backup_failed": True,
+                "total_items": len(items_to_clear),
+            }
+
+        rated = len(items_to_clear)
+        if section_counts and all(count is not None for count in section_counts):
+            total = max(sum(section_counts), rated)
+        else:
+            total = rated
+        log_queue.put({
+            "type": "log",
+            "data": f"Found {rated} rated of {total} items across {len(sections)} library/libraries",
+        })
+        log_queue.put({
+            "type": "log",
+            "data": f"Backed up {backed_up} ratings before clearing",
+        })
 
-            total_cleared = 0
-            total_skipped = 0
-            total_failed = 0
+        counts = {"cleared": 0, "failed": 0, "done": 0}
+        total_skipped = total - rated
+        throttle = ProgressThrottle(rated)
 
-            for i, (_library_name, item) in enumerate(items_with_libraries, 1):
-                existing = _positive_user_rating(item)
-                if existing is not None:
-                    try:
-                        key = f"/:/rate?key={item.ratingKey}&identifier=com.plexapp.plugins.library&rating=-1"
-                        server.query(key, method=server._session.put)
-                        total_cleared += 1
-                        log_queue.put({"type": "log", "data": f'Cleared rating for "{item.title} ({getattr(item, "year", "?")})" (was {existing})'})
-                    except Exception as e:
-                        total_failed += 1
-                        log_queue.put({"type": "log", "data": f'Failed to clear rating for "{item.title}": {e}'})
-                else:
-                    total_skipped += 1
+        def _clear_one(item):
+            rate_rating_key(server, item.ratingKey, -1)
 
+        def _on_cleared(outcome):
+            item = outcome.task
+            if outcome.ok:
+                counts["cleared"] += 1
+                existing = positive_user_rating(item)
+                log_queue.put({"type": "log", "data": f'Cleared rating for "{item.title} ({getattr(item, "year", "?")})" (was {existing})'})
+            else:
+                counts["failed"] += 1
+                log_queue.put({"type": "log", "data": f'Failed to clear rating for "{item.title}": {outcome.error}'})
+            counts["done"] += 1
+            if throttle.should_emit(counts["done"]):
                 log_queue.put({
                     "type": "progress",
-                    "data": json.dumps({"current": i, "total": total}),
+                    "data": json.dumps({
+                        "current": counts["done"], "total": rated, "jobId": job.job_id,
+                    }),
                 })
 
-            msg = f"Clear complete: {total_cleared} ratings cleared, {total_skipped} had no rating, {total_failed} failed (out of {total} items)"
-            log_queue.put({"type": "log", "data": msg})
-            log_queue.put({"type": "update_complete", "data": json.dumps({
-                "success": total_failed == 0,
-                "stats": {"operation": "clear", "cleared": total_cleared,
-                           "skipped_no_rating": total_skipped, "failed": total_failed,
-                           "total_items": total, "backed_up": backed_up,
-                           "backup_id": backup_id, "backup_filename": backup_filename},
-            })})
-        except Exception as e:
-            log_queue.put({"type": "log", "data": f"Clear error: {e}"})
-            log_queue.put({"type": "update_complete", "data": json.dumps({
-                "success": False, "stats": {"operation": "clear"}
-            })})
-        finally:
-            with state_lock:
-                update_running = False
+        executor = PlexWriteExecutor(breaker=circuit_breaker(server))
+        executor.run(items_to_clear, _clear_one, on_done=_on_cleared)
+        log_queue.put({"type": "log", "data": describe_write_stats(executor.stats())})
+        total_cleared = counts["cleared"]
+        total_failed = counts["failed"]
+
+        msg = f"Clear complete: {total_cleared} ratings cleared, {total_skipped} had no rating, {total_failed} failed (out of {total} items)"
+        log_queue.put({"type": "log", "data": msg})
+        stats = {"operation": "clear", "cleared": total_cleared,
+                 "skipped_no_rating": total_skipped, "failed": total_failed,
+                 "total_items": total, "backed_up": backed_up,
+                 "backup_id": backup_id, "backup_filename": backup_filename,
+                 "writes": executor.stats()}
+        return total_failed == 0, stats
 
-    threading.Thread(target=_clear_thread, daemon=True).start()
-    return jsonify({"status": "clear_started"})
+    job = _run_write_job("clear", _clear_job, server)
+    return jsonify({"status": "clear_started", "jobId": job.job_id, "jobStatus": job.status})
 
 
 @app.route("/api/rating-backups/<backup_id>", methods=["GET"])
 def api_download_rating_backup(backup_id):
-    with backup_lock:
-        backup = rating_backups.get(backup_id)
-    if not backup or not os.path.isfile(backup["path"]):
+    backup = _backup_store().get(backup_id)
+    if not backup:
         return jsonify({"error": "Rating backup was not found"}), 404
+    record, path = backup
     response = send_file(
-        backup["path"],
+        path,
         as_attachment=True,
-        download_name=backup["download_name"],
-        mimetype="text/csv",
+        download_name=record.download_name,
+        mimetype="application/gzip",
     )
     response.headers["Cache-Control"] = "no-store"
     return response
 
 
+@app.route("/api/export-ratings", methods=["GET"])
+def api_export_ratings():
+    """Stream the connected user's Plex ratings as an IMDb or Letterboxd CSV.
+
+    Rated items are read and written out a page at a time, so the response
+    starts right away and the file is never held in memory.
+    """
+    fmt = request.args.get("format", "IMDb")
+    if fmt not in EXPORT_COLUMNS:
+        return jsonify({"error": f"format must be one of: {', '.join(EXPORT_COLUMNS)}"}), 400
+    selected_library = request.args.get("library", "").strip()
+    all_libs = request.args.get("allLibraries") in ("1", "true")
+    if not all_libs and not selected_library:
+        return jsonify({"error": "No library selected"}), 400
+
+    ctrl = _get_controller()
+    if not ctrl.plex_connection or not ctrl.plex_connection.server:
+        return jsonify({"error": "Not connected to a Plex server"}), 400
+    server = ctrl.plex_connection.server
+    try:
+        sections = _list_sections(ctrl, server)
+        if not all_libs:
+            sections = [find_section(server, selected_library, sections)]
+    except Exception:
+        return jsonify({"error": "Selected library was not found"}), 404
+    try:
+        exporter = RatingsExporter(
+            sections, fmt, include_episodes=request.args.get("episodes") in ("1", "true")
+        )
+    except ImportPipelineError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def generate():
+        try:
+            yield from exporter.iter_csv()
+        except Exception as e:
+            _handle_plex_error(_get_controller(), e)
+            log_queue.put({"type": "log", "data": f"Export error: {e}"})
+            raise
+        stats = exporter.stats
+        log_queue.put({"type": "log", "data": (
+            f"Exported {stats['exported']} {fmt} ratings "
+            f"({stats['missing_imdb_id']} without an IMDb ID, {stats['duplicates']} duplicates skipped)"
+        )})
+
+    download_name = f"PlexRatings_{fmt}_{time.strftime('%Y%m%d_%H%M%S')}.csv"
+    response = Response(generate(), mimetype="text/csv")
+    response.headers["Content-Disposition"] = f'attachment; filename="{download_name}"'
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+@app.route("/api/restore-ratings", methods=["POST"])
+def api_restore_ratings():
+    """Write ratings from a backup back to Plex by ratingKey, without a library scan."""
+    ctrl = _get_controller()
+    if not ctrl.plex_connection or not ctrl.plex_connection.server:
+        return jsonify({"error": "Not connected to a Plex server"}), 400
+    server = ctrl.plex_connection.server
+
+    restore_path = None
+    uploaded_path = None
+    release_upload = None
+    if "file" in request.files:
+        uploaded_path = _upload_path(f"restore_{uuid.uuid4().hex}.upload")
+        restore_path = uploaded_path
+        release_upload = _hold_upload(uploaded_path)
+        search_all_libraries = request.form.get("searchAllLibraries") == "true"
+    else:
+        data = request.get_json(silent=True) or {}
+        search_all_libraries = data.get("searchAllLibraries") is True
+        backup = _backup_store().get(data.get("backupId", ""))
+        if not backup:
+            return jsonify({"error": "Rating backup was not found"}), 404
+        restore_path = backup[1]
+
+    try:
+        if uploaded_path:
+            request.files["file"].save(uploaded_path)
+        rows = read_backup(restore_path)
+    except (RestoreError, UnicodeDecodeError, csv.Error) as error:
+        return jsonify({"error": str(error)}), 400
+    except OSError:
+        app.logger.exception("Unable to read ratings backup")
+        return jsonify({"error": "Unable to read ratings backup"}), 500
+    finally:
+        _discard_upload(uploaded_path)
+        if release_upload is not None:
+            release_upload()
+    if not rows:
+        return jsonify({"error": "The backup does not contain any ratings"}), 400
+
+    def _restore_job(job):
+        log_queue.put({"type": "log", "data": f"Restoring {len(rows)} ratings from backup"})
+        throttles = {}
+
+        def _on_progress(current, total):
+            throttle = throttles.setdefault("restore", ProgressThrottle(total))
+            if throttle.should_emit(current):
+                log_queue.put({
+                    "type": "progress",
+                    "data": json.dumps({
+                        "current": current, "total": total, "jobId": job.job_id,
+                    }),
+                })
+
+        ctrl = _get_controller()
+        pipeline = RatingsRestorePipeline(
+            server,
+            log=lambda message: log_queue.put({"type": "log", "data": message}),
+            list_sections=ctrl.section_source(server) if hasattr(ctrl, "section_source") else None,
+            search_all_libraries=search_all_libraries,
+        )
+        result = pipeline.restore(rows, on_progress=_on_progress)
+        stats = result.stats
+        if "writes" in stats:
+            log_queue.put({"type": "log", "data": describe_write_stats(stats["writes"])})
+        log_queue.put({"type": "log", "data": (
+            f"Restore complete: {stats['restored']} ratings restored "
+            f"({stats['resolved_by_guid']} matched by GUID), {stats['not_found']} not found, "
+            f"{stats['failed']} failed (out of {stats['total_items']} backup entries)"
+        )})
+        return result.success, stats
+
+    job = _run_write_job("restore", _restore_job, server)
+    return jsonify({
+        "status": "restore_started",
+        "entries": len(rows),
+        "jobId": job.job_id,
+        "jobStatus": job.status,
+    })
+
+
+@app.route("/api/import-journals", methods=["GET"])
+def api_import_journals():
+    """Import runs that were interrupted before all of their writes finished."""
+    return jsonify({"journals": [state.to_dict() for state in _journal_store().list()]})
+
+
+@app.route("/api/import-journals/<run_id>/resume", methods=["POST"])
+def api_resume_import(run_id):
+    """Finish an interrupted import from its journal, skipping writes that already succeeded."""
+    ctrl = _get_controller()
+    if not ctrl.plex_connection or not ctrl.plex_connection.server:
+        return jsonify({"error": "Not connected to a Plex server"}), 400
+    server = ctrl.plex_connection.server
+    state = _journal_store().get(run_id)
+    if state is None:
+        return jsonify({"error": "Import journal was not found"}), 404
+    if state.details.get("user"):
+        return jsonify({"error": "Imports for other Plex users can only be resumed from the command line"}), 400
+    journal_server = state.details.get("server")
+    if journal_server and journal_server != getattr(server, "machineIdentifier", journal_server):
+        return jsonify({
+            "error": f"This import was run against {state.details.get('serverName') or 'another server'}; "
+                     "connect to that server to resume it"
+        }), 409
+
+    def _resume_job(job):
+        throttle = ProgressThrottle(len(state.remaining))
+        done = 0
+
+        def _log(message):
+            nonlocal done
+            log_queue.put({"type": "log", "data": message})
+            if message.startswith("Updated Plex rating for"):
+                done += 1
+                if throttle.should_emit(done):
+                    log_queue.put({"type": "progress", "data": json.dumps({
+                        "current": done, "total": len(state.remaining), "jobId": job.job_id,
+                    })})
+
+        pipeline = RatingsImportPipeline(server, log=_log)
+        failure_log = _failure_log(job.job_id, state.details.get("source", "IMDb"))
+        try:
+            result = pipeline.resume(
+                state, ImportJournal(state.path), changes=_change_store(), failure_log=failure_log
+            )
+        finally:
+            failure_log.close()
+        stats = result.stats
+        if "writes" in stats:
+            log_queue.put({"type": "log", "data": describe_write_stats(stats["writes"])})
+        log_queue.put({"type": "log", "data": (
+            f"Resume complete: {stats['updated']} ratings written, {stats['rate_failed']} failed, "
+            f"{stats['already_done']} already done (out of {stats['total_items']} planned writes)"
+        )})
+        return result.success, stats
+
+    job = _run_write_job("resume", _resume_job, server)
+    return jsonify({
+        "status": "resume_started",
+        "remaining": len(state.remaining),
+        "jobId": job.job_id,
+        "jobStatus": job.status,
+    })
+
+
+@app.route("/api/import-runs", methods=["GET"])
+def api_import_runs():
+    """Recent import runs whose rating changes were recorded and can be undone."""
+    return jsonify({"runs": [run.to_dict() for run in _change_store().runs()]})
+
+
+@app.route("/api/import-runs/<run_id>/undo", methods=["POST"])
+def api_undo_import(run_id):
+    """Put back the ratings (and watched state) one import run replaced, by ratingKey."""
+    ctrl = _get_controller()
+    if not ctrl.plex_connection or not ctrl.plex_connection.server:
+        return jsonify({"error": "Not connected to a Plex server"}), 400
+    server = ctrl.plex_connection.server
+    store = _change_store()
+    run = store.get_run(run_id)
+    if run is None:
+        return jsonify({"error": "Import run was not found"}), 404
+    if run.undone_at is not None:
+        return jsonify({"error": "This import run has already been undone"}), 409
+    if run.user:
+        return jsonify({"error": "Imports for other Plex users can only be undone from the command line"}), 400
+    if run.server and run.server != getattr(server, "machineIdentifier", run.server):
+        return jsonify({
+            "error": f"This import was run against {run.server_name or 'another server'}; "
+                     "connect to that server to undo it"
+        }), 409
+
+    def _undo_job(job):
+        log_queue.put({"type": "log", "data": f"Undoing import run {run_id} ({run.changes} changes)"})
+        throttles = {}
+
+        def _on_progress(current, total):
+            throttle = throttles.setdefault("undo", ProgressThrottle(total))
+            if throttle.should_emit(current):
+                log_queue.put({"type": "progress", "data": json.dumps({
+                    "current": current, "total": total, "jobId": job.job_id,
+                })})
+
+        pipeline = RatingsUndoPipeline(
+            server, store, log=lambda message: log_queue.put({"type": "log", "data": message})
+        )
+        result = pipeline.undo(run_id, on_progress=_on_progress)
+        stats = result.stats
+        if "writes" in stats:
+            log_queue.put({"type": "log", "data": describe_write_stats(stats["writes"])})
+        log_queue.put({"type": "log", "data": (
+            f"Undo complete: {stats['reverted']} ratings reverted ({stats['unwatched']} marked unwatched), "
+            f"{stats['changed_since']} changed since, {stats['not_found']} not found, "
+            f"{stats['failed']} failed (out of {stats['total_items']} items)"
+        )})
+        return result.success, stats
+
+    job = _run_write_job("undo", _undo_job, server)
+    return jsonify({
+        "status": "undo_started",
+        "changes": run.changes,
+        "jobId": job.job_id,
+        "jobStatus": job.status,
+    })
+
+
+def _build_plan_holding_upload(ctrl, csv_path, library_name, values, max_items=0, server=None):
+    release_upload = _hold_upload(csv_path)
+    try:
+        return ctrl.build_import_plan(
+            csv_path,
+            library_name,
+            values,
+            max_items=max_items,
+            server=server or ctrl.plex_connection.server,
+        )
+    finally:
+        release_upload()
+
+
 @app.route("/api/preview-items", methods=["POST"])
 def api_preview_items():
     """Build and serialize the same import plan used by the update operation."""
     ctrl = _get_controller()
     if not ctrl.plex_connection or not ctrl.plex_connection.server:
         return jsonify({"error": "Not connected to Plex"}), 400
-    if not uploaded_csv_path or not os.path.isfile(uploaded_csv_path):
+    csv_path, _row_count = _current_upload()
+    if not csv_path or not os.path.isfile(csv_path):
         return jsonify({"error": "No CSV uploaded"}), 400
 
     data = request.get_json(silent=True) or {}
@@ -784,39 +1312,236 @@ def api_preview_items():
         max_items = max(0, int(data.get("maxItems", 0)))
     except (TypeError, ValueError):
         return jsonify({"error": "Invalid preview item limit"}), 400
+    shape = data.get("shape", "items")
+    if shape not in PREVIEW_SHAPES:
+        return jsonify({"error": f"shape must be one of: {', '.join(PREVIEW_SHAPES)}"}), 400
 
-    values = {
-        "-IMDB-": source == "IMDb",
-        "-LETTERBOXD-": source == "Letterboxd",
-        "-MOVIE-": data.get("movie", True),
-        "-TVSERIES-": data.get("tvSeries", True),
-        "-TVMINISERIES-": data.get("tvMiniSeries", True),
-        "-TVMOVIE-": data.get("tvMovie", True),
-        "-WATCHED-": data.get("markWatched", False),
-        "-FORCEOVERWRITE-": data.get("forceOverwrite", False),
-        "-DRYRUN-": True,
-        "-ALLLIBS-": all_libs,
-    }
+    values = dict(_import_values(data, all_libs), **{"-DRYRUN-": True})
 
+    # Read-only and answered in this request, so it runs here rather than
+    # taking a job worker while the request thread waits for it.
     try:
-        plan = ctrl.build_import_plan(
-            uploaded_csv_path,
-            library_name,
-            values,
-            max_items=max_items,
-        )
+        plan = _build_plan_holding_upload(ctrl, csv_path, library_name, values, max_items=max_items)
     except Exception as error:
-        return jsonify({"error": str(error)}), 400
+        return jsonify({"error": str(error) or "Preview failed"}), 400
 
-    return jsonify({
-        "items": [item.to_preview_dict() for item in plan.items],
+    totals = {
         "totalMatched": plan.matched_count,
         "totalUnmatched": plan.unmatched_count,
         "totalItems": plan.total_rows,
         "plannedUpdates": plan.update_count,
+    }
+    if shape == "columnar":
+        return jsonify(dict(plan.to_preview_columns(), **totals))
+    return jsonify(dict(items=[item.to_preview_dict() for item in plan.items], **totals))
+
+
+@app.route("/api/plan-file", methods=["POST"])
+def api_plan_file():
+    """Build the import plan for the uploaded CSV and download it as a plan file.
+
+    The file records each planned write by ratingKey, so it can be applied
+    later with ``/api/apply-plan`` or ``main.py apply-plan`` without matching
+    the CSV again.
+    """
+    ctrl = _get_controller()
+    if not ctrl.plex_connection or not ctrl.plex_connection.server:
+        return jsonify({"error": "Not connected to Plex"}), 400
+    csv_path, _row_count = _current_upload()
+    if not csv_path or not os.path.isfile(csv_path):
+        return jsonify({"error": "No CSV uploaded"}), 400
+
+    data = request.get_json(silent=True) or {}
+    library_name = data.get("library", "")
+    all_libs = data.get("allLibraries") is True
+    if data.get("source", "IMDb") not in ("IMDb", "Letterboxd"):
+        return jsonify({"error": "Unsupported ratings source"}), 400
+    if not all_libs and not library_name:
+        return jsonify({"error": "No library selected"}), 400
+
+    values = _import_values(data, all_libs)
+    values["-DRYRUN-"] = False
+    server = ctrl.plex_connection.server
+    try:
+        plan = _build_plan_holding_upload(ctrl, csv_path, library_name, values, server=server)
+    except Exception as error:
+        return jsonify({"error": str(error) or "Planning failed"}), 400
+    saved = saved_plan(plan, server, library="" if all_libs else library_name)
+
+    response = Response(dump_plan(saved), mimetype="application/x-ndjson")
+    filename = f"ratings-{time.strftime('%Y%m%d_%H%M%S')}-{saved.hash[:8]}{PLAN_SUFFIX}"
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response.headers["X-Plan-Hash"] = saved.hash
+    response.headers["X-Planned-Updates"] = str(saved.update_count)
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+@app.route("/api/apply-plan", methods=["POST"])
+def api_apply_plan():
+    """Apply an uploaded plan file by ratingKey, skipping items whose rating drifted since."""
+    ctrl = _get_controller()
+    if not ctrl.plex_connection or not ctrl.plex_connection.server:
+        return jsonify({"error": "Not connected to a Plex server"}), 400
+    server = ctrl.plex_connection.server
+    if "file" not in request.files:
+        return jsonify({"error": "No plan file uploaded"}), 400
+    try:
+        saved = load_plan(io.TextIOWrapper(request.files["file"].stream, encoding="utf-8"))
+    except (PlanFileError, UnicodeDecodeError) as error:
+        return jsonify({"error": str(error)}), 400
+    if saved.server and saved.server != getattr(server, "machineIdentifier", saved.server):
+        return jsonify({
+            "error": f"This plan was made for {saved.server_name or 'another server'}; "
+                     "connect to that server to apply it"
+        }), 409
+    dry_run = request.form.get("dryRun") == "true"
+
+    def _apply_plan_job(job):
+        throttle = ProgressThrottle(saved.update_count)
+        done = 0
+
+        def _log(message):
+            nonlocal done
+            log_queue.put({"type": "log", "data": message})
+            if message.startswith(("Updated Plex rating for", "[DRY RUN] Would update")):
+                done += 1
+                if throttle.should_emit(done):
+                    log_queue.put({"type": "progress", "data": json.dumps({
+                        "current": done, "total": saved.update_count, "jobId": job.job_id,
+                    })})
+
+        pipeline = RatingsImportPipeline(server, log=_log)
+        plan = pipeline.load_saved_plan(saved, dry_run=dry_run)
+        failure_log = None if dry_run else _failure_log(job.job_id, saved.source)
+        try:
+            result = pipeline.apply(
+                plan,
+                journal=None if dry_run else _journal_store().create(),
+                changes=None if dry_run else _change_store(),
+                details={"plan": saved.hash, "library": saved.library or "All libraries"},
+                failure_log=failure_log,
+            )
+        finally:
+            if failure_log is not None:
+                failure_log.close()
+        stats = dict(result.stats, operation="apply-plan")
+        if failure_log is not None:
+            stats["exported_failures"] = len(failure_log)
+        if "writes" in stats:
+            log_queue.put({"type": "log", "data": describe_write_stats(stats["writes"])})
+        log_queue.put({"type": "log", "data": (
+            f"Plan applied: {stats['updated']} ratings {'would be ' if dry_run else ''}written, "
+            f"{stats['drifted']} drifted, {stats['skipped_unchanged']} already up to date, "
+            f"{stats['rate_failed']} failed (out of {saved.update_count} planned updates)"
+        )})
+        return result.success, stats
+
+    job = _run_write_job("apply-plan", _apply_plan_job, server)
+    return jsonify({
+        "status": "apply_plan_started",
+        "hash": saved.hash,
+        "plannedUpdates": saved.update_count,
+        "jobId": job.job_id,
+        "jobStatus": job.status,
     })
 
 
+@app.route("/api/jobs", methods=["GET"])
+def api_jobs():
+    listed = [job.to_dict() for job in jobs.list()]
+    if state_store.shared:
+        local = {details["jobId"] for details in listed}
+        listed.extend(
+            {key: value for key, value in details.items() if key != "result"}
+            for job_id, details in state_store.items("jobs").items() if job_id not in local
+        )
+        listed.sort(key=lambda details: details["createdAt"], reverse=True)
+    return jsonify({"jobs": listed})
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def api_job_status(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        # Started by another worker process.
+        details = state_store.get("jobs", job_id) if state_store.shared else None
+        if details is None:
+            return jsonify({"error": "Job was not found"}), 404
+        return jsonify(details)
+    details = job.to_dict()
+    if isinstance(job.result, dict):
+        details["result"] = job.result
+    return jsonify(details)
+
+
+@app.route("/api/jobs/<job_id>/failures", methods=["GET"])
+def api_job_failures(job_id):
+    """Unmatched and failed rows of an update or resume job, as recorded so far.
+
+    The file may still be growing; only whole records up to the moment of
+    the request are sent.
+    """
+    fmt = request.args.get("format", "csv")
+    if fmt not in FAILURE_FORMATS:
+        return jsonify({"error": f"format must be one of: {', '.join(FAILURE_FORMATS)}"}), 400
+    with failure_log_lock:
+        log = failure_logs.get(job_id)
+    if log is None and jobs.get(job_id) is None:
+        return _shared_job_failures(job_id, fmt)
+    if log is None or jobs.get(job_id) is None:
+        return jsonify({"error": "This job has no failure log"}), 404
+    path, size = log.snapshot(fmt)
+    if path is None:
+        return jsonify({"error": "No failed or unmatched items have been recorded"}), 404
+    job = jobs.get(job_id)
+    response = Response(
+        read_prefix(path, size),
+        mimetype="text/csv" if fmt == "csv" else "application/x-ndjson",
+    )
+    response.headers["Content-Length"] = str(size)
+    response.headers["Content-Disposition"] = f'attachment; filename="{os.path.basename(path)}"'
+    response.headers["X-Job-Status"] = job.status
+    response.headers["X-Failure-Count"] = str(len(log))
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+def _shared_job_failures(job_id, fmt):
+    """The failure file of a finished job that another worker process ran."""
+    details = state_store.get("jobs", job_id) if state_store.shared else None
+    if details is None or details["status"] not in (JOB_SUCCEEDED, JOB_FAILED):
+        return jsonify({"error": "This job has no failure log"}), 404
+    path = f"{os.path.join(FAILURE_DIR, f'failures_{job_id}')}.{fmt}"
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return jsonify({"error": "No failed or unmatched items have been recorded"}), 404
+    response = Response(read_prefix(path, size), mimetype="text/csv" if fmt == "csv" else "application/x-ndjson")
+    response.headers["Content-Length"] = str(size)
+    response.headers["Content-Disposition"] = f'attachment; filename="{os.path.basename(path)}"'
+    response.headers["X-Job-Status"] = details["status"]
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+@app.route("/api/cache-stats", methods=["GET"])
+def api_cache_stats():
+    """Hit/miss statistics for the connection, section and match-index caches."""
+    ctrl = _get_controller()
+    return jsonify(ctrl.cache_stats() if hasattr(ctrl, "cache_stats") else {})
+
+
+@app.route("/api/cache", methods=["DELETE"])
+def api_clear_cache():
+    """Forget cached Plex connections, section lists and match indexes."""
+    ctrl = _get_controller()
+    server_name = request.args.get("server") or None
+    if hasattr(ctrl, "invalidate_caches"):
+        ctrl.invalidate_caches(server_name)
+    return jsonify({"status": "cleared", "server": server_name})
+
+
 @app.route("/api/plex-image")
 def api_plex_image():
     """Proxy a Plex poster image to avoid exposing auth tokens."""
@@ -828,6 +1553,8 @@ def api_plex_image():
         return "Not connected", 400
     server = ctrl.plex_connection.server
     url = server.url(thumb, includeToken=True)
+    import ssl
+    import urllib.request
     ctx = ssl.create_default_context()
     ctx.check_hostname = False
     ctx.verify_mode = ssl.CERT_NONE
@@ -844,32 +1571,143 @@ def api_plex_image():
 
 @app.route("/api/log-stream")
 def api_log_stream():
+    """Server-sent events from the state store's event log.
+
+    Each connection reads from its own cursor, so every open page (on any
+    worker) sees every event; a reconnecting browser resumes after the
+    ``Last-Event-ID`` it last received.
+    """
+    store = state_store
+    latest = store.last_event_id()
+    try:
+        cursor = min(int(request.headers.get("Last-Event-ID", "")), latest)
+    except ValueError:
+        cursor = latest
+
     def generate():
+        position = cursor
         while True:
-            try:
-                msg = log_queue.get(timeout=15)
+            events = store.events_after(position, timeout=15)
+            if not events:
+                yield ": keepalive\n\n"
+            for event_id, msg in events:
+                position = event_id
                 event_type = msg.get("type", "log")
                 data = msg.get("data", "")
-                yield f"event: {event_type}\ndata: {data}\n\n"
-            except queue.Empty:
-                yield ": keepalive\n\n"
+                yield f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
 
     return Response(generate(), mimetype="text/event-stream",
                     headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
-def run_web(port=5000, host="127.0.0.1"):
-    """Launch the Flask web GUI and open a browser."""
+def init_app():
+    """Prepare logging and on-disk state; kept out of import so startup stays cheap."""
+    configure_logging()
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    static_assets.build()
+    return app
+
+
+def _auth_config(host):
+    """``REQUIRE_AUTH`` and ``ACCESS_TOKEN`` for serving on ``host``; remote binds need a strong token."""
     remote_bind = not _is_loopback_host(host)
     access_token = os.environ.get("RTP_ACCESS_TOKEN", "").strip()
-    if remote_bind and len(access_token) < 16:
+    if remote_bind and len(access_token) < MIN_ACCESS_TOKEN_LENGTH:
         raise RuntimeError(
             "Refusing to bind to a non-loopback address without strong authentication. "
             "Set RTP_ACCESS_TOKEN to at least 16 characters or bind to 127.0.0.1."
         )
+    return {"REQUIRE_AUTH": remote_bind, "ACCESS_TOKEN": access_token}
+
+
+def default_state_store_url():
+    return "sqlite:///" + os.path.join(SESSION_DIR, "state.sqlite3")
+
+
+def create_app(state_store_url=None, loopback_only=False):
+    """The app for an external WSGI server, e.g. ``gunicorn 'RatingsToPlexRatingsWeb:create_app()'``.
+
+    The state store comes from ``state_store_url`` or ``RTP_STATE_STORE``
+    (``memory`` by default; use ``sqlite:///<path>`` with more than one
+    worker process). The bind address is not known here, so requests must
+    carry ``RTP_ACCESS_TOKEN`` (at least 16 characters) unless the caller
+    promises a loopback-only bind with ``loopback_only=True``.
+    """
+    access_token = os.environ.get("RTP_ACCESS_TOKEN", "").strip()
+    if not loopback_only and len(access_token) < MIN_ACCESS_TOKEN_LENGTH:
+        raise RuntimeError(
+            "Refusing to serve through an external WSGI server without strong authentication. "
+            "Set RTP_ACCESS_TOKEN to at least 16 characters, or use create_app(loopback_only=True) "
+            "with a server bound to 127.0.0.1."
+        )
+    url = state_store_url if state_store_url is not None else os.environ.get("RTP_STATE_STORE", "")
+    init_app()
+    configure_state_store(open_state_store(url))
+    app.config.update(REQUIRE_AUTH=bool(access_token) or not loopback_only, ACCESS_TOKEN=access_token)
+    return app
 
-    app.config["REQUIRE_AUTH"] = remote_bind
-    app.config["ACCESS_TOKEN"] = access_token
+
+def _serve_waitress(host, port, threads):
+    try:
+        import waitress
+    except ImportError:
+        return False
+    waitress.serve(app, host=host, port=port, threads=threads)
+    return True
+
+
+def _serve_gunicorn(host, port, workers, threads):
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        return False
+
+    class _GunicornApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{'[' + host + ']' if ':' in host else host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("threads", threads)
+            self.cfg.set("worker_class", "gthread")
+            # The log stream holds a connection open; keepalives go out every 15s.
+            self.cfg.set("timeout", 60)
+
+        def load(self):
+            return app
+
+    _GunicornApplication().run()
+    return True
+
+
+def run_web(port=5000, host="127.0.0.1", production=False, workers=1, threads=8, state_store_url=""):
+    """Launch the web GUI.
+
+    By default this runs Flask's development server and opens a browser.
+    With ``production`` it serves through waitress (one process) or gunicorn
+    (several ``workers``, POSIX only) instead. More than one worker needs a
+    shared state store, which defaults to a SQLite file next to the session
+    cache.
+    """
+    auth = _auth_config(host)
+    workers = max(1, workers)
+    if production and workers > 1 and not state_store_url:
+        state_store_url = default_state_store_url()
+    store = open_state_store(state_store_url)
+    if workers > 1 and not store.shared:
+        raise RuntimeError("More than one worker needs a shared state store, e.g. --state-store sqlite:///state.sqlite3")
+
+    init_app()
+    configure_state_store(store)
+    app.config.update(auth)
+    if production:
+        if workers == 1 and _serve_waitress(host, port, threads):
+            return
+        if _serve_gunicorn(host, port, workers, threads):
+            return
+        if workers == 1:
+            raise RuntimeError("Production mode needs a WSGI server: pip install waitress")
+        raise RuntimeError("Production mode with more than one worker needs gunicorn: pip install gunicorn")
+    import webbrowser
     threading.Timer(1.0, webbrowser.open, args=[f"http://localhost:{port}"]).start()
     app.run(host=host, port=port, debug=False, threaded=True)
 
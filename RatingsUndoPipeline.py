@@ -0,0 +1,171 @@
+import math
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from PlexWriteExecutor import (
+    PlexWriteExecutor,
+    WriteOutcome,
+    circuit_breaker,
+    mark_unwatched_rating_key,
+    rate_rating_key,
+)
+from RatingsChangeStore import ChangeStore, RatingChange
+from RatingsImportPipeline import RATING_TOLERANCE
+from RatingsRestorePipeline import fetch_items_by_rating_key
+
+
+class UndoError(Exception):
+    """Raised when an import run cannot be undone."""
+
+
+@dataclass(frozen=True)
+class UndoTarget:
+    """One item to revert: the first rating a run replaced and the last one it wrote."""
+
+    rating_key: str
+    title: str
+    year: str
+    old_rating: Optional[float]
+    new_rating: float
+    unwatch: bool
+
+
+@dataclass(frozen=True)
+class UndoResult:
+    success: bool
+    stats: Dict[str, Any]
+
+
+def undo_targets(changes: Sequence[RatingChange]) -> List[UndoTarget]:
+    """Collapse a run's changes to one target per ratingKey, in first-seen order."""
+    firsts: Dict[str, RatingChange] = {}
+    lasts: Dict[str, RatingChange] = {}
+    watched: Dict[str, bool] = {}
+    for change in changes:
+        firsts.setdefault(change.rating_key, change)
+        lasts[change.rating_key] = change
+        if change.marked_watched and change.was_watched is False:
+            watched[change.rating_key] = True
+    return [
+        UndoTarget(
+            rating_key=key,
+            title=first.title,
+            year=first.year,
+            old_rating=first.old_rating,
+            new_rating=lasts[key].new_rating,
+            unwatch=watched.get(key, False),
+        )
+        for key, first in firsts.items()
+    ]
+
+
+class RatingsUndoPipeline:
+    """Revert the changes of one recorded import run by ratingKey, without a library scan.
+
+    Current ratings are read with batched ``/library/metadata/<k1,k2,...>``
+    requests. Items whose rating is no longer the one the run wrote were
+    changed since (or never written), and are left alone.
+    """
+
+    def __init__(
+        self,
+        server: Any,
+        store: ChangeStore,
+        log: Optional[Callable[[str], None]] = None,
+        executor: Optional[PlexWriteExecutor] = None,
+    ):
+        self.server = server
+        self.store = store
+        self.log = log or (lambda _message: None)
+        self.executor = executor or PlexWriteExecutor(breaker=circuit_breaker(server))
+
+    def undo(
+        self,
+        run_id: str,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+    ) -> UndoResult:
+        run = self.store.get_run(run_id)
+        if run is None:
+            raise UndoError("Import run was not found")
+        if run.undone_at is not None:
+            raise UndoError("This import run has already been undone")
+
+        targets = undo_targets(self.store.changes(run_id))
+        current = self._current_ratings([target.rating_key for target in targets])
+        stats: Dict[str, Any] = {
+            "operation": "undo",
+            "run_id": run_id,
+            "total_items": len(targets),
+            "reverted": 0,
+            "unwatched": 0,
+            "changed_since": 0,
+            "not_found": 0,
+            "failed": 0,
+        }
+        writable: List[UndoTarget] = []
+        for target in targets:
+            if target.rating_key not in current:
+                stats["not_found"] += 1
+                self.log(f'Could not find "{target.title} ({target.year})" on the server')
+            elif not _same_rating(current[target.rating_key], target.new_rating):
+                stats["changed_since"] += 1
+                self.log(
+                    f'Leaving "{target.title} ({target.year})" alone: its rating is '
+                    f'{current[target.rating_key]}, not the {target.new_rating} this run wrote'
+                )
+            else:
+                writable.append(target)
+
+        done = 0
+
+        def _write(target: UndoTarget) -> None:
+            old_rating = target.old_rating if target.old_rating is not None else -1
+            rate_rating_key(self.server, target.rating_key, old_rating)
+            if target.unwatch:
+                mark_unwatched_rating_key(self.server, target.rating_key)
+
+        def _on_done(outcome: WriteOutcome) -> None:
+            nonlocal done
+            target = outcome.task
+            if outcome.ok:
+                stats["reverted"] += 1
+                if target.unwatch:
+                    stats["unwatched"] += 1
+                previous = target.old_rating if target.old_rating is not None else "no rating"
+                self.log(f'Reverted "{target.title} ({target.year})" to {previous}')
+            else:
+                stats["failed"] += 1
+                self.log(f'Failed to revert "{target.title}": {outcome.error}')
+            done += 1
+            if on_progress:
+                on_progress(done, len(writable))
+
+        self.executor.run(writable, _write, on_done=_on_done)
+        if writable:
+            stats["writes"] = self.executor.stats()
+        success = stats["failed"] == 0
+        if success:
+            self.store.mark_undone(run_id)
+        return UndoResult(success=success, stats=stats)
+
+    def _current_ratings(self, rating_keys: Sequence[str]) -> Dict[str, Optional[float]]:
+        """Map each ratingKey still on the server to its current user rating."""
+        try:
+            items = fetch_items_by_rating_key(self.server, rating_keys)
+        except Exception as error:
+            raise UndoError(f"Could not look up the run's items in Plex: {error}") from error
+        return {key: _rating(getattr(item, "userRating", None)) for key, item in items.items()}
+
+
+def _rating(value: Any) -> Optional[float]:
+    try:
+        rating = float(value)
+    except (TypeError, ValueError):
+        return None
+    return rating if math.isfinite(rating) else None
+
+
+def _same_rating(current: Optional[float], expected: Optional[float]) -> bool:
+    if current is None or expected is None:
+        return current is expected
+    return abs(current - expected) < RATING_TOLERANCE
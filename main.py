@@ -1,7 +1,7 @@
 import argparse
 
 
-def main():
+def build_parser():
     parser = argparse.ArgumentParser(description="Ratings To Plex Ratings")
     parser.add_argument(
         "--host",
@@ -9,11 +9,91 @@ def main():
         help="Address for the web GUI (default: 127.0.0.1; remote binds require RTP_ACCESS_TOKEN)",
     )
     parser.add_argument("--port", type=int, default=5000, help="Port for web GUI (default: 5000)")
-    args = parser.parse_args()
+    parser.add_argument(
+        "--production",
+        action="store_true",
+        help="Serve through waitress or gunicorn instead of the development server, without opening a browser",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes in production mode (default: 1; more than one needs gunicorn)",
+    )
+    parser.add_argument("--threads", type=int, default=8, help="Threads per worker in production mode (default: 8)")
+    parser.add_argument(
+        "--state-store",
+        default="",
+        help="Where web state lives: memory (default) or sqlite:///<path>; "
+             "defaults to a SQLite file with more than one worker",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    from RatingsToPlexRatingsCli import (
+        add_apply_plan_arguments,
+        add_export_arguments,
+        add_import_arguments,
+        add_resume_arguments,
+        add_undo_arguments,
+    )
+    import_parser = subparsers.add_parser(
+        "import",
+        help="Import ratings headlessly (no web GUI or browser) and print a JSON summary",
+    )
+    add_import_arguments(import_parser)
+    apply_plan_parser = subparsers.add_parser(
+        "apply-plan",
+        help="Apply a plan saved with import --save-plan, skipping items whose rating changed since",
+    )
+    add_apply_plan_arguments(apply_plan_parser)
+    resume_parser = subparsers.add_parser(
+        "resume",
+        help="Finish an interrupted headless import from its journal, skipping writes already made",
+    )
+    add_resume_arguments(resume_parser)
+    undo_parser = subparsers.add_parser(
+        "undo",
+        help="Revert the ratings written by one recorded import run",
+    )
+    add_undo_arguments(undo_parser)
+    export_parser = subparsers.add_parser(
+        "export",
+        help="Export your Plex ratings as an IMDb- or Letterboxd-format CSV",
+    )
+    add_export_arguments(export_parser)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.command == "import":
+        from RatingsToPlexRatingsCli import run_import
+        return run_import(args)
+    if args.command == "apply-plan":
+        from RatingsToPlexRatingsCli import run_apply_plan
+        return run_apply_plan(args)
+    if args.command == "resume":
+        from RatingsToPlexRatingsCli import run_resume
+        return run_resume(args)
+    if args.command == "undo":
+        from RatingsToPlexRatingsCli import run_undo
+        return run_undo(args)
+    if args.command == "export":
+        from RatingsToPlexRatingsCli import run_export
+        return run_export(args)
 
     from RatingsToPlexRatingsWeb import run_web
-    run_web(host=args.host, port=args.port)
+    run_web(
+        host=args.host,
+        port=args.port,
+        production=args.production,
+        workers=args.workers,
+        threads=args.threads,
+        state_store_url=args.state_store,
+    )
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
@@ -0,0 +1,1045 @@
+(function() {
+    var csrfToken = document.querySelector('meta[name="csrf-token"]').getAttribute('content');
+    function apiHeaders(headers) {
+        var result = new Headers(headers || {});
+        result.set('X-CSRF-Token', csrfToken);
+        return result;
+    }
+
+    var $ = function(id) { return document.getElementById(id); };
+    var $logOutput     = $('log-output');
+    var $statusText    = $('status-text');
+    var $statusDot     = $('status-dot');
+    var $btnLogin      = $('btn-login');
+    var $btnUpdate     = $('btn-update');
+    var $btnClearRatings = $('btn-clear-ratings');
+    var $btnRestoreRatings = $('btn-restore-ratings');
+    var $btnExportRatings = $('btn-export-ratings');
+    var $btnSavePlan   = $('btn-save-plan');
+    var $btnApplyPlan  = $('btn-apply-plan');
+    var $planFile      = $('plan-file');
+    var $restoreFile   = $('restore-file');
+    var $chkRestoreAllLibraries = $('chk-restore-all-libraries');
+    var $serverSelect  = $('server-select');
+    var $librarySelect = $('library-select');
+    var $csvFile       = $('csv-file');
+    var $fileName      = $('file-name');
+    var $themeSelect   = $('theme-select');
+    var $headerLabel   = $('header-label');
+    var $chkAllLibs    = $('chk-all-libs');
+    var $chkWatched    = $('chk-watched');
+    var $userBadge     = $('user-badge');
+    var $usernameText  = $('username-text');
+    var $progressContainer = $('progress-container');
+    var $progressFill  = $('progress-fill');
+    var $progressText  = $('progress-text');
+    var $summaryCard   = $('summary-card');
+    var $csvPreview    = $('csv-preview');
+    var $csvTable      = $('csv-table');
+    var $csvRowCount   = $('csv-row-count');
+    var $dropZone      = $('drop-zone');
+    var $filtersSection = $('filters-section');
+    var $previewGrid = $('preview-grid');
+    var $btnLoadPreview = $('btn-load-preview');
+
+    var csvUploaded = false;
+    var loggedIn = false;
+
+    // ---- Show/hide media filters based on source type ----
+    function updateFiltersVisibility() {
+        var src = (document.querySelector('input[name="source"]:checked') || {}).value || 'IMDb';
+        $filtersSection.style.display = src === 'IMDb' ? 'block' : 'none';
+    }
+    updateFiltersVisibility();
+
+    // ---- localStorage settings ----
+    var SETTINGS_KEY = 'rtp-settings';
+
+    function saveSettings() {
+        var s = {
+            theme: $themeSelect.value,
+            source: (document.querySelector('input[name="source"]:checked') || {}).value || 'IMDb',
+            movie: $('chk-movie').checked,
+            tvSeries: $('chk-tv-series').checked,
+            tvMiniSeries: $('chk-tv-mini-series').checked,
+            tvMovie: $('chk-tv-movie').checked,
+            tvEpisode: $('chk-tv-episode').checked,
+            markWatched: $chkWatched.checked,
+            forceOverwrite: $('chk-force-overwrite').checked,
+            dryRun: $('chk-dry-run').checked,
+            verify: $('chk-verify').checked,
+            allLibraries: $chkAllLibs.checked
+        };
+        try { localStorage.setItem(SETTINGS_KEY, JSON.stringify(s)); } catch(e) {}
+    }
+
+    function loadSettings() {
+        try {
+            var s = JSON.parse(localStorage.getItem(SETTINGS_KEY));
+            if (!s) return;
+            if (s.theme) {
+                $themeSelect.value = s.theme;
+                document.documentElement.setAttribute('data-theme', s.theme);
+            }
+            if (s.source) {
+                var radio = document.querySelector('input[name="source"][value="' + s.source + '"]');
+                if (radio) radio.checked = true;
+                $headerLabel.innerHTML = s.source === 'IMDb'
+                    ? 'IMDb &rarr; Plex Ratings'
+                    : 'Letterboxd &rarr; Plex Ratings';
+            }
+            if (typeof s.movie === 'boolean') $('chk-movie').checked = s.movie;
+            if (typeof s.tvSeries === 'boolean') $('chk-tv-series').checked = s.tvSeries;
+            if (typeof s.tvMiniSeries === 'boolean') $('chk-tv-mini-series').checked = s.tvMiniSeries;
+            if (typeof s.tvMovie === 'boolean') $('chk-tv-movie').checked = s.tvMovie;
+            if (typeof s.tvEpisode === 'boolean') $('chk-tv-episode').checked = s.tvEpisode;
+            if (typeof s.markWatched === 'boolean') $chkWatched.checked = s.markWatched;
+            if (typeof s.forceOverwrite === 'boolean') $('chk-force-overwrite').checked = s.forceOverwrite;
+            if (typeof s.dryRun === 'boolean') $('chk-dry-run').checked = s.dryRun;
+            if (typeof s.verify === 'boolean') $('chk-verify').checked = s.verify;
+            if (typeof s.allLibraries === 'boolean') {
+                $chkAllLibs.checked = s.allLibraries;
+                $librarySelect.disabled = s.allLibraries;
+            }
+            updateFiltersVisibility();
+        } catch(e) {}
+    }
+
+    function onSettingsChange() { saveSettings(); }
+    $themeSelect.addEventListener('change', onSettingsChange);
+    document.querySelectorAll('input[name="source"]').forEach(function(r) { r.addEventListener('change', onSettingsChange); });
+    [$('chk-movie'), $('chk-tv-series'), $('chk-tv-mini-series'), $('chk-tv-movie'), $('chk-tv-episode'),
+     $chkWatched, $('chk-force-overwrite'), $('chk-dry-run'), $('chk-verify'), $chkAllLibs
+    ].forEach(function(el) { if (el) el.addEventListener('change', onSettingsChange); });
+
+    loadSettings();
+
+    // ---- Log colorization ----
+    function getLogClass(msg) {
+        if (/error|failed/i.test(msg) && !/Exported failures/i.test(msg)) return 'log-error';
+        if (msg.indexOf('[DRY RUN]') !== -1) return 'log-warning';
+        if (msg.indexOf('Updated Plex rating') !== -1 || msg.indexOf('Login successful') !== -1 || msg.indexOf('Successfully updated') !== -1) return 'log-success';
+        if (msg.indexOf('Skipping') !== -1 || msg.indexOf('Skipped') !== -1) return 'log-muted';
+        return '';
+    }
+
+    function appendLog(msg) {
+        var line = document.createElement('div');
+        line.className = 'log-line ' + getLogClass(msg);
+        line.textContent = msg;
+        $logOutput.appendChild(line);
+        $logOutput.scrollTop = $logOutput.scrollHeight;
+    }
+
+    function setStatus(text, state) {
+        $statusText.textContent = text;
+        $statusDot.className = 'status-dot' + (state ? ' ' + state : '');
+    }
+
+    // ---- Clear & Export log ----
+    $('btn-clear-log').addEventListener('click', function() {
+        $logOutput.innerHTML = '';
+        $summaryCard.style.display = 'none';
+    });
+
+    $('btn-export-log').addEventListener('click', function() {
+        var text = $logOutput.innerText;
+        var blob = new Blob([text], { type: 'text/plain' });
+        var a = document.createElement('a');
+        a.href = URL.createObjectURL(blob);
+        a.download = 'activity_log_' + new Date().toISOString().slice(0, 19).replace(/[T:]/g, '_') + '.txt';
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
+        URL.revokeObjectURL(a.href);
+    });
+
+    // ---- SSE ----
+    function connectSSE() {
+        var es = new EventSource('/api/log-stream');
+
+        es.addEventListener('log', function(e) { appendLog(e.data); });
+
+        es.addEventListener('progress', function(e) {
+            var data = JSON.parse(e.data);
+            var pct = data.total > 0 ? Math.min(100, Math.round((data.current / data.total) * 100)) : 0;
+            $progressFill.style.width = pct + '%';
+            $progressText.textContent = data.current + ' / ' + data.total + ' processed';
+            setStatus('Updating: ' + data.current + ' / ' + data.total + ' items...', 'busy');
+        });
+
+        es.addEventListener('login_complete', function(e) {
+            var data = JSON.parse(e.data);
+            if (data.success) {
+                showLoggedIn(data.servers, data.username);
+                setStatus('Servers loaded. Select a server.', 'connected');
+                appendLog('Login successful. Servers loaded.');
+            } else {
+                setStatus('Login failed. Retry.', 'error');
+                appendLog('Login failed or timed out.');
+            }
+            $btnLogin.disabled = false;
+            updateActionButton();
+        });
+
+        es.addEventListener('session_invalid', function() {
+            showLoggedOut();
+            setStatus('Plex session expired. Log in again.', 'error');
+        });
+
+        es.addEventListener('update_complete', function(e) {
+            var data = JSON.parse(e.data);
+            setUIEnabled(true);
+            $progressContainer.style.display = 'none';
+            $progressFill.style.width = '0%';
+            var operation = data.stats && data.stats.operation;
+            var doneMsg = ({ clear: 'Ratings cleared.', restore: 'Ratings restored.', 'apply-plan': 'Plan applied.' })[operation] || 'Update complete.';
+            var failMsg = ({ clear: 'Clear failed.', restore: 'Restore failed.', 'apply-plan': 'Applying the plan failed.' })[operation] || 'Update failed.';
+            setStatus(data.success ? doneMsg : failMsg, data.success ? 'connected' : 'error');
+            if (data.stats && Object.keys(data.stats).length > 0) {
+                showResultsView(data.success, data.stats, data.jobId);
+            }
+        });
+
+        es.onerror = function() {
+            setTimeout(connectSSE, 3000);
+            es.close();
+        };
+    }
+    connectSSE();
+
+    // ---- Results View (replaces preview after update) ----
+    var $resultsView = $('results-view');
+
+    function showResultsView(success, stats, jobId) {
+        // Hide preview elements
+        $previewGrid.style.display = 'none';
+        $previewFilters.style.display = 'none';
+        $previewPagination.style.display = 'none';
+        $summaryCard.style.display = 'none';
+
+        var isClear = stats.operation === 'clear';
+        var isRestore = stats.operation === 'restore';
+        var isDry = stats.dry_run || false;
+        var title, titleClass, statItems;
+        titleClass = success ? 'success' : 'error';
+
+        if (isClear) {
+            title = success ? 'Ratings Cleared' : 'Clear Failed';
+            statItems = [
+                { label: 'Ratings cleared', value: stats.cleared || 0, cls: 'green' },
+                { label: 'No rating (skipped)', value: stats.skipped_no_rating || 0, cls: '' },
+                { label: 'Failed', value: stats.failed || 0, cls: stats.failed ? 'red' : '' },
+                { label: 'Total items', value: stats.total_items || 0, cls: '' },
+            ];
+        } else if (isRestore) {
+            title = success ? 'Ratings Restored' : 'Restore Failed';
+            statItems = [
+                { label: 'Ratings restored', value: stats.restored || 0, cls: 'green' },
+                { label: 'Matched by GUID', value: stats.resolved_by_guid || 0, cls: stats.resolved_by_guid ? 'yellow' : '' },
+                { label: 'Not on server', value: stats.not_found || 0, cls: stats.not_found ? 'red' : '' },
+                { label: 'Failed', value: stats.failed || 0, cls: stats.failed ? 'red' : '' },
+                { label: 'Backup entries', value: stats.total_items || 0, cls: '' },
+            ];
+        } else {
+            title = isDry ? 'Dry Run Complete' : (success ? 'Update Complete' : 'Update Failed');
+            statItems = [
+                { label: isDry ? 'Would update' : 'Updated', value: stats.updated || 0, cls: 'green' },
+                { label: 'Total items', value: stats.total_items || 0, cls: '' },
+                { label: 'Skipped unchanged', value: stats.skipped_unchanged || 0, cls: 'yellow' },
+                { label: 'Not on server', value: stats.not_found || 0, cls: stats.not_found ? 'red' : '' },
+                { label: 'Invalid rating', value: stats.invalid_rating || 0, cls: stats.invalid_rating ? 'red' : '' },
+                { label: 'Type mismatch', value: stats.type_mismatch || 0, cls: stats.type_mismatch ? 'yellow' : '' },
+                { label: 'Rate failed', value: stats.rate_failed || 0, cls: stats.rate_failed ? 'red' : '' },
+                { label: 'Missing ID/fields', value: (stats.missing_id || 0) + (stats.missing_fields || 0), cls: (stats.missing_id || stats.missing_fields) ? 'red' : '' },
+            ];
+            if (stats.operation === 'apply-plan') {
+                statItems.push({ label: 'Changed since plan', value: stats.drifted || 0, cls: stats.drifted ? 'yellow' : '' });
+            }
+        }
+
+        var html = '<div class="results-header">';
+        html += '<span class="results-title ' + titleClass + '">' + title + '</span>';
+        html += '<button class="btn-icon" id="btn-back-preview">Back to Preview</button>';
+        html += '</div>';
+        html += '<div class="results-stats-grid">';
+        statItems.forEach(function(item) {
+            html += '<div class="results-stat-card">';
+            html += '<div class="results-stat-value ' + item.cls + '">' + item.value + '</div>';
+            html += '<div class="results-stat-label">' + item.label + '</div>';
+            html += '</div>';
+        });
+        html += '</div>';
+        if (isClear && stats.backup_id) {
+            var backupUrl = '/api/rating-backups/' + encodeURIComponent(stats.backup_id);
+            html += '<a class="btn btn-primary" href="' + backupUrl + '">Download pre-clear backup (' + (stats.backed_up || 0) + ' ratings)</a>';
+            html += '<button class="btn btn-danger-sm" id="btn-restore-backup">Restore these ratings</button>';
+        }
+        if (!isClear && !isRestore && !isDry && jobId && stats.exported_failures) {
+            var failuresUrl = '/api/jobs/' + encodeURIComponent(jobId) + '/failures';
+            html += '<a class="btn btn-primary" href="' + failuresUrl + '?format=csv">Download failures CSV (' + stats.exported_failures + ')</a>';
+            html += '<a class="btn btn-icon" href="' + failuresUrl + '?format=jsonl">JSONL</a>';
+        }
+
+        $resultsView.innerHTML = html;
+        $resultsView.style.display = 'flex';
+
+        if ($('btn-restore-backup')) {
+            $('btn-restore-backup').addEventListener('click', function() {
+                if (!confirm('Restore ' + (stats.backed_up || 0) + ' ratings from the pre-clear backup?')) return;
+                startRestore({
+                    headers: apiHeaders({ 'Content-Type': 'application/json' }),
+                    body: JSON.stringify({
+                        backupId: stats.backup_id,
+                        searchAllLibraries: $chkRestoreAllLibraries.checked
+                    })
+                });
+            });
+        }
+
+        $('btn-back-preview').addEventListener('click', function() {
+            $resultsView.style.display = 'none';
+            $previewGrid.style.display = '';
+            if (previewAllItems.length > 0) {
+                $previewFilters.style.display = 'flex';
+                renderPreviewPage();
+            }
+        });
+    }
+
+    // ---- Summary Card (kept for log area, unused now) ----
+    function showSummaryCard(success, stats) {
+        var isDry = stats.dry_run || false;
+        var title = isDry ? 'Dry Run Complete' : (success ? 'Update Complete' : 'Update Failed');
+        var titleClass = success ? 'success' : 'error';
+        var statItems = [
+            { label: isDry ? 'Would update' : 'Updated', value: stats.updated || 0, cls: 'green' },
+            { label: 'Total items', value: stats.total_items || 0, cls: '' },
+        ];
+        var html = '<div class="summary-card-header">';
+        html += '<span class="summary-card-title ' + titleClass + '">' + title + '</span>';
+        html += '<button class="summary-card-dismiss" id="btn-dismiss-summary">&times;</button>';
+        html += '</div><div class="summary-stats">';
+        statItems.forEach(function(item) {
+            html += '<div class="summary-stat"><span class="summary-stat-label">' + item.label + '</span>';
+            html += '<span class="summary-stat-value ' + item.cls + '">' + item.value + '</span></div>';
+        });
+        html += '</div>';
+        $summaryCard.innerHTML = html;
+        $summaryCard.style.display = 'block';
+        $('btn-dismiss-summary').addEventListener('click', function() { $summaryCard.style.display = 'none'; });
+    }
+
+    // ---- Theme ----
+    $themeSelect.addEventListener('change', function() {
+        document.documentElement.setAttribute('data-theme', this.value);
+    });
+
+    // ---- Source type change ----
+    document.querySelectorAll('input[name="source"]').forEach(function(radio) {
+        radio.addEventListener('change', function() {
+            var src = this.value;
+            $headerLabel.innerHTML = src === 'IMDb'
+                ? 'IMDb &rarr; Plex Ratings'
+                : 'Letterboxd &rarr; Plex Ratings';
+            updateFiltersVisibility();
+        });
+    });
+
+    // ---- Login ----
+    function showLoggedIn(servers, username) {
+        loggedIn = true;
+        $serverSelect.innerHTML = '<option value="">Select a server</option>';
+        servers.forEach(function(s) {
+            var opt = document.createElement('option');
+            opt.value = s; opt.textContent = s;
+            $serverSelect.appendChild(opt);
+        });
+        $serverSelect.disabled = false;
+        if (username) {
+            $usernameText.textContent = username;
+            $userBadge.style.display = 'flex';
+        }
+    }
+
+    function showLoggedOut() {
+        loggedIn = false;
+        $serverSelect.innerHTML = '<option value="">Select a server</option>';
+        $serverSelect.disabled = true;
+        $librarySelect.innerHTML = '<option value="">Select a library</option>';
+        $librarySelect.disabled = true;
+        $userBadge.style.display = 'none';
+        $btnLogin.disabled = false;
+        updateActionButton();
+    }
+
+    // A saved session lets a restart come back already connected.
+    fetch('/api/session')
+        .then(function(r) { return r.json(); })
+        .then(function(data) {
+            if (!data.connected || loggedIn) return;
+            showLoggedIn(data.servers, data.username);
+            appendLog('Restored saved Plex session.');
+            if (data.server && data.servers.indexOf(data.server) !== -1) {
+                $serverSelect.value = data.server;
+                $serverSelect.dispatchEvent(new Event('change'));
+            } else {
+                setStatus('Servers loaded. Select a server.', 'connected');
+            }
+            updateActionButton();
+        })
+        .catch(function() {});
+
+    $('btn-logout').addEventListener('click', function() {
+        fetch('/api/session', { method: 'DELETE', headers: apiHeaders() })
+            .then(function() {
+                showLoggedOut();
+                setStatus('Logged out.', '');
+                appendLog('Logged out; saved Plex session removed.');
+            });
+    });
+
+    $btnLogin.addEventListener('click', function() {
+        $btnLogin.disabled = true;
+        setStatus('Logging in to Plex... (check browser for OAuth)', 'busy');
+        appendLog('Initiating Plex login...');
+        fetch('/api/login', { method: 'POST', headers: apiHeaders() });
+    });
+
+    // ---- Server -> fetch libraries ----
+    $serverSelect.addEventListener('change', function() {
+        var server = this.value;
+        if (!server) return;
+        $librarySelect.innerHTML = '<option value="">Loading...</option>';
+        $librarySelect.disabled = true;
+        setStatus('Fetching libraries for ' + server + '...', 'busy');
+        appendLog('Loading libraries for server: ' + server);
+        fetch('/api/libraries', {
+            method: 'POST',
+            headers: apiHeaders({ 'Content-Type': 'application/json' }),
+            body: JSON.stringify({ server: server })
+        })
+        .then(function(r) { return r.json(); })
+        .then(function(data) {
+            $librarySelect.innerHTML = '<option value="">Select a library</option>';
+            if (data.libraries && data.libraries.length) {
+                data.libraries.forEach(function(lib) {
+                    var opt = document.createElement('option');
+                    opt.value = lib; opt.textContent = lib;
+                    $librarySelect.appendChild(opt);
+                });
+                $librarySelect.disabled = $chkAllLibs.checked;
+                setStatus('Libraries loaded.', 'connected');
+            } else {
+                setStatus('No libraries found.', '');
+            }
+            updateActionButton();
+        })
+        .catch(function() { setStatus('Failed to load libraries.', 'error'); });
+    });
+
+    $librarySelect.addEventListener('change', function() {
+        if (this.value) setStatus("Library '" + this.value + "' selected.", 'connected');
+        updateActionButton();
+        if (canLoadPreview()) loadPreview();
+    });
+
+    $chkAllLibs.addEventListener('change', function() {
+        $librarySelect.disabled = this.checked;
+        if (this.checked) setStatus('All libraries mode enabled.', 'connected');
+        updateActionButton();
+    });
+
+    $chkWatched.addEventListener('change', function() {
+        if (this.checked) alert('WARNING: When enabled, any title that has its rating imported will be marked as watched. Use with caution.');
+    });
+
+    // ---- Drag-and-drop ----
+    ['dragenter', 'dragover'].forEach(function(evt) {
+        $dropZone.addEventListener(evt, function(e) { e.preventDefault(); e.stopPropagation(); $dropZone.classList.add('drag-over'); });
+    });
+    ['dragleave', 'drop'].forEach(function(evt) {
+        $dropZone.addEventListener(evt, function(e) { e.preventDefault(); e.stopPropagation(); $dropZone.classList.remove('drag-over'); });
+    });
+    $dropZone.addEventListener('drop', function(e) {
+        if (e.dataTransfer.files.length > 0) uploadFile(e.dataTransfer.files[0]);
+    });
+    $dropZone.addEventListener('click', function(e) {
+        if (e.target !== $csvFile) $csvFile.click();
+    });
+    $csvFile.addEventListener('change', function() {
+        if (this.files[0]) uploadFile(this.files[0]);
+    });
+
+    // ---- CSV upload + preview ----
+    function uploadFile(file) {
+        if (!file.name.toLowerCase().endsWith('.csv')) {
+            $fileName.textContent = 'Please select a .csv file';
+            return;
+        }
+        $fileName.textContent = 'Uploading: ' + file.name;
+        var formData = new FormData();
+        formData.append('file', file);
+        formData.append('source', (document.querySelector('input[name="source"]:checked') || {}).value || 'IMDb');
+        fetch('/api/upload-csv', { method: 'POST', headers: apiHeaders(), body: formData })
+        .then(function(r) { return r.json(); })
+        .then(function(data) {
+            if (data.error) {
+                $fileName.textContent = 'Upload failed: ' + data.error;
+                csvUploaded = false;
+            } else {
+                $fileName.textContent = data.filename + ' (' + data.rowCount + ' rows)';
+                csvUploaded = true;
+                appendLog('CSV loaded: ' + data.filename + ' (' + data.rowCount + ' rows)');
+                setStatus('CSV loaded. Ready to update.', 'connected');
+                fetchCsvPreview();
+                if (canLoadPreview()) loadPreview();
+            }
+            updateActionButton();
+        })
+        .catch(function() { $fileName.textContent = 'Upload failed'; csvUploaded = false; updateActionButton(); });
+    }
+
+    function fetchCsvPreview() {
+        fetch('/api/csv-preview')
+        .then(function(r) { return r.json(); })
+        .then(function(data) {
+            if (data.error || !data.headers) { $csvPreview.style.display = 'none'; return; }
+            var html = '<thead><tr>';
+            data.headers.forEach(function(h) { html += '<th>' + escapeHtml(h) + '</th>'; });
+            html += '</tr></thead><tbody>';
+            data.rows.forEach(function(row) {
+                html += '<tr>';
+                data.headers.forEach(function(h) { html += '<td>' + escapeHtml(row[h] || '') + '</td>'; });
+                html += '</tr>';
+            });
+            html += '</tbody>';
+            $csvTable.innerHTML = html;
+            $csvRowCount.textContent = 'Showing ' + data.rows.length + ' of ' + data.totalRows + ' rows';
+            $csvPreview.style.display = 'block';
+        })
+        .catch(function() { $csvPreview.style.display = 'none'; });
+    }
+
+    function escapeHtml(str) {
+        var div = document.createElement('div');
+        div.textContent = str;
+        return div.innerHTML;
+    }
+
+    // ---- Preview ----
+    var previewAllItems = [];
+    var previewFilter = 'all';
+    var previewPage = 1;
+    var PREVIEW_PAGE_SIZE = 30;
+    var $previewFilters = $('preview-filters');
+    var $previewPagination = $('preview-pagination');
+    var $pageInfo = $('page-info');
+
+    function canLoadPreview() {
+        return loggedIn && csvUploaded && ($chkAllLibs.checked || ($librarySelect.value && $librarySelect.value !== ''));
+    }
+
+    function updatePreviewButton() {
+        if ($btnLoadPreview) $btnLoadPreview.disabled = !canLoadPreview();
+    }
+
+    $btnLoadPreview.addEventListener('click', loadPreview);
+
+    function loadPreview() {
+        if (!canLoadPreview()) return;
+        $previewGrid.innerHTML = '<div class="preview-loading">Scanning Plex library...</div>';
+        $previewFilters.style.display = 'none';
+        $previewPagination.style.display = 'none';
+        $btnLoadPreview.disabled = true;
+        var source = (document.querySelector('input[name="source"]:checked') || {}).value || 'IMDb';
+        fetch('/api/preview-items', {
+            method: 'POST',
+            headers: apiHeaders({'Content-Type': 'application/json'}),
+            body: JSON.stringify({
+                source: source,
+                library: $librarySelect.value,
+                allLibraries: $chkAllLibs.checked,
+                movie: $('chk-movie').checked,
+                tvSeries: $('chk-tv-series').checked,
+                tvMiniSeries: $('chk-tv-mini-series').checked,
+                tvMovie: $('chk-tv-movie').checked,
+                tvEpisode: $('chk-tv-episode').checked,
+                forceOverwrite: $('chk-force-overwrite').checked,
+                markWatched: $chkWatched.checked,
+                shape: 'columnar'
+            })
+        })
+        .then(function(r) { return r.json(); })
+        .then(function(data) {
+            if (data.error) {
+                $previewGrid.innerHTML = '<div class="preview-empty">' + escapeHtml(data.error) + '</div>';
+                return;
+            }
+            previewAllItems = data.columns ? decodePreviewColumns(data) : (data.items || []);
+            previewFilter = 'all';
+            previewPage = 1;
+            updateFilterCounts();
+            $previewFilters.style.display = 'flex';
+            document.querySelectorAll('.filter-btn').forEach(function(b) {
+                b.classList.toggle('active', b.getAttribute('data-filter') === 'all');
+            });
+            renderPreviewPage();
+            appendLog('Preview: ' + data.totalMatched + ' matched, ' + data.totalUnmatched + ' not on server, ' + data.totalItems + ' total rows');
+        })
+        .catch(function() {
+            $previewGrid.innerHTML = '<div class="preview-empty">Failed to load preview</div>';
+        })
+        .finally(function() { updatePreviewButton(); });
+    }
+
+    // Rebuild preview items from the columnar response (parallel arrays, coded statuses and sources)
+    function decodePreviewColumns(data) {
+        var c = data.columns;
+        var items = new Array(data.count);
+        for (var i = 0; i < data.count; i++) {
+            items[i] = {
+                title: c.title[i],
+                year: c.year[i],
+                matched: c.matched[i] === 1,
+                status: data.statuses[c.status[i]],
+                newRating: c.newRating[i],
+                currentRating: c.currentRating[i],
+                thumb: c.thumb[i],
+                source: data.sources[c.source[i]]
+            };
+        }
+        return items;
+    }
+
+    function getEffectiveStatus(item) {
+        return item.status;
+    }
+
+    function getFilteredItems() {
+        if (previewFilter === 'all') return previewAllItems;
+        return previewAllItems.filter(function(i) {
+            var eff = getEffectiveStatus(i);
+            if (previewFilter === 'will_update') return eff === 'will_update';
+            if (previewFilter === 'unchanged') return eff === 'unchanged';
+            if (previewFilter === 'not_found') return !i.matched;
+            return true;
+        });
+    }
+
+    function updateFilterCounts() {
+        var all = previewAllItems.length;
+        var willUpdate = previewAllItems.filter(function(i) { return getEffectiveStatus(i) === 'will_update'; }).length;
+        var unchanged = previewAllItems.filter(function(i) { return getEffectiveStatus(i) === 'unchanged'; }).length;
+        var notFound = previewAllItems.filter(function(i) { return !i.matched; }).length;
+        $('count-all').textContent = '(' + all + ')';
+        $('count-will-update').textContent = '(' + willUpdate + ')';
+        $('count-unchanged').textContent = '(' + unchanged + ')';
+        $('count-not-found').textContent = '(' + notFound + ')';
+    }
+
+    function renderPreviewPage() {
+        var filtered = getFilteredItems();
+        var totalPages = Math.max(1, Math.ceil(filtered.length / PREVIEW_PAGE_SIZE));
+        if (previewPage > totalPages) previewPage = totalPages;
+        if (previewPage < 1) previewPage = 1;
+        var start = (previewPage - 1) * PREVIEW_PAGE_SIZE;
+        var pageItems = filtered.slice(start, start + PREVIEW_PAGE_SIZE);
+        if (filtered.length === 0) {
+            $previewGrid.innerHTML = '<div class="preview-empty">No items match this filter</div>';
+            $previewPagination.style.display = 'none';
+            return;
+        }
+        renderPreviewCards(pageItems);
+        if (totalPages > 1) {
+            $previewPagination.style.display = 'flex';
+            $pageInfo.textContent = 'Page ' + previewPage + ' of ' + totalPages + ' (' + filtered.length + ' items)';
+            $('prev-page').disabled = previewPage <= 1;
+            $('next-page').disabled = previewPage >= totalPages;
+        } else {
+            $previewPagination.style.display = 'none';
+        }
+    }
+
+    // Filter buttons
+    document.querySelectorAll('.filter-btn').forEach(function(btn) {
+        btn.addEventListener('click', function() {
+            previewFilter = this.getAttribute('data-filter');
+            previewPage = 1;
+            document.querySelectorAll('.filter-btn').forEach(function(b) { b.classList.remove('active'); });
+            this.classList.add('active');
+            renderPreviewPage();
+        });
+    });
+
+    // Pagination
+    $('prev-page').addEventListener('click', function() {
+        if (previewPage > 1) { previewPage--; renderPreviewPage(); $previewGrid.scrollTop = 0; }
+    });
+    $('next-page').addEventListener('click', function() {
+        var totalPages = Math.ceil(getFilteredItems().length / PREVIEW_PAGE_SIZE);
+        if (previewPage < totalPages) { previewPage++; renderPreviewPage(); $previewGrid.scrollTop = 0; }
+    });
+
+    function renderPreviewCards(items) {
+        var fragment = document.createDocumentFragment();
+        items.forEach(function(item) {
+            var effStatus = getEffectiveStatus(item);
+            var statusClass = effStatus === 'will_update'
+                ? 'status-update'
+                : (effStatus === 'unchanged' ? 'status-unchanged' : 'status-missing');
+            var statusText = ({
+                'will_update': 'Will Update',
+                'unchanged': 'Unchanged',
+                'not_found': 'Not on Server',
+                'type_mismatch': 'Type Mismatch',
+                'invalid_rating': 'Invalid Rating',
+                'missing_fields': 'Missing Fields',
+                'missing_id': 'Missing IMDb ID'
+            })[effStatus] || effStatus;
+
+            var card = document.createElement('div');
+            card.classList.add('preview-card', statusClass);
+
+            var poster;
+            if (item.thumb) {
+                poster = document.createElement('img');
+                poster.className = 'preview-poster';
+                poster.src = '/api/plex-image?thumb=' + encodeURIComponent(item.thumb);
+                poster.alt = '';
+                poster.loading = 'lazy';
+            } else {
+                poster = document.createElement('div');
+                poster.className = 'preview-poster preview-no-poster';
+                poster.textContent = 'No Poster';
+            }
+            card.appendChild(poster);
+
+            var info = document.createElement('div');
+            info.className = 'preview-info';
+
+            var titleElement = document.createElement('div');
+            var titleText = item.title || 'Unknown';
+            titleElement.className = 'preview-title';
+            titleElement.title = titleText;
+            titleElement.textContent = titleText;
+            info.appendChild(titleElement);
+
+            var yearElement = document.createElement('div');
+            yearElement.className = 'preview-year';
+            yearElement.textContent = item.year || '';
+            info.appendChild(yearElement);
+
+            if (item.matched && item.newRating !== null) {
+                var cur = item.currentRating !== null ? item.currentRating.toFixed(1) : '\u2014';
+                var matchedRating = document.createElement('div');
+                matchedRating.className = 'preview-rating';
+                matchedRating.appendChild(document.createTextNode(cur + ' '));
+                var arrow = document.createElement('span');
+                arrow.className = 'rating-arrow';
+                arrow.textContent = '\u2192';
+                matchedRating.appendChild(arrow);
+                matchedRating.appendChild(document.createTextNode(' ' + item.newRating.toFixed(1)));
+                info.appendChild(matchedRating);
+            } else if (item.newRating !== null) {
+                var newRating = document.createElement('div');
+                newRating.className = 'preview-rating';
+                newRating.textContent = 'New: ' + item.newRating.toFixed(1);
+                info.appendChild(newRating);
+            }
+
+            var statusBadge = document.createElement('div');
+            statusBadge.classList.add('preview-status-badge', statusClass);
+            statusBadge.textContent = statusText;
+            info.appendChild(statusBadge);
+
+            card.appendChild(info);
+            fragment.appendChild(card);
+        });
+        $previewGrid.textContent = '';
+        $previewGrid.appendChild(fragment);
+    }
+
+    // ---- Force overwrite toggle updates preview ----
+    $('chk-force-overwrite').addEventListener('change', function() {
+        if (canLoadPreview()) loadPreview();
+    });
+
+    // ---- Update button state ----
+    function updateActionButton() {
+        var hasLib = $chkAllLibs.checked || ($librarySelect.value && $librarySelect.value !== '');
+        $btnUpdate.disabled = !(loggedIn && csvUploaded && hasLib);
+        $btnClearRatings.disabled = !(loggedIn && hasLib);
+        $btnRestoreRatings.disabled = !loggedIn;
+        $btnExportRatings.disabled = !(loggedIn && hasLib);
+        $btnSavePlan.disabled = !(loggedIn && csvUploaded && hasLib);
+        $btnApplyPlan.disabled = !loggedIn;
+        updatePreviewButton();
+    }
+
+    // ---- Disable/enable UI ----
+    function setUIEnabled(enabled) {
+        var controls = [
+            $btnLogin, $btnUpdate, $btnClearRatings, $btnRestoreRatings, $btnExportRatings, $btnSavePlan, $btnApplyPlan,
+            $serverSelect, $csvFile,
+            $('chk-movie'), $('chk-tv-series'), $('chk-tv-mini-series'), $('chk-tv-movie'), $('chk-tv-episode'),
+            $chkWatched, $('chk-force-overwrite'), $('chk-dry-run'), $('chk-verify'), $chkAllLibs
+        ];
+        document.querySelectorAll('input[name="source"]').forEach(function(r) { r.disabled = !enabled; });
+        controls.forEach(function(el) { if (el) el.disabled = !enabled; });
+        if (enabled) {
+            $librarySelect.disabled = $chkAllLibs.checked;
+            if (!loggedIn) { $serverSelect.disabled = true; $librarySelect.disabled = true; }
+            updateActionButton();
+        }
+    }
+
+    // Import options as sent to /api/update-ratings and /api/plan-file
+    function importOptions() {
+        return {
+            source: document.querySelector('input[name="source"]:checked').value,
+            library: $librarySelect.value,
+            allLibraries: $chkAllLibs.checked,
+            movie: $('chk-movie').checked,
+            tvSeries: $('chk-tv-series').checked,
+            tvMiniSeries: $('chk-tv-mini-series').checked,
+            tvMovie: $('chk-tv-movie').checked,
+            tvEpisode: $('chk-tv-episode').checked,
+            markWatched: $chkWatched.checked,
+            forceOverwrite: $('chk-force-overwrite').checked,
+            dryRun: $('chk-dry-run').checked,
+            verify: $('chk-verify').checked
+        };
+    }
+
+    // ---- Start update ----
+    $btnUpdate.addEventListener('click', function() {
+        setUIEnabled(false);
+        setStatus('Updating Plex ratings...', 'busy');
+        $summaryCard.style.display = 'none';
+        $progressContainer.style.display = 'block';
+        $progressFill.style.width = '0%';
+        $progressText.textContent = '0 / ? processed';
+
+        // Hide results view if showing from previous run
+        $resultsView.style.display = 'none';
+        $previewGrid.style.display = '';
+
+        var expectedTotal = 0;
+        if (previewAllItems.length > 0) {
+            expectedTotal = previewAllItems.filter(function(i) {
+                return getEffectiveStatus(i) === 'will_update';
+            }).length;
+        }
+        fetch('/api/update-ratings', {
+            method: 'POST',
+            headers: apiHeaders({ 'Content-Type': 'application/json' }),
+            body: JSON.stringify(Object.assign(importOptions(), {
+                expectedTotal: expectedTotal || undefined
+            }))
+        })
+        .then(function(r) { return r.json(); })
+        .then(function(data) {
+            if (data.error) {
+                appendLog('Error: ' + data.error);
+                setStatus(data.error, 'error');
+                setUIEnabled(true);
+                $progressContainer.style.display = 'none';
+            }
+        })
+        .catch(function() {
+            setStatus('Request failed.', 'error');
+            setUIEnabled(true);
+            $progressContainer.style.display = 'none';
+        });
+    });
+    // ---- Clear all ratings ----
+    $btnClearRatings.addEventListener('click', async function() {
+        var selectedLibrary = $librarySelect.value;
+        var allLibraries = $chkAllLibs.checked;
+        var libName = allLibraries ? 'ALL movie/TV libraries' : ("'" + selectedLibrary + "'");
+        if (!confirm('WARNING: This will permanently remove ALL user ratings from ' + libName + '.\n\nA backup will be created first. Continue?')) return;
+
+        setUIEnabled(false);
+        setStatus('Preparing secure confirmation...', 'busy');
+
+        try {
+            var prepareResponse = await fetch('/api/clear-ratings/prepare', {
+                method: 'POST',
+                headers: apiHeaders({ 'Content-Type': 'application/json' }),
+                body: JSON.stringify({
+                    library: selectedLibrary,
+                    allLibraries: allLibraries
+                })
+            });
+            var preparation = await prepareResponse.json();
+            if (!prepareResponse.ok || preparation.error) {
+                throw new Error(preparation.error || 'Could not prepare clear confirmation');
+            }
+
+            var typedLibrary = prompt(
+                'To confirm clearing ' + preparation.scope + ', type exactly:\n\n' +
+                preparation.confirmationText + '\n\nThis confirmation expires in ' +
+                preparation.expiresIn + ' seconds.'
+            );
+            if (typedLibrary === null) {
+                setUIEnabled(true);
+                setStatus('Clear cancelled. Nothing was changed.', 'connected');
+                return;
+            }
+            if (typedLibrary !== preparation.confirmationText) {
+                setUIEnabled(true);
+                setStatus('Confirmation did not match. Nothing was changed.', 'error');
+                appendLog('Clear cancelled: confirmation text did not match.');
+                return;
+            }
+
+            setStatus('Backing up and clearing ratings...', 'busy');
+            $summaryCard.style.display = 'none';
+            $progressContainer.style.display = 'block';
+            $progressFill.style.width = '0%';
+            $progressText.textContent = 'Scanning library and creating backup...';
+
+            var clearResponse = await fetch('/api/clear-ratings', {
+                method: 'POST',
+                headers: apiHeaders({ 'Content-Type': 'application/json' }),
+                body: JSON.stringify({
+                    library: selectedLibrary,
+                    allLibraries: allLibraries,
+                    confirmationToken: preparation.confirmationToken,
+                    confirmationLibrary: typedLibrary
+                })
+            });
+            var clearResult = await clearResponse.json();
+            if (!clearResponse.ok || clearResult.error) {
+                throw new Error(clearResult.error || 'Clear request failed');
+            }
+        } catch (error) {
+            appendLog('Error: ' + error.message);
+            setStatus(error.message, 'error');
+            setUIEnabled(true);
+            $progressContainer.style.display = 'none';
+        }
+    });
+
+    // ---- Restore ratings from a backup ----
+    function startRestore(request) {
+        setUIEnabled(false);
+        setStatus('Restoring ratings...', 'busy');
+        $resultsView.style.display = 'none';
+        $previewGrid.style.display = '';
+        $progressContainer.style.display = 'block';
+        $progressFill.style.width = '0%';
+        $progressText.textContent = 'Looking up backup items...';
+        fetch('/api/restore-ratings', {
+            method: 'POST',
+            headers: request.headers,
+            body: request.body
+        })
+        .then(function(r) { return r.json(); })
+        .then(function(data) {
+            if (data.error) {
+                appendLog('Error: ' + data.error);
+                setStatus(data.error, 'error');
+                setUIEnabled(true);
+                $progressContainer.style.display = 'none';
+            }
+        })
+        .catch(function() {
+            setStatus('Request failed.', 'error');
+            setUIEnabled(true);
+            $progressContainer.style.display = 'none';
+        });
+    }
+
+    $btnExportRatings.addEventListener('click', function() {
+        var params = new URLSearchParams({
+            format: (document.querySelector('input[name="source"]:checked') || {}).value || 'IMDb',
+            library: $librarySelect.value || '',
+            allLibraries: $chkAllLibs.checked ? '1' : '0',
+            episodes: $('chk-tv-episode').checked ? '1' : '0'
+        });
+        window.location.href = '/api/export-ratings?' + params.toString();
+    });
+
+    // ---- Saved plans ----
+    $btnSavePlan.addEventListener('click', function() {
+        setUIEnabled(false);
+        setStatus('Planning import...', 'busy');
+        fetch('/api/plan-file', {
+            method: 'POST',
+            headers: apiHeaders({ 'Content-Type': 'application/json' }),
+            body: JSON.stringify(importOptions())
+        })
+        .then(function(r) {
+            if (!r.ok) return r.json().then(function(data) { throw new Error(data.error || 'Planning failed'); });
+            var disposition = r.headers.get('Content-Disposition') || '';
+            var match = /filename="([^"]+)"/.exec(disposition);
+            var planned = r.headers.get('X-Planned-Updates');
+            return r.blob().then(function(blob) {
+                var link = document.createElement('a');
+                link.href = URL.createObjectURL(blob);
+                link.download = match ? match[1] : 'ratings.plan.jsonl';
+                link.click();
+                URL.revokeObjectURL(link.href);
+                appendLog('Saved plan with ' + planned + ' planned update(s) as ' + link.download);
+                setStatus('Plan saved.', 'connected');
+            });
+        })
+        .catch(function(error) {
+            appendLog('Error: ' + error.message);
+            setStatus(error.message, 'error');
+        })
+        .then(function() { setUIEnabled(true); });
+    });
+
+    $btnApplyPlan.addEventListener('click', function() {
+        $planFile.value = '';
+        $planFile.click();
+    });
+    $planFile.addEventListener('change', function() {
+        var file = this.files[0];
+        if (!file) return;
+        var dryRun = $('chk-dry-run').checked;
+        if (!confirm((dryRun ? 'Dry run the plan in ' : 'Apply the plan in ') + file.name + ' to the selected server?')) return;
+        var formData = new FormData();
+        formData.append('file', file);
+        formData.append('dryRun', dryRun ? 'true' : 'false');
+        setUIEnabled(false);
+        setStatus('Applying saved plan...', 'busy');
+        $resultsView.style.display = 'none';
+        $previewGrid.style.display = '';
+        $progressContainer.style.display = 'block';
+        $progressFill.style.width = '0%';
+        $progressText.textContent = 'Checking planned items...';
+        fetch('/api/apply-plan', { method: 'POST', headers: apiHeaders(), body: formData })
+        .then(function(r) { return r.json(); })
+        .then(function(data) {
+            if (data.error) {
+                appendLog('Error: ' + data.error);
+                setStatus(data.error, 'error');
+                setUIEnabled(true);
+                $progressContainer.style.display = 'none';
+            }
+        })
+        .catch(function() {
+            setStatus('Request failed.', 'error');
+            setUIEnabled(true);
+            $progressContainer.style.display = 'none';
+        });
+    });
+
+    $btnRestoreRatings.addEventListener('click', function() {
+        $restoreFile.value = '';
+        $restoreFile.click();
+    });
+    $restoreFile.addEventListener('change', function() {
+        var file = this.files[0];
+        if (!file) return;
+        if (!confirm('Restore the ratings stored in ' + file.name + ' to the selected server?')) return;
+        var formData = new FormData();
+        formData.append('file', file);
+        formData.append('searchAllLibraries', $chkRestoreAllLibraries.checked ? 'true' : 'false');
+        startRestore({ headers: apiHeaders(), body: formData });
+    });
+})();
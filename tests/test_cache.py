@@ -0,0 +1,128 @@
+import unittest
+from types import SimpleNamespace
+
+import RatingsToPlexRatingsWeb as web
+from RatingsCache import SectionInfo, TTLCache
+from RatingsSessionStore import CachedServer
+from RatingsToPlexRatingsController import PlexConnection, RatingsToPlexRatingsController
+
+
+class TTLCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.cache = TTLCache("test", ttl=10, max_entries=2, clock=lambda: self.now)
+
+    def test_entries_expire_and_are_counted(self):
+        self.cache.put("a", 1)
+        self.assertEqual(self.cache.get("a"), 1)
+        self.now = 10
+        self.assertIsNone(self.cache.get("a"))
+
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["expirations"]), (1, 1, 1))
+        self.assertEqual(stats["hitRate"], 0.5)
+        self.assertEqual(stats["size"], 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.put("a", 1)
+        self.cache.put("b", 2)
+        self.cache.get("a")
+        self.cache.put("c", 3)
+
+        self.assertIsNone(self.cache.peek("b"))
+        self.assertEqual((self.cache.peek("a"), self.cache.peek("c")), (1, 3))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_get_or_load_only_loads_on_a_miss(self):
+        loads = []
+
+        def load():
+            loads.append(True)
+            return "value"
+
+        self.assertEqual(self.cache.get_or_load("a", load), "value")
+        self.assertEqual(self.cache.get_or_load("a", load), "value")
+        self.assertEqual(len(loads), 1)
+
+    def test_invalidate_by_predicate(self):
+        self.cache.put(("home", 1), "x")
+        self.cache.put(("cabin", 1), "y")
+
+        self.assertEqual(self.cache.invalidate(lambda key: key[0] == "home"), 1)
+
+        self.assertEqual(len(self.cache), 1)
+        self.assertEqual(self.cache.stats()["invalidations"], 1)
+
+
+class FakeSection:
+    def __init__(self, title, section_type="movie"):
+        self.title = title
+        self.type = section_type
+        self.key = title.lower()
+        self.totalSize = 3
+
+
+class SectionCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.section_calls = 0
+        sections = [FakeSection("Movies"), FakeSection("Music", "artist")]
+
+        def list_sections():
+            self.section_calls += 1
+            return list(sections)
+
+        self.server = SimpleNamespace(
+            friendlyName="Home",
+            machineIdentifier="home",
+            library=SimpleNamespace(sections=list_sections, section=lambda title: sections[0]),
+        )
+        self.controller = RatingsToPlexRatingsController()
+        self.controller.plex_connection = PlexConnection(None, None, [CachedServer(name="Home")], token="t")
+        self.controller.plex_connection._connected("Home", self.server)
+
+        self.previous_controller = web.controller
+        self.previous_config = {
+            key: web.app.config.get(key) for key in ("TESTING", "REQUIRE_AUTH", "CSRF_TOKEN")
+        }
+        web.controller = self.controller
+        web.app.config.update(TESTING=True, REQUIRE_AUTH=False, CSRF_TOKEN="test-csrf-token")
+        self.client = web.app.test_client()
+
+    def tearDown(self):
+        web.controller = self.previous_controller
+        web.app.config.update(self.previous_config)
+
+    def _post(self, path, payload):
+        return self.client.post(path, json=payload, headers={"X-CSRF-Token": "test-csrf-token"})
+
+    def test_library_and_clear_endpoints_share_one_section_listing(self):
+        libraries = self._post("/api/libraries", {"server": "Home"})
+        self.assertEqual(libraries.get_json(), {"libraries": ["Movies"]})
+        prepare = self._post("/api/clear-ratings/prepare", {"library": "Movies"})
+        self.assertEqual(prepare.status_code, 200)
+        self._post("/api/clear-ratings/prepare", {"allLibraries": True})
+
+        self.assertEqual(self.section_calls, 1)
+        stats = self.client.get("/api/cache-stats").get_json()
+        self.assertEqual(stats["sections"]["misses"], 1)
+        self.assertGreaterEqual(stats["sections"]["hits"], 2)
+        self.assertIn("libraryIndexes", stats)
+
+    def test_cache_can_be_cleared_explicitly(self):
+        self._post("/api/libraries", {"server": "Home"})
+
+        response = self.client.delete("/api/cache", headers={"X-CSRF-Token": "test-csrf-token"})
+        self.assertEqual(response.status_code, 200)
+
+        self.assertIsNone(self.controller.plex_connection.sections.peek("Home"))
+        self.assertIsNone(self.controller.plex_connection.connections.peek("Home"))
+
+    def test_section_info_counts_items_only_on_request(self):
+        info = SectionInfo.from_section(FakeSection("Movies"))
+
+        self.assertNotIn("itemCount", info.to_dict())
+        self.assertEqual(info.to_dict(include_count=True)["itemCount"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,28 @@
 import csv
+import gzip
 import json
 import os
 import queue
+import subprocess
+import sys
 import tempfile
 import unittest
 from types import SimpleNamespace
 from unittest.mock import patch
 
 import RatingsToPlexRatingsWeb as web
+from RatingsImportPipeline import iter_rated_items
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class NotFound(Exception):
+    pass
+
+
+class BadRequest(Exception):
+    pass
 
 
 class FakeItem:
@@ -21,14 +36,36 @@ class FakeItem:
 
 
 class FakeSection:
-    def __init__(self, title, section_type, items):
+    def __init__(self, title, section_type, items, supports_filters=True):
         self.title = title
         self.type = section_type
         self._items = items
+        self.supports_filters = supports_filters
+        self.filter_error = NotFound(
+            'Unknown filter field "userRating" for libtype "movie". '
+            'Available filter fields: [title, year]'
+        )
+        self.all_calls = 0
+        self.search_calls = []
+
+    @property
+    def totalSize(self):
+        return len(self._items)
 
     def all(self):
+        self.all_calls += 1
         return list(self._items)
 
+    def search(self, filters=None, container_start=0, container_size=None, maxresults=None):
+        self.search_calls.append((filters, container_start, maxresults))
+        if not self.supports_filters:
+            raise self.filter_error
+        rated = [
+            item for item in self._items
+            if item.userRating is not None and item.userRating > 0
+        ]
+        return rated[container_start:container_start + maxresults]
+
 
 class FakeLibrary:
     def __init__(self, sections):
@@ -51,21 +88,17 @@ class FakeServer:
         self._session = SimpleNamespace(put=object())
         self.queries = []
         self.backup_existed_before_first_query = False
+        self.transient_failures = 0
 
     def query(self, key, method=None):
         if not self.queries:
             self.backup_existed_before_first_query = any(
-                name.endswith(".csv") for name in os.listdir(web.BACKUP_DIR)
+                name.endswith(".csv.gz") for name in os.listdir(web.BACKUP_DIR)
             )
         self.queries.append((key, method))
-
-
-class ImmediateThread:
-    def __init__(self, target, daemon=None):
-        self.target = target
-
-    def start(self):
-        self.target()
+        if self.transient_failures:
+            self.transient_failures -= 1
+            raise ConnectionError("connection reset by peer")
 
 
 class ClearSecurityTests(unittest.TestCase):
@@ -73,9 +106,7 @@ class ClearSecurityTests(unittest.TestCase):
         self.temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
         self.previous_backup_dir = web.BACKUP_DIR
         self.previous_controller = web.controller
-        self.previous_update_running = web.update_running
-        self.previous_confirmations = dict(web.clear_confirmations)
-        self.previous_backups = dict(web.rating_backups)
+        self.previous_jobs = web.jobs
         self.previous_config = {
             "TESTING": web.app.config.get("TESTING"),
             "REQUIRE_AUTH": web.app.config.get("REQUIRE_AUTH"),
@@ -94,11 +125,8 @@ class ClearSecurityTests(unittest.TestCase):
             plex_connection=SimpleNamespace(server=self.server)
         )
         web.BACKUP_DIR = self.temp_dir.name
-        web.update_running = False
-        with web.clear_confirmation_lock:
-            web.clear_confirmations.clear()
-        with web.backup_lock:
-            web.rating_backups.clear()
+        web.jobs = web.JobManager(max_workers=2)
+        self.previous_store = web.configure_state_store(web.MemoryStateStore())
         self._drain_log_queue()
 
         web.app.config.update(
@@ -113,13 +141,8 @@ class ClearSecurityTests(unittest.TestCase):
     def tearDown(self):
         web.BACKUP_DIR = self.previous_backup_dir
         web.controller = self.previous_controller
-        web.update_running = self.previous_update_running
-        with web.clear_confirmation_lock:
-            web.clear_confirmations.clear()
-            web.clear_confirmations.update(self.previous_confirmations)
-        with web.backup_lock:
-            web.rating_backups.clear()
-            web.rating_backups.update(self.previous_backups)
+        web.jobs = self.previous_jobs
+        web.configure_state_store(self.previous_store)
         web.app.config.update(self.previous_config)
         self._drain_log_queue()
         self.temp_dir.cleanup()
@@ -132,7 +155,9 @@ class ClearSecurityTests(unittest.TestCase):
                 return
 
     def _post(self, path, payload):
-        return self.client.post(path, json=payload, headers=self.headers)
+        response = self.client.post(path, json=payload, headers=self.headers)
+        self.assertTrue(web.jobs.wait_idle(timeout=10))
+        return response
 
     def _prepare(self, library="Movies", all_libraries=False):
         response = self._post(
@@ -182,28 +207,26 @@ class ClearSecurityTests(unittest.TestCase):
         self.server.library._sections.append(FakeSection("Películas", "movie", []))
         preparation = self._prepare("Películas")
 
-        with patch.object(web.threading, "Thread", ImmediateThread):
-            response = self._post(
-                "/api/clear-ratings",
-                self._clear_payload(preparation, library="Películas"),
-            )
+        response = self._post(
+            "/api/clear-ratings",
+            self._clear_payload(preparation, library="Películas"),
+        )
 
         self.assertEqual(response.status_code, 200)
 
     def test_confirmation_expires(self):
-        with patch.object(web.time, "monotonic", return_value=100.0):
-            preparation = self._prepare("Movies")
-        with patch.object(
-            web.time,
-            "monotonic",
-            return_value=100.0 + web.CLEAR_CONFIRMATION_TTL_SECONDS + 1,
-        ):
-            response = self._post(
-                "/api/clear-ratings",
-                self._clear_payload(preparation),
-            )
+        now = [1000.0]
+        web.state_store.clock = lambda: now[0]
+        preparation = self._prepare("Movies")
+        now[0] += web.CLEAR_CONFIRMATION_TTL_SECONDS + 1
+
+        response = self._post(
+            "/api/clear-ratings",
+            self._clear_payload(preparation),
+        )
 
-        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.status_code, 403)
+        self.assertIn("expired", response.get_json()["error"])
         self.assertEqual(self.server.queries, [])
 
     def test_all_library_confirmation_uses_explicit_phrase(self):
@@ -216,18 +239,22 @@ class ClearSecurityTests(unittest.TestCase):
         preparation = self._prepare("Movies")
         payload = self._clear_payload(preparation)
 
-        with patch.object(web.threading, "Thread", ImmediateThread):
-            response = self._post("/api/clear-ratings", payload)
+        response = self._post("/api/clear-ratings", payload)
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(self.server.queries), 1)
         self.assertTrue(self.server.backup_existed_before_first_query)
-        self.assertFalse(web.update_running)
-
-        with web.backup_lock:
-            self.assertEqual(len(web.rating_backups), 1)
-            backup_id, backup = next(iter(web.rating_backups.items()))
-        with open(backup["path"], "r", encoding="utf-8", newline="") as backup_file:
+        job_status = self.client.get(f"/api/jobs/{response.get_json()['jobId']}").get_json()
+        self.assertEqual(job_status["kind"], "clear")
+        self.assertEqual(job_status["status"], "succeeded")
+        self.assertEqual(job_status["result"]["stats"]["cleared"], 1)
+        self.assertEqual(web.jobs.active(), [])
+
+        backups = web._backup_store().list()
+        self.assertEqual(len(backups), 1)
+        backup_id = backups[0].backup_id
+        _record, backup_path = web._backup_store().get(backup_id)
+        with gzip.open(backup_path, "rt", encoding="utf-8", newline="") as backup_file:
             rows = list(csv.DictReader(backup_file))
         self.assertEqual(len(rows), 1)
         self.assertEqual(rows[0]["Library"], "Movies")
@@ -238,17 +265,190 @@ class ClearSecurityTests(unittest.TestCase):
         self.assertEqual(download.status_code, 200)
         self.assertEqual(download.headers["Cache-Control"], "no-store")
         self.assertIn("attachment", download.headers["Content-Disposition"])
+        self.assertIn(".csv.gz", download.headers["Content-Disposition"])
         download.close()
 
         reused = self._post("/api/clear-ratings", payload)
         self.assertEqual(reused.status_code, 403)
         self.assertEqual(len(self.server.queries), 1)
 
+    def test_clear_requests_only_rated_items_in_pages(self):
+        self.movie_section._items.extend(
+            FakeItem(key, f"Movie {key}", 7 if key % 2 else None)
+            for key in range(3, 9)
+        )
+        preparation = self._prepare("Movies")
+
+        with (
+            patch.object(
+                web,
+                "iter_rated_items",
+                lambda section: iter_rated_items(section, page_size=2),
+            ),
+        ):
+            response = self._post("/api/clear-ratings", self._clear_payload(preparation))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.movie_section.all_calls, 0)
+        self.assertEqual(
+            [call[1] for call in self.movie_section.search_calls],
+            [0, 2, 4],
+        )
+        self.assertEqual(len(self.server.queries), 4)
+        stats = self._completion_stats()
+        self.assertEqual(stats["cleared"], 4)
+        self.assertEqual(stats["skipped_no_rating"], 4)
+        self.assertEqual(stats["total_items"], 8)
+        self.assertEqual(stats["backed_up"], 4)
+
+    def test_clear_falls_back_to_full_scan_when_filter_is_rejected(self):
+        self.movie_section.supports_filters = False
+        preparation = self._prepare("Movies")
+
+        response = self._post("/api/clear-ratings", self._clear_payload(preparation))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.movie_section.all_calls, 1)
+        self.assertEqual(len(self.server.queries), 1)
+        stats = self._completion_stats()
+        self.assertEqual(stats["cleared"], 1)
+        self.assertEqual(stats["skipped_no_rating"], 1)
+
+    def test_bad_request_for_the_filter_falls_back_to_a_full_scan(self):
+        self.movie_section.supports_filters = False
+        self.movie_section.filter_error = BadRequest("(400) bad_request; http://plex/library/sections/1/all")
+
+        rated = list(iter_rated_items(self.movie_section))
+
+        self.assertEqual(self.movie_section.all_calls, 1)
+        self.assertEqual([item.title for item in rated], ["Rated Movie"])
+
+    def test_other_not_found_errors_do_not_fall_back_to_a_full_scan(self):
+        self.movie_section.supports_filters = False
+        self.movie_section.filter_error = NotFound("(404) not_found; http://plex/library/sections/1/all")
+
+        with self.assertRaises(NotFound):
+            list(iter_rated_items(self.movie_section))
+        self.assertEqual(self.movie_section.all_calls, 0)
+
+    def test_network_errors_do_not_fall_back_to_a_full_scan(self):
+        def unreachable(**kwargs):
+            raise ConnectionError("connection refused")
+
+        self.movie_section.search = unreachable
+
+        with self.assertRaises(ConnectionError):
+            list(iter_rated_items(self.movie_section))
+        self.assertEqual(self.movie_section.all_calls, 0)
+
+    def test_clear_retries_transient_errors_and_throttles_progress(self):
+        self.movie_section._items.extend(
+            FakeItem(key, f"Movie {key}", 6) for key in range(3, 203)
+        )
+        self.server.transient_failures = 1
+        preparation = self._prepare("Movies")
+
+        with (
+            patch("PlexWriteExecutor.time.sleep"),
+        ):
+            response = self._post("/api/clear-ratings", self._clear_payload(preparation))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.queries), 202)
+        progress_events = []
+        completion_events = []
+        while True:
+            try:
+                event = web.log_queue.get_nowait()
+            except queue.Empty:
+                break
+            if event.get("type") == "progress":
+                progress_events.append(json.loads(event["data"]))
+            elif event.get("type") == "update_complete":
+                completion_events.append(json.loads(event["data"]))
+
+        self.assertLess(len(progress_events), 201)
+        self.assertEqual(
+            (progress_events[-1]["current"], progress_events[-1]["total"]),
+            (201, 201),
+        )
+        self.assertEqual(progress_events[-1]["jobId"], completion_events[0]["jobId"])
+        stats = completion_events[0]["stats"]
+        self.assertTrue(completion_events[0]["success"])
+        self.assertEqual(stats["cleared"], 201)
+        self.assertEqual(stats["failed"], 0)
+        self.assertEqual(stats["skipped_no_rating"], 1)
+        self.assertEqual(stats["total_items"], 202)
+
+    def test_backup_catalog_survives_restart_and_applies_retention(self):
+        with patch.object(web, "BACKUP_RETENTION_COUNT", 2):
+            first_id, _name, _count = web._create_ratings_backup([("Movies", self.rated_item)])
+            second_id, _name, _count = web._create_ratings_backup([("Movies", self.rated_item)])
+            third_id, _name, backed_up = web._create_ratings_backup(
+                [("Movies", self.rated_item), ("Movies", self.unrated_item)]
+            )
+
+        self.assertEqual(backed_up, 1)
+        # A fresh store reads only the on-disk catalog, as after a process restart.
+        restarted = web.RatingsBackupStore(self.temp_dir.name)
+        self.assertEqual(
+            {record.backup_id for record in restarted.list()},
+            {second_id, third_id},
+        )
+        self.assertIsNone(restarted.get(first_id))
+        self.assertFalse(any(name.startswith(first_id) for name in os.listdir(self.temp_dir.name)))
+        self.assertFalse(any(name.endswith(".tmp") for name in os.listdir(self.temp_dir.name)))
+
+        download = self.client.get(f"/api/rating-backups/{third_id}")
+        self.assertEqual(download.status_code, 200)
+        self.assertEqual(gzip.decompress(download.data).decode("utf-8").count("Rated Movie"), 1)
+        download.close()
+
+    def test_corrupt_backup_catalog_is_set_aside_and_rebuilt(self):
+        first_id, _name, _count = web._create_ratings_backup([("Movies", self.rated_item)])
+        store = web.RatingsBackupStore(self.temp_dir.name)
+        with open(store.catalog_path, "w", encoding="utf-8") as catalog_file:
+            catalog_file.write("{not json")
+
+        second_id, _name, _count = web._create_ratings_backup([("Movies", self.rated_item)])
+
+        records = {record.backup_id: record for record in store.list()}
+        self.assertEqual(set(records), {first_id, second_id})
+        self.assertEqual(records[first_id].entries, 1)
+        self.assertTrue(any(name.startswith("catalog.json.corrupt-") for name in os.listdir(self.temp_dir.name)))
+
+    @unittest.skipUnless(os.name == "posix", "the catalog file lock is POSIX-only")
+    def test_backups_written_by_several_processes_are_all_catalogued(self):
+        script = (
+            "import sys; from RatingsBackupStore import RatingsBackupStore; "
+            "store = RatingsBackupStore(sys.argv[1], max_backups=1000); "
+            "[store.write([]) for _ in range(25)]"
+        )
+        workers = [
+            subprocess.Popen([sys.executable, "-c", script, self.temp_dir.name], cwd=ROOT)
+            for _ in range(3)
+        ]
+        self.assertEqual([worker.wait(timeout=60) for worker in workers], [0, 0, 0])
+
+        store = web.RatingsBackupStore(self.temp_dir.name)
+        self.assertEqual(len(store.list()), 75)
+
+    def _completion_stats(self):
+        completion_events = []
+        while True:
+            try:
+                event = web.log_queue.get_nowait()
+            except queue.Empty:
+                break
+            if event.get("type") == "update_complete":
+                completion_events.append(json.loads(event["data"]))
+        self.assertEqual(len(completion_events), 1)
+        return completion_events[0]["stats"]
+
     def test_backup_failure_aborts_without_clearing(self):
         preparation = self._prepare("Movies")
 
         with (
-            patch.object(web.threading, "Thread", ImmediateThread),
             patch.object(web, "_create_ratings_backup", side_effect=OSError("disk full")),
         ):
             response = self._post(
@@ -258,7 +458,7 @@ class ClearSecurityTests(unittest.TestCase):
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(self.server.queries, [])
-        self.assertFalse(web.update_running)
+        self.assertEqual(web.jobs.active(), [])
 
         completion_events = []
         while True:
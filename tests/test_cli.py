@@ -0,0 +1,372 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import main
+from RatingsImportPipeline import RatingsImportPipeline
+from RatingsImportJournal import read_journal
+from RatingsToPlexRatingsCli import CliError, run_apply_plan, run_import, run_resume, run_undo
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMDB_CSV = (
+    "Const,Title,Title Type,Your Rating,Year\n"
+    "tt1,Inception,Movie,9,2010\n"
+    "tt2,Missing,Movie,7,2001\n"
+)
+LETTERBOXD_CSV = "Date,Name,Year,Letterboxd URI,Rating\n2024-01-01,Heat,1995,x,4.5\n"
+
+
+class FakeItem:
+    def __init__(self, guid, title, year, user_rating=None, rating_key=None):
+        self.guid = guid
+        self.ratingKey = rating_key
+        self.guids = []
+        self.title = title
+        self.year = year
+        self.type = "movie"
+        self.userRating = user_rating
+        self.thumb = None
+        self.rate_calls = []
+
+    def rate(self, rating):
+        self.rate_calls.append(rating)
+
+
+class FakeSection:
+    title = "Movies"
+    type = "movie"
+    key = 1
+
+    def __init__(self, items):
+        self.items = items
+        self.scans = 0
+
+    def all(self):
+        self.scans += 1
+        return list(self.items)
+
+    def search(self, filters=None, container_start=0, container_size=None, maxresults=None):
+        if container_start:
+            return []
+        return [item for item in self.items if item.userRating]
+
+
+class FakeUserServer:
+    """A connection holding a managed user's token: their own ratings, writes by ratingKey."""
+
+    def __init__(self, rated_items):
+        section = FakeSection(rated_items)
+        self.library = SimpleNamespace(sectionByID=lambda key: section)
+        self._session = SimpleNamespace(put="PUT")
+        self.queries = []
+
+    def query(self, path, method=None):
+        self.queries.append(path)
+
+
+class HeadlessImportTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
+        self.inception = FakeItem("imdb://tt1", "Inception", 2010, rating_key=101)
+        self.heat = FakeItem("plex://movie/heat", "Heat", 1995, rating_key=102)
+        self.section = section = FakeSection([self.inception, self.heat])
+        self.user_servers = {
+            "kid": FakeUserServer([FakeItem("imdb://tt1", "Inception", 2010, user_rating=9.0, rating_key=101)]),
+            "guest": FakeUserServer([]),
+        }
+        self.server = SimpleNamespace(
+            library=SimpleNamespace(
+                section=lambda title: section,
+                sections=lambda: [section],
+            ),
+            switchUser=self._switch_user,
+        )
+        self.connect_calls = []
+        self.failures_dir = os.path.join(self.temp_dir.name, "failures")
+        failures_dir = patch("RatingsToPlexRatingsCli.DEFAULT_FAILURES_DIR", self.failures_dir)
+        failures_dir.start()
+        self.addCleanup(failures_dir.stop)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _switch_user(self, username):
+        if username not in self.user_servers:
+            raise ValueError(f"Unable to find user {username}")
+        return self.user_servers[username]
+
+    def _csv(self, name, contents):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "w", encoding="utf-8", newline="") as csv_file:
+            csv_file.write(contents)
+        return path
+
+    def _run(self, argv):
+        def connect(token, baseurl=None, server_name=None):
+            self.connect_calls.append((token, baseurl, server_name))
+            if not token:
+                raise CliError("A Plex token is required (--token or PLEX_TOKEN)")
+            return self.server
+
+        args = main.build_parser().parse_args(argv)
+        run = {"resume": run_resume, "undo": run_undo, "apply-plan": run_apply_plan}.get(args.command, run_import)
+        out = io.StringIO()
+        code = run(args, connect=connect, out=out)
+        return code, json.loads(out.getvalue())
+
+    def test_imports_several_csvs_and_reports_json_summary(self):
+        imdb = self._csv("imdb.csv", IMDB_CSV)
+        letterboxd = self._csv("letterboxd.csv", LETTERBOXD_CSV)
+
+        code, report = self._run([
+            "import", imdb, letterboxd,
+            "--token", "secret", "--baseurl", "http://plex:32400", "--library", "Movies",
+        ])
+
+        self.assertEqual(code, 0)
+        self.assertTrue(report["success"])
+        self.assertEqual(self.connect_calls, [("secret", "http://plex:32400", None)])
+        imdb_summary, letterboxd_summary = report["files"]
+        self.assertEqual(imdb_summary["source"], "IMDb")
+        self.assertEqual(imdb_summary["stats"]["updated"], 1)
+        self.assertEqual(imdb_summary["stats"]["not_found"], 1)
+        self.assertEqual(imdb_summary["failures"], 1)
+        with open(imdb_summary["failureLog"]["jsonl"], encoding="utf-8") as failures:
+            self.assertEqual([json.loads(line)["Title"] for line in failures], ["Missing"])
+        self.assertEqual(os.path.dirname(imdb_summary["failureLog"]["csv"]), self.failures_dir)
+        self.assertEqual(letterboxd_summary["failures"], 0)
+        self.assertNotIn("failureLog", letterboxd_summary)
+        self.assertEqual(letterboxd_summary["source"], "Letterboxd")
+        self.assertEqual(self.inception.rate_calls, [9.0])
+        self.assertEqual(self.heat.rate_calls, [9.0])
+        self.assertEqual(
+            set(imdb_summary["timings"]),
+            {"resolve", "parse", "validate", "index", "match", "merge", "plan", "apply"},
+        )
+        self.assertIn("connect", report["timings"])
+
+    def test_dry_run_and_bad_csv_are_reported_without_writes(self):
+        imdb = self._csv("imdb.csv", IMDB_CSV)
+        unknown = self._csv("other.csv", "a,b\n1,2\n")
+
+        code, report = self._run([
+            "import", imdb, unknown, "--dry-run",
+            "--token", "secret", "--server", "Home", "--library", "Movies",
+        ])
+
+        self.assertEqual(code, 1)
+        self.assertTrue(report["dryRun"])
+        self.assertTrue(report["files"][0]["success"])
+        self.assertFalse(report["files"][1]["success"])
+        self.assertIn("Unsupported CSV format", report["files"][1]["error"])
+        self.assertEqual(self.inception.rate_calls, [])
+
+    def test_plex_errors_fail_only_their_file(self):
+        class BadRequest(Exception):
+            pass
+
+        imdb = self._csv("imdb.csv", IMDB_CSV)
+        letterboxd = self._csv("letterboxd.csv", LETTERBOXD_CSV)
+        build = RatingsImportPipeline.build_merged_plan
+        calls = []
+
+        def flaky_build(pipeline, *args, **kwargs):
+            calls.append(args[0])
+            if len(calls) == 1:
+                raise BadRequest("(500) internal_server_error")
+            return build(pipeline, *args, **kwargs)
+
+        with patch.object(RatingsImportPipeline, "build_merged_plan", flaky_build):
+            code, report = self._run(["import", imdb, letterboxd, "--token", "secret", "--server", "Home", "--library", "Movies"])
+
+        self.assertEqual(code, 1)
+        self.assertEqual(report["files"][0]["error"], "BadRequest: (500) internal_server_error")
+        self.assertTrue(report["files"][1]["success"])
+
+    def test_merged_csvs_are_one_import(self):
+        imdb = self._csv("imdb.csv", IMDB_CSV)
+        letterboxd = self._csv(
+            "letterboxd.csv",
+            "Date,Name,Year,Letterboxd URI,Rating\n2024-01-01,Heat,1995,x,4.5\n2024-01-01,Inception,2010,x,3\n",
+        )
+
+        code, report = self._run([
+            "import", imdb, letterboxd, "--merge", "--conflict", "priority",
+            "--token", "secret", "--baseurl", "http://plex:32400", "--library", "Movies",
+        ])
+
+        self.assertEqual(code, 0)
+        (summary,) = report["files"]
+        self.assertEqual(summary["csv"], [imdb, letterboxd])
+        self.assertEqual(summary["source"], "IMDb+Letterboxd")
+        self.assertEqual(summary["stats"]["superseded"], 1)
+        self.assertEqual(self.inception.rate_calls, [9.0])
+        self.assertEqual(self.heat.rate_calls, [9.0])
+        self.assertEqual(self.section.scans, 1)
+
+    def test_several_users_share_one_library_scan(self):
+        imdb = self._csv("imdb.csv", IMDB_CSV)
+
+        code, report = self._run([
+            "import", "--user", f"kid={imdb}", "--user", f"guest={imdb}", "--user", f"nobody={imdb}",
+            "--token", "secret", "--baseurl", "http://plex:32400", "--library", "Movies",
+        ])
+
+        self.assertEqual(code, 1)
+        kid, guest, nobody = report["files"]
+        self.assertEqual((kid["user"], kid["stats"]["skipped_unchanged"], kid["stats"]["updated"]), ("kid", 1, 0))
+        self.assertEqual((guest["user"], guest["stats"]["updated"]), ("guest", 1))
+        self.assertIn("ratings", guest["timings"])
+        self.assertIn("Could not switch to Plex user 'nobody'", nobody["error"])
+        self.assertEqual(self.user_servers["kid"].queries, [])
+        self.assertEqual(len(self.user_servers["guest"].queries), 1)
+        self.assertIn("/:/rate?key=101&", self.user_servers["guest"].queries[0])
+        # Ratings were written as the users, never as the owner.
+        self.assertEqual(self.inception.rate_calls, [])
+        self.assertEqual(self.section.scans, 1)
+        self.assertEqual(report["indexCache"]["misses"], 1)
+
+    def test_journaled_import_can_be_resumed(self):
+        imdb = self._csv("imdb.csv", IMDB_CSV)
+        journal_dir = os.path.join(self.temp_dir.name, "journals")
+
+        code, report = self._run([
+            "import", "--user", f"guest={imdb}", "--journal-dir", journal_dir,
+            "--token", "secret", "--baseurl", "http://plex:32400", "--library", "Movies",
+        ])
+        self.assertEqual(code, 0)
+        journal_path = report["files"][0]["journal"]
+        state = read_journal(journal_path)
+        self.assertTrue(state.complete)
+        self.assertEqual((state.details["user"], len(state.entries)), ("guest", 1))
+
+        # Pretend the run died before its write was recorded.
+        with open(journal_path, "r", encoding="utf-8") as journal_file:
+            lines = journal_file.readlines()
+        with open(journal_path, "w", encoding="utf-8") as journal_file:
+            journal_file.writelines(line for line in lines if '"type":"planned"' in line or '"type":"run"' in line)
+
+        code, report = self._run([
+            "resume", journal_path, "--token", "secret", "--baseurl", "http://plex:32400",
+        ])
+
+        self.assertEqual(code, 0)
+        self.assertEqual((report["stats"]["already_done"], report["stats"]["updated"]), (0, 1))
+        self.assertEqual(len(self.user_servers["guest"].queries), 2)
+        self.assertTrue(read_journal(journal_path).complete)
+
+    def test_recorded_user_import_is_undone_as_that_user(self):
+        imdb = self._csv("imdb.csv", IMDB_CSV)
+        changes_db = os.path.join(self.temp_dir.name, "changes.sqlite3")
+        guest = self.user_servers["guest"]
+        guest.fetchItems = lambda keys: [SimpleNamespace(ratingKey=key, userRating=9.0) for key in keys]
+
+        code, report = self._run([
+            "import", "--user", f"guest={imdb}", "--changes-db", changes_db,
+            "--token", "secret", "--baseurl", "http://plex:32400", "--library", "Movies",
+        ])
+        self.assertEqual(code, 0)
+        run_id = report["files"][0]["stats"]["run_id"]
+
+        code, report = self._run([
+            "undo", run_id, "--changes-db", changes_db, "--token", "secret", "--baseurl", "http://plex:32400",
+        ])
+
+        self.assertEqual(code, 0)
+        self.assertEqual(report["stats"]["reverted"], 1)
+        self.assertEqual(guest.queries[-1], "/:/rate?key=101&identifier=com.plexapp.plugins.library&rating=-1")
+        self.assertEqual(self.inception.rate_calls, [])
+
+    def test_plex_errors_in_every_command_are_a_json_error(self):
+        class Unauthorized(Exception):
+            pass
+
+        class ExpiredTokenServer:
+            @property
+            def machineIdentifier(self):
+                raise Unauthorized("(401) unauthorized; http://plex:32400/")
+
+        imdb = self._csv("imdb.csv", IMDB_CSV)
+        changes_db = os.path.join(self.temp_dir.name, "changes.sqlite3")
+        plan = os.path.join(self.temp_dir.name, "plan.json")
+        code, report = self._run([
+            "import", "--user", f"guest={imdb}", "--changes-db", changes_db,
+            "--journal-dir", os.path.join(self.temp_dir.name, "journals"),
+            "--token", "secret", "--baseurl", "http://plex:32400", "--library", "Movies",
+        ])
+        summary = report["files"][0]
+        self.server.machineIdentifier = "home"
+        self._run([
+            "import", imdb, "--save-plan", plan,
+            "--token", "secret", "--baseurl", "http://plex:32400", "--library", "Movies",
+        ])
+        self.server = ExpiredTokenServer()
+        connection = ["--token", "secret", "--baseurl", "http://plex:32400"]
+
+        for argv in (
+            ["resume", summary["journal"], *connection],
+            ["undo", summary["stats"]["run_id"], "--changes-db", changes_db, *connection],
+            ["apply-plan", plan, *connection],
+        ):
+            with self.subTest(command=argv[0]):
+                code, report = self._run(argv)
+
+                self.assertEqual(code, 1)
+                self.assertFalse(report["success"])
+                self.assertEqual(report["error"], "Unauthorized: (401) unauthorized; http://plex:32400/")
+
+    def test_resume_of_a_missing_journal_is_a_json_error(self):
+        code, report = self._run([
+            "resume", os.path.join(self.temp_dir.name, "missing.jsonl"),
+            "--token", "secret", "--baseurl", "http://plex:32400",
+        ])
+
+        self.assertEqual(code, 1)
+        self.assertIn("Could not read import journal", report["error"])
+        self.assertEqual(self.connect_calls, [])
+
+    def test_malformed_user_argument_is_a_json_error(self):
+        code, report = self._run([
+            "import", "--user", "kid", "--token", "secret", "--baseurl", "http://plex", "--library", "Movies",
+        ])
+
+        self.assertEqual(code, 1)
+        self.assertIn("USER=CSV", report["error"])
+        self.assertEqual(self.connect_calls, [])
+
+    def test_missing_token_is_a_json_error(self):
+        imdb = self._csv("imdb.csv", IMDB_CSV)
+
+        code, report = self._run([
+            "import", imdb, "--token", "", "--baseurl", "http://plex:32400", "--all-libraries",
+        ])
+
+        self.assertEqual(code, 1)
+        self.assertIn("token", report["error"])
+        self.assertEqual(report["files"], [])
+
+    def test_cli_path_never_imports_flask(self):
+        script = (
+            "import sys, main; main.build_parser().parse_args(['import', 'x.csv', "
+            "'--baseurl', 'http://plex', '--library', 'Movies']); "
+            "import RatingsToPlexRatingsCli; print('flask' in sys.modules)"
+        )
+        completed = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(completed.stdout.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,193 @@
+import argparse
+import csv
+import datetime
+import io
+import json
+import os
+import queue
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import RatingsToPlexRatingsWeb as web
+from RatingsExportPipeline import EXPORT_COLUMNS, RatingsExporter
+from RatingsImportPipeline import ImportOptions, ImportPipelineError, RatingsImportPipeline, detect_source
+from RatingsToPlexRatingsCli import add_export_arguments, run_export
+
+
+class FakeItem:
+    def __init__(self, rating_key, title, year, rating, media_type="movie", imdb=None):
+        self.ratingKey = rating_key
+        self.title = title
+        self.year = year
+        self.userRating = rating
+        self.type = media_type
+        self.guid = f"plex://{media_type}/{rating_key}"
+        self.guids = [SimpleNamespace(id=f"imdb://{imdb}")] if imdb else []
+        self.lastRatedAt = datetime.datetime(2024, 5, 1, 12, 30)
+
+    def rate(self, rating):
+        self.userRating = rating
+
+
+class FakeSection:
+    def __init__(self, title, section_type, items, episodes=()):
+        self.title = title
+        self.type = section_type
+        self.key = title
+        self.items = items
+        self.episodes = list(episodes)
+        self.requests = []
+
+    def all(self):
+        return list(self.items)
+
+    def search(self, filters=None, container_start=0, container_size=None, maxresults=None, libtype=None):
+        self.requests.append((libtype, container_start))
+        items = self.episodes if libtype == "episode" else self.items
+        rated = [item for item in items if item.userRating]
+        return rated[container_start:container_start + container_size]
+
+
+class FakeServer:
+    machineIdentifier = "home"
+
+    def __init__(self, sections):
+        self.library = SimpleNamespace(
+            sections=lambda: list(sections),
+            section=lambda title: next(section for section in sections if section.title == title),
+        )
+
+
+def _rows(text):
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+class ExporterTests(unittest.TestCase):
+    def setUp(self):
+        self.heat = FakeItem(1, "Heat", 1995, 7.0, imdb="tt0113277")
+        self.unrated = FakeItem(2, "Unrated", 2001, None, imdb="tt0000002")
+        self.no_id = FakeItem(3, "Home Video", 2010, 6.0)
+        self.show = FakeItem(4, "The Wire", 2002, 9.0, media_type="show", imdb="tt0306414")
+        self.episode = FakeItem(5, "The Target", 2002, 8.0, media_type="episode", imdb="tt0749451")
+        self.movies = FakeSection("Movies", "movie", [self.heat, self.unrated, self.no_id])
+        self.movies_4k = FakeSection("Movies 4K", "movie", [self.heat])
+        self.shows = FakeSection("TV", "show", [self.show], episodes=[self.episode])
+        self.music = FakeSection("Music", "artist", [])
+
+    def test_imdb_export_uses_import_columns_and_guid_ids(self):
+        exporter = RatingsExporter(
+            [self.movies, self.movies_4k, self.shows, self.music], "IMDb", include_episodes=True
+        )
+        chunks = list(exporter.iter_csv(chunk_rows=1))
+
+        self.assertEqual(detect_source(chunks[0].splitlines()[0].split(",")), "IMDb")
+        self.assertGreater(len(chunks), 2)
+        rows = _rows("".join(chunks))
+        self.assertEqual(list(rows[0]), list(EXPORT_COLUMNS["IMDb"]))
+        self.assertEqual(
+            [(row["Const"], row["Your Rating"], row["Title Type"], row["Date Rated"]) for row in rows],
+            [
+                ("tt0113277", "7", "Movie", "2024-05-01"),
+                ("tt0306414", "9", "TV Series", "2024-05-01"),
+                ("tt0749451", "8", "TV Episode", "2024-05-01"),
+            ],
+        )
+        self.assertEqual(
+            {key: exporter.stats[key] for key in ("sections", "exported", "missing_imdb_id", "duplicates")},
+            {"sections": 3, "exported": 3, "missing_imdb_id": 1, "duplicates": 1},
+        )
+        self.assertEqual(self.shows.requests, [(None, 0), ("episode", 0)])
+
+    def test_letterboxd_export_is_movies_in_half_stars(self):
+        exporter = RatingsExporter([self.movies, self.shows], "Letterboxd")
+        rows = _rows("".join(exporter.iter_csv()))
+
+        self.assertEqual(detect_source(list(rows[0])), "Letterboxd")
+        self.assertEqual(
+            [(row["Name"], row["Year"], row["Rating"]) for row in rows],
+            [("Heat", "1995", "3.5"), ("Home Video", "2010", "3")],
+        )
+
+    def test_exported_csv_imports_back_as_unchanged(self):
+        temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
+        self.addCleanup(temp_dir.cleanup)
+        path = os.path.join(temp_dir.name, "export.csv")
+        with open(path, "w", encoding="utf-8", newline="") as csv_file:
+            csv_file.writelines(RatingsExporter([self.movies], "IMDb").iter_csv())
+
+        pipeline = RatingsImportPipeline(FakeServer([self.movies]))
+        plan = pipeline.build_plan(
+            path, "Movies", ImportOptions(source="IMDb", selected_media_types=frozenset({"Movie"}))
+        )
+
+        self.assertEqual([item.status for item in plan.items], ["unchanged"])
+
+
+class ExportEndpointTests(unittest.TestCase):
+    def setUp(self):
+        self.section = FakeSection("Movies", "movie", [FakeItem(1, "Heat", 1995, 8.0, imdb="tt0113277")])
+        self.previous_controller = web.controller
+        self.previous_config = {key: web.app.config.get(key) for key in ("TESTING", "REQUIRE_AUTH")}
+        web.controller = SimpleNamespace(plex_connection=SimpleNamespace(server=FakeServer([self.section])))
+        web.app.config.update(TESTING=True, REQUIRE_AUTH=False)
+        self.client = web.app.test_client()
+
+    def tearDown(self):
+        web.controller = self.previous_controller
+        web.app.config.update(self.previous_config)
+        while True:
+            try:
+                web.log_queue.get_nowait()
+            except queue.Empty:
+                break
+
+    def test_export_is_streamed_as_a_csv_download(self):
+        response = self.client.get("/api/export-ratings?format=IMDb&library=Movies")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertIn("attachment", response.headers["Content-Disposition"])
+        self.assertEqual([row["Const"] for row in _rows(response.get_data(as_text=True))], ["tt0113277"])
+
+    def test_plex_errors_abort_the_download_instead_of_ending_it(self):
+        def unreachable(**kwargs):
+            raise ConnectionError("connection reset")
+
+        self.section.search = unreachable
+
+        with self.assertRaises(ImportPipelineError):
+            self.client.get("/api/export-ratings?format=IMDb&library=Movies").get_data()
+        self.assertIn("Export error", web.log_queue.get_nowait()["data"])
+
+    def test_bad_requests_are_refused_before_streaming(self):
+        self.assertEqual(self.client.get("/api/export-ratings?format=Trakt&library=Movies").status_code, 400)
+        self.assertEqual(self.client.get("/api/export-ratings?format=IMDb").status_code, 400)
+        self.assertEqual(self.client.get("/api/export-ratings?library=Nope").status_code, 404)
+
+
+class ExportCliTests(unittest.TestCase):
+    def test_export_writes_the_file_and_a_json_summary(self):
+        temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
+        self.addCleanup(temp_dir.cleanup)
+        output = os.path.join(temp_dir.name, "ratings.csv")
+        parser = argparse.ArgumentParser()
+        add_export_arguments(parser)
+        args = parser.parse_args([
+            "--token", "t", "--baseurl", "http://plex", "--all-libraries",
+            "--format", "Letterboxd", "--output", output,
+        ])
+        section = FakeSection("Movies", "movie", [FakeItem(1, "Heat", 1995, 10.0)])
+        out = io.StringIO()
+
+        code = run_export(args, connect=lambda *_args, **_kwargs: FakeServer([section]), out=out)
+
+        self.assertEqual(code, 0)
+        self.assertEqual(json.loads(out.getvalue())["stats"]["exported"], 1)
+        with open(output, encoding="utf-8", newline="") as csv_file:
+            self.assertEqual(list(csv.DictReader(csv_file))[0]["Rating"], "5")
+        self.assertEqual(os.listdir(temp_dir.name), ["ratings.csv"])
+
+
+if __name__ == "__main__":
+    unittest.main()
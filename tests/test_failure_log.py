@@ -0,0 +1,141 @@
+import csv
+import json
+import os
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import RatingsToPlexRatingsWeb as web
+from PlexWriteExecutor import PlexWriteExecutor
+from RatingsFailureLog import LETTERBOXD_FAILURE_COLUMNS, FailureLog
+from RatingsImportPipeline import ImportOptions, ImportPlan, ParsedRow, PlanItem, RatingsImportPipeline
+
+
+class Interrupted(BaseException):
+    """Stands in for the process dying mid-run."""
+
+
+class FakeItem:
+    ratingKey = 1
+    title = "Crashes"
+
+    def rate(self, rating):
+        raise Interrupted()
+
+
+def _plan_item(title, status, plex_item=None):
+    return PlanItem(
+        parsed=ParsedRow(
+            source="IMDb", raw={}, title=title, year="2001", rating_text="8",
+            external_id="tt1", title_type="Movie",
+        ),
+        status=status,
+        matched=plex_item is not None,
+        new_rating=8.0,
+        current_rating=None,
+        title=title,
+        year="2001",
+        thumb=None,
+        plex_item=plex_item,
+    )
+
+
+class FailureLogTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
+        self.base = os.path.join(self.temp_dir.name, "run")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_columns_are_fixed_and_both_files_are_written_per_record(self):
+        log = FailureLog(self.base, columns=LETTERBOXD_FAILURE_COLUMNS)
+        self.assertEqual(log.snapshot("csv"), (None, 0))
+        self.assertFalse(os.path.exists(log.csv_path))
+
+        log.append({"YourRating": "3", "Reason": "Not Found", "Year": "2001", "Title": "Amélie"})
+        log.append({"Title": "Heat", "Reason": "Invalid Rating", "Year": "1995", "YourRating": "0"})
+
+        with open(log.csv_path, encoding="utf-8", newline="") as csv_file:
+            rows = list(csv.reader(csv_file))
+        self.assertEqual(rows[0], list(LETTERBOXD_FAILURE_COLUMNS))
+        self.assertEqual(rows[1], ["Amélie", "2001", "Not Found", "3"])
+        self.assertEqual([record["Title"] for record in log], ["Amélie", "Heat"])
+        path, size = log.snapshot("jsonl")
+        self.assertEqual((path, size), (log.jsonl_path, os.path.getsize(log.jsonl_path)))
+        log.close()
+        self.assertEqual(len(log), 2)
+
+    def test_failures_before_a_crash_are_already_on_disk(self):
+        log = FailureLog(self.base)
+        plan = ImportPlan(
+            source="IMDb",
+            items=[_plan_item("Missing", "not_found"), _plan_item("Crashes", "will_update", FakeItem())],
+            total_rows=2,
+            options=ImportOptions(source="IMDb", selected_media_types=frozenset({"Movie"})),
+        )
+        pipeline = RatingsImportPipeline(
+            SimpleNamespace(),
+            executor=PlexWriteExecutor(max_workers=1, initial_workers=1, sleep=lambda _delay: None),
+        )
+
+        with self.assertRaises(Interrupted):
+            pipeline.apply(plan, failure_log=log)
+
+        with open(log.jsonl_path, encoding="utf-8") as jsonl_file:
+            records = [json.loads(line) for line in jsonl_file]
+        self.assertEqual([(record["Title"], record["IMDbID"]) for record in records], [("Missing", "tt1")])
+        log.close()
+
+
+class FailureDownloadTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
+        self.previous_jobs = web.jobs
+        self.previous_config = {key: web.app.config.get(key) for key in ("TESTING", "REQUIRE_AUTH")}
+        web.jobs = web.JobManager(max_workers=2)
+        web.app.config.update(TESTING=True, REQUIRE_AUTH=False)
+        self.failure_dir = patch.object(web, "FAILURE_DIR", self.temp_dir.name)
+        self.failure_dir.start()
+        self.client = web.app.test_client()
+
+    def tearDown(self):
+        self.failure_dir.stop()
+        web.jobs.wait_idle(timeout=10)
+        web.jobs = self.previous_jobs
+        web.app.config.update(self.previous_config)
+        self.temp_dir.cleanup()
+
+    def test_failures_download_while_the_job_is_still_running(self):
+        recorded = threading.Event()
+        release = threading.Event()
+
+        def _job(job):
+            log = web._failure_log(job.job_id, "IMDb")
+            log.append({"Title": "Missing", "Year": "2001", "Reason": "Not Found"})
+            recorded.set()
+            release.wait(10)
+            log.close()
+
+        job = web.jobs.submit("update", _job)
+        self.assertTrue(recorded.wait(10))
+        try:
+            response = self.client.get(f"/api/jobs/{job.job_id}/failures")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers["X-Job-Status"], "running")
+            self.assertEqual(
+                response.get_data(as_text=True).splitlines(),
+                ["Title,Year,IMDbID,Reason,YourRating,TitleType", "Missing,2001,,Not Found,,"],
+            )
+            jsonl = self.client.get(f"/api/jobs/{job.job_id}/failures?format=jsonl")
+            self.assertEqual(json.loads(jsonl.get_data(as_text=True))["Reason"], "Not Found")
+            self.assertEqual(self.client.get(f"/api/jobs/{job.job_id}/failures?format=xml").status_code, 400)
+        finally:
+            release.set()
+        self.assertEqual(self.client.get("/api/jobs/missing/failures").status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
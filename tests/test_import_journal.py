@@ -0,0 +1,276 @@
+import json
+import os
+import queue
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import RatingsToPlexRatingsWeb as web
+from PlexWriteExecutor import PlexWriteExecutor
+from RatingsImportJournal import ImportJournal, JournalEntry, JournalError, JournalStore, read_journal
+from RatingsImportPipeline import ImportOptions, ImportPlan, ParsedRow, PlanItem, RatingsImportPipeline
+
+
+class Interrupted(BaseException):
+    """Stands in for the process dying mid-run."""
+
+
+class FakeItem:
+    def __init__(self, rating_key, title, fail=False):
+        self.ratingKey = rating_key
+        self.title = title
+        self.fail = fail
+        self.rate_calls = []
+
+    def rate(self, rating):
+        if self.fail:
+            raise Interrupted()
+        self.rate_calls.append(rating)
+
+
+class FakeServer:
+    machineIdentifier = "home"
+    friendlyName = "Home"
+
+    def __init__(self):
+        self._session = SimpleNamespace(put="PUT")
+        self.queries = []
+        self.view_counts = {}
+
+    def query(self, path, method=None):
+        self.queries.append(path)
+
+    def fetchItems(self, keys):
+        return [SimpleNamespace(ratingKey=key, viewCount=self.view_counts.get(key, 0)) for key in keys]
+
+
+def _plan(items, mark_watched=False):
+    options = ImportOptions(
+        source="IMDb", selected_media_types=frozenset({"Movie"}), mark_watched=mark_watched
+    )
+    plan_items = [
+        PlanItem(
+            parsed=ParsedRow(source="IMDb", raw={}, title=item.title, year="2001", rating_text="8"),
+            status="will_update",
+            matched=True,
+            new_rating=8.0,
+            current_rating=None,
+            title=item.title,
+            year="2001",
+            thumb=None,
+            plex_item=item,
+        )
+        for item in items
+    ]
+    return ImportPlan(source="IMDb", items=plan_items, total_rows=len(plan_items), options=options)
+
+
+def _serial_executor():
+    return PlexWriteExecutor(max_workers=1, initial_workers=1, sleep=lambda _delay: None)
+
+
+class ImportJournalTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
+        self.store = JournalStore(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_outcomes_are_synced_in_batches(self):
+        journal = ImportJournal(
+            os.path.join(self.temp_dir.name, "run.jsonl"), sync_every=3, clock=lambda: 0.0
+        )
+        entries = [JournalEntry(index, str(index), 8.0) for index in range(7)]
+        journal.begin({"source": "IMDb"}, entries)
+        for entry in entries:
+            journal.record(entry.index, ValueError("boom") if entry.index == 6 else None)
+        journal.close()
+
+        # One sync for the plan, two full batches of outcomes and one on close.
+        self.assertEqual(journal.syncs, 4)
+        state = read_journal(journal.path)
+        self.assertTrue(state.complete)
+        self.assertEqual(state.done, set(range(6)))
+        self.assertEqual(state.failed, {6: "boom"})
+        self.assertEqual([entry.index for entry in state.remaining], [6])
+
+    def test_torn_final_line_is_ignored_but_corruption_is_not(self):
+        journal = self.store.create({"library": "Movies"})
+        journal.begin({"source": "IMDb"}, [JournalEntry(0, "1", 8.0), JournalEntry(1, "2", 6.0)])
+        journal.record(0)
+        journal.close(complete=False)
+        with open(journal.path, "a", encoding="utf-8") as journal_file:
+            journal_file.write('{"type":"done","i":')
+
+        state = read_journal(journal.path)
+        self.assertFalse(state.complete)
+        self.assertEqual(state.done, {0})
+        self.assertEqual(state.details["library"], "Movies")
+
+        with open(journal.path, "a", encoding="utf-8") as journal_file:
+            journal_file.write('\n{"type":"end"}\n')
+        with self.assertRaises(JournalError):
+            read_journal(journal.path)
+
+    def test_store_lists_only_resumable_runs_and_rejects_odd_ids(self):
+        unfinished = self.store.create()
+        unfinished.begin({}, [JournalEntry(0, "1", 8.0)])
+        unfinished.close(complete=False)
+        finished = self.store.create()
+        finished.begin({}, [JournalEntry(0, "1", 8.0)])
+        finished.close()
+
+        self.assertEqual([state.run_id for state in self.store.list()], [unfinished.run_id])
+        self.assertEqual(len(self.store.list(include_complete=True)), 2)
+        self.assertIsNone(self.store.get("../" + unfinished.run_id))
+
+
+class ResumeTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
+        self.server = FakeServer()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _interrupted_run(self):
+        items = [FakeItem(1, "One"), FakeItem(2, "Two"), FakeItem(3, "Three", fail=True), FakeItem(4, "Four")]
+        journal = JournalStore(self.temp_dir.name).create()
+        pipeline = RatingsImportPipeline(self.server, executor=_serial_executor())
+        with self.assertRaises(Interrupted):
+            pipeline.apply(_plan(items, mark_watched=True), journal=journal)
+        return items, journal
+
+    def test_interrupted_apply_leaves_a_resumable_journal(self):
+        items, journal = self._interrupted_run()
+
+        state = read_journal(journal.path)
+        self.assertFalse(state.complete)
+        self.assertEqual(state.done, {0, 1})
+        self.assertEqual(state.details["server"], "home")
+        self.assertTrue(state.details["markWatched"])
+        self.assertEqual([entry.rating_key for entry in state.remaining], ["3", "4"])
+
+    def test_resume_writes_only_what_is_left(self):
+        _items, journal = self._interrupted_run()
+        logs = []
+
+        pipeline = RatingsImportPipeline(self.server, log=logs.append, executor=_serial_executor())
+        result = pipeline.resume(read_journal(journal.path), ImportJournal(journal.path))
+
+        self.assertTrue(result.success)
+        self.assertEqual((result.stats["already_done"], result.stats["updated"]), (2, 2))
+        self.assertEqual(self.server.queries, [
+            "/:/rate?key=3&identifier=com.plexapp.plugins.library&rating=8.0",
+            "/:/rate?key=4&identifier=com.plexapp.plugins.library&rating=8.0",
+            "/:/scrobble?key=3&identifier=com.plexapp.plugins.library",
+            "/:/scrobble?key=4&identifier=com.plexapp.plugins.library",
+        ])
+        self.assertEqual(result.stats["watched_marked"], 2)
+        self.assertIn("2 remaining", logs[0])
+        state = read_journal(journal.path)
+        self.assertTrue(state.complete)
+        self.assertEqual(state.remaining, [])
+
+    def test_resume_does_not_scrobble_items_that_were_already_watched(self):
+        _items, journal = self._interrupted_run()
+        self.server.view_counts = {3: 2}
+
+        pipeline = RatingsImportPipeline(self.server, executor=_serial_executor())
+        result = pipeline.resume(read_journal(journal.path), ImportJournal(journal.path))
+
+        self.assertEqual(
+            [path for path in self.server.queries if path.startswith("/:/scrobble")],
+            ["/:/scrobble?key=4&identifier=com.plexapp.plugins.library"],
+        )
+        self.assertEqual((result.stats["watched_marked"], result.stats["watched_skipped"]), (1, 1))
+
+    def test_runs_without_writes_leave_no_journal(self):
+        journal = JournalStore(self.temp_dir.name).create()
+        RatingsImportPipeline(self.server).apply(_plan([]), journal=journal)
+
+        self.assertFalse(journal.started)
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+
+
+class ResumeEndpointTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
+        self.server = FakeServer()
+        self.previous_controller = web.controller
+        self.previous_jobs = web.jobs
+        self.previous_config = {
+            key: web.app.config.get(key) for key in ("TESTING", "REQUIRE_AUTH", "CSRF_TOKEN")
+        }
+        web.controller = SimpleNamespace(plex_connection=SimpleNamespace(server=self.server))
+        web.jobs = web.JobManager(max_workers=2)
+        web.app.config.update(TESTING=True, REQUIRE_AUTH=False, CSRF_TOKEN="test-csrf-token")
+        self.journal_dir = patch.object(web, "JOURNAL_DIR", self.temp_dir.name)
+        self.journal_dir.start()
+        self.client = web.app.test_client()
+        self._drain_log_queue()
+
+    def tearDown(self):
+        self.journal_dir.stop()
+        web.controller = self.previous_controller
+        web.jobs = self.previous_jobs
+        web.app.config.update(self.previous_config)
+        self._drain_log_queue()
+        self.temp_dir.cleanup()
+
+    def _drain_log_queue(self):
+        events = []
+        while True:
+            try:
+                events.append(web.log_queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def _journal(self, server="home", user=None):
+        journal = web._journal_store().create({"library": "Movies", "user": user})
+        journal.begin(
+            {"source": "IMDb", "server": server, "serverName": "Elsewhere"},
+            [JournalEntry(0, "1", 8.0, "One"), JournalEntry(1, "2", 6.0, "Two")],
+        )
+        journal.record(0)
+        journal.close(complete=False)
+        return journal
+
+    def _resume(self, run_id):
+        return self.client.post(
+            f"/api/import-journals/{run_id}/resume", headers={"X-CSRF-Token": "test-csrf-token"}
+        )
+
+    def test_interrupted_runs_are_listed_and_resumed(self):
+        journal = self._journal()
+
+        listed = self.client.get("/api/import-journals").get_json()["journals"]
+        self.assertEqual(len(listed), 1)
+        self.assertEqual((listed[0]["runId"], listed[0]["remaining"]), (journal.run_id, 1))
+
+        response = self._resume(journal.run_id)
+        self.assertEqual(response.status_code, 200)
+        job = web.jobs.get(response.get_json()["jobId"])
+        self.assertTrue(job.wait(timeout=10))
+        self.assertEqual(job.kind, "resume")
+        self.assertEqual(job.result["stats"]["updated"], 1)
+        self.assertEqual(self.server.queries, ["/:/rate?key=2&identifier=com.plexapp.plugins.library&rating=6.0"])
+        completions = [
+            json.loads(event["data"])
+            for event in self._drain_log_queue()
+            if event["type"] == "update_complete"
+        ]
+        self.assertEqual(completions[0]["stats"]["operation"], "resume")
+        self.assertEqual(self.client.get("/api/import-journals").get_json()["journals"], [])
+
+    def test_resume_is_refused_for_another_server_or_user(self):
+        self.assertEqual(self._resume(self._journal(server="cabin").run_id).status_code, 409)
+        self.assertEqual(self._resume(self._journal(user="kid").run_id).status_code, 400)
+        self.assertEqual(self._resume("0" * 32).status_code, 404)
+        self.assertEqual(self.server.queries, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,14 +1,21 @@
 import os
 import tempfile
+import threading
 import unittest
 from types import SimpleNamespace
 from unittest.mock import patch
 
 import RatingsToPlexRatingsWeb as web
+from RatingsFailureLog import FailureLog
 from RatingsImportPipeline import (
+    CONFLICT_RECENT,
     ImportOptions,
+    ImportSource,
     ImportPipelineError,
+    LibraryIndexCache,
     RatingsImportPipeline,
+    iter_episodes,
+    user_ratings,
 )
 from RatingsToPlexRatingsController import RatingsToPlexRatingsController
 
@@ -57,6 +64,17 @@ class FakeSection:
         return list(self.items)
 
 
+class FakeShowSection(FakeSection):
+    def __init__(self, title, shows, episodes):
+        super().__init__(title, "show", shows)
+        self.episodes = episodes
+        self.episode_requests = []
+
+    def search(self, libtype=None, container_start=0, container_size=None, maxresults=None, includeGuids=False):
+        self.episode_requests.append((libtype, container_start, includeGuids))
+        return self.episodes[container_start:container_start + container_size]
+
+
 class FakeLibrary:
     def __init__(self, sections):
         self._sections = sections
@@ -207,6 +225,72 @@ class ImportPipelineTests(unittest.TestCase):
         self.assertEqual(item.rate_calls, [])
         self.assertEqual(item.watched_calls, 0)
 
+    def test_verification_rereads_written_items_in_one_bulk_request(self):
+        stored = FakeItem("imdb://tt1", "Stored", 2001, user_rating=5)
+        dropped = FakeItem("imdb://tt2", "Dropped", 2002, user_rating=5)
+        stored.ratingKey, dropped.ratingKey = 1, 2
+        dropped.rate = lambda rating: dropped.rate_calls.append(rating)
+        section = FakeSection("Movies", "movie", [stored, dropped])
+        fetch_batches = []
+
+        def fetch_items(keys):
+            fetch_batches.append(list(keys))
+            return [item for item in (stored, dropped) if item.ratingKey in keys]
+
+        server = SimpleNamespace(library=FakeLibrary([section]), fetchItems=fetch_items)
+        filepath = self._write_csv(
+            "verify.csv",
+            "Const,Title,Title Type,Your Rating,Year\n"
+            "tt1,Stored,Movie,9,2001\n"
+            "tt2,Dropped,Movie,9,2002\n",
+        )
+        options = ImportOptions(source="IMDb", selected_media_types=frozenset({"Movie"}), verify=True)
+        pipeline = RatingsImportPipeline(server)
+
+        result = pipeline.apply(pipeline.build_plan(filepath, "Movies", options))
+
+        self.assertEqual(fetch_batches, [[1, 2]])
+        self.assertEqual(result.stats["updated"], 2)
+        self.assertEqual(result.stats["verify_mismatch"], 1)
+        self.assertEqual(result.stats["verification"]["requests"], 1)
+        (failure,) = result.failures
+        self.assertEqual(failure["Title"], "Dropped")
+        self.assertEqual(failure["Reason"], "Verification failed: Plex has 5.0, expected 9.0")
+
+    def test_mark_watched_is_a_separate_phase_that_skips_watched_items(self):
+        seen = FakeItem("imdb://tt1", "Seen", 2001)
+        fresh = FakeItem("imdb://tt2", "Fresh", 2002)
+        broken = FakeItem("imdb://tt3", "Broken", 2003)
+        seen.viewCount, fresh.viewCount, broken.viewCount = 3, 0, 0
+        order = []
+        for item in (seen, fresh, broken):
+            item.rate = lambda rating, item=item: order.append(("rate", item.title))
+        fresh.markWatched = lambda: order.append(("watch", "Fresh"))
+
+        def fail_to_mark():
+            raise RuntimeError("(500) internal_server_error")
+
+        broken.markWatched = fail_to_mark
+        section = FakeSection("Movies", "movie", [seen, fresh, broken])
+        filepath = self._write_csv(
+            "watched.csv",
+            "Const,Title,Title Type,Your Rating,Year\n"
+            "tt1,Seen,Movie,9,2001\n"
+            "tt2,Fresh,Movie,9,2002\n"
+            "tt3,Broken,Movie,9,2003\n",
+        )
+        pipeline = RatingsImportPipeline(self._server(section))
+
+        result = pipeline.apply(pipeline.build_plan(filepath, "Movies", self._options(watched=True)))
+
+        self.assertEqual([step for step, _title in order], ["rate", "rate", "rate", "watch"])
+        self.assertEqual(result.stats["updated"], 3)
+        self.assertEqual(result.stats["rate_failed"], 0)
+        self.assertEqual(
+            (result.stats["watched_marked"], result.stats["watched_skipped"], result.stats["watch_failed"]),
+            (1, 1, 1),
+        )
+
     def test_preview_limit_does_not_change_total_csv_row_count(self):
         items = [FakeItem(f"imdb://tt{i}", f"Movie {i}", 2000 + i) for i in range(3)]
         section = FakeSection("Movies", "movie", items)
@@ -243,6 +327,128 @@ class ImportPipelineTests(unittest.TestCase):
                 self._options(),
             )
 
+    def _merge_inputs(self):
+        imdb = self._write_csv(
+            "imdb.csv",
+            "Const,Title,Title Type,Your Rating,Year,Date Rated\n"
+            "tt1,Heat,Movie,6,1995,2020-01-01\n"
+            "tt2,Alien,Movie,9,1979,2020-01-01\n",
+        )
+        letterboxd = self._write_csv(
+            "letterboxd.csv",
+            "Date,Name,Year,Letterboxd URI,Rating\n"
+            "2024-05-01,Heat,1995,x,4\n",
+        )
+        return [ImportSource(imdb, "IMDb"), ImportSource(letterboxd, "Letterboxd")]
+
+    def _merge_server(self):
+        self.heat = FakeItem("imdb://tt1", "Heat", 1995)
+        self.alien = FakeItem("imdb://tt2", "Alien", 1979)
+        self.section = FakeSection("Movies", "movie", [self.heat, self.alien])
+        return self._server(self.section)
+
+    def test_merged_sources_write_each_item_once_by_priority(self):
+        pipeline = RatingsImportPipeline(self._merge_server())
+
+        plan = pipeline.build_merged_plan(self._merge_inputs(), "Movies", self._options())
+        result = pipeline.apply(plan)
+
+        self.assertEqual(plan.source, "IMDb+Letterboxd")
+        self.assertEqual(plan.total_rows, 3)
+        self.assertEqual([item.status for item in plan.items], ["will_update", "will_update", "superseded"])
+        self.assertEqual(plan.items[2].to_preview_dict()["source"], "Letterboxd")
+        self.assertEqual(self.heat.rate_calls, [6.0])
+        self.assertEqual(self.alien.rate_calls, [9.0])
+        self.assertEqual((result.stats["updated"], result.stats["superseded"]), (2, 1))
+        self.assertEqual(result.failures, [])
+        self.assertEqual(self.section.scan_count, 1)
+
+    def test_recency_rule_keeps_the_latest_rating(self):
+        pipeline = RatingsImportPipeline(self._merge_server())
+
+        plan = pipeline.build_merged_plan(
+            self._merge_inputs(), "Movies", self._options(), conflict_rule=CONFLICT_RECENT
+        )
+        pipeline.apply(plan)
+
+        self.assertEqual(plan.items[0].status, "superseded")
+        self.assertIn("Letterboxd rating 8", plan.items[0].reason)
+        self.assertEqual(self.heat.rate_calls, [8.0])
+
+    def test_unknown_conflict_rule_is_rejected(self):
+        pipeline = RatingsImportPipeline(self._merge_server())
+
+        with self.assertRaises(ImportPipelineError):
+            pipeline.build_merged_plan(self._merge_inputs(), "Movies", self._options(), conflict_rule="loudest")
+
+    def _episode_library(self):
+        self.show = FakeItem("imdb://tt100", "Severance", 2022, media_type="show")
+        self.episode = FakeItem("imdb://tt200", "Good News About Hell", 2022, media_type="episode")
+        self.episode.guids = [SimpleNamespace(id="tmdb://1")]
+        self.shows = FakeShowSection("TV Shows", [self.show], [self.episode])
+        return self._server(self.shows)
+
+    def test_episode_rows_match_through_a_bulk_episode_index(self):
+        filepath = self._write_csv(
+            "episodes.csv",
+            "Const,Title,Title Type,Your Rating,Year\n"
+            "tt100,Severance,TV Series,9,2022\n"
+            "tt200,Good News About Hell,TV Episode,8,2022\n",
+        )
+        pipeline = RatingsImportPipeline(self._episode_library())
+        options = self._options(media_types=frozenset({"TV Series", "TV Episode"}))
+
+        plan = pipeline.build_plan(filepath, "TV Shows", options)
+        pipeline.apply(plan)
+
+        self.assertEqual([item.status for item in plan.items], ["will_update", "will_update"])
+        self.assertEqual(self.show.rate_calls, [9.0])
+        self.assertEqual(self.episode.rate_calls, [8.0])
+        self.assertEqual(self.shows.episode_requests, [("episode", 0, True)])
+
+    def test_episode_index_is_skipped_without_episode_rows(self):
+        filepath = self._write_csv(
+            "shows.csv",
+            "Const,Title,Title Type,Your Rating,Year\n"
+            "tt100,Severance,TV Series,9,2022\n",
+        )
+        cache = LibraryIndexCache()
+        server = self._episode_library()
+        pipeline = RatingsImportPipeline(server, index_cache=cache)
+
+        pipeline.build_plan(filepath, "TV Shows", self._options(media_types=frozenset({"TV Series"})))
+
+        self.assertEqual(self.shows.episode_requests, [])
+        self.assertFalse(cache.peek(server, [self.shows]).includes_episodes)
+
+    def test_user_ratings_include_rated_episodes_when_asked(self):
+        show = FakeItem("plex://show/1", "Severance", 2022, media_type="show", user_rating=9)
+        episode = FakeItem("plex://episode/2", "Good News About Hell", 2022, media_type="episode", user_rating=8)
+        requested = []
+
+        def search(filters=None, container_start=0, container_size=None, maxresults=None, libtype=None):
+            requested.append(libtype)
+            return [episode] if libtype == "episode" else [show]
+
+        user_section = SimpleNamespace(search=search)
+        server = SimpleNamespace(library=SimpleNamespace(sectionByID=lambda key: user_section))
+        sections = [SimpleNamespace(key="2", type="show")]
+
+        self.assertEqual(user_ratings(server, sections), {"plex://show/1": 9.0})
+        self.assertEqual(
+            user_ratings(server, sections, include_episodes=True),
+            {"plex://show/1": 9.0, "plex://episode/2": 8.0},
+        )
+        self.assertEqual(requested, [None, None, "episode"])
+
+    def test_episode_pages_are_fetched_until_a_short_page(self):
+        section = FakeShowSection("TV Shows", [], [FakeItem(f"imdb://tt{n}", "E", 2022) for n in range(5)])
+
+        episodes = list(iter_episodes(section, page_size=2))
+
+        self.assertEqual(len(episodes), 5)
+        self.assertEqual([start for _, start, _ in section.episode_requests], [0, 2, 4])
+
     def test_preview_and_update_have_identical_planned_write_set(self):
         update_item = FakeItem("imdb://tt1", "Update", 2001, user_rating=5)
         unchanged_item = FakeItem("imdb://tt2", "Unchanged", 2002, user_rating=7)
@@ -269,14 +475,14 @@ class ImportPipelineTests(unittest.TestCase):
             "-ALLLIBS-": False,
         }
         previous_controller = web.controller
-        previous_path = web.uploaded_csv_path
         previous_config = {
             "TESTING": web.app.config.get("TESTING"),
             "REQUIRE_AUTH": web.app.config.get("REQUIRE_AUTH"),
             "CSRF_TOKEN": web.app.config.get("CSRF_TOKEN"),
         }
         web.controller = controller
-        web.uploaded_csv_path = filepath
+        previous_store = web.configure_state_store(web.MemoryStateStore())
+        web._set_current_upload(filepath, 0)
         web.app.config.update(TESTING=True, REQUIRE_AUTH=False, CSRF_TOKEN="test-csrf-token")
 
         try:
@@ -293,12 +499,16 @@ class ImportPipelineTests(unittest.TestCase):
 
             with (
                 patch.object(controller, "log_message"),
-                patch.object(controller, "_export_failures_if_any"),
+                patch.object(
+                    controller,
+                    "_failure_log",
+                    return_value=FailureLog(os.path.join(self.temp_dir.name, "failures")),
+                ),
             ):
                 self.assertTrue(controller.update_ratings(filepath, "Movies", values))
         finally:
             web.controller = previous_controller
-            web.uploaded_csv_path = previous_path
+            web.configure_state_store(previous_store)
             web.app.config.update(previous_config)
 
         written_titles = {
@@ -306,6 +516,122 @@ class ImportPipelineTests(unittest.TestCase):
         }
         self.assertEqual(planned_titles, written_titles)
         self.assertEqual(planned_titles, {"Update"})
+        # The update reused the index built for the preview.
+        self.assertEqual(section.scan_count, 1)
+        self.assertIsNone(controller.library_indexes.peek(server, [section]))
+
+    def test_failed_update_drops_the_index_and_raises_auth_errors(self):
+        class Unauthorized(Exception):
+            pass
+
+        section = FakeSection("Movies", "movie", [FakeItem("imdb://tt1", "Update", 2001, user_rating=5)])
+        server = self._server(section)
+        filepath = self._write_csv(
+            "failing.csv",
+            "Const,Title,Title Type,Your Rating,Year\ntt1,Update,Movie,8,2001\n",
+        )
+        controller = RatingsToPlexRatingsController()
+        controller.plex_connection = SimpleNamespace(server=server)
+        values = {
+            "-IMDB-": True, "-LETTERBOXD-": False, "-MOVIE-": True, "-TVSERIES-": False,
+            "-TVMINISERIES-": False, "-TVMOVIE-": False, "-WATCHED-": False,
+            "-FORCEOVERWRITE-": False, "-DRYRUN-": False, "-ALLLIBS-": False,
+        }
+        failure_log = FailureLog(os.path.join(self.temp_dir.name, "failures"))
+
+        for error, raised in ((OSError("journal disk full"), False), (Unauthorized("(401) unauthorized"), True)):
+            with self.subTest(error=type(error).__name__):
+                controller.build_import_plan(filepath, "Movies", values)
+                self.assertIsNotNone(controller.library_indexes.peek(server, [section]))
+                with (
+                    patch.object(controller, "log_message"),
+                    patch.object(RatingsImportPipeline, "apply", side_effect=error),
+                ):
+                    if raised:
+                        with self.assertRaises(Unauthorized):
+                            controller.update_ratings(filepath, "Movies", values, failure_log=failure_log)
+                    else:
+                        self.assertFalse(
+                            controller.update_ratings(filepath, "Movies", values, failure_log=failure_log)
+                        )
+                self.assertIsNone(controller.library_indexes.peek(server, [section]))
+
+
+class LibraryIndexCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.cache = LibraryIndexCache(ttl=60, clock=lambda: self.now)
+        self.section = FakeSection("Movies", "movie", [FakeItem("imdb://tt1", "Heat", 1995)])
+        self.server = SimpleNamespace(machineIdentifier="abc", library=FakeLibrary([self.section]))
+
+    def test_index_is_reused_until_it_expires(self):
+        first = self.cache.get_or_build(self.server, [self.section])
+        self.now = 59
+        self.assertIs(self.cache.get_or_build(self.server, [self.section]), first)
+        self.assertEqual(self.section.scan_count, 1)
+
+        self.now = 60
+        self.assertIsNone(self.cache.peek(self.server, [self.section]))
+        self.cache.get_or_build(self.server, [self.section])
+        self.assertEqual(self.section.scan_count, 2)
+
+    def test_invalidate_drops_only_that_servers_indexes(self):
+        other_section = FakeSection("Movies", "movie", [])
+        other = SimpleNamespace(machineIdentifier="xyz", library=FakeLibrary([other_section]))
+        self.cache.get_or_build(self.server, [self.section])
+        self.cache.get_or_build(other, [other_section])
+
+        self.cache.invalidate(self.server)
+
+        self.assertIsNone(self.cache.peek(self.server, [self.section]))
+        self.assertIsNotNone(self.cache.peek(other, [other_section]))
+
+    def test_concurrent_requests_share_one_scan(self):
+        release = threading.Event()
+        scanning = threading.Event()
+        original_all = self.section.all
+
+        def slow_all():
+            scanning.set()
+            release.wait(5)
+            return original_all()
+
+        self.section.all = slow_all
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.cache.get_or_build(self.server, [self.section])))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        scanning.wait(5)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(self.section.scan_count, 1)
+        self.assertEqual(len({id(index) for index in results}), 1)
+
+    def test_index_with_episodes_serves_plain_lookups(self):
+        with_episodes = self.cache.get_or_build(self.server, [self.section], include_episodes=True)
+
+        self.assertIs(self.cache.get_or_build(self.server, [self.section]), with_episodes)
+        self.assertEqual(self.section.scan_count, 1)
+        self.cache.invalidate(self.server)
+        self.assertIsNone(self.cache.peek(self.server, [self.section]))
+
+    def test_build_interrupted_by_a_write_is_not_cached(self):
+        original_all = self.section.all
+
+        def all_then_write():
+            items = original_all()
+            self.cache.invalidate(self.server)
+            return items
+
+        self.section.all = all_then_write
+        self.cache.get_or_build(self.server, [self.section])
+
+        self.assertIsNone(self.cache.peek(self.server, [self.section]))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,94 @@
+import threading
+import unittest
+
+from RatingsJobManager import JOB_FAILED, JOB_QUEUED, JOB_SUCCEEDED, JobManager
+from RatingsStateStore import MemoryStateStore, StoreLeases
+
+
+class JobManagerTests(unittest.TestCase):
+    def setUp(self):
+        self.jobs = JobManager(max_workers=3)
+
+    def tearDown(self):
+        self.assertTrue(self.jobs.wait_idle(timeout=10))
+
+    def test_exclusive_jobs_for_one_server_are_queued_in_order(self):
+        release = threading.Event()
+        order = []
+
+        def blocking(job):
+            order.append(job.kind)
+            release.wait(10)
+
+        first = self.jobs.submit("update", blocking, server_id="a")
+        second = self.jobs.submit("clear", lambda job: order.append(job.kind), server_id="a")
+
+        self.assertEqual(second.status, JOB_QUEUED)
+        self.assertEqual(
+            {job.job_id for job in self.jobs.active(server_id="a")},
+            {first.job_id, second.job_id},
+        )
+        release.set()
+        self.assertTrue(second.wait(timeout=10))
+        self.assertEqual(order, ["update", "clear"])
+
+    def test_different_servers_and_read_only_jobs_run_in_parallel(self):
+        started = threading.Barrier(3, timeout=10)
+
+        def meet(_job):
+            started.wait()
+            return "done"
+
+        jobs = [
+            self.jobs.submit("update", meet, server_id="a"),
+            self.jobs.submit("update", meet, server_id="b"),
+            self.jobs.submit("preview", meet, server_id="a", exclusive=False),
+        ]
+
+        for job in jobs:
+            self.assertTrue(job.wait(timeout=10))
+            self.assertEqual(job.status, JOB_SUCCEEDED)
+            self.assertEqual(job.result, "done")
+
+    def test_failed_job_records_error_and_frees_the_server(self):
+        def explode(_job):
+            raise RuntimeError("plex went away")
+
+        failed = self.jobs.submit("restore", explode, server_id="a")
+        following = self.jobs.submit("clear", lambda _job: 1, server_id="a")
+
+        self.assertTrue(following.wait(timeout=10))
+        self.assertEqual(failed.status, JOB_FAILED)
+        self.assertEqual(failed.to_dict()["error"], "plex went away")
+        self.assertEqual(following.status, JOB_SUCCEEDED)
+
+    def test_history_keeps_only_recent_finished_jobs(self):
+        jobs = JobManager(max_workers=1, history_limit=2)
+        for _ in range(4):
+            jobs.submit("preview", lambda _job: None, exclusive=False).wait(timeout=10)
+
+        self.assertLessEqual(len(jobs.list()), 3)
+        self.assertTrue(jobs.wait_idle(timeout=10))
+
+    def test_workers_sharing_leases_never_write_to_one_server_at_once(self):
+        leases = StoreLeases(MemoryStateStore(), "server-lock", ttl=60)
+        first_worker = JobManager(max_workers=2, leases=leases, lease_interval=0.02)
+        second_worker = JobManager(max_workers=2, leases=leases, lease_interval=0.02)
+        release = threading.Event()
+
+        first = first_worker.submit("update", lambda _job: release.wait(10), server_id="a")
+        blocked = second_worker.submit("clear", lambda _job: "cleared", server_id="a")
+        other_server = second_worker.submit("clear", lambda _job: "cleared", server_id="b")
+
+        self.assertTrue(other_server.wait(timeout=10))
+        self.assertEqual(blocked.status, JOB_QUEUED)
+        self.assertEqual(leases.holders(), {"a": first.job_id})
+        release.set()
+        self.assertTrue(blocked.wait(timeout=10))
+        self.assertEqual(blocked.result, "cleared")
+        self.assertTrue(second_worker.wait_idle(timeout=10))
+        self.assertEqual(leases.holders(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,243 @@
+import io
+import json
+import os
+import queue
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import RatingsToPlexRatingsWeb as web
+import main
+from RatingsImportPipeline import ImportOptions, ImportPipelineError, RatingsImportPipeline
+from RatingsPlanFile import PlanFileError, dump_plan, read_plan, saved_plan, write_plan
+from RatingsToPlexRatingsCli import run_apply_plan, run_import
+
+
+IMDB_CSV = (
+    "Const,Title,Title Type,Your Rating,Year\n"
+    "tt1,Inception,Movie,9,2010\n"
+    "tt2,Heat,Movie,8,1995\n"
+    "tt3,Missing,Movie,7,2001\n"
+)
+
+
+class FakeItem:
+    def __init__(self, rating_key, imdb_id, title, year, user_rating=None):
+        self.ratingKey = rating_key
+        self.guid = f"imdb://{imdb_id}"
+        self.guids = []
+        self.title = title
+        self.year = year
+        self.type = "movie"
+        self.userRating = user_rating
+        self.thumb = None
+        self.rate_calls = []
+
+    def rate(self, rating):
+        self.rate_calls.append(rating)
+        self.userRating = rating
+
+
+class FakeSection:
+    title = "Movies"
+    type = "movie"
+    key = 1
+
+    def __init__(self, items):
+        self.items = items
+
+    def all(self):
+        return list(self.items)
+
+    def search(self, filters=None, container_start=0, container_size=None, maxresults=None):
+        if container_start:
+            return []
+        return [item for item in self.items if item.userRating]
+
+
+class FakeServer:
+    machineIdentifier = "home"
+    friendlyName = "Home"
+
+    def __init__(self, items):
+        section = FakeSection(items)
+        self.items = {item.ratingKey: item for item in items}
+        self.library = SimpleNamespace(section=lambda title: section, sections=lambda: [section])
+        self.fetches = []
+
+    def fetchItems(self, keys):
+        self.fetches.append(list(keys))
+        return [self.items[key] for key in keys if key in self.items]
+
+
+class PlanFileTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
+        self.addCleanup(self.temp_dir.cleanup)
+        self.csv_path = os.path.join(self.temp_dir.name, "ratings.csv")
+        with open(self.csv_path, "w", encoding="utf-8", newline="") as csv_file:
+            csv_file.write(IMDB_CSV)
+        failures_dir = patch(
+            "RatingsToPlexRatingsCli.DEFAULT_FAILURES_DIR", os.path.join(self.temp_dir.name, "failures")
+        )
+        failures_dir.start()
+        self.addCleanup(failures_dir.stop)
+        self.inception = FakeItem(101, "tt1", "Inception", 2010)
+        self.heat = FakeItem(102, "tt2", "Heat", 1995, user_rating=6.0)
+        self.server = FakeServer([self.inception, self.heat])
+
+    def _saved(self):
+        plan = RatingsImportPipeline(self.server).build_plan(
+            self.csv_path, "Movies", ImportOptions(source="IMDb", selected_media_types=frozenset({"Movie"}))
+        )
+        return saved_plan(plan, self.server, library="Movies")
+
+    def test_plan_round_trips_by_rating_key_and_rejects_edits(self):
+        saved = self._saved()
+        path = os.path.join(self.temp_dir.name, "ratings.plan.jsonl")
+        write_plan(saved, path)
+
+        loaded = read_plan(path)
+        self.assertEqual(loaded.hash, saved.hash)
+        self.assertEqual(
+            [(item.rating_key, item.section_key, item.old_rating, item.new_rating, item.status)
+             for item in loaded.items],
+            [("101", "1", None, 9.0, "will_update"), ("102", "1", 6.0, 8.0, "will_update"),
+             (None, None, None, 7.0, "not_found")],
+        )
+        self.assertEqual(loaded.to_dict()["plannedUpdates"], 2)
+        self.assertEqual(os.listdir(self.temp_dir.name), ["ratings.csv", "ratings.plan.jsonl"])
+
+        with open(path, encoding="utf-8") as plan_file:
+            lines = plan_file.readlines()
+        lines[1] = lines[1].replace("9.0", "10.0")
+        with open(path, "w", encoding="utf-8") as plan_file:
+            plan_file.writelines(lines)
+        with self.assertRaises(PlanFileError):
+            read_plan(path)
+
+    def test_applying_skips_items_whose_rating_drifted(self):
+        saved = self._saved()
+        self.heat.userRating = 4.0
+        pipeline = RatingsImportPipeline(self.server)
+
+        plan = pipeline.load_saved_plan(saved)
+        result = pipeline.apply(plan)
+
+        self.assertEqual([item.status for item in plan.items], ["will_update", "drifted", "not_found"])
+        self.assertEqual(self.server.fetches, [[101, 102]])
+        self.assertEqual((self.inception.rate_calls, self.heat.rate_calls), ([9.0], []))
+        self.assertEqual((result.stats["updated"], result.stats["drifted"]), (1, 1))
+        self.assertIn("plan: 6.0, Plex: 4.0", result.failures[0]["Reason"])
+
+        again = pipeline.load_saved_plan(saved)
+        self.assertEqual(again.items[0].status, "unchanged")
+
+        other = FakeServer([])
+        other.machineIdentifier = "cabin"
+        with self.assertRaises(ImportPipelineError):
+            RatingsImportPipeline(other).load_saved_plan(saved)
+
+    def test_cli_saves_a_plan_and_applies_it_later(self):
+        path = os.path.join(self.temp_dir.name, "ratings.plan.jsonl")
+
+        def _run(argv, run):
+            out = io.StringIO()
+            code = run(
+                main.build_parser().parse_args(argv),
+                connect=lambda *_args, **_kwargs: self.server,
+                out=out,
+            )
+            return code, json.loads(out.getvalue())
+
+        code, report = _run(
+            ["import", self.csv_path, "--token", "t", "--baseurl", "http://plex", "--library", "Movies",
+             "--save-plan", path],
+            run_import,
+        )
+        self.assertEqual(code, 0)
+        self.assertEqual(report["files"][0]["plan"]["plannedUpdates"], 2)
+        self.assertEqual(self.inception.rate_calls, [])
+
+        code, report = _run(["apply-plan", path, "--token", "t", "--baseurl", "http://plex"], run_apply_plan)
+        self.assertEqual(code, 0)
+        self.assertEqual(report["stats"]["updated"], 2)
+        self.assertEqual((self.inception.rate_calls, self.heat.rate_calls), ([9.0], [8.0]))
+
+
+class ApplyPlanEndpointTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
+        self.item = FakeItem(101, "tt1", "Inception", 2010, user_rating=6.0)
+        self.server = FakeServer([self.item])
+        self.previous_controller = web.controller
+        self.previous_jobs = web.jobs
+        self.previous_config = {
+            key: web.app.config.get(key) for key in ("TESTING", "REQUIRE_AUTH", "CSRF_TOKEN")
+        }
+        web.controller = SimpleNamespace(plex_connection=SimpleNamespace(server=self.server))
+        web.jobs = web.JobManager(max_workers=2)
+        web.app.config.update(TESTING=True, REQUIRE_AUTH=False, CSRF_TOKEN="test-csrf-token")
+        self.patches = [
+            patch.object(web, "JOURNAL_DIR", os.path.join(self.temp_dir.name, "journals")),
+            patch.object(web, "CHANGE_DB_PATH", os.path.join(self.temp_dir.name, "changes.sqlite3")),
+            patch.object(web, "FAILURE_DIR", os.path.join(self.temp_dir.name, "failures")),
+        ]
+        for patcher in self.patches:
+            patcher.start()
+        self.client = web.app.test_client()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+        web.jobs.wait_idle(timeout=10)
+        web.controller = self.previous_controller
+        web.jobs = self.previous_jobs
+        web.app.config.update(self.previous_config)
+        while True:
+            try:
+                web.log_queue.get_nowait()
+            except queue.Empty:
+                break
+        self.temp_dir.cleanup()
+
+    def _plan_text(self):
+        csv_path = os.path.join(self.temp_dir.name, "ratings.csv")
+        with open(csv_path, "w", encoding="utf-8", newline="") as csv_file:
+            csv_file.write(IMDB_CSV)
+        plan = RatingsImportPipeline(self.server).build_plan(
+            csv_path, "Movies", ImportOptions(source="IMDb", selected_media_types=frozenset({"Movie"}))
+        )
+        return "".join(dump_plan(saved_plan(plan, self.server, library="Movies")))
+
+    def _apply(self, text):
+        return self.client.post(
+            "/api/apply-plan",
+            data={"file": (io.BytesIO(text.encode("utf-8")), "ratings.plan.jsonl")},
+            headers={"X-CSRF-Token": "test-csrf-token"},
+        )
+
+    def test_uploaded_plan_is_applied_as_a_job(self):
+        response = self._apply(self._plan_text())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["plannedUpdates"], 1)
+        job = web.jobs.get(response.get_json()["jobId"])
+        self.assertTrue(job.wait(timeout=10))
+        self.assertEqual(job.kind, "apply-plan")
+        stats = job.result["stats"]
+        self.assertEqual((stats["updated"], stats["not_found"], stats["exported_failures"]), (1, 2, 2))
+        self.assertEqual(self.item.rate_calls, [9.0])
+        self.assertTrue(stats["run_id"])
+
+    def test_modified_or_foreign_plans_are_refused(self):
+        text = self._plan_text()
+        self.assertEqual(self._apply(text.replace('"Inception"', '"Inceptionn"')).status_code, 400)
+        self.server.machineIdentifier = "cabin"
+        self.assertEqual(self._apply(text).status_code, 409)
+        self.assertEqual(self.item.rate_calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import gzip
+import json
+import unittest
+from unittest.mock import patch
+
+import RatingsResponseCompression as compression
+import RatingsToPlexRatingsWeb as web
+from RatingsImportPipeline import ImportOptions, ImportPlan, ParsedRow, PlanItem
+
+
+def _plan_item(title, status, source="IMDb", matched=True):
+    return PlanItem(
+        parsed=ParsedRow(source=source, raw={}, title=title, year="2001", rating_text="8"),
+        status=status,
+        matched=matched,
+        new_rating=8.0,
+        current_rating=6.0 if matched else None,
+        title=title,
+        year="2001",
+        thumb=f"/library/metadata/{title}/thumb" if matched else None,
+    )
+
+
+class EncodingNegotiationTests(unittest.TestCase):
+    def test_gzip_is_used_unless_brotli_is_installed_and_preferred(self):
+        with patch.object(compression, "brotli_available", return_value=False):
+            self.assertEqual(compression.choose_encoding("gzip, deflate, br"), "gzip")
+            self.assertEqual(compression.choose_encoding("br"), None)
+        with patch.object(compression, "brotli_available", return_value=True):
+            self.assertEqual(compression.choose_encoding("gzip, deflate, br"), "br")
+            self.assertEqual(compression.choose_encoding("br;q=0.5, gzip"), "gzip")
+            self.assertEqual(compression.choose_encoding("*;q=0.1, br;q=0"), "gzip")
+        self.assertEqual(compression.choose_encoding("identity"), None)
+        self.assertEqual(compression.choose_encoding("gzip;q=0"), None)
+        self.assertEqual(compression.choose_encoding(""), None)
+
+
+class ResponseCompressionTests(unittest.TestCase):
+    def setUp(self):
+        self.previous_jobs = web.jobs
+        self.previous_config = {key: web.app.config.get(key) for key in ("TESTING", "REQUIRE_AUTH")}
+        web.jobs = web.JobManager(max_workers=1)
+        web.app.config.update(TESTING=True, REQUIRE_AUTH=False)
+        self.client = web.app.test_client()
+
+    def tearDown(self):
+        web.jobs = self.previous_jobs
+        web.app.config.update(self.previous_config)
+
+    def test_large_json_is_gzipped_when_accepted(self):
+        with (
+            patch.object(web, "COMPRESSION_MIN_BYTES", 0),
+            patch.object(compression, "brotli_available", return_value=False),
+        ):
+            response = self.client.get("/api/jobs", headers={"Accept-Encoding": "gzip"})
+            plain = self.client.get("/api/jobs")
+
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        self.assertEqual(int(response.headers["Content-Length"]), len(response.get_data()))
+        self.assertEqual(json.loads(gzip.decompress(response.get_data())), {"jobs": []})
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertEqual(plain.get_json(), {"jobs": []})
+
+    def test_small_responses_are_sent_as_is(self):
+        response = self.client.get("/api/jobs", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", response.headers)
+
+
+class ColumnarPreviewTests(unittest.TestCase):
+    def test_columns_decode_to_the_per_item_preview(self):
+        items = [
+            _plan_item("Heat", "will_update"),
+            _plan_item("Missing", "not_found", matched=False),
+            _plan_item("Ran", "unchanged", source="Letterboxd"),
+            _plan_item("Later", "drifted"),
+        ]
+        plan = ImportPlan(
+            source="IMDb+Letterboxd",
+            items=items,
+            total_rows=4,
+            options=ImportOptions(source="IMDb", selected_media_types=frozenset({"Movie"})),
+        )
+
+        payload = plan.to_preview_columns()
+        columns = payload["columns"]
+        decoded = [
+            {
+                "title": columns["title"][index],
+                "year": columns["year"][index],
+                "matched": columns["matched"][index] == 1,
+                "status": payload["statuses"][columns["status"][index]],
+                "newRating": columns["newRating"][index],
+                "currentRating": columns["currentRating"][index],
+                "thumb": columns["thumb"][index],
+                "source": payload["sources"][columns["source"][index]],
+            }
+            for index in range(payload["count"])
+        ]
+
+        self.assertEqual(decoded, [item.to_preview_dict() for item in items])
+        self.assertEqual(columns["status"][:3], [0, 2, 1])
+        self.assertEqual(payload["sources"], ["IMDb", "Letterboxd"])
+        self.assertLess(
+            len(json.dumps(payload)), len(json.dumps([item.to_preview_dict() for item in items]))
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
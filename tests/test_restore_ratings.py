@@ -0,0 +1,249 @@
+import io
+import json
+import os
+import queue
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import RatingsToPlexRatingsWeb as web
+from RatingsRestorePipeline import RatingsRestorePipeline, RestoreError, read_backup
+
+
+BACKUP_HEADER = "Library,RatingKey,MediaType,Title,Year,UserRating,Guid\n"
+
+
+class NotFound(Exception):
+    pass
+
+
+class FakeItem:
+    def __init__(self, rating_key, guid, title="Movie"):
+        self.ratingKey = rating_key
+        self.guid = guid
+        self.guids = []
+        self.title = title
+
+
+class FakeSection:
+    def __init__(self, title, items):
+        self.title = title
+        self.type = "movie"
+        self.items = items
+        self.scan_count = 0
+        self.guid_searches = []
+
+    def all(self):
+        self.scan_count += 1
+        return list(self.items)
+
+    def search(self, guid=None):
+        self.guid_searches.append(list(guid))
+        return [item for item in self.items if item.guid in guid]
+
+
+class FakeServer:
+    def __init__(self, sections):
+        self.library = SimpleNamespace(sections=lambda: list(sections))
+        self._session = SimpleNamespace(put=object())
+        self.items = {item.ratingKey: item for section in sections for item in section.items}
+        self.fetch_batches = []
+        self.queries = []
+
+    def fetchItems(self, keys):
+        self.fetch_batches.append(list(keys))
+        found = [self.items[key] for key in keys if key in self.items]
+        if not found:
+            raise NotFound("(404) not_found")
+        return found
+
+    def query(self, key, method=None):
+        self.queries.append(key)
+
+
+class RestorePipelineTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write_backup(self, contents):
+        path = os.path.join(self.temp_dir.name, "backup.csv")
+        with open(path, "w", encoding="utf-8", newline="") as backup_file:
+            backup_file.write(contents)
+        return path
+
+    def test_read_backup_undoes_formula_escaping_and_skips_invalid_rows(self):
+        path = self._write_backup(
+            BACKUP_HEADER
+            + "Movies,1,movie,'-Minus,2001,8.5,imdb://tt1\n"
+            + "Movies,2,movie,No Rating,2002,,imdb://tt2\n"
+            + "Movies,3,movie,Too High,2003,11,imdb://tt3\n"
+        )
+
+        rows = read_backup(path)
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0].title, "-Minus")
+        self.assertEqual(rows[0].rating, 8.5)
+
+    def test_read_backup_rejects_other_csv_files(self):
+        path = self._write_backup("Const,Title\ntt1,Movie\n")
+
+        with self.assertRaisesRegex(RestoreError, "Not a ratings backup"):
+            read_backup(path)
+
+    def test_restore_writes_by_rating_key_and_falls_back_to_guid(self):
+        section = FakeSection("Movies", [
+            FakeItem(1, "imdb://tt1"),
+            FakeItem(50, "imdb://tt2"),
+        ])
+        server = FakeServer([section])
+        path = self._write_backup(
+            BACKUP_HEADER
+            + "Movies,1,movie,Kept,2001,8,imdb://tt1\n"
+            + "Movies,2,movie,Re-added,2002,6.5,imdb://tt2\n"
+            + "Movies,3,movie,Deleted,2003,4,imdb://tt3\n"
+        )
+
+        result = RatingsRestorePipeline(server).restore(read_backup(path))
+
+        self.assertEqual(server.fetch_batches, [[1, 2, 3]])
+        self.assertEqual(section.scan_count, 0)
+        self.assertEqual(section.guid_searches, [["imdb://tt2", "imdb://tt3"]])
+        self.assertEqual(
+            sorted(server.queries),
+            [
+                "/:/rate?key=1&identifier=com.plexapp.plugins.library&rating=8.0",
+                "/:/rate?key=50&identifier=com.plexapp.plugins.library&rating=6.5",
+            ],
+        )
+        self.assertTrue(result.success)
+        self.assertEqual(result.stats["restored"], 2)
+        self.assertEqual(result.stats["resolved_by_guid"], 1)
+        self.assertEqual(result.stats["not_found"], 1)
+
+    def test_entries_of_deleted_libraries_are_only_searched_everywhere_when_asked(self):
+        section = FakeSection("Movies", [FakeItem(50, "imdb://tt2")])
+        server = FakeServer([section])
+        path = self._write_backup(BACKUP_HEADER + "Old Movies,2,movie,Re-added,2002,6.5,imdb://tt2\n")
+        messages = []
+
+        result = RatingsRestorePipeline(server, log=messages.append).restore(read_backup(path))
+
+        self.assertEqual(section.guid_searches, [])
+        self.assertEqual(result.stats["not_found"], 1)
+        self.assertTrue(any("no longer exists" in message for message in messages))
+
+        result = RatingsRestorePipeline(server, search_all_libraries=True).restore(read_backup(path))
+
+        self.assertEqual(section.guid_searches, [["imdb://tt2"]])
+        self.assertEqual(result.stats["restored"], 1)
+
+    def test_restore_without_missing_keys_never_scans_libraries(self):
+        section = FakeSection("Movies", [FakeItem(1, "imdb://tt1")])
+        server = FakeServer([section])
+        path = self._write_backup(BACKUP_HEADER + "Movies,1,movie,Kept,2001,8,imdb://tt1\n")
+
+        RatingsRestorePipeline(server).restore(read_backup(path))
+
+        self.assertEqual(section.scan_count, 0)
+        self.assertEqual(len(server.queries), 1)
+
+
+class RestoreEndpointTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
+        self.previous_upload_dir = web.UPLOAD_DIR
+        self.previous_controller = web.controller
+        self.previous_jobs = web.jobs
+        self.previous_config = {
+            "TESTING": web.app.config.get("TESTING"),
+            "REQUIRE_AUTH": web.app.config.get("REQUIRE_AUTH"),
+            "CSRF_TOKEN": web.app.config.get("CSRF_TOKEN"),
+        }
+        self.section = FakeSection("Movies", [FakeItem(1, "imdb://tt1")])
+        self.server = FakeServer([self.section])
+        web.controller = SimpleNamespace(plex_connection=SimpleNamespace(server=self.server))
+        web.UPLOAD_DIR = self.temp_dir.name
+        web.jobs = web.JobManager(max_workers=2)
+        web.app.config.update(TESTING=True, REQUIRE_AUTH=False, CSRF_TOKEN="test-csrf-token")
+        self.client = web.app.test_client()
+        self._drain_log_queue()
+
+    def tearDown(self):
+        web.UPLOAD_DIR = self.previous_upload_dir
+        web.controller = self.previous_controller
+        web.jobs = self.previous_jobs
+        web.app.config.update(self.previous_config)
+        self._drain_log_queue()
+        self.temp_dir.cleanup()
+
+    def _drain_log_queue(self):
+        events = []
+        while True:
+            try:
+                events.append(web.log_queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def test_uploaded_backup_is_restored_and_reported(self):
+        contents = BACKUP_HEADER + "Movies,1,movie,Kept,2001,8,imdb://tt1\n"
+
+        response = self.client.post(
+            "/api/restore-ratings",
+            data={"file": (io.BytesIO(contents.encode("utf-8")), "backup.csv")},
+            content_type="multipart/form-data",
+            headers={"X-CSRF-Token": "test-csrf-token"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["entries"], 1)
+        job = web.jobs.get(response.get_json()["jobId"])
+        self.assertTrue(job.wait(timeout=10))
+        self.assertEqual(job.kind, "restore")
+        self.assertEqual(job.result["stats"]["restored"], 1)
+        self.assertEqual(len(self.server.queries), 1)
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+        completions = [
+            json.loads(event["data"])
+            for event in self._drain_log_queue()
+            if event["type"] == "update_complete"
+        ]
+        self.assertEqual(completions[0]["stats"]["operation"], "restore")
+        self.assertEqual(completions[0]["stats"]["restored"], 1)
+
+    def test_catalogued_compressed_backup_is_restored_by_id(self):
+        rated = SimpleNamespace(
+            ratingKey=1, guid="imdb://tt1", title="Kept", year=2001, type="movie", userRating=7.5
+        )
+        with patch.object(web, "BACKUP_DIR", self.temp_dir.name):
+            backup_id, _name, _count = web._create_ratings_backup([("Movies", rated)])
+            response = self.client.post(
+                "/api/restore-ratings",
+                json={"backupId": backup_id},
+                headers={"X-CSRF-Token": "test-csrf-token"},
+            )
+            self.assertTrue(web.jobs.wait_idle(timeout=10))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.server.queries,
+            ["/:/rate?key=1&identifier=com.plexapp.plugins.library&rating=7.5"],
+        )
+
+    def test_unknown_backup_id_is_rejected(self):
+        response = self.client.post(
+            "/api/restore-ratings",
+            json={"backupId": "missing"},
+            headers={"X-CSRF-Token": "test-csrf-token"},
+        )
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.server.queries, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
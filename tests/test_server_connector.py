@@ -0,0 +1,178 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from PlexServerConnector import (
+    REMEMBERED_URI_TTL_SECONDS,
+    NoReachableConnection,
+    candidate_uris,
+    race_connections,
+    remembered_uri_is_fresh,
+)
+from RatingsSessionStore import CachedServer
+from RatingsToPlexRatingsController import PlexConnection, RatingsToPlexRatingsController
+
+
+class RaceConnectionsTests(unittest.TestCase):
+    def test_fastest_healthy_candidate_wins_without_waiting_for_slow_ones(self):
+        release_slow = threading.Event()
+        self.addCleanup(release_slow.set)
+
+        def probe(uri):
+            if uri == "https://relay":
+                release_slow.wait(10)
+            elif uri == "http://stale-lan":
+                raise ConnectionError("connection refused")
+
+        started = time.monotonic()
+        results = race_connections(["https://relay", "http://stale-lan", "http://lan"], probe)
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(results[0].uri, "http://lan")
+        self.assertTrue(results[0].ok)
+        self.assertIn("ms", results[0].describe())
+        self.assertTrue(all(not result.ok for result in results[1:]))
+
+    def test_all_failures_are_reported(self):
+        def probe(uri):
+            raise ConnectionError(f"{uri} unreachable")
+
+        results = race_connections(["http://a", "http://b"], probe)
+
+        self.assertEqual({result.uri for result in results}, {"http://a", "http://b"})
+        self.assertFalse(any(result.ok for result in results))
+
+    def test_candidates_are_deduplicated_in_preference_order(self):
+        resource = SimpleNamespace(preferred_connections=lambda: ["http://lan", "https://relay", "http://lan"])
+        cached = CachedServer(name="Home", connections=("http://lan",))
+
+        self.assertEqual(candidate_uris(resource), ["http://lan", "https://relay"])
+        self.assertEqual(candidate_uris(cached), ["http://lan"])
+
+    def test_remembered_uri_expires_after_ttl(self):
+        self.assertTrue(remembered_uri_is_fresh(1000.0, now=1000.0 + 60))
+        self.assertFalse(remembered_uri_is_fresh(1000.0, now=1000.0 + REMEMBERED_URI_TTL_SECONDS))
+        self.assertFalse(remembered_uri_is_fresh(None))
+
+
+class PlexConnectionRaceTests(unittest.TestCase):
+    def _connection(self, server, remembered=None):
+        self.remembered = []
+        self.logs = []
+        return PlexConnection(
+            None,
+            None,
+            [server],
+            token="token",
+            on_connected=lambda name, uri, at: self.remembered.append((name, uri)),
+            log_fn=self.logs.append,
+        )
+
+    def test_stale_remembered_uri_triggers_a_race_and_records_the_winner(self):
+        server = CachedServer(
+            name="Home",
+            client_identifier="abc",
+            connections=("https://relay", "http://lan"),
+            last_uri="https://relay",
+            last_uri_at=time.time() - REMEMBERED_URI_TTL_SECONDS - 1,
+        )
+        connection = self._connection(server)
+        probed = []
+
+        def probe(uri, token, identifier):
+            probed.append((uri, token, identifier))
+            if uri == "https://relay":
+                raise ConnectionError("timed out")
+
+        with (
+            patch("RatingsToPlexRatingsController.probe_identity", probe),
+            patch("plexapi.server.PlexServer", side_effect=lambda uri, token, timeout: SimpleNamespace(_baseurl=uri)),
+        ):
+            self.assertTrue(connection.switch_to_server("Home"))
+
+        self.assertEqual(connection.server._baseurl, "http://lan")
+        self.assertEqual({call[2] for call in probed}, {"abc"})
+        self.assertEqual(self.remembered, [("Home", "http://lan")])
+        self.assertEqual(connection.remembered_uri("Home")[0], "http://lan")
+        self.assertTrue(any("Probed 2 connection(s)" in line for line in self.logs))
+
+    def test_no_reachable_candidate_fails_the_switch(self):
+        connection = self._connection(CachedServer(name="Home", connections=("http://lan",)))
+
+        def probe(uri, token, identifier):
+            raise ConnectionError("refused")
+
+        with patch("RatingsToPlexRatingsController.probe_identity", probe):
+            self.assertFalse(connection.switch_to_server("Home"))
+            with self.assertRaises(NoReachableConnection):
+                connection._connect(connection.resources[0])
+        self.assertEqual(self.remembered, [])
+
+
+class FakeSection:
+    title = "Movies"
+    type = "movie"
+
+    def __init__(self):
+        self.scan_count = 0
+
+    def all(self):
+        self.scan_count += 1
+        return [SimpleNamespace(guid="imdb://tt1", guids=[], title="Heat", year=1995, type="movie")]
+
+
+def fake_server(name):
+    section = FakeSection()
+    return SimpleNamespace(
+        friendlyName=name,
+        machineIdentifier=name.lower(),
+        library=SimpleNamespace(sections=lambda: [section], section=lambda title: section),
+    )
+
+
+class PrefetchTests(unittest.TestCase):
+    def test_servers_are_prefetched_in_parallel(self):
+        names = ["Home", "Cabin", "Office"]
+        connection = PlexConnection(None, None, [CachedServer(name=name) for name in names], token="token")
+        all_connecting = threading.Barrier(len(names), timeout=5)
+        ready = []
+        done = threading.Event()
+
+        def connect(resource):
+            # Every server must be connecting at once for the barrier to open.
+            all_connecting.wait()
+            return fake_server(resource.name)
+
+        def on_server_ready(name, server):
+            ready.append(name)
+            if len(ready) == len(names):
+                done.set()
+
+        with patch.object(connection, "_connect", side_effect=connect):
+            connection.prefetch_all_libraries_async(on_server_ready=on_server_ready, max_workers=len(names))
+            self.assertTrue(done.wait(5))
+
+        self.assertEqual(sorted(ready), sorted(names))
+        self.assertEqual([info.title for info in connection.sections.peek("Cabin")], ["Movies"])
+
+    def test_only_the_active_servers_recent_library_is_warmed(self):
+        controller = RatingsToPlexRatingsController()
+        home, cabin = fake_server("Home"), fake_server("Cabin")
+        controller.plex_connection = SimpleNamespace(server=home)
+        controller._recent_libraries = {"Home": ("Movies", False), "Cabin": ("Movies", False)}
+
+        controller._warm_if_active("Cabin", cabin)
+        controller._warm_if_active("Home", home)
+
+        section = home.library.section("Movies")
+        self.assertIsNotNone(controller.library_indexes.peek(home, [section]))
+        self.assertIsNone(controller.library_indexes.peek(cabin, [cabin.library.section("Movies")]))
+        # A second warm-up finds the index already cached.
+        controller.warm_library_index("Home", home)
+        self.assertEqual(section.scan_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+import os
+import stat
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from plexapi.exceptions import Unauthorized
+
+import RatingsToPlexRatingsWeb as web
+from RatingsSessionStore import (
+    SESSION_KEY_ENV,
+    CachedServer,
+    CachedSession,
+    SessionStore,
+    is_auth_error,
+)
+from RatingsToPlexRatingsController import RatingsToPlexRatingsController
+
+
+SESSION = CachedSession(
+    token="plex-secret-token",
+    username="alice",
+    servers=(
+        CachedServer(
+            name="Home",
+            client_identifier="abc",
+            connections=("http://10.0.0.2:32400",),
+            last_uri="http://10.0.0.2:32400",
+            last_uri_at=time.time(),
+        ),
+    ),
+)
+
+
+@unittest.skipUnless(SessionStore.encryption_available(), "cryptography is not installed")
+class SessionStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
+        self.store = SessionStore(self.temp_dir.name)
+        environment = patch.dict(os.environ)
+        environment.start()
+        self.addCleanup(environment.stop)
+        os.environ.pop(SESSION_KEY_ENV, None)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_session_round_trips_encrypted_at_rest(self):
+        self.assertTrue(self.store.save(SESSION))
+
+        with open(self.store.session_path, "rb") as session_file:
+            self.assertNotIn(b"plex-secret-token", session_file.read())
+        if os.name == "posix":
+            self.assertEqual(stat.S_IMODE(os.stat(self.store.key_path).st_mode), 0o600)
+        self.assertEqual(SessionStore(self.temp_dir.name).load(), SESSION)
+
+    def test_unreadable_session_is_discarded(self):
+        self.store.save(SESSION)
+        with open(self.store.session_path, "wb") as session_file:
+            session_file.write(b"not a fernet token")
+
+        self.assertIsNone(self.store.load())
+        self.assertFalse(os.path.exists(self.store.session_path))
+
+    def test_remember_uri_updates_only_that_server(self):
+        self.store.save(SESSION)
+
+        self.store.remember_uri("Home", "https://relay.plex.direct:443")
+        self.store.remember_uri("Unknown", "http://ignored")
+
+        self.assertEqual(self.store.load().server("Home").last_uri, "https://relay.plex.direct:443")
+
+    def test_recent_library_is_remembered_for_index_warm_up(self):
+        self.store.save(SESSION)
+
+        self.store.remember_library("Home", "Movies", False)
+
+        session = SessionStore(self.temp_dir.name).load()
+        self.assertEqual(session.last_server, "Home")
+        self.assertEqual(session.server("Home").recent_library, "Movies")
+
+    def test_nothing_is_written_without_encryption(self):
+        with patch.object(SessionStore, "encryption_available", return_value=False):
+            self.assertFalse(self.store.save(SESSION))
+            self.assertIsNone(self.store.load())
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+
+
+class FakeStore:
+    def __init__(self, session=None):
+        self.session = session
+        self.cleared = False
+        self.remembered = []
+
+    def load(self):
+        return self.session
+
+    def save(self, session):
+        self.session = session
+        return True
+
+    def clear(self):
+        self.cleared = True
+        self.session = None
+
+    def remember_uri(self, name, uri, at=None):
+        self.remembered.append((name, uri))
+
+
+class RestoredSessionTests(unittest.TestCase):
+    def setUp(self):
+        self.store = FakeStore(SESSION)
+        self.invalidated = []
+        self.controller = RatingsToPlexRatingsController(
+            session_store=self.store,
+            on_session_invalid=lambda: self.invalidated.append(True),
+        )
+
+    def test_restore_connects_through_last_working_uri(self):
+        self.assertTrue(self.controller.restore_session())
+        server = SimpleNamespace(_baseurl="http://10.0.0.2:32400", library=None)
+
+        with patch("plexapi.server.PlexServer", return_value=server) as plex_server:
+            self.assertTrue(self.controller.plex_connection.switch_to_server("Home"))
+
+        plex_server.assert_called_once_with("http://10.0.0.2:32400", "plex-secret-token", timeout=8)
+        self.assertIsNone(self.controller.plex_connection.account)
+        # A fresh remembered URI is used as-is, without probing or re-recording it.
+        self.assertEqual(self.store.remembered, [])
+
+    def test_rejected_token_invalidates_the_cached_session(self):
+        self.controller.restore_session()
+
+        with patch("plexapi.myplex.MyPlexAccount", side_effect=Unauthorized("(401) unauthorized")):
+            self.assertFalse(self.controller.revalidate_session())
+
+        self.assertTrue(self.store.cleared)
+        self.assertIsNone(self.controller.plex_connection)
+        self.assertEqual(self.invalidated, [True])
+
+    def test_network_failure_keeps_the_cached_session(self):
+        self.controller.restore_session()
+
+        with patch("plexapi.myplex.MyPlexAccount", side_effect=ConnectionError("offline")):
+            self.assertTrue(self.controller.revalidate_session())
+
+        self.assertFalse(self.store.cleared)
+        self.assertIsNotNone(self.controller.plex_connection)
+
+    def test_auth_errors_are_recognised(self):
+        self.assertTrue(is_auth_error(Unauthorized("(401) unauthorized")))
+        self.assertFalse(is_auth_error(ConnectionError("offline")))
+
+    def test_session_endpoint_reports_restored_connection(self):
+        self.controller.restore_session()
+        previous_controller = web.controller
+        web.controller = self.controller
+        try:
+            data = web.app.test_client().get("/api/session").get_json()
+        finally:
+            web.controller = previous_controller
+
+        self.assertTrue(data["connected"])
+        self.assertEqual(data["username"], "alice")
+        self.assertEqual(data["servers"], ["Home"])
+
+
+if __name__ == "__main__":
+    unittest.main()
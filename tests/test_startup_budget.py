@@ -0,0 +1,69 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Generous budgets: a healthy cold start is several times faster on typical
+# hardware. Slow CI machines can scale them with RTP_STARTUP_BUDGET_SCALE.
+BUDGET_SCALE = float(os.environ.get("RTP_STARTUP_BUDGET_SCALE", "1"))
+IMPORT_BUDGET_SECONDS = 1.5 * BUDGET_SCALE
+FIRST_RESPONSE_BUDGET_SECONDS = 1.0 * BUDGET_SCALE
+ATTEMPTS = 3
+
+STARTUP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import RatingsToPlexRatingsWeb as web
+imported = time.perf_counter()
+web.app.config.update(TESTING=True)
+response = web.app.test_client().get("/")
+responded = time.perf_counter()
+print(json.dumps({
+    "import": imported - started,
+    "first_response": responded - imported,
+    "status": response.status_code,
+    "lazy_modules_loaded": [
+        name for name in ("plexapi", "requests", "urllib.request", "webbrowser")
+        if name in sys.modules
+    ],
+}))
+"""
+
+
+def _probe_startup():
+    completed = subprocess.run(
+        [sys.executable, "-c", STARTUP_PROBE],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+class StartupBudgetTests(unittest.TestCase):
+    def test_cold_import_and_first_response_stay_within_budget(self):
+        probes = [_probe_startup() for _ in range(ATTEMPTS)]
+
+        for probe in probes:
+            self.assertEqual(probe["status"], 200)
+            self.assertEqual(probe["lazy_modules_loaded"], [])
+        best_import = min(probe["import"] for probe in probes)
+        best_response = min(probe["first_response"] for probe in probes)
+        self.assertLess(
+            best_import,
+            IMPORT_BUDGET_SECONDS,
+            f"cold import took {best_import:.3f}s",
+        )
+        self.assertLess(
+            best_response,
+            FIRST_RESPONSE_BUDGET_SECONDS,
+            f"first response took {best_response:.3f}s",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,248 @@
+import io
+import os
+import queue
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import Mock, patch
+
+import RatingsToPlexRatingsWeb as web
+from RatingsJobManager import JobManager
+from RatingsStateStore import (
+    EventQueue,
+    MemoryStateStore,
+    SqliteStateStore,
+    StateStoreError,
+    StoreLeases,
+    open_state_store,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class StateStoreContractMixin:
+    def make_store(self, clock):
+        raise NotImplementedError
+
+    def test_values_expire_and_are_taken_once(self):
+        clock = FakeClock()
+        store = self.make_store(clock)
+
+        store.put("upload", "current", {"path": "a.csv", "rowCount": 3})
+        store.put("confirm", "token", {"library": "Movies"}, ttl=60)
+        self.assertEqual(store.get("upload", "current"), {"path": "a.csv", "rowCount": 3})
+        self.assertEqual(store.items("confirm"), {"token": {"library": "Movies"}})
+        self.assertEqual(store.take("confirm", "token"), {"library": "Movies"})
+        self.assertIsNone(store.take("confirm", "token"))
+
+        store.put("confirm", "token", "value", ttl=60)
+        clock.now += 61
+        self.assertIsNone(store.get("confirm", "token"))
+        self.assertEqual(store.items("confirm"), {})
+
+    def test_add_keeps_the_first_value_and_counters_increment(self):
+        store = self.make_store(FakeClock())
+
+        self.assertEqual(store.add("app", "csrf-token", "first"), "first")
+        self.assertEqual(store.add("app", "csrf-token", "second"), "first")
+        self.assertEqual(store.increment("app", "generation"), 1)
+        self.assertEqual(store.increment("app", "generation"), 2)
+
+    def test_a_lapsed_lease_cannot_touch_the_next_owners_lease(self):
+        clock = FakeClock()
+        store = self.make_store(clock)
+        leases = StoreLeases(store, "server-lease", ttl=30)
+
+        self.assertTrue(leases.acquire("server-1", "worker-a"))
+        self.assertFalse(leases.acquire("server-1", "worker-b"))
+        clock.now += 31
+        self.assertTrue(leases.acquire("server-1", "worker-b"))
+
+        self.assertFalse(leases.renew("server-1", "worker-a"))
+        self.assertFalse(leases.release("server-1", "worker-a"))
+        self.assertEqual(leases.holders(), {"server-1": "worker-b"})
+        self.assertTrue(leases.renew("server-1", "worker-b"))
+        self.assertTrue(leases.release("server-1", "worker-b"))
+        self.assertEqual(leases.holders(), {})
+
+    def test_events_are_read_from_a_cursor(self):
+        store = self.make_store(FakeClock())
+        start = store.last_event_id()
+        first = store.publish({"type": "log", "data": "one"})
+        store.publish({"type": "log", "data": "two"})
+
+        self.assertEqual([event["data"] for _, event in store.events_after(start)], ["one", "two"])
+        self.assertEqual([event["data"] for _, event in store.events_after(first)], ["two"])
+        self.assertEqual(store.events_after(store.last_event_id(), timeout=0.05), [])
+
+
+class MemoryStateStoreTests(StateStoreContractMixin, unittest.TestCase):
+    def make_store(self, clock):
+        return MemoryStateStore(clock=clock)
+
+
+class SqliteStateStoreTests(StateStoreContractMixin, unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
+        self.addCleanup(self.temp_dir.cleanup)
+        self.path = os.path.join(self.temp_dir.name, "state.sqlite3")
+
+    def make_store(self, clock):
+        return SqliteStateStore(self.path, clock=clock)
+
+    def test_two_stores_on_one_file_share_state_and_events(self):
+        first, second = SqliteStateStore(self.path), SqliteStateStore(self.path)
+        reader = EventQueue(second)
+
+        first.put("upload", "current", {"path": "a.csv"})
+        first.publish({"type": "log", "data": "from another worker"})
+
+        self.assertEqual(second.get("upload", "current"), {"path": "a.csv"})
+        self.assertEqual(reader.get(timeout=1), {"type": "log", "data": "from another worker"})
+        with self.assertRaises(queue.Empty):
+            reader.get_nowait()
+        self.assertTrue(first.shared)
+
+    def test_workers_on_one_file_keep_each_others_leases(self):
+        clock = FakeClock()
+        worker_a = StoreLeases(SqliteStateStore(self.path, clock=clock), "server-lease", ttl=30)
+        worker_b = StoreLeases(SqliteStateStore(self.path, clock=clock), "server-lease", ttl=30)
+
+        self.assertTrue(worker_a.acquire("server-1", "job-a"))
+        self.assertFalse(worker_b.acquire("server-1", "job-b"))
+        clock.now += 31
+        self.assertTrue(worker_b.acquire("server-1", "job-b"))
+
+        self.assertFalse(worker_a.renew("server-1", "job-a"))
+        self.assertFalse(worker_a.release("server-1", "job-a"))
+        self.assertEqual(worker_a.holders(), {"server-1": "job-b"})
+
+    def test_urls_select_the_backend(self):
+        self.assertIsInstance(open_state_store(""), MemoryStateStore)
+        self.assertIsInstance(open_state_store("sqlite:///" + self.path), SqliteStateStore)
+        with self.assertRaises(StateStoreError):
+            open_state_store("redis://localhost")
+
+
+class SharedWebStateTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
+        self.addCleanup(self.temp_dir.cleanup)
+        self.path = os.path.join(self.temp_dir.name, "state.sqlite3")
+        self.previous_jobs = web.jobs
+        self.previous_config = {key: web.app.config.get(key) for key in ("TESTING", "REQUIRE_AUTH", "CSRF_TOKEN")}
+        web.app.config.update(TESTING=True, REQUIRE_AUTH=False)
+        self.previous_store = web.configure_state_store(SqliteStateStore(self.path))
+
+    def tearDown(self):
+        web.jobs = self.previous_jobs
+        web.configure_state_store(self.previous_store)
+        web.app.config.update(self.previous_config)
+
+    def test_workers_share_the_csrf_token(self):
+        token = web.app.config["CSRF_TOKEN"]
+        web.app.config["CSRF_TOKEN"] = "token-of-a-second-worker"
+
+        web.configure_state_store(SqliteStateStore(self.path))
+
+        self.assertEqual(web.app.config["CSRF_TOKEN"], token)
+
+    def test_jobs_of_other_workers_are_reported(self):
+        other_worker = JobManager(max_workers=1, on_change=web._publish_job)
+        job = other_worker.submit("export", lambda _job: {"exported": 3})
+        self.assertTrue(other_worker.wait_idle(timeout=5))
+        web.jobs = JobManager(max_workers=1)
+        client = web.app.test_client()
+
+        details = client.get(f"/api/jobs/{job.job_id}").get_json()
+        listed = client.get("/api/jobs").get_json()["jobs"]
+
+        self.assertEqual(details["status"], "succeeded")
+        self.assertEqual(details["result"], {"exported": 3})
+        self.assertEqual([entry["jobId"] for entry in listed], [job.job_id])
+
+    def test_upload_waits_for_an_update_job_of_another_worker(self):
+        other_worker = JobManager(max_workers=1, on_change=web._publish_job)
+        release = threading.Event()
+        job = other_worker.submit("update", lambda _job: release.wait(10), server_id="server")
+        web.jobs = JobManager(max_workers=1)
+        client = web.app.test_client()
+        try:
+            response = client.post(
+                "/api/upload-csv",
+                data={"source": "IMDb", "file": (io.BytesIO(b"Const,Your Rating\n"), "ratings.csv")},
+                headers={"X-CSRF-Token": web.app.config["CSRF_TOKEN"]},
+                content_type="multipart/form-data",
+            )
+        finally:
+            release.set()
+            self.assertTrue(other_worker.wait_idle(timeout=5))
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(job.status, "succeeded")
+
+    def test_session_reload_waits_for_running_jobs(self):
+        self.addCleanup(setattr, web, "session_generation", web.session_generation)
+        web.jobs = JobManager(max_workers=1)
+        ctrl = Mock(plex_connection=None)
+        release = threading.Event()
+        job = web.jobs.submit("update", lambda _job: release.wait(10), server_id="server")
+        web.state_store.increment("app", "session-generation")
+
+        web._sync_controller(ctrl)
+        ctrl.reload_session.assert_not_called()
+        release.set()
+        self.assertTrue(job.wait(timeout=5))
+        self.assertTrue(web.jobs.wait_idle(timeout=5))
+        web._sync_controller(ctrl)
+        ctrl.reload_session.assert_called_once_with()
+
+
+class ProductionServingTests(unittest.TestCase):
+    def setUp(self):
+        self.previous_store = web.state_store
+        self.previous_config = {key: web.app.config.get(key) for key in ("REQUIRE_AUTH", "ACCESS_TOKEN", "CSRF_TOKEN")}
+
+    def tearDown(self):
+        web.configure_state_store(self.previous_store)
+        web.app.config.update(self.previous_config)
+
+    def test_several_workers_need_a_shared_store(self):
+        with self.assertRaisesRegex(RuntimeError, "shared state store"):
+            web.run_web(production=True, workers=2, state_store_url="memory")
+
+    def test_missing_wsgi_server_is_reported(self):
+        missing = {"waitress": None, "gunicorn": None, "gunicorn.app": None, "gunicorn.app.base": None}
+        with patch.dict(sys.modules, missing), patch.object(web, "init_app"):
+            with self.assertRaisesRegex(RuntimeError, "pip install waitress"):
+                web.run_web(production=True)
+
+    def test_external_wsgi_app_requires_a_strong_token(self):
+        with patch.object(web, "init_app") as init_app:
+            for token in ("", "too-short"):
+                with self.subTest(token=token), patch.dict(os.environ, {"RTP_ACCESS_TOKEN": token}):
+                    with self.assertRaisesRegex(RuntimeError, "at least 16 characters"):
+                        web.create_app("memory")
+            init_app.assert_not_called()
+
+            with patch.dict(os.environ, {"RTP_ACCESS_TOKEN": "a-strong-access-token"}):
+                web.create_app("memory")
+            self.assertEqual(
+                (web.app.config["REQUIRE_AUTH"], web.app.config["ACCESS_TOKEN"]),
+                (True, "a-strong-access-token"),
+            )
+
+            with patch.dict(os.environ, {"RTP_ACCESS_TOKEN": ""}):
+                web.create_app("memory", loopback_only=True)
+            self.assertFalse(web.app.config["REQUIRE_AUTH"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import gzip
+import os
+import re
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import RatingsResponseCompression as compression
+import RatingsToPlexRatingsWeb as web
+from RatingsStaticAssets import ASSET_CACHE_CONTROL, StaticAssets
+
+
+class StaticAssetsTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
+        self.addCleanup(self.temp_dir.cleanup)
+        for name, contents in (("app.js", "console.log(1);\n"), ("notes.txt", "not an asset\n")):
+            with open(os.path.join(self.temp_dir.name, name), "w", encoding="utf-8") as asset_file:
+                asset_file.write(contents)
+
+    def test_assets_are_fingerprinted_by_content(self):
+        assets = StaticAssets(self.temp_dir.name)
+        url = assets.url("app.js")
+
+        self.assertRegex(url, r"^/assets/app\.[0-9a-f]{12}\.js$")
+        self.assertEqual(assets.url("notes.txt"), "/static/notes.txt")
+        asset = assets.get(url.rsplit("/", 1)[1])
+        self.assertEqual(gzip.decompress(asset.body("gzip")), b"console.log(1);\n")
+        self.assertNotEqual(asset.etag_for("gzip"), asset.etag_for(None))
+
+        with open(os.path.join(self.temp_dir.name, "app.js"), "w", encoding="utf-8") as asset_file:
+            asset_file.write("console.log(2);\n")
+        self.assertEqual(assets.url("app.js"), url)
+        self.assertNotEqual(StaticAssets(self.temp_dir.name).url("app.js"), url)
+
+
+class AssetServingTests(unittest.TestCase):
+    def setUp(self):
+        self.previous_config = {key: web.app.config.get(key) for key in ("TESTING", "REQUIRE_AUTH")}
+        web.app.config.update(TESTING=True, REQUIRE_AUTH=False)
+        self.client = web.app.test_client()
+
+    def tearDown(self):
+        web.app.config.update(self.previous_config)
+
+    def _asset_urls(self):
+        page = self.client.get("/")
+        self.assertEqual(page.headers["Cache-Control"], "no-cache")
+        return re.findall(r'(?:href|src)="(/assets/[^"]+)"', page.get_data(as_text=True))
+
+    def test_page_links_fingerprinted_assets(self):
+        urls = self._asset_urls()
+
+        self.assertEqual(len(urls), 2)
+        self.assertTrue(any(url.endswith(".css") for url in urls))
+        self.assertTrue(any(url.endswith(".js") for url in urls))
+
+    def test_assets_are_precompressed_immutable_and_revalidate_by_etag(self):
+        script_url = next(url for url in self._asset_urls() if url.endswith(".js"))
+        with open(os.path.join(web.STATIC_DIR, "app.js"), "rb") as script_file:
+            script = script_file.read()
+
+        with patch.object(compression, "brotli_available", return_value=False):
+            response = self.client.get(script_url, headers={"Accept-Encoding": "gzip, br"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Cache-Control"], ASSET_CACHE_CONTROL)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("javascript", response.mimetype)
+        self.assertEqual(gzip.decompress(response.get_data()), script)
+        etag = response.headers["ETag"]
+        self.assertFalse(etag.startswith("W/"))
+
+        plain = self.client.get(script_url)
+        self.assertEqual(plain.get_data(), script)
+        self.assertNotEqual(plain.headers["ETag"], etag)
+
+        with patch.object(compression, "brotli_available", return_value=False):
+            cached = self.client.get(script_url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.get_data(), b"")
+
+    def test_unknown_fingerprints_are_not_found(self):
+        self.assertEqual(self.client.get("/assets/app.000000000000.js").status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,19 +5,21 @@ import unittest
 class TemplateSecurityTests(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
-        template_path = os.path.join(
-            os.path.dirname(__file__),
-            "..",
-            "templates",
-            "index.html",
-        )
-        with open(template_path, "r", encoding="utf-8") as template_file:
+        root = os.path.join(os.path.dirname(__file__), "..")
+        with open(os.path.join(root, "templates", "index.html"), "r", encoding="utf-8") as template_file:
             cls.template = template_file.read()
+        with open(os.path.join(root, "static", "app.js"), "r", encoding="utf-8") as script_file:
+            cls.script = script_file.read()
+
+    def test_page_has_no_inline_script(self):
+        self.assertNotIn("<script>", self.template)
+        self.assertNotIn("csrf_token | tojson", self.template)
+        self.assertNotIn("{{", self.script)
 
     def test_preview_cards_are_constructed_without_html_injection_sinks(self):
-        start = self.template.index("function renderPreviewCards(items)")
-        end = self.template.index("// ---- Force overwrite toggle", start)
-        renderer = self.template[start:end]
+        start = self.script.index("function renderPreviewCards(items)")
+        end = self.script.index("// ---- Force overwrite toggle", start)
+        renderer = self.script[start:end]
 
         self.assertNotIn("innerHTML", renderer)
         self.assertNotIn("escapeHtml", renderer)
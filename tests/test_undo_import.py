@@ -0,0 +1,227 @@
+import os
+import queue
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import RatingsToPlexRatingsWeb as web
+from PlexWriteExecutor import PlexWriteExecutor
+from RatingsChangeStore import ChangeStore, RatingChange
+from RatingsImportPipeline import ImportOptions, ImportPlan, ParsedRow, PlanItem, RatingsImportPipeline
+from RatingsUndoPipeline import RatingsUndoPipeline, UndoError, undo_targets
+
+
+class NotFound(Exception):
+    pass
+
+
+class FakeItem:
+    def __init__(self, rating_key, title, user_rating=None, view_count=0):
+        self.ratingKey = rating_key
+        self.title = title
+        self.userRating = user_rating
+        self.viewCount = view_count
+
+    def rate(self, rating):
+        self.userRating = rating
+
+    def markWatched(self):
+        self.viewCount += 1
+
+
+class FakeServer:
+    machineIdentifier = "home"
+    friendlyName = "Home"
+
+    def __init__(self, items):
+        self._session = SimpleNamespace(put="PUT")
+        self.items = {item.ratingKey: item for item in items}
+        self.queries = []
+        self.fetch_batches = []
+
+    def fetchItems(self, keys):
+        self.fetch_batches.append(list(keys))
+        found = [self.items[key] for key in keys if key in self.items]
+        if not found:
+            raise NotFound("(404) not_found")
+        return found
+
+    def query(self, path, method=None):
+        self.queries.append(path)
+
+
+def _plan(items, new_rating=9.0, mark_watched=False):
+    options = ImportOptions(
+        source="IMDb", selected_media_types=frozenset({"Movie"}), mark_watched=mark_watched
+    )
+    plan_items = [
+        PlanItem(
+            parsed=ParsedRow(source="IMDb", raw={}, title=item.title, year="2001", rating_text="9"),
+            status="will_update",
+            matched=True,
+            new_rating=new_rating,
+            current_rating=item.userRating,
+            title=item.title,
+            year="2001",
+            thumb=None,
+            plex_item=item,
+        )
+        for item in items
+    ]
+    return ImportPlan(source="IMDb", items=plan_items, total_rows=len(plan_items), options=options)
+
+
+def _serial_executor():
+    return PlexWriteExecutor(max_workers=1, initial_workers=1, sleep=lambda _delay: None)
+
+
+class ChangeStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
+        self.store = ChangeStore(os.path.join(self.temp_dir.name, "changes.sqlite3"), max_runs=2)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_apply_records_old_state_and_applied_writes(self):
+        kept = FakeItem(1, "Kept", user_rating=6.0, view_count=2)
+        fresh = FakeItem(2, "Fresh")
+        pipeline = RatingsImportPipeline(FakeServer([kept, fresh]), executor=_serial_executor())
+
+        result = pipeline.apply(
+            _plan([kept, fresh], mark_watched=True), changes=self.store, details={"library": "Movies"}
+        )
+
+        run = self.store.get_run(result.stats["run_id"])
+        self.assertEqual((run.library, run.server, run.changes, run.applied), ("Movies", "home", 2, 2))
+        changes = self.store.changes(run.run_id)
+        self.assertEqual([(c.old_rating, c.new_rating, c.was_watched) for c in changes], [
+            (6.0, 9.0, True), (None, 9.0, False),
+        ])
+        # "Kept" was already watched, so only "Fresh" needed marking.
+        self.assertEqual([(c.applied, c.marked_watched) for c in changes], [(True, False), (True, True)])
+        self.assertEqual((result.stats["watched_marked"], result.stats["watched_skipped"]), (1, 1))
+
+    def test_oldest_runs_are_pruned(self):
+        run_ids = [
+            self.store.begin_run({}, [RatingChange("1", 8.0)], run_id=f"run{index}").run_id
+            for index in range(3)
+        ]
+
+        self.assertEqual(self.store.get_run(run_ids[0]), None)
+        self.assertEqual(len(self.store.runs()), 2)
+
+    def test_targets_keep_the_first_old_rating_and_last_new_rating(self):
+        targets = undo_targets([
+            RatingChange("1", 7.0, old_rating=5.0, was_watched=False, marked_watched=True),
+            RatingChange("1", 8.0, old_rating=7.0),
+            RatingChange("2", 6.0, old_rating=None, was_watched=True, marked_watched=True),
+        ])
+
+        self.assertEqual(
+            [(t.rating_key, t.old_rating, t.new_rating, t.unwatch) for t in targets],
+            [("1", 5.0, 8.0, True), ("2", None, 6.0, False)],
+        )
+
+
+class UndoPipelineTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
+        self.store = ChangeStore(os.path.join(self.temp_dir.name, "changes.sqlite3"))
+        self.rated = FakeItem(1, "Rated", user_rating=6.0, view_count=1)
+        self.unrated = FakeItem(2, "Unrated")
+        self.edited = FakeItem(3, "Edited", user_rating=4.0)
+        self.deleted = FakeItem(4, "Deleted")
+        items = [self.rated, self.unrated, self.edited, self.deleted]
+        self.server = FakeServer(items)
+        result = RatingsImportPipeline(self.server, executor=_serial_executor()).apply(
+            _plan(items, mark_watched=True), changes=self.store
+        )
+        self.run_id = result.stats["run_id"]
+        self.edited.userRating = 2.0
+        del self.server.items[4]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_undo_reverts_only_items_still_holding_the_runs_rating(self):
+        logs = []
+        result = RatingsUndoPipeline(self.server, self.store, log=logs.append, executor=_serial_executor()).undo(
+            self.run_id
+        )
+
+        self.assertTrue(result.success)
+        self.assertEqual(
+            {key: result.stats[key] for key in ("reverted", "unwatched", "changed_since", "not_found")},
+            {"reverted": 2, "unwatched": 1, "changed_since": 1, "not_found": 1},
+        )
+        self.assertEqual(self.server.fetch_batches, [[1, 2, 3, 4]])
+        self.assertEqual(self.server.queries, [
+            "/:/rate?key=1&identifier=com.plexapp.plugins.library&rating=6.0",
+            "/:/rate?key=2&identifier=com.plexapp.plugins.library&rating=-1",
+            "/:/unscrobble?key=2&identifier=com.plexapp.plugins.library",
+        ])
+        self.assertIsNotNone(self.store.get_run(self.run_id).undone_at)
+        with self.assertRaises(UndoError):
+            RatingsUndoPipeline(self.server, self.store).undo(self.run_id)
+
+
+class UndoEndpointTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
+        self.item = FakeItem(1, "Rated", user_rating=6.0)
+        self.server = FakeServer([self.item])
+        self.previous_controller = web.controller
+        self.previous_jobs = web.jobs
+        self.previous_config = {
+            key: web.app.config.get(key) for key in ("TESTING", "REQUIRE_AUTH", "CSRF_TOKEN")
+        }
+        web.controller = SimpleNamespace(plex_connection=SimpleNamespace(server=self.server))
+        web.jobs = web.JobManager(max_workers=2)
+        web.app.config.update(TESTING=True, REQUIRE_AUTH=False, CSRF_TOKEN="test-csrf-token")
+        self.change_db = patch.object(web, "CHANGE_DB_PATH", os.path.join(self.temp_dir.name, "changes.sqlite3"))
+        self.change_db.start()
+        self.client = web.app.test_client()
+
+    def tearDown(self):
+        self.change_db.stop()
+        web.controller = self.previous_controller
+        web.jobs = self.previous_jobs
+        web.app.config.update(self.previous_config)
+        while True:
+            try:
+                web.log_queue.get_nowait()
+            except queue.Empty:
+                break
+        self.temp_dir.cleanup()
+
+    def _undo(self, run_id):
+        return self.client.post(f"/api/import-runs/{run_id}/undo", headers={"X-CSRF-Token": "test-csrf-token"})
+
+    def test_recorded_run_is_listed_and_undone(self):
+        result = RatingsImportPipeline(self.server).apply(_plan([self.item]), changes=web._change_store())
+        runs = self.client.get("/api/import-runs").get_json()["runs"]
+        self.assertEqual([(run["runId"], run["applied"]) for run in runs], [(result.stats["run_id"], 1)])
+
+        response = self._undo(result.stats["run_id"])
+        self.assertEqual(response.status_code, 200)
+        job = web.jobs.get(response.get_json()["jobId"])
+        self.assertTrue(job.wait(timeout=10))
+        self.assertEqual((job.kind, job.result["stats"]["reverted"]), ("undo", 1))
+        self.assertEqual(self.server.queries, ["/:/rate?key=1&identifier=com.plexapp.plugins.library&rating=6.0"])
+        self.assertEqual(self._undo(result.stats["run_id"]).status_code, 409)
+
+    def test_runs_for_other_users_or_servers_are_refused(self):
+        store = web._change_store()
+        other_user = store.begin_run({"server": "home", "user": "kid"}, [RatingChange("1", 9.0)]).run_id
+        other_server = store.begin_run({"server": "cabin"}, [RatingChange("1", 9.0)]).run_id
+
+        self.assertEqual(self._undo(other_user).status_code, 400)
+        self.assertEqual(self._undo(other_server).status_code, 409)
+        self.assertEqual(self._undo("missing").status_code, 404)
+        self.assertEqual(self.server.queries, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,7 @@ import io
 import os
 import re
 import tempfile
+import threading
 import unittest
 import uuid
 
@@ -23,9 +24,7 @@ class UploadSecurityTests(unittest.TestCase):
     def setUp(self):
         self.temp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(__file__))
         self.previous_upload_dir = web.UPLOAD_DIR
-        self.previous_uploaded_path = web.uploaded_csv_path
-        self.previous_row_count = web.csv_row_count
-        self.previous_update_running = web.update_running
+        self.previous_jobs = web.jobs
         self.previous_config = {
             "TESTING": web.app.config.get("TESTING"),
             "REQUIRE_AUTH": web.app.config.get("REQUIRE_AUTH"),
@@ -35,9 +34,8 @@ class UploadSecurityTests(unittest.TestCase):
         }
 
         web.UPLOAD_DIR = self.temp_dir.name
-        web.uploaded_csv_path = None
-        web.csv_row_count = 0
-        web.update_running = False
+        self.previous_store = web.configure_state_store(web.MemoryStateStore())
+        web.jobs = web.JobManager(max_workers=2)
         web.app.config.update(
             TESTING=True,
             REQUIRE_AUTH=False,
@@ -50,9 +48,8 @@ class UploadSecurityTests(unittest.TestCase):
 
     def tearDown(self):
         web.UPLOAD_DIR = self.previous_upload_dir
-        web.uploaded_csv_path = self.previous_uploaded_path
-        web.csv_row_count = self.previous_row_count
-        web.update_running = self.previous_update_running
+        web.configure_state_store(self.previous_store)
+        web.jobs = self.previous_jobs
         web.app.config.update(self.previous_config)
         self.temp_dir.cleanup()
 
@@ -82,7 +79,7 @@ class UploadSecurityTests(unittest.TestCase):
         stored_files = os.listdir(self.temp_dir.name)
         self.assertEqual(len(stored_files), 1)
         self.assertRegex(stored_files[0], re.compile(r"^[0-9a-f]{32}\.csv$"))
-        self.assertEqual(web.uploaded_csv_path, os.path.join(self.temp_dir.name, stored_files[0]))
+        self.assertEqual(web._current_upload()[0], os.path.join(self.temp_dir.name, stored_files[0]))
 
     def test_non_csv_extension_is_rejected_without_saving(self):
         response = self._upload(IMDB_CSV, filename="ratings.txt")
@@ -97,7 +94,7 @@ class UploadSecurityTests(unittest.TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertIn("missing required columns", response.get_json()["error"])
         self.assertEqual(os.listdir(self.temp_dir.name), [])
-        self.assertIsNone(web.uploaded_csv_path)
+        self.assertIsNone(web._current_upload()[0])
 
     def test_source_specific_headers_are_validated(self):
         response = self._upload(LETTERBOXD_CSV, source="IMDb")
@@ -112,7 +109,7 @@ class UploadSecurityTests(unittest.TestCase):
 
         first_response = self._upload(IMDB_CSV, filename="first.csv")
         self.assertEqual(first_response.status_code, 200)
-        first_path = web.uploaded_csv_path
+        first_path = web._current_upload()[0]
         self.assertFalse(os.path.exists(stale_path))
 
         second_response = self._upload(
@@ -146,13 +143,30 @@ class UploadSecurityTests(unittest.TestCase):
         self.assertEqual(os.listdir(self.temp_dir.name), [])
 
     def test_upload_is_rejected_while_operation_is_running(self):
-        web.update_running = True
-
-        response = self._upload(IMDB_CSV)
+        release = threading.Event()
+        job = web.jobs.submit("update", lambda _job: release.wait(10), server_id="server")
+        try:
+            response = self._upload(IMDB_CSV)
+        finally:
+            release.set()
+            job.wait(timeout=10)
 
         self.assertEqual(response.status_code, 409)
         self.assertEqual(os.listdir(self.temp_dir.name), [])
 
+    def test_upload_is_rejected_while_the_csv_is_being_read(self):
+        first = self._upload(IMDB_CSV, filename="first.csv")
+        self.assertEqual(first.status_code, 200)
+        release = web._hold_upload(web._current_upload()[0])
+        try:
+            response = self._upload(LETTERBOXD_CSV, source="Letterboxd")
+        finally:
+            release()
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(os.listdir(self.temp_dir.name)), 1)
+        self.assertEqual(self._upload(LETTERBOXD_CSV, source="Letterboxd").status_code, 200)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,200 @@
+import threading
+import unittest
+from types import SimpleNamespace
+
+from PlexWriteExecutor import (
+    AdaptiveConcurrency,
+    CircuitBreaker,
+    CircuitOpenError,
+    PlexWriteExecutor,
+    ProgressThrottle,
+    describe_write_stats,
+    error_status_code,
+    is_transient_error,
+)
+
+
+class BadRequest(Exception):
+    """Mirrors the message format of plexapi.exceptions.BadRequest."""
+
+
+class ReadTimeout(OSError):
+    """Mirrors requests.exceptions.ReadTimeout without importing requests."""
+
+
+class WriteExecutorTests(unittest.TestCase):
+    def test_transient_error_classification(self):
+        self.assertTrue(is_transient_error(ConnectionError("reset")))
+        self.assertTrue(is_transient_error(ReadTimeout("timed out")))
+        self.assertTrue(is_transient_error(BadRequest("(503) service_unavailable; url")))
+        self.assertTrue(is_transient_error(BadRequest("(429) too_many_requests; url")))
+        self.assertFalse(is_transient_error(BadRequest("(400) bad_request; url")))
+        self.assertFalse(is_transient_error(ValueError("bad rating")))
+        self.assertEqual(error_status_code(BadRequest("(502) bad_gateway; url")), 502)
+
+    def test_transient_failures_are_retried_with_backoff(self):
+        attempts = {}
+        delays = []
+
+        def write(task):
+            attempts[task] = attempts.get(task, 0) + 1
+            if task == "flaky" and attempts[task] < 3:
+                raise ConnectionError("reset")
+            if task == "broken":
+                raise BadRequest("(400) bad_request; url")
+
+        executor = PlexWriteExecutor(
+            max_workers=2, retries=2, backoff=0.1, sleep=delays.append, jitter=lambda: 1.0
+        )
+        collected = []
+        executor.run(["ok", "flaky", "broken"], write, on_done=collected.append)
+        outcomes = {outcome.task: outcome for outcome in collected}
+
+        self.assertTrue(outcomes["ok"].ok)
+        self.assertTrue(outcomes["flaky"].ok)
+        self.assertEqual(outcomes["flaky"].attempts, 3)
+        self.assertFalse(outcomes["broken"].ok)
+        self.assertEqual(outcomes["broken"].attempts, 1)
+        self.assertEqual(delays, [0.1, 0.2])
+
+    def test_retries_are_bounded(self):
+        def write(_task):
+            raise ConnectionError("reset")
+
+        executor = PlexWriteExecutor(max_workers=1, retries=1, sleep=lambda _delay: None)
+        outcomes = []
+        executor.run(["item"], write, on_done=outcomes.append)
+        outcome = outcomes[0]
+
+        self.assertFalse(outcome.ok)
+        self.assertEqual(outcome.attempts, 2)
+
+    def test_retry_delay_is_jittered_and_honours_retry_after(self):
+        error = BadRequest("(429) too_many_requests; url")
+        error.response = SimpleNamespace(status_code=429, headers={"Retry-After": "3"})
+        low = PlexWriteExecutor(backoff=1.0, jitter=lambda: 0.0)
+        high = PlexWriteExecutor(backoff=1.0, jitter=lambda: 1.0)
+
+        self.assertEqual(low._retry_delay(2, ConnectionError("reset")), 1.0)
+        self.assertEqual(high._retry_delay(2, ConnectionError("reset")), 2.0)
+        self.assertEqual(low._retry_delay(1, error), 3.0)
+
+    def test_in_flight_writes_never_exceed_the_limit(self):
+        lock = threading.Lock()
+        in_flight = [0, 0]
+
+        def write(_task):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight[1], in_flight[0])
+            with lock:
+                in_flight[0] -= 1
+
+        executor = PlexWriteExecutor(max_workers=3, initial_workers=2)
+        outcomes = []
+        run_stats = executor.run(range(200), write, on_done=outcomes.append)
+
+        self.assertTrue(all(outcome.ok for outcome in outcomes))
+        self.assertLessEqual(in_flight[1], 3)
+        self.assertEqual(run_stats, executor.stats())
+        stats = executor.stats()["concurrency"]
+        self.assertEqual(stats["requests"], 200)
+        self.assertEqual(stats["peak"], 3)
+        self.assertIn("peak 3", describe_write_stats(executor.stats()))
+
+    def test_open_circuit_fails_writes_fast(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        calls = []
+
+        def write(task):
+            calls.append(task)
+            raise ConnectionError("refused")
+
+        executor = PlexWriteExecutor(max_workers=1, initial_workers=1, retries=0, breaker=breaker)
+        outcomes = []
+        executor.run(["a", "b", "c", "d"], write, on_done=outcomes.append)
+
+        self.assertEqual(calls, ["a", "b"])
+        self.assertTrue(all(isinstance(outcome.error, CircuitOpenError) for outcome in outcomes[2:]))
+        self.assertEqual(executor.stats()["circuit"]["state"], "open")
+
+
+    def test_progress_throttle_emits_on_percentage_and_final_item(self):
+        now = [0.0]
+        throttle = ProgressThrottle(1000, min_interval=10.0, min_percent=5.0, clock=lambda: now[0])
+
+        emitted = [current for current in range(1, 1001) if throttle.should_emit(current)]
+
+        self.assertEqual(emitted[0], 1)
+        self.assertEqual(emitted[-1], 1000)
+        self.assertLessEqual(len(emitted), 22)
+
+    def test_progress_throttle_emits_after_interval(self):
+        now = [0.0]
+        throttle = ProgressThrottle(1000, min_interval=1.0, min_percent=50.0, clock=lambda: now[0])
+
+        self.assertTrue(throttle.should_emit(1))
+        self.assertFalse(throttle.should_emit(2))
+        now[0] = 1.5
+        self.assertTrue(throttle.should_emit(3))
+
+
+
+class AdaptiveConcurrencyTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.limiter = AdaptiveConcurrency(
+            initial=4, minimum=1, maximum=6, latency_target=1.0, decrease_interval=1.0,
+            clock=lambda: self.now,
+        )
+
+    def test_fast_successes_grow_the_limit_additively(self):
+        for _ in range(4 + 5):
+            self.limiter.record(0.1)
+
+        self.assertEqual(self.limiter.limit, 6)
+        self.assertEqual([entry["reason"] for entry in self.limiter.history], ["start", "increase", "increase"])
+
+    def test_errors_and_slow_requests_halve_the_limit_once_per_interval(self):
+        throttled = BadRequest("(429) too_many_requests; url")
+        self.limiter.record(0.1, throttled)
+        self.limiter.record(0.1, ConnectionError("reset"))
+        self.assertEqual(self.limiter.limit, 2)
+
+        self.now = 1.5
+        self.limiter.record(2.5)
+        self.assertEqual(self.limiter.limit, 1)
+        self.now = 3.0
+        self.limiter.record(0.1, ConnectionError("reset"))
+        self.assertEqual(self.limiter.limit, 1)
+
+        stats = self.limiter.to_dict()
+        self.assertEqual((stats["errors"], stats["throttled"], stats["slow"]), (3, 1, 1))
+        self.assertEqual([entry["reason"] for entry in stats["history"][1:]], ["throttled", "latency"])
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def test_half_open_trial_closes_or_reopens(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        now[0] = 10
+        self.assertEqual(breaker.state, "half_open")
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # only one trial at a time
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+
+        now[0] = 20
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertEqual(breaker.to_dict()["trips"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()